@@ -1,8 +1,30 @@
+"""
+This module authenticates the users of the app from their bearer tokens.
+
+Tokens come in two kinds, and both are accepted whichever SESSION_TOKEN_MODE issues new ones at login:
+*   **stored sessions**: random tokens whose session is looked up in the sessions collection (see session_repo.py)
+*   **signed tokens**: "v1.<claims>.<signature>", where the claims are the user id, role, issue and expiry times
+    and a token id, signed with SESSION_SIGNING_KEY by HMAC-SHA256. Checking one needs no session lookup, so any
+    worker holding the key can authorize the request; only the small revocation list is consulted, for logouts.
+
+The users tokens resolve to are kept for USER_CACHE_TTL_SECONDS in the user cache (see user_cache.py). The token
+itself is still checked on every request, since it may be revoked or logged out by another worker meanwhile.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
 import time
+from typing import Any
 from fastapi import HTTPException, WebSocket, WebSocketException, status
 from fastapi import Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.repositories.user_repo import load_users
+from app.repositories.session_repo import get_session, is_token_revoked
+from app.repositories.user_cache import user_cache
+from app.repositories.user_repo import get_user
+from app.services.config_service import get_session_signing_key_default, get_user_cache_ttl_default
 from app.schemas.user_schema import (
     User, 
     UserRole, 
@@ -16,9 +38,134 @@ from app.schemas.user_schema import (
 # tells swagger ui that the app uses bearer tokens
 http_bearer = HTTPBearer()
 
+SIGNED_TOKEN_PREFIX = "v1."
+
+def _signing_key() -> bytes:
+    """
+    Returns the key signed tokens are signed with. Raises a ValueError if SESSION_SIGNING_KEY is blank, since a key
+    made up by one worker would leave its tokens invalid in every other worker.
+    """
+    key = get_session_signing_key_default()
+    if not key:
+        raise ValueError("SESSION_SIGNING_KEY must be set to sign or check signed session tokens")
+    return key.encode()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def sign_token(user_id: str, role: UserRole | str, expires_at: float) -> str:
+    """
+    Issues a signed token, which carries the user's id and role and is checked without a session lookup.
+
+    Parameters:
+        user_id (str): the identifier of the user
+        role (UserRole | str): the user's role
+        expires_at (float): the unix time the token expires at
+
+    Returns:
+        str: the signed token
+
+    Raises:
+        ValueError: if SESSION_SIGNING_KEY is blank
+    """
+    claims = {
+        "sub": user_id,
+        "role": role.value if isinstance(role, UserRole) else role,
+        "iat": time.time(),
+        "exp": expires_at,
+        "jti": secrets.token_urlsafe(12),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    signature = hmac.new(_signing_key(), payload.encode(), hashlib.sha256).digest()
+    return f"{SIGNED_TOKEN_PREFIX}{payload}.{_b64encode(signature)}"
+
+def read_signed_token(token: str) -> dict[str, Any] | None:
+    """
+    Verifies a signed token and returns its claims.
+
+    Parameters:
+        token (str): the bearer token
+
+    Returns:
+        dict[str, Any] | None: the token's claims ("sub", "role", "iat", "exp" and "jti"),
+        or None if it is not a signed token
+
+    Raises:
+        HTTPException (status_code = 401): if the token's signature is invalid, or it has expired or been revoked
+    """
+    if not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    payload, _, signature = token[len(SIGNED_TOKEN_PREFIX):].partition(".")
+    try:
+        # without a key no signed token is valid
+        expected = hmac.new(_signing_key(), payload.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise ValueError("signature does not match")
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token") from None
+    if claims["exp"] < time.time():
+        raise HTTPException(status_code=401, detail="Session token has expired, please log in again")
+    if is_token_revoked(claims["jti"], claims["sub"], claims["iat"]):
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    return claims
+
+def _session_of(token: str) -> dict[str, Any]:
+    """Looks up the stored session of a token. Raises a 401 if it is missing or expired."""
+    session = get_session(token)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    if session["expires_at"] < time.time():
+        raise HTTPException(status_code=401, detail="Session token has expired, please log in again")
+    return session
+
+def _load_user(user_id: str) -> User:
+    """Loads the user a token belongs to, as the class of their role. Raises a 401 if they no longer exist."""
+    user = get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    if isinstance(user.get("role"), str):
+        user["role"] = UserRole(user["role"])
+
+    user_class = ROLE_TO_CLASS[user["role"]]
+    return user_class(**user)
+
+def _authenticate(token: str, required_role: UserRole | None = None) -> User:
+    """
+    Resolves a token to its user, from the user cache if it holds the token.
+    With a required role, a signed token of another role is rejected before its user is loaded.
+    """
+    user = user_cache.get(token)
+    if user is not None:
+        # only the user is cached: the token is checked again, so it stops working once it expires or is revoked
+        if read_signed_token(token) is None:
+            _session_of(token)
+        return user
+
+    generation = user_cache.generation()
+    claims = read_signed_token(token)
+    if claims is not None:
+        if required_role is not None and claims["role"] != required_role:
+            raise HTTPException(status_code=403, detail=f"User role '{UserRole(claims['role'])}' does not have access to this resource")
+        user_id, expires_at = claims["sub"], claims["exp"]
+    else:
+        session = _session_of(token)
+        user_id, expires_at = session["user_id"], session["expires_at"]
+
+    user = _load_user(user_id)
+    ttl = get_user_cache_ttl_default()
+    if ttl > 0:
+        user_cache.put(token, user_id, user, min(expires_at, time.time() + ttl), generation)
+    return user
+
 def get_user_from_token(token: str) -> User:
     """
     Authenticates and retrives a user based on their authentication token.
+    A signed token names its user itself; otherwise the token's session is looked up by key first.
+    Either way only the token's own user is loaded, unless it is in the user cache already.
 
     Parameters:
         token (str): the user's authentication token
@@ -29,20 +176,7 @@ def get_user_from_token(token: str) -> User:
     Raises:
         HTTPException (status_code = 401): if user's token is invalid or expired
     """
-    users = load_users()
-
-    for user in users:
-        if user.get("auth_token") == token:
-            if user.get("auth_token_expiry", 0) < time.time():
-                raise HTTPException(status_code=401, detail="Session token has expired, please log in again")
-
-            if isinstance(user.get("role"), str):
-                user["role"] = UserRole(user["role"])
-
-            user_class = ROLE_TO_CLASS[user["role"]]
-            return user_class(**user)
-    
-    raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    return _authenticate(token)
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(http_bearer)) -> User:
     """
@@ -63,6 +197,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(http_be
 def require_role(required_role: UserRole):
     """
     Authenticates and retrieves the current user, and confirms they are of the correct role.
+    The role of a signed token is checked from its claims, before the user is loaded.
 
     Parameters:
         required_role (UserRole): the role that this user must posess
@@ -74,7 +209,8 @@ def require_role(required_role: UserRole):
         HTTPException (status_code = 401): if user's token is invalid or expired
         HTTPException (status_code = 403): if user's role does not match the requested role
     """
-    def role_check(current_user: User = Depends(get_current_user)):
+    def role_check(credentials: HTTPAuthorizationCredentials = Depends(http_bearer)):
+        current_user = _authenticate(credentials.credentials, required_role)
         if current_user.role != required_role:
             raise HTTPException(status_code=403, detail=f"User role '{current_user.role}' does not have access to this resource")
         return current_user
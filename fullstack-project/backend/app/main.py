@@ -1,6 +1,8 @@
+import asyncio
 import os
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -14,15 +16,40 @@ from .routers.payment_router import router as payment_router
 from .routers.receipt_router import router as receipt_router
 from .routers.config_router import router as config_router
 from .routers.promo_router import router as promo_router
+from .repositories.conflicts import StorageConflictError
+from .repositories.schema_migrate import upgrade_stale_collections
+from .repositories.storage_engine import get_engine, track_reads
+from .services.config_service import get_session_signing_key_default, get_session_token_mode_default
+from .services.order_service import archive_orders_periodically
+from .services.session_service import purge_sessions_periodically
 
 description = """
 *Why bother cooking your own meals...*
 Just a few clicks and food from your favourite restaurant will be at your doorstep!
 """
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # signed tokens must be checked with the same key in every worker, so a worker without one refuses to start
+    if get_session_token_mode_default() == "signed" and not get_session_signing_key_default():
+        raise RuntimeError('SESSION_TOKEN_MODE is "signed", but no SESSION_SIGNING_KEY is set')
+    # old delivered, cancelled and rejected orders are moved to the archive in the background
+    archiver = asyncio.create_task(archive_orders_periodically())
+    # expired login sessions are deleted in the background
+    purger = asyncio.create_task(purge_sessions_periodically())
+    # collections still holding records in an older schema are rewritten in their current shape
+    upgrader = asyncio.create_task(asyncio.to_thread(upgrade_stale_collections))
+    yield
+    archiver.cancel()
+    purger.cancel()
+    upgrader.cancel()
+    # write out anything still buffered in write-behind mode before the worker exits
+    get_engine().flush()
+
 app = FastAPI(
     title = "Food Delivery App",
     description = description,
-    summary = "Food delivery with exceptional service!"
+    summary = "Food delivery with exceptional service!",
+    lifespan = lifespan
 )
 origins = [
     "http://localhost:8000",
@@ -37,6 +64,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+# Each request is its own unit of work for conflict detection, so concurrent requests
+# (including ones served by other worker processes) never silently overwrite each other's changes
+class StorageScopeMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_reads():
+            await self.app(scope, receive, send)
+
+app.add_middleware(StorageScopeMiddleware)
+
+@app.exception_handler(StorageConflictError)
+async def storage_conflict_handler(request: Request, exc: StorageConflictError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
 # Mount static files directory (CSS, JS, images, etc.)
 # frontend_path = os.path.join(os.path.dirname(__file__), "..", "..", "frontend")
 # frontend_path = os.path.normpath(frontend_path)
@@ -67,4 +113,6 @@ async def read_root():
     return FileResponse(html_path)
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 runs that many worker processes sharing app/data; reload only works with one
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=workers == 1, workers=workers)
\ No newline at end of file
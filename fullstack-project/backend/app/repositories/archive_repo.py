@@ -0,0 +1,126 @@
+"""
+This module handles the archive of orders and receipts.
+
+Orders that reached a final status long ago are moved out of orders.json into monthly partitions
+(orders_archive_2026_01, ...) by order_service.archive_old_orders, together with their receipts.
+The active collections then only hold the orders the lifecycle operations work on, however much history builds up.
+Partitions are ordinary storage engine collections; they are only read when the archive is queried.
+"""
+
+from typing import Any
+
+from app.repositories.conflicts import StorageConflictError
+from app.repositories.storage_engine import ARCHIVE_PARTITION, archive_partition, get_engine, record_version
+
+
+def _month(partition: str) -> str:
+    """Returns the YYYY-MM month of an archive partition's collection name."""
+    match = ARCHIVE_PARTITION.match(partition)
+    return f"{match.group(2)}-{match.group(3)}"
+
+def archive_months(collection: str) -> list[str]:
+    """
+    **Lists the months that have an archive partition.**
+
+    Parameters:
+        collection (str): "orders" or "receipts"
+
+    Returns:
+        list[str]: the months as YYYY-MM, oldest first
+    """
+    return [_month(partition) for partition in get_engine().partitions(collection)]
+
+def load_archive(collection: str, month: str) -> list[dict[str, Any]]:
+    """
+    **Loads every archived record of a month.**
+
+    Parameters:
+        collection (str): "orders" or "receipts"
+        month (str): the month as YYYY-MM
+
+    Returns:
+        list[dict[str, Any]]: the archived records, empty if the month has no partition
+
+    Raises:
+        ValueError: if the month is not YYYY-MM
+    """
+    return get_engine().load(archive_partition(collection, month))
+
+def find_archived(collection: str, field: str, value: Any, months: list[str] | None = None) -> list[dict[str, Any]]:
+    """
+    **Loads every archived record whose field matches the value.** Each partition searched is scanned.
+
+    Parameters:
+        collection (str): "orders" or "receipts"
+        field (str): the field to match, e.g. "customer_id"
+        value (Any): the value to match
+        months (list[str] | None): the months to search as YYYY-MM, or None to search every partition
+
+    Returns:
+        list[dict[str, Any]]: the matching records, oldest month first
+
+    Raises:
+        ValueError: if a month is not YYYY-MM
+    """
+    engine = get_engine()
+    if months is None:
+        partitions = engine.partitions(collection)
+    else:
+        partitions = [archive_partition(collection, month) for month in sorted(set(months))]
+    return [record for partition in partitions for record in engine.find_by(partition, field, value)]
+
+def has_archived(collection: str, field: str, value: Any) -> bool:
+    """
+    **Checks whether any archived record's field matches the value, stopping at the first match.**
+
+    Parameters:
+        collection (str): "orders" or "receipts"
+        field (str): the field to match, e.g. "customer_id"
+        value (Any): the value to match
+
+    Returns:
+        bool: True if a record matches
+    """
+    engine = get_engine()
+    return any(engine.find_by(partition, field, value) for partition in reversed(engine.partitions(collection)))
+
+def get_archived(collection: str, key: Any) -> dict[str, Any] | None:
+    """
+    **Loads a single archived record by its identifier, searching the newest partitions first.**
+
+    Parameters:
+        collection (str): "orders" or "receipts"
+        key (Any): the identifier of the record
+
+    Returns:
+        dict[str, Any] | None: the record, or None if it is not archived
+    """
+    engine = get_engine()
+    for partition in reversed(engine.partitions(collection)):
+        record = engine.get(partition, key)
+        if record is not None:
+            return record
+    return None
+
+def archive_record(collection: str, month: str, record: dict[str, Any]) -> None:
+    """
+    **Moves a record from its active collection into the month's archive partition.**
+    Run it inside unit_of_work.transaction() so the copy and the removal are saved together, and the removal fails
+    if the record is changed by another request before the transaction commits.
+
+    Parameters:
+        collection (str): "orders" or "receipts"
+        month (str): the month as YYYY-MM
+        record (dict[str, Any]): the record to archive
+
+    Returns: None
+
+    Raises:
+        ValueError: if the month is not YYYY-MM
+        StorageConflictError: if the stored record was changed since it was read
+    """
+    engine = get_engine()
+    if record_version(engine.get(collection, record["id"])) != record_version(record):
+        raise StorageConflictError(collection, record["id"])
+    engine.upsert(archive_partition(collection, month), record)
+    engine.delete(collection, record["id"])
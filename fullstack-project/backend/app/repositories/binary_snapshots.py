@@ -0,0 +1,114 @@
+"""
+This module implements binary snapshots of the json data files.
+
+Parsing a large json file is the slowest part of a cold start or of reloading a file changed by another worker.
+A snapshot (<file>.snap, e.g. orders.json.snap) holds the same records already serialized with marshal - the
+format the DocumentCache keeps them in - so loading one is a plain file read instead of a parse.
+
+The json files stay the source of truth and keep their readable format. Each snapshot records the stamp of the file
+it was taken from and is only used while the file still has that stamp, so a stale snapshot is never read and
+snapshots can be deleted at any time. Snapshots written by a different Python version are ignored as well,
+since the marshal format is only guaranteed within one version. A snapshot also records a tag given by its
+writer - the schema version its records were upgraded to (see migrations.py) - and is only read back under it.
+
+File layout: a fixed header (see _HEADER) followed by the marshalled records.
+"""
+
+from pathlib import Path
+import marshal
+import os
+import struct
+import sys
+from typing import Any, Callable
+
+from app.repositories.document_cache import freeze
+
+SNAPSHOT_SUFFIX = ".snap"
+FORMAT_VERSION = 2
+
+_MAGIC = b"FDSNAP"
+# magic, format version, marshal version, python major, python minor, tag, source mtime_ns, size, inode, body length
+_HEADER = struct.Struct("<6s4BI4Q")
+
+
+def snapshot_path(path: Path) -> Path:
+    """Returns the snapshot path of a data file."""
+    return path.with_name(path.name + SNAPSHOT_SUFFIX)
+
+
+def _header(stamp: tuple[int, int, int], length: int, tag: int) -> bytes:
+    return _HEADER.pack(
+        _MAGIC, FORMAT_VERSION, marshal.version, sys.version_info[0], sys.version_info[1], tag, *stamp, length
+    )
+
+
+def read_snapshot(path: Path, stamp: tuple[int, int, int] | None, tag: int = 0) -> bytes | None:
+    """
+    Reads the snapshot of a data file, if there is one taken at the file's current stamp.
+
+    Parameters:
+        path (Path): the data file, e.g. app/data/orders.json
+        stamp (tuple[int, int, int] | None): the data file's current stamp (see json_files.file_stamp)
+        tag (int): the tag the snapshot must have been written with
+
+    Returns:
+        bytes | None: the records frozen with freeze(), or None if there is no usable snapshot
+    """
+    if stamp is None:
+        return None
+    try:
+        data = snapshot_path(path).read_bytes()
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    length = _HEADER.unpack_from(data)[-1]
+    if data[:_HEADER.size] != _header(stamp, length, tag) or len(data) != _HEADER.size + length:
+        return None
+    return data[_HEADER.size:]
+
+
+def write_snapshot(path: Path, stamp: tuple[int, int, int] | None, frozen: bytes, tag: int = 0) -> None:
+    """
+    Atomically writes the snapshot of a data file. Failing to write it is not an error, since the data file
+    still holds the records; the next load just parses the file.
+
+    Parameters:
+        path (Path): the data file the records were read from or written to
+        stamp (tuple[int, int, int] | None): the data file's stamp for these records
+        frozen (bytes): the records frozen with freeze()
+        tag (int): the tag to write the snapshot with
+
+    Returns: None
+    """
+    if stamp is None:
+        return
+    target = snapshot_path(path)
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        tmp.write_bytes(_header(stamp, len(frozen), tag) + frozen)
+        os.replace(tmp, target)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+
+
+def load_frozen(path: Path, stamp: tuple[int, int, int] | None, parser: Callable[[Path], Any], tag: int = 0) -> bytes:
+    """
+    Returns the frozen records of a data file, from its snapshot if it is up to date.
+    Otherwise the file is parsed and a snapshot is written for the next load.
+    The stamp must be taken before the file is read, so a file replaced meanwhile is never snapshotted under it.
+
+    Parameters:
+        path (Path): the data file
+        stamp (tuple[int, int, int] | None): the data file's stamp, taken before this call
+        parser (Callable[[Path], Any]): parses the data file
+        tag (int): the snapshot's tag, e.g. the schema version parser upgrades records to
+
+    Returns:
+        bytes: the records frozen with freeze()
+    """
+    frozen = read_snapshot(path, stamp, tag)
+    if frozen is None:
+        frozen = freeze(parser(path))
+        write_snapshot(path, stamp, frozen, tag)
+    return frozen
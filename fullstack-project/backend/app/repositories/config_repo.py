@@ -2,7 +2,9 @@
 
 from pathlib import Path
 import json
-import os
+
+from app.repositories.document_cache import document_cache
+from app.repositories.json_files import write_json_file
 
 CONFIG_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "config.json"
 
@@ -17,9 +19,44 @@ default = {
 
     # defaults for user service
     "RESET_TOKEN_EXPIRY": 900, # 15 minutes
-    "SESSION_TOKEN_EXPIRY": 86400 # 24 hours
+    "SESSION_TOKEN_EXPIRY": 86400, # 24 hours
+    "SESSION_PURGE_INTERVAL_SECONDS": 3600, # how often expired sessions are deleted, 0 to never purge them
+    "SESSION_TOKEN_MODE": "stored", # "stored" sessions, or "signed" tokens checked without reading storage
+    "SESSION_SIGNING_KEY": "", # secret signing "signed" tokens, shared by all workers; required in "signed" mode
+    "PASSWORD_HASH_ITERATIONS": 600000, # pbkdf2-sha256 cost of new password hashes
+    "PASSWORD_HASH_WORKERS": 2, # passwords hashed or checked at the same time, the rest wait their turn
+    "PASSWORD_REHASH_ON_LOGIN": True, # hash passwords again at login if they were stored at another cost
+    "USER_CACHE_TTL_SECONDS": 30, # how long a token's authenticated user is reused, 0 to load it on every request
+
+    # defaults for restaurant service
+    "SEARCH_CACHE_TTL_SECONDS": 60, # how long a search's results are reused if no restaurant changes, 0 to not cache
+
+    # defaults for order archiving
+    "ARCHIVE_AFTER_DAYS": 30, # delivered, cancelled and rejected orders older than this are archived
+    "ARCHIVE_INTERVAL_SECONDS": 3600, # how often the archiver runs, 0 to only archive on demand
+
+    # defaults for repositories ("json" or "sqlite")
+    "STORAGE_ENGINE": "json",
+    "JOURNALED_COLLECTIONS": [], # json engine only, e.g. ["orders", "deliveries"]
+    "JOURNAL_COMPACT_BYTES": 1048576, # 1 MiB
+    "JSONL_COLLECTIONS": [], # json engine only, set by python -m app.repositories.jsonl_migrate
+    "BINARY_SNAPSHOTS": True, # json engine only, keeps a <file>.snap next to each json file for fast loading
+    "SNAPSHOT_INTERVAL_SECONDS": 60, # least time between two snapshots of a collection being saved
+    "WRITE_BEHIND_MS": 0, # 0 writes every save straight away, otherwise the longest a change is held in memory
+    "WRITE_BEHIND_MAX_PENDING": 100 # buffered writes that trigger a flush before WRITE_BEHIND_MS is up
 }
 
+def _read_config(path: Path) -> dict:
+    """Parses the config file, falling back to the defaults if it is missing or blank."""
+    if not path.exists():
+        return default
+    with path.open("r", encoding="utf-8") as f:
+        content = f.read().strip()
+        if not content:
+            return default
+        else:
+            return json.loads(content)
+
 def load_config() -> dict:
     """
     **Loads all saved configs.**
@@ -29,14 +66,7 @@ def load_config() -> dict:
     Returns:
     *   **dict**: all configs
     """
-    if not CONFIG_DATA_PATH.exists():
-        return default
-    with CONFIG_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return default
-        else:
-            return json.loads(content)
+    return document_cache.load(CONFIG_DATA_PATH, _read_config)
 
 def save_config(items: dict) -> None:
     """
@@ -47,7 +77,4 @@ def save_config(items: dict) -> None:
 
     Returns: None
     """
-    tmp = CONFIG_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, CONFIG_DATA_PATH)
+    document_cache.store(CONFIG_DATA_PATH, items, write_json_file(CONFIG_DATA_PATH, items))
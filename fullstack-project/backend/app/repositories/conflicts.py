@@ -0,0 +1,76 @@
+"""
+This module implements conflict detection for whole-collection saves.
+
+Repositories save by loading a collection, changing it and writing it back. When another request or worker
+process writes the same collection in between, writing the list back as-is would silently undo their changes.
+Instead, the changes made since the load are merged onto the current contents, and a StorageConflictError is
+raised when both sides changed the same record in different ways.
+"""
+
+from typing import Any
+
+_MISSING = object()
+
+
+class StorageConflictError(Exception):
+    """
+    Raised when a save would overwrite a concurrent change to the same record.
+
+    Attributes:
+        collection (str): the collection being saved
+        key (Any): the primary key of the conflicting record
+    """
+
+    def __init__(self, collection: str, key: Any):
+        super().__init__(f"The {collection} record '{key}' was changed by another request. Please retry.")
+        self.collection = collection
+        self.key = key
+
+
+def merge_records(collection: str, key_field: str, base: list[dict[str, Any]], ours: list[dict[str, Any]],
+                  theirs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Applies the changes between base and ours onto theirs.
+    Records added or changed in ours replace the record in theirs, records removed from ours are removed,
+    and records ours left untouched keep whatever theirs holds.
+
+    Parameters:
+        collection (str): the collection name, used in error messages
+        key_field (str): the primary key field of the records
+        base (list[dict[str, Any]]): the records as they were loaded
+        ours (list[dict[str, Any]]): the records being saved
+        theirs (list[dict[str, Any]]): the records currently stored
+
+    Returns:
+        list[dict[str, Any]]: the merged records, in the stored order with new records at the end
+
+    Raises:
+        StorageConflictError: if a record was changed or removed on both sides with different results
+    """
+    base_by_key = {record.get(key_field): record for record in base}
+    merged = {record.get(key_field): record for record in theirs}
+
+    our_keys = set()
+    for record in ours:
+        key = record.get(key_field)
+        our_keys.add(key)
+        original = base_by_key.get(key, _MISSING)
+        if original == record:
+            continue
+        current = merged.get(key, _MISSING)
+        if current is _MISSING and original is not _MISSING:
+            # changed here, removed there
+            raise StorageConflictError(collection, key)
+        if current is not _MISSING and current != original and current != record:
+            raise StorageConflictError(collection, key)
+        merged[key] = record
+
+    for key, original in base_by_key.items():
+        if key in our_keys or key not in merged:
+            continue
+        if merged[key] != original:
+            # removed here, changed there
+            raise StorageConflictError(collection, key)
+        del merged[key]
+
+    return list(merged.values())
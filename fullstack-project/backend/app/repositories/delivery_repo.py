@@ -1,28 +1,21 @@
-import json
-from pathlib import Path
 from typing import Any
 
-DELIVERIES_FILE = Path(__file__).parent.parent / "data" / "deliveries.json"
+from app.repositories.storage_engine import get_engine
 
 def load_deliveries() -> list[dict[str, Any]]:
-    if not DELIVERIES_FILE.exists():
-        return []
-    try:
-        raw = DELIVERIES_FILE.read_bytes()
-        if not raw.strip():
-            return []
-        # strip any bom and decode
-        for encoding in ("utf-8-sig", "utf-16", "utf-8", "cp1252"):
-            try:
-                content = raw.decode(encoding).strip()
-                if content:
-                    return json.loads(content)
-            except (UnicodeDecodeError, json.JSONDecodeError):
-                continue
-        return []
-    except Exception:
-        return []
+    return get_engine().load("deliveries")
 
 def save_deliveries(deliveries: list[dict[str, Any]]) -> None:
-    with open(DELIVERIES_FILE, "w", encoding="utf-8") as f:
-        json.dump(deliveries, f, indent=2)
\ No newline at end of file
+    get_engine().save("deliveries", deliveries)
+
+def save_delivery(delivery: dict[str, Any]) -> None:
+    get_engine().upsert("deliveries", delivery)
+
+def get_delivery_for_order(order_id: int) -> dict[str, Any] | None:
+    return get_engine().get_by("deliveries", "order_id", order_id)
+
+def find_deliveries_by(field: str, value: Any) -> list[dict[str, Any]]:
+    return get_engine().find_by("deliveries", field, value)
+
+def next_delivery_id() -> int:
+    return get_engine().next_id("deliveries")
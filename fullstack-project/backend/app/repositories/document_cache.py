@@ -0,0 +1,167 @@
+"""
+This module implements the in-process cache of parsed json data files.
+
+Handling a single request usually loads the same files several times (users.json is parsed three times during checkout).
+The cache keeps the parsed contents of each file keyed on its (path, mtime_ns, size) stamp, so a file is only
+parsed again after it changes on disk - including changes made by other processes.
+
+Callers are free to mutate what they load: every load hands out a private copy rebuilt from a marshal snapshot of
+the parsed data, which is far cheaper than parsing the json again, and the shared parse itself is never handed out.
+"""
+
+from enum import Enum
+from pathlib import Path
+import marshal
+import threading
+from typing import Any, Callable
+
+from app.repositories.json_files import file_stamp, read_json_file
+
+
+def _plain(data: Any) -> Any:
+    """Converts str subclasses such as str enums to plain str, the same way json.dump writes them."""
+    if isinstance(data, dict):
+        return {key: _plain(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_plain(value) for value in data]
+    if isinstance(data, str) and type(data) is not str:
+        return data.value if isinstance(data, Enum) else str.__str__(data)
+    return data
+
+
+def freeze(data: Any) -> bytes:
+    """
+    Serializes json-like data into a compact snapshot that can be copied out cheaply with marshal.loads.
+
+    Parameters:
+        data (Any): dicts, lists and scalars as produced by json.loads
+
+    Returns:
+        bytes: the marshalled data
+    """
+    try:
+        return marshal.dumps(data)
+    except ValueError:
+        # values such as str enums are not marshallable
+        return marshal.dumps(_plain(data))
+
+
+def clone(data: Any) -> Any:
+    """
+    Returns an independent deep copy of json-like data.
+
+    Parameters:
+        data (Any): dicts, lists and scalars as produced by json.loads
+
+    Returns:
+        Any: the copy
+    """
+    return marshal.loads(freeze(data))
+
+
+class DocumentCache:
+    """
+    Caches parsed json files, validated against the file's stamp on every load.
+
+    Attributes:
+        hits (int): loads served from the cache
+        misses (int): loads that had to parse the file
+    """
+
+    def __init__(self):
+        self._entries: dict[Path, tuple[Any, bytes]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path: Path, parser: Callable[[Path], Any] = read_json_file) -> Any:
+        """
+        Returns the parsed contents of a file, parsing it only if it changed since it was cached.
+
+        Parameters:
+            path (Path): the file to load
+            parser (Callable[[Path], Any]): parses the file when it is not cached
+
+        Returns:
+            Any: a private copy of the parsed contents
+        """
+        return marshal.loads(self.snapshot(path, parser)[1])
+
+    def snapshot(self, path: Path, parser: Callable[[Path], Any] = read_json_file,
+                 loader: Callable[[Path, Any], bytes] | None = None) -> tuple[Any, bytes]:
+        """
+        Returns the cached snapshot of a file together with the stamp it was taken at.
+
+        Parameters:
+            path (Path): the file to load
+            parser (Callable[[Path], Any]): parses the file when it is not cached
+            loader (Callable[[Path, Any], bytes] | None): if passed, used instead of parser to read the file's
+                contents already frozen, given the file stamp (see binary_snapshots.load_frozen)
+
+        Returns:
+            tuple[Any, bytes]: the file stamp, and the contents frozen with freeze()
+        """
+        stamp = file_stamp(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = (stamp, loader(path, stamp) if loader is not None else freeze(parser(path)))
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def store(self, path: Path, data: Any, stamp: tuple[int, int, int]) -> bytes:
+        """
+        Replaces the cached contents of a file with data that was just written to it,
+        so the next load does not need to parse the file again.
+
+        Parameters:
+            path (Path): the file that was written
+            data (Any): the data that was written to it
+            stamp (tuple[int, int, int]): the file stamp returned by write_json_file
+
+        Returns:
+            bytes: the data frozen with freeze()
+        """
+        frozen = freeze(data)
+        with self._lock:
+            self._entries[path] = (stamp, frozen)
+        return frozen
+
+    def invalidate(self, path: Path | None = None) -> None:
+        """
+        Drops the cached contents of a file, or of every file if no path is passed.
+
+        Parameters:
+            path (Path | None): the file to drop
+
+        Returns: None
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the cache counters.
+
+        Parameters: None
+
+        Returns:
+            dict[str, Any]: hits, misses, hit_rate and the number of cached files
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+document_cache = DocumentCache()
@@ -0,0 +1,242 @@
+"""
+This module checks that the stored collections are consistent, and rebuilds what the storage engines derive from them.
+
+Usage (from the backend directory):
+    python -m app.repositories.fsck             # check every collection
+    python -m app.repositories.fsck --rebuild   # rebuild indexes, cached copies and snapshots first, then check
+
+Checks:
+*   **primary keys**: every record has a key, and no two records of a collection share one
+*   **indexes**: looking a record up by key, or by each of its indexed fields, through the engine finds it as stored
+*   **references**: order.receipt_id points to a receipt, order.delivery_id to a delivery and
+    restaurant.manager_ids to users (0 and missing ids mean "not set yet")
+
+Records are read as stored - straight from the json files, or from the sqlite tables - bypassing the engine's
+caches, indexes and binary snapshots, and are streamed rather than loaded: only the keys and references seen so far
+are kept, never the records. Journaled collections are the exception, since their journal is replayed in memory.
+Collections are checked and rebuilt in parallel, one worker thread per collection.
+"""
+
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from typing import Any, Iterator
+
+from app.repositories.config_repo import load_config
+from app.repositories.indexes import index_value
+from app.repositories.journal import Journal
+from app.repositories.json_files import iter_json_file, iter_jsonl_file
+from app.repositories.migrations import upgrade_record
+from app.repositories.storage_engine import (
+    ARCHIVE_PARTITION, ARCHIVED_COLLECTIONS, COLLECTION_KEYS, ENGINES, INDEXED_FIELDS, JsonStorageEngine,
+    StorageEngine, _record_key,
+)
+
+DEFAULT_WORKERS = 4
+
+# (collection, field) -> the collection the field's ids point to
+REFERENCES = {
+    ("orders", "receipt_id"): "receipts",
+    ("orders", "delivery_id"): "deliveries",
+    ("restaurants", "manager_ids"): "users",
+}
+
+
+class CollectionScan:
+    """
+    What a single pass over one collection found.
+
+    Attributes:
+        collection (str): the collection, or archive partition, that was scanned
+        keys (set[Any]): the primary key of every record
+        references (list[tuple[Any, str, Any]]): (record key, field, referenced id) for each reference to check
+        problems (list[str]): the problems found within the collection
+    """
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.keys: set[Any] = set()
+        self.references: list[tuple[Any, str, Any]] = []
+        self.problems: list[str] = []
+
+
+def _base(collection: str) -> str:
+    """Returns the collection an archive partition belongs to, or the collection itself."""
+    match = ARCHIVE_PARTITION.match(collection)
+    return match.group(1) if match else collection
+
+
+def stored_records(engine: StorageEngine, collection: str) -> Iterator[dict[str, Any]]:
+    """
+    Streams the records of a collection as stored, without going through the engine's caches, indexes or snapshots.
+
+    Parameters:
+        engine (StorageEngine): the engine the collection is stored by
+        collection (str): the collection name
+
+    Returns:
+        Iterator[dict[str, Any]]: the records, upgraded to the current schema if the engine upgrades them
+    """
+    if not isinstance(engine, JsonStorageEngine):
+        # sqlite reads its rows straight from the table
+        yield from engine.iter_records(collection)
+        return
+    path = engine.path_for(collection)
+    if collection in engine.journals:
+        records = Journal(path, COLLECTION_KEYS.get(collection, "id")).load()
+    elif collection in engine.jsonl:
+        records = iter_jsonl_file(path)
+    else:
+        records = iter_json_file(path)
+    for record in records:
+        if engine.migrate:
+            upgrade_record(collection, record)
+        yield record
+
+
+def scan(engine: StorageEngine, collection: str) -> CollectionScan:
+    """
+    Checks the primary keys and indexes of one collection in a single streaming pass.
+
+    Parameters:
+        engine (StorageEngine): the engine the collection is stored by
+        collection (str): the collection, or archive partition, to scan
+
+    Returns:
+        CollectionScan: the keys, references and problems found
+    """
+    result = CollectionScan(collection)
+    base = _base(collection)
+    fields = INDEXED_FIELDS.get(collection, ())
+    # field -> index value -> keys of the records holding it
+    expected: dict[str, dict[Any, set[Any]]] = {field: defaultdict(set) for field in fields}
+    referencing = [field for (source, field) in REFERENCES if source == base]
+    # lookups of a duplicated key cannot find every record holding it, so only the duplication is reported
+    duplicated: set[Any] = set()
+    lookups: list[tuple[Any, str]] = []
+
+    for position, record in enumerate(stored_records(engine, collection)):
+        key = _record_key(collection, record)
+        if key is None:
+            result.problems.append(f"{collection}: record #{position} has no primary key")
+            continue
+        if key in result.keys:
+            if key not in duplicated:
+                result.problems.append(f"{collection} {key!r}: primary key is used by more than one record")
+            duplicated.add(key)
+            continue
+        result.keys.add(key)
+        if engine.get(collection, key) != record:
+            lookups.append((key, "lookup by key does not return the stored record"))
+        for field in fields:
+            value = record.get(field)
+            for item in value if isinstance(value, list) else [value]:
+                # missing values are indexed by the json engine only, since sqlite cannot look up null
+                if item is not None and not isinstance(item, (dict, list)):
+                    expected[field][index_value(item)].add(key)
+        for field in referencing:
+            value = record.get(field)
+            for target in value if isinstance(value, list) else [value]:
+                if target:
+                    result.references.append((key, field, target))
+
+    for field, values in expected.items():
+        for value, keys in values.items():
+            found = {_record_key(collection, record) for record in engine.find_by(collection, field, value)}
+            found.discard(None)
+            for key in sorted(keys - found, key=repr):
+                lookups.append((key, f"lookup by {field}={value!r} does not find the record"))
+            for key in sorted(found - keys, key=repr):
+                lookups.append((key, f"lookup by {field}={value!r} finds a record without it"))
+    result.problems += [f"{collection} {key!r}: {problem}" for key, problem in lookups if key not in duplicated]
+    return result
+
+
+def _collections(engine: StorageEngine) -> list[str]:
+    """Returns every collection and archive partition the engine stores."""
+    collections = list(COLLECTION_KEYS)
+    for archived in ARCHIVED_COLLECTIONS:
+        collections += engine.partitions(archived)
+    return collections
+
+
+def check(engine: StorageEngine, workers: int = DEFAULT_WORKERS) -> list[str]:
+    """
+    **Checks every collection's primary keys, indexes and references.**
+
+    Parameters:
+        engine (StorageEngine): the engine to check
+        workers (int): the number of collections scanned at the same time
+
+    Returns:
+        list[str]: a description of each problem found, empty if everything is consistent
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scans = list(pool.map(lambda collection: scan(engine, collection), _collections(engine)))
+
+    # archived orders keep their receipts in the receipt partitions
+    keys: dict[str, set[Any]] = defaultdict(set)
+    for result in scans:
+        keys[_base(result.collection)] |= result.keys
+
+    problems = []
+    for result in scans:
+        problems += result.problems
+        base = _base(result.collection)
+        for key, field, target in result.references:
+            target_collection = REFERENCES[(base, field)]
+            if target not in keys[target_collection]:
+                problems.append(f"{result.collection} {key!r}: {field} {target!r} is not in {target_collection}")
+    return problems
+
+
+def rebuild(engine: StorageEngine, workers: int = DEFAULT_WORKERS) -> list[str]:
+    """
+    **Rebuilds the indexes, cached copies and snapshots of every collection from its stored records.**
+
+    Parameters:
+        engine (StorageEngine): the engine to rebuild
+        workers (int): the number of collections rebuilt at the same time
+
+    Returns:
+        list[str]: the collections that were rebuilt
+    """
+    collections = _collections(engine)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(engine.rebuild, collections))
+    return collections
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the checker from the command line, using the storage engine set in config.json.
+
+    Parameters:
+        argv (list[str] | None): the command line arguments, read from sys.argv if not provided
+
+    Returns:
+        int: the exit status, 1 if any problem was found
+    """
+    parser = argparse.ArgumentParser(description="Check the stored collections for consistency.")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild indexes and snapshots before checking")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="collections processed at once")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    engine = ENGINES[config.get("STORAGE_ENGINE", "json")].from_config(config)
+    try:
+        if args.rebuild:
+            for collection in rebuild(engine, args.workers):
+                print(f"rebuilt {collection}")
+        problems = check(engine, args.workers)
+    finally:
+        engine.close()
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problems found")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+This module implements the in-memory hash indexes kept by the repository layer.
+
+Every collection gets a primary key index (key -> record), and the fields declared in storage_engine.INDEXED_FIELDS
+also get a secondary index (value -> keys), so lookups by id or by an indexed field cost O(1) or O(matches)
+instead of a scan. List values (such as restaurant manager_ids) are indexed under each of their elements.
+
+Text fields (storage_engine.TEXT_INDEXED_FIELDS) get a trigram index instead, for case-insensitive substring search:
+every three-character run of each lower-cased value points to the records holding it. A search intersects the
+posting lists of the query's trigrams, smallest first, then checks the few remaining candidates for the whole
+substring. Text fields are dotted paths, which go through lists, e.g. "menu.items.name" is the name of every
+menu item.
+
+Sorted fields (storage_engine.SORTED_FIELDS) hold numbers, and are kept in order in a sorted list per direction,
+so a page of records in that order is a slice instead of a sort of the whole collection. Records whose value is
+not a number are left out of the order.
+"""
+
+import bisect
+from enum import Enum
+from typing import Any, Iterable
+
+def index_value(value: Any) -> Any:
+    """
+    Normalizes a value before it is used as an index key.
+    str enums hash differently from their string value, so they are indexed by their value.
+
+    Parameters:
+        value (Any): the field value
+
+    Returns:
+        Any: the value to index on
+    """
+    return value.value if isinstance(value, Enum) else value
+
+
+def _values(value: Any) -> Iterable[Any]:
+    """Returns the index keys for a field value, one per element for lists."""
+    if isinstance(value, list):
+        return [index_value(v) for v in value if not isinstance(v, (dict, list))]
+    if isinstance(value, dict):
+        return []
+    return [index_value(value)]
+
+
+def text_values(record: dict[str, Any], path: str) -> list[str]:
+    """
+    Returns the lower-cased string values at a dotted path of a record, going through lists along the way.
+
+    Parameters:
+        record (dict[str, Any]): the record
+        path (str): the path, e.g. "address.street" or "menu.items.name"
+
+    Returns:
+        list[str]: the values found, lower-cased
+    """
+    values: list[Any] = [record]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            value = value.get(part) if isinstance(value, dict) else None
+            found.extend(value if isinstance(value, list) else [value])
+        values = found
+    return [value.lower() for value in values if isinstance(value, str)]
+
+
+def sort_value(record: dict[str, Any], field: str) -> float | None:
+    """
+    Returns the value a record is ordered by in a sorted field.
+
+    Parameters:
+        record (dict[str, Any]): the record
+        field (str): the sorted field
+
+    Returns:
+        float | None: the value, or None if it is not a number
+    """
+    value = record.get(field)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Returns every three-character run of a text.
+
+    Parameters:
+        text (str): the text, already lower-cased
+
+    Returns:
+        set[str]: the trigrams, empty for texts shorter than three characters
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CollectionIndex:
+    """
+    Holds the records of one collection keyed by primary key, plus secondary indexes on the declared fields.
+    Records are stored as given - callers must pass records they will not mutate afterwards.
+
+    Attributes:
+        key_field (str): the primary key field
+        fields (tuple[str, ...]): the fields with a secondary index
+        text_fields (tuple[str, ...]): the dotted paths with a trigram index
+        sorted_fields (tuple[str, ...]): the numeric fields kept in order
+        records (dict[Any, dict[str, Any]]): primary key -> record, in insertion order
+        version (Any): the version of the stored collection this index reflects, set by the owner
+    """
+
+    def __init__(self, key_field: str, fields: Iterable[str], records: Iterable[dict[str, Any]] = (), version: Any = None,
+                 text_fields: Iterable[str] = (), sorted_fields: Iterable[str] = ()):
+        self.key_field = key_field
+        self.fields = tuple(fields)
+        self.text_fields = tuple(text_fields)
+        self.sorted_fields = tuple(sorted_fields)
+        self.records: dict[Any, dict[str, Any]] = {}
+        self.version = version
+        self._secondary: dict[str, dict[Any, dict[Any, None]]] = {field: {} for field in self.fields}
+        # text field -> trigram -> keys, and text field -> key -> the lower-cased values searched
+        self._trigrams: dict[str, dict[str, dict[Any, None]]] = {field: {} for field in self.text_fields}
+        self._texts: dict[str, dict[Any, list[str]]] = {field: {} for field in self.text_fields}
+        # sorted field -> (value, position, key) ascending, and (-value, position, key) for descending order,
+        # the position keeping records with the same value in insertion order both ways
+        self._ascending: dict[str, list[tuple[float, int, Any]]] = {field: [] for field in self.sorted_fields}
+        self._descending: dict[str, list[tuple[float, int, Any]]] = {field: [] for field in self.sorted_fields}
+        self._position: dict[Any, int] = {}
+        self._next_position = 0
+        for record in records:
+            self.put(record)
+
+    def _link(self, key: Any, record: dict[str, Any]) -> None:
+        for field in self.fields:
+            for value in _values(record.get(field)):
+                self._secondary[field].setdefault(value, {})[key] = None
+        for field in self.text_fields:
+            texts = text_values(record, field)
+            self._texts[field][key] = texts
+            for gram in set().union(*map(trigrams, texts)):
+                self._trigrams[field].setdefault(gram, {})[key] = None
+        for field in self.sorted_fields:
+            value = sort_value(record, field)
+            if value is not None:
+                bisect.insort(self._ascending[field], (value, self._position[key], key))
+                bisect.insort(self._descending[field], (-value, self._position[key], key))
+
+    def _unlink(self, key: Any, record: dict[str, Any]) -> None:
+        for field in self.fields:
+            for value in _values(record.get(field)):
+                bucket = self._secondary[field].get(value)
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del self._secondary[field][value]
+        for field in self.text_fields:
+            for gram in set().union(*map(trigrams, self._texts[field].pop(key, ()))):
+                bucket = self._trigrams[field].get(gram)
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del self._trigrams[field][gram]
+        for field in self.sorted_fields:
+            value = sort_value(record, field)
+            if value is not None:
+                for entries, entry in ((self._ascending[field], (value, self._position[key])),
+                                       (self._descending[field], (-value, self._position[key]))):
+                    del entries[bisect.bisect_left(entries, entry)]
+
+    def put(self, record: dict[str, Any]) -> None:
+        """
+        Adds a record, or replaces the record with the same primary key.
+
+        Parameters:
+            record (dict[str, Any]): the record to index
+
+        Returns: None
+        """
+        key = index_value(record.get(self.key_field))
+        old = self.records.get(key)
+        if old is not None:
+            self._unlink(key, old)
+        else:
+            self._position[key] = self._next_position
+            self._next_position += 1
+        self.records[key] = record
+        self._link(key, record)
+
+    def remove(self, key: Any) -> dict[str, Any] | None:
+        """
+        Removes a record by primary key.
+
+        Parameters:
+            key (Any): the primary key of the record
+
+        Returns:
+            dict[str, Any] | None: the removed record, or None if it was not indexed
+        """
+        key = index_value(key)
+        record = self.records.pop(key, None)
+        if record is not None:
+            self._unlink(key, record)
+            del self._position[key]
+        return record
+
+    def sync(self, items: list[dict[str, Any]], copy=lambda record: record) -> None:
+        """
+        Updates the index to match a full list of records, only touching the records that changed.
+
+        Parameters:
+            items (list[dict[str, Any]]): the full, current list of records
+            copy (Callable): applied to changed records before they are stored
+
+        Returns: None
+        """
+        seen = set()
+        for record in items:
+            key = index_value(record.get(self.key_field))
+            seen.add(key)
+            if self.records.get(key) != record:
+                self.put(copy(record))
+        for key in [key for key in self.records if key not in seen]:
+            self.remove(key)
+
+    def get(self, key: Any) -> dict[str, Any] | None:
+        """
+        Returns the record with the given primary key.
+
+        Parameters:
+            key (Any): the primary key
+
+        Returns:
+            dict[str, Any] | None: the record, or None if it does not exist
+        """
+        return self.records.get(index_value(key))
+
+    def find(self, field: str, value: Any) -> list[dict[str, Any]]:
+        """
+        Returns every record whose indexed field matches the value, in insertion order.
+
+        Parameters:
+            field (str): an indexed field
+            value (Any): the value to match
+
+        Returns:
+            list[dict[str, Any]]: the matching records
+
+        Raises:
+            KeyError: if the field is not indexed
+        """
+        keys = self._secondary[field].get(index_value(value), {})
+        return [self.records[key] for key in sorted(keys, key=self._position.__getitem__)]
+
+    def search(self, field: str, text: str) -> list[dict[str, Any]]:
+        """
+        Returns every record with a value of a text field containing the text, ignoring case, in insertion order.
+
+        Parameters:
+            field (str): a text field
+            text (str): the substring to look for
+
+        Returns:
+            list[dict[str, Any]]: the matching records
+
+        Raises:
+            KeyError: if the field has no trigram index
+        """
+        text = text.lower()
+        texts = self._texts[field]
+        grams = trigrams(text)
+        if grams:
+            postings = sorted((self._trigrams[field].get(gram, {}) for gram in grams), key=len)
+            candidates = [key for key in postings[0] if all(key in posting for posting in postings[1:])]
+        else:
+            # too short for a trigram, so every record is a candidate
+            candidates = list(texts)
+        keys = [key for key in candidates if any(text in value for value in texts[key])]
+        return [self.records[key] for key in sorted(keys, key=self._position.__getitem__)]
+
+    def ordered(self, field: str, descending: bool = False, start: int = 0, stop: int | None = None) -> list[dict[str, Any]]:
+        """
+        Returns a slice of the records ordered by a sorted field, records with the same value in insertion order.
+
+        Parameters:
+            field (str): a sorted field
+            descending (bool): True for the highest values first
+            start (int): the position in the order of the first record returned
+            stop (int | None): the position after the last record returned, the end of the order if not provided
+
+        Returns:
+            list[dict[str, Any]]: the records in the slice
+
+        Raises:
+            KeyError: if the field is not sorted
+        """
+        entries = self._descending[field] if descending else self._ascending[field]
+        return [self.records[key] for _, _, key in entries[start:stop]]
+
+    def count(self, field: str) -> int:
+        """
+        Returns the number of records in the order of a sorted field.
+
+        Parameters:
+            field (str): a sorted field
+
+        Returns:
+            int: the number of records with a number in the field
+
+        Raises:
+            KeyError: if the field is not sorted
+        """
+        return len(self._ascending[field])
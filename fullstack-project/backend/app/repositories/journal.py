@@ -0,0 +1,429 @@
+"""
+This module implements the append-only journal used by the json storage engine for write-heavy collections.
+
+A journaled collection is stored as:
+*   **<collection>.json**: the last snapshot, in the normal json format
+*   **<collection>.journal**: one json line per mutation made since that snapshot
+
+Each write appends a single line instead of rewriting the whole collection.
+The in-memory copy is rebuilt from the snapshot plus the journal, and is kept up to date by replaying
+new lines, so writes made by other processes are picked up as well.
+Once the journal grows past a size threshold it is rolled into a fresh snapshot in a background thread.
+Every write holds the collection's lock file, so several worker processes can share one journal.
+
+The first line of a journal records the file stamp of the snapshot it applies to.
+If the snapshot is replaced by anything other than compaction the journal no longer matches and is ignored.
+"""
+
+from pathlib import Path
+import json
+import marshal
+import os
+import threading
+from typing import Any, Callable
+
+from app.repositories.binary_snapshots import load_frozen, snapshot_path as binary_snapshot_path, write_snapshot
+from app.repositories.document_cache import clone, freeze
+from app.repositories.indexes import CollectionIndex
+from app.repositories.json_files import file_lock, file_stamp, read_json_file
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+DEFAULT_COMPACT_BYTES = 1024 * 1024
+
+
+class Journal:
+    """
+    Keeps one collection as a snapshot plus an append-only journal of mutations.
+
+    Attributes:
+        snapshot_path (Path): the collection's json snapshot
+        journal_path (Path): the collection's journal file
+        lock_path (Path): the lock file held while writing
+        key_field (str): the primary key field of the collection's records
+        compact_bytes (int): journal size after which a background compaction is started
+        indexed_fields (tuple[str, ...]): the fields with a secondary index
+        binary (bool): whether the json snapshot is loaded from and saved to a binary snapshot (see binary_snapshots.py)
+        upgrade (Callable[[list[dict[str, Any]]], Any] | None): upgrades records read from the snapshot or journal
+            to the current schema in place (see migrations.py)
+        snapshot_tag (int): the tag of the binary snapshot, the schema version upgrade brings records to
+        text_fields (tuple[str, ...]): the dotted paths with a trigram index, for substring search
+        sorted_fields (tuple[str, ...]): the numeric fields kept in order, for paging through records in that order
+    """
+
+    def __init__(self, snapshot_path: Path, key_field: str = "id", compact_bytes: int = DEFAULT_COMPACT_BYTES,
+                 indexed_fields: tuple[str, ...] = (), binary: bool = False,
+                 upgrade: Callable[[list[dict[str, Any]]], Any] | None = None, snapshot_tag: int = 0,
+                 text_fields: tuple[str, ...] = (), sorted_fields: tuple[str, ...] = ()):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_suffix(JOURNAL_SUFFIX)
+        self.lock_path = self.snapshot_path.with_suffix(LOCK_SUFFIX)
+        self.key_field = key_field
+        self.compact_bytes = compact_bytes
+        self.indexed_fields = tuple(indexed_fields)
+        self.binary = binary
+        self.upgrade = upgrade
+        self.snapshot_tag = snapshot_tag
+        self.text_fields = tuple(text_fields)
+        self.sorted_fields = tuple(sorted_fields)
+        self._lock = threading.RLock()
+        self._index = CollectionIndex(key_field, self.indexed_fields, text_fields=self.text_fields,
+                                      sorted_fields=self.sorted_fields)
+        # (snapshot stamp, journal inode or None if the journal does not apply, bytes of journal applied)
+        self._state: tuple[Any, int | None, int] | None = None
+        self._compacting = False
+
+    @property
+    def _records(self) -> dict[Any, dict[str, Any]]:
+        return self._index.records
+
+    # ---- reading ----
+
+    def _refresh(self) -> None:
+        """Brings the in-memory records up to date with the snapshot and journal on disk."""
+        snapshot = file_stamp(self.snapshot_path)
+        journal = file_stamp(self.journal_path)
+        if self._state is not None and self._state[0] == snapshot:
+            _, journal_ino, offset = self._state
+            if journal_ino is None and (journal is None or self._read_header() != list(snapshot or ())):
+                return
+            if journal is not None and journal[2] == journal_ino and journal[1] >= offset:
+                if journal[1] > offset:
+                    self._replay(offset, journal_ino)
+                return
+
+        if self.binary:
+            records = marshal.loads(load_frozen(self.snapshot_path, snapshot, self._parse, self.snapshot_tag))
+        else:
+            records = self._parse(self.snapshot_path)
+        self._index = CollectionIndex(self.key_field, self.indexed_fields, records, text_fields=self.text_fields,
+                                      sorted_fields=self.sorted_fields)
+        self._state = (snapshot, None, 0)
+        if journal is not None and self._read_header() == list(snapshot or ()):
+            self._replay(0, journal[2])
+
+    def _parse(self, path: Path) -> list[dict[str, Any]]:
+        """Parses the json snapshot, upgrading its records."""
+        records = read_json_file(path)
+        if self.upgrade is not None:
+            self.upgrade(records)
+        return records
+
+    def _read_header(self) -> list | None:
+        """Returns the snapshot stamp recorded on the first line of the journal."""
+        try:
+            with self.journal_path.open("rb") as f:
+                return json.loads(f.readline()).get("snapshot")
+        except (FileNotFoundError, ValueError, AttributeError):
+            return None
+
+    def _replay(self, offset: int, journal_ino: int) -> None:
+        """Applies every complete journal line after offset to the in-memory records."""
+        with self.journal_path.open("rb") as f:
+            if os.fstat(f.fileno()).st_ino != journal_ino:
+                # compacted by another process since the stat, so start over from the new snapshot
+                self._state = None
+                self._refresh()
+                return
+            f.seek(offset)
+            data = f.read()
+        if offset == 0:
+            # skip the header line
+            header_end = data.find(b"\n") + 1
+            if header_end == 0:
+                return
+            data, offset = data[header_end:], header_end
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._state = (self._state[0], journal_ino, offset + end)
+
+    def _apply(self, entry: dict[str, Any]) -> None:
+        """Applies a single journal entry to the in-memory records."""
+        if entry["op"] == "put":
+            if self.upgrade is not None:
+                self.upgrade([entry["record"]])
+            self._index.put(entry["record"])
+        elif entry["op"] == "del":
+            self._index.remove(entry["key"])
+
+    def load(self) -> list[dict[str, Any]]:
+        """
+        Returns a copy of every record in the collection.
+
+        Parameters: None
+
+        Returns:
+            list[dict[str, Any]]: all records, in insertion order
+        """
+        with self._lock:
+            self._refresh()
+            return clone(list(self._records.values()))
+
+    def version(self) -> Any:
+        """
+        Returns the version of the collection, which changes whenever the collection does.
+
+        Parameters: None
+
+        Returns:
+            Any: the version
+        """
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def snapshot(self) -> tuple[Any, bytes]:
+        """
+        Returns every record frozen with freeze(), together with the version of the collection they reflect.
+
+        Parameters: None
+
+        Returns:
+            tuple[Any, bytes]: the version, which changes whenever the collection does, and the frozen records
+        """
+        with self._lock:
+            self._refresh()
+            return self._state, freeze(list(self._records.values()))
+
+    def get(self, key: Any) -> dict[str, Any] | None:
+        """
+        Returns a copy of a single record.
+
+        Parameters:
+            key (Any): the primary key of the record
+
+        Returns:
+            dict[str, Any] | None: the record, or None if it does not exist
+        """
+        with self._lock:
+            self._refresh()
+            record = self._index.get(key)
+            return clone(record) if record is not None else None
+
+    def find(self, field: str, value: Any) -> list[dict[str, Any]]:
+        """
+        Returns a copy of every record whose indexed field matches the value.
+
+        Parameters:
+            field (str): one of indexed_fields
+            value (Any): the value to match
+
+        Returns:
+            list[dict[str, Any]]: the matching records, in insertion order
+        """
+        with self._lock:
+            self._refresh()
+            return clone(self._index.find(field, value))
+
+    def search(self, field: str, text: str) -> list[dict[str, Any]]:
+        """
+        Returns a copy of every record with a value of a text field containing the text, ignoring case.
+
+        Parameters:
+            field (str): one of text_fields
+            text (str): the substring to look for
+
+        Returns:
+            list[dict[str, Any]]: the matching records, in insertion order
+        """
+        with self._lock:
+            self._refresh()
+            return clone(self._index.search(field, text))
+
+    def ordered(self, field: str, descending: bool = False, start: int = 0,
+                stop: int | None = None) -> tuple[list[dict[str, Any]], int]:
+        """
+        Returns a copy of a slice of the records ordered by a sorted field, and the number of records in the order.
+
+        Parameters:
+            field (str): one of sorted_fields
+            descending (bool): True for the highest values first
+            start (int): the position in the order of the first record returned
+            stop (int | None): the position after the last record returned, the end of the order if not provided
+
+        Returns:
+            tuple[list[dict[str, Any]], int]: the records in the slice, and the number of records in the order
+        """
+        with self._lock:
+            self._refresh()
+            return clone(self._index.ordered(field, descending, start, stop)), self._index.count(field)
+
+    # ---- writing ----
+
+    def _append(self, entries: list[dict[str, Any]]) -> None:
+        """Appends entries to the journal, starting a new journal if the current one does not apply."""
+        if not entries:
+            return
+        self._refresh()
+        if self._state[1] is None:
+            self._write_journal(file_stamp(self.snapshot_path), b"")
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8")
+        with self.journal_path.open("ab") as f:
+            f.write(data)
+        self._refresh()
+        if self._state[2] >= self.compact_bytes and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _write_journal(self, snapshot: tuple | None, body: bytes) -> None:
+        """
+        Atomically replaces the journal with a new one based on the given snapshot stamp.
+        The in-memory records must already include every entry in body.
+        """
+        header = json.dumps({"snapshot": list(snapshot or ())}).encode("utf-8") + b"\n"
+        tmp = self.journal_path.with_suffix(".journal.tmp")
+        with tmp.open("wb") as f:
+            f.write(header + body)
+        os.replace(tmp, self.journal_path)
+        self._state = (snapshot, file_stamp(self.journal_path)[2], len(header) + len(body))
+
+    def upsert(self, record: dict[str, Any]) -> None:
+        """
+        Appends a put entry for a single record.
+
+        Parameters:
+            record (dict[str, Any]): the record to insert or replace
+
+        Returns: None
+        """
+        with file_lock(self.lock_path), self._lock:
+            self._append([{"op": "put", "record": record}])
+
+    def delete(self, key: Any) -> bool:
+        """
+        Appends a delete entry for a single record.
+
+        Parameters:
+            key (Any): the primary key of the record
+
+        Returns:
+            bool: true if the record existed
+        """
+        with file_lock(self.lock_path), self._lock:
+            self._refresh()
+            if key not in self._records:
+                return False
+            self._append([{"op": "del", "key": key}])
+            return True
+
+    def save(self, items: list[dict[str, Any]]) -> None:
+        """
+        Journals the difference between the stored records and the passed records.
+        Only records that were added, changed or removed are appended.
+        If the existing records were reordered, the collection is written as a new snapshot instead.
+
+        Parameters:
+            items (list[dict[str, Any]]): the full list of records to save
+
+        Returns: None
+        """
+        with file_lock(self.lock_path), self._lock:
+            self._refresh()
+            new_keys = [record.get(self.key_field) for record in items]
+            kept = [key for key in new_keys if key in self._records]
+            kept_set = set(kept)
+            if kept != [key for key in self._records if key in kept_set] or len(set(new_keys)) != len(new_keys):
+                self._write_snapshot(items)
+                return
+            entries = [
+                {"op": "put", "record": record}
+                for key, record in zip(new_keys, items)
+                if self._records.get(key) != record
+            ]
+            entries += [{"op": "del", "key": key} for key in self._records.keys() - set(new_keys)]
+            self._append(entries)
+
+    # ---- compaction ----
+
+    def _write_snapshot(self, items: list[dict[str, Any]]) -> None:
+        """Writes the records as a new snapshot and starts an empty journal for it."""
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.snapshot_path)
+        self._index = CollectionIndex(self.key_field, self.indexed_fields, clone(items), text_fields=self.text_fields,
+                                      sorted_fields=self.sorted_fields)
+        self._snapshot_written(items)
+        self._write_journal(file_stamp(self.snapshot_path), b"")
+
+    def _snapshot_written(self, items: list[dict[str, Any]]) -> None:
+        """Writes the binary snapshot of a json snapshot that was just written, if binary snapshots are on."""
+        if self.binary:
+            write_snapshot(self.snapshot_path, file_stamp(self.snapshot_path), freeze(items), self.snapshot_tag)
+
+    def compact(self) -> None:
+        """
+        Rolls the journal into a fresh snapshot.
+        The snapshot is serialized without holding the lock; entries appended meanwhile are carried over to the new journal.
+
+        Parameters: None
+
+        Returns: None
+        """
+        with self._lock:
+            self._refresh()
+            if self._state[1] is None:
+                return
+            items = list(self._records.values())
+            snapshot, journal_ino, offset = self._state
+
+        tmp = self.snapshot_path.with_suffix(".snapshot.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False, indent=2)
+
+        with file_lock(self.lock_path), self._lock:
+            self._refresh()
+            if self._state[0] != snapshot or self._state[1] != journal_ino:
+                # the snapshot or journal was replaced while compacting, so the compacted copy is out of date
+                tmp.unlink(missing_ok=True)
+                return
+            with self.journal_path.open("rb") as f:
+                f.seek(offset)
+                tail = f.read(self._state[2] - offset)
+            os.replace(tmp, self.snapshot_path)
+            self._snapshot_written(items)
+            self._write_journal(file_stamp(self.snapshot_path), tail)
+
+    def rewrite(self) -> None:
+        """
+        Writes every record as a new snapshot with an empty journal, even if the journal is empty.
+        Used to store records that were upgraded as they were read in their upgraded shape.
+
+        Parameters: None
+
+        Returns: None
+        """
+        with file_lock(self.lock_path), self._lock:
+            self._refresh()
+            self._write_snapshot(list(self._records.values()))
+
+    def rebuild(self) -> None:
+        """
+        Throws away the in-memory records, their index and the binary snapshot, reads the snapshot and journal
+        again, and rewrites them as a new snapshot (see rewrite).
+
+        Parameters: None
+
+        Returns: None
+        """
+        with file_lock(self.lock_path), self._lock:
+            binary_snapshot_path(self.snapshot_path).unlink(missing_ok=True)
+            self._state = None
+            self.rewrite()
+
+    def _compact_in_background(self) -> None:
+        try:
+            # entries appended while compacting are carried over, so a busy journal may need another pass
+            for _ in range(3):
+                self.compact()
+                if self.journal_size() < self.compact_bytes:
+                    break
+        finally:
+            self._compacting = False
+
+    def journal_size(self) -> int:
+        """Returns the current size of the journal in bytes, 0 if there is none."""
+        stamp = file_stamp(self.journal_path)
+        return stamp[1] if stamp else 0
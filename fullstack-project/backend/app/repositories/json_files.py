@@ -0,0 +1,321 @@
+""" This module holds the helpers for reading and writing the json data files. """
+
+from pathlib import Path
+import json
+import os
+import threading
+from typing import Any, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+
+def read_json_file(path: Path) -> list[dict[str, Any]]:
+    """
+    Reads a json collection file, treating a missing or blank file as an empty collection.
+    Files saved by other editors with a byte order mark are also accepted.
+
+    Parameters:
+        path (Path): the json file to read
+
+    Returns:
+        list[dict[str, Any]]: the parsed records
+    """
+    if not path.exists():
+        return []
+    content = path.read_bytes().decode("utf-8-sig").strip()
+    if not content:
+        return []
+    return json.loads(content)
+
+
+def write_json_file(path: Path, items: Any) -> tuple[int, int, int]:
+    """
+    Atomically writes data to a json file by writing a temporary file and moving it into place.
+
+    Parameters:
+        path (Path): the json file to write
+        items (Any): the data to write
+
+    Returns:
+        tuple[int, int, int]: the file stamp of the written file (see file_stamp)
+    """
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+    # the move keeps the inode and mtime, so stamping the temporary file is race free
+    stamp = file_stamp(tmp)
+    os.replace(tmp, path)
+    return stamp
+
+
+def iter_json_file(path: Path, chunk_size: int = 1 << 16) -> Iterator[dict[str, Any]]:
+    """
+    Streams the records of a json collection file, reading it in chunks instead of parsing it all at once.
+    A missing or blank file is an empty collection.
+
+    Parameters:
+        path (Path): the json file to read
+        chunk_size (int): the number of characters read at a time
+
+    Returns:
+        Iterator[dict[str, Any]]: the records, in file order
+
+    Raises:
+        ValueError: if the file is not a json array
+    """
+    try:
+        f = path.open("r", encoding="utf-8-sig")
+    except FileNotFoundError:
+        return
+    decoder = json.JSONDecoder()
+    with f:
+        buffer, pos, started = "", 0, False
+        while True:
+            # skip to the next value, past the opening bracket and the commas between records
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+                pos += 1
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path.name} is not a json array")
+                    started, pos = True, pos + 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    pass
+                else:
+                    yield record
+                    buffer, pos = buffer[end:], 0
+                    continue
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if started:
+                    raise ValueError(f"{path.name} ends before its closing bracket")
+                return
+            buffer, pos = buffer[pos:] + chunk, 0
+
+
+def write_json_records(path: Path, records: Iterable[dict[str, Any]]) -> tuple[int, int, int]:
+    """
+    Atomically writes records to a json file one at a time, in the same layout as write_json_file,
+    so a collection can be rewritten without holding all of it in memory.
+
+    Parameters:
+        path (Path): the json file to write
+        records (Iterable[dict[str, Any]]): the records to write
+
+    Returns:
+        tuple[int, int, int]: the file stamp of the written file (see file_stamp)
+    """
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        separator = "[\n  "
+        for record in records:
+            f.write(separator + json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+            separator = ",\n  "
+        f.write("[]" if separator == "[\n  " else "\n]")
+    stamp = file_stamp(tmp)
+    os.replace(tmp, path)
+    return stamp
+
+
+def iter_jsonl_file(path: Path) -> Iterator[dict[str, Any]]:
+    """
+    Streams the records of a JSON Lines collection file, one per line, without reading the whole file.
+    A missing file is an empty collection. A last line without its newline is an append that never finished
+    and is skipped.
+
+    Parameters:
+        path (Path): the jsonl file to read
+
+    Returns:
+        Iterator[dict[str, Any]]: the records, in file order
+    """
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            line = line.strip()
+            if line:
+                yield json.loads(line.decode("utf-8-sig"))
+
+
+def read_jsonl_file(path: Path) -> list[dict[str, Any]]:
+    """
+    Reads every record of a JSON Lines collection file (see iter_jsonl_file).
+
+    Parameters:
+        path (Path): the jsonl file to read
+
+    Returns:
+        list[dict[str, Any]]: the parsed records
+    """
+    return list(iter_jsonl_file(path))
+
+
+def _jsonl_lines(items: list[dict[str, Any]]) -> bytes:
+    """Encodes records as JSON Lines, one compact line per record."""
+    return "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items).encode("utf-8")
+
+
+def write_jsonl_file(path: Path, items: list[dict[str, Any]]) -> tuple[int, int, int]:
+    """
+    Atomically writes records to a JSON Lines file by writing a temporary file and moving it into place.
+
+    Parameters:
+        path (Path): the jsonl file to write
+        items (list[dict[str, Any]]): the records to write
+
+    Returns:
+        tuple[int, int, int]: the file stamp of the written file (see file_stamp)
+    """
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(_jsonl_lines(items))
+    stamp = file_stamp(tmp)
+    os.replace(tmp, path)
+    return stamp
+
+
+def write_jsonl_records(path: Path, records: Iterable[dict[str, Any]]) -> tuple[int, int, int]:
+    """
+    Atomically writes records to a JSON Lines file one at a time, without holding all of them in memory.
+
+    Parameters:
+        path (Path): the jsonl file to write
+        records (Iterable[dict[str, Any]]): the records to write
+
+    Returns:
+        tuple[int, int, int]: the file stamp of the written file (see file_stamp)
+    """
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        for record in records:
+            f.write(_jsonl_lines([record]))
+    stamp = file_stamp(tmp)
+    os.replace(tmp, path)
+    return stamp
+
+
+def append_jsonl_file(path: Path, items: list[dict[str, Any]]) -> tuple[int, int, int]:
+    """
+    Appends records to a JSON Lines file with a single write, creating the file if needed.
+    A torn last line left by an append that never finished is cut off first.
+    The caller must hold the file's lock.
+
+    Parameters:
+        path (Path): the jsonl file to append to
+        items (list[dict[str, Any]]): the records to append
+
+    Returns:
+        tuple[int, int, int]: the file stamp after the append (see file_stamp)
+    """
+    with path.open("a+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size:
+            f.seek(max(0, size - 1))
+            if f.read(1) != b"\n":
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+        f.write(_jsonl_lines(items))
+    return file_stamp(path)
+
+
+def file_stamp(path: Path) -> tuple[int, int, int] | None:
+    """
+    Returns a stamp that changes whenever a file is rewritten.
+
+    Parameters:
+        path (Path): the file to stamp
+
+    Returns:
+        tuple[int, int, int] | None: (mtime_ns, size, inode), or None if the file does not exist
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+
+class FileLock:
+    """
+    An exclusive lock shared by every thread and process using the same lock file.
+    The lock is reentrant within a thread, so code holding it may call other code that takes it again.
+    The lock file is created if it does not exist and is left in place afterwards.
+
+    Attributes:
+        path (Path): the lock file
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+
+_file_locks: dict[Path, FileLock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(path: Path) -> FileLock:
+    """
+    Returns the process-wide FileLock for a lock file. Use it as a context manager.
+
+    Parameters:
+        path (Path): the lock file
+
+    Returns:
+        FileLock: the lock
+    """
+    path = Path(path).resolve()
+    with _file_locks_guard:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = FileLock(path)
+        return lock
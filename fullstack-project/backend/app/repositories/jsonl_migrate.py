@@ -0,0 +1,82 @@
+"""
+This module converts collections from the JSON array format to JSON Lines.
+
+Usage (from the backend directory, with the app stopped):
+    python -m app.repositories.jsonl_migrate receipts notifications
+
+Each collection's <collection>.json is rewritten as <collection>.jsonl, one record per line, and the collection is
+added to JSONL_COLLECTIONS in config.json so the json engine reads and writes the new file from then on.
+The old file is removed once the new one is in place. Collections that were already converted are skipped.
+"""
+
+import argparse
+from pathlib import Path
+
+from app.repositories.config_repo import load_config, save_config
+from app.repositories.json_files import file_lock, read_json_file, write_jsonl_file
+from app.repositories.storage_engine import COLLECTION_KEYS, DATA_DIR, LOCK_SUFFIX
+
+DEFAULT_COLLECTIONS = ["receipts", "notifications"]
+
+
+def migrate(collections: list[str], data_dir: Path = DATA_DIR) -> list[str]:
+    """
+    Converts collections to JSON Lines and records them in JSONL_COLLECTIONS.
+
+    Parameters:
+        collections (list[str]): the collections to convert, e.g. ["receipts", "notifications"]
+        data_dir (Path): the directory holding the json files
+
+    Returns:
+        list[str]: the collections that were converted by this call
+
+    Raises:
+        ValueError: if a collection is unknown or is journaled, since journals keep the array format
+    """
+    config = load_config()
+    journaled = set(config.get("JOURNALED_COLLECTIONS", []))
+    for collection in collections:
+        if collection not in COLLECTION_KEYS:
+            raise ValueError(f"Unknown collection '{collection}'")
+        if collection in journaled:
+            raise ValueError(f"Collection '{collection}' is journaled and cannot be stored as JSON Lines")
+
+    data_dir = Path(data_dir)
+    converted = []
+    for collection in collections:
+        source = data_dir / f"{collection}.json"
+        target = data_dir / f"{collection}.jsonl"
+        with file_lock(data_dir / f"{collection}{LOCK_SUFFIX}"):
+            if target.exists() and not source.exists():
+                continue
+            write_jsonl_file(target, read_json_file(source))
+            source.unlink(missing_ok=True)
+        converted.append(collection)
+
+    current = config.get("JSONL_COLLECTIONS", [])
+    added = [collection for collection in collections if collection not in current]
+    if added:
+        save_config({**config, "JSONL_COLLECTIONS": current + added})
+    return converted
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Runs the migration from the command line.
+
+    Parameters:
+        argv (list[str] | None): the command line arguments, read from sys.argv if not provided
+
+    Returns: None
+    """
+    parser = argparse.ArgumentParser(description="Convert json collections to JSON Lines.")
+    parser.add_argument("collections", nargs="*", default=DEFAULT_COLLECTIONS,
+                        help="collections to convert (default: receipts notifications)")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="directory holding the json files")
+    args = parser.parse_args(argv)
+    for collection in migrate(args.collections, args.data_dir):
+        print(f"converted {collection} to {collection}.jsonl")
+
+
+if __name__ == "__main__":
+    main()
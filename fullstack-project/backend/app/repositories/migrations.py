@@ -0,0 +1,152 @@
+"""
+This module holds the schema versions of the stored collections and the migrations between them.
+
+Every record of a migrated collection carries a _schema field with the version of the shape it was written in.
+A migration is a function registered for a collection and the version it upgrades records to; it changes the
+record in place, e.g. filling in a field added since. When the storage engine reads a record written at an older
+version, the pending migrations run on it in order before it reaches the services, so services can rely on
+every field of the current shape being present instead of guarding each access with .get() and a default.
+
+Records are upgraded:
+*   **lazily**, as the engine reads them (records already at the current version are passed through as they are)
+*   **eagerly**, by the background job started with the app, which rewrites collections read with older records
+*   **offline**, with the bulk command in schema_migrate.py
+
+To change the shape of a collection, add a migration with the next version number below.
+Migrations must leave records that are already in the new shape unchanged, since records written by the app
+before their _schema was recorded go through every migration.
+"""
+
+from typing import Any, Callable
+
+SCHEMA_FIELD = "_schema"
+
+# collection -> migrations, the one at index i upgrading records to version i + 1
+MIGRATIONS: dict[str, list[Callable[[dict[str, Any]], None]]] = {}
+
+
+def migration(collection: str, version: int) -> Callable:
+    """
+    Registers a function as the migration of a collection's records to a schema version.
+    Migrations of a collection must be registered in version order, starting at 1.
+
+    Parameters:
+        collection (str): the collection the migration applies to, e.g. "users"
+        version (int): the version the migration upgrades records to
+
+    Returns:
+        Callable: the decorator registering the function
+
+    Raises:
+        ValueError: if the version is not the next one for the collection
+    """
+    def register(upgrade: Callable[[dict[str, Any]], None]) -> Callable[[dict[str, Any]], None]:
+        registered = MIGRATIONS.setdefault(collection, [])
+        if version != len(registered) + 1:
+            raise ValueError(f"Migration of '{collection}' to version {version} registered out of order")
+        registered.append(upgrade)
+        return upgrade
+    return register
+
+
+def schema_version(collection: str) -> int:
+    """Returns the current schema version of a collection, 0 for a collection without migrations."""
+    return len(MIGRATIONS.get(collection, ()))
+
+
+def upgrade_record(collection: str, record: dict[str, Any]) -> bool:
+    """
+    Upgrades a record to the current schema version of its collection, in place.
+
+    Parameters:
+        collection (str): the record's collection
+        record (dict[str, Any]): the record, as stored
+
+    Returns:
+        bool: True if the record was behind the current version and has been upgraded
+    """
+    migrations = MIGRATIONS.get(collection)
+    if not migrations:
+        return False
+    version = record.get(SCHEMA_FIELD, 0)
+    if version >= len(migrations):
+        return False
+    for upgrade in migrations[version:]:
+        upgrade(record)
+    record[SCHEMA_FIELD] = len(migrations)
+    return True
+
+
+def upgrade_records(collection: str, records: list[dict[str, Any]]) -> int:
+    """
+    Upgrades every record of a collection to its current schema version, in place.
+
+    Parameters:
+        collection (str): the records' collection
+        records (list[dict[str, Any]]): the records, as stored
+
+    Returns:
+        int: how many records were behind the current version
+    """
+    if collection not in MIGRATIONS:
+        return 0
+    return sum(upgrade_record(collection, record) for record in records)
+
+
+# ---- migrations ----
+
+@migration("users", 1)
+def _user_role_fields(user: dict[str, Any]) -> None:
+    """Fills in the password reset fields and the fields of the user's role, with the model defaults."""
+    user.setdefault("reset_token", None)
+    user.setdefault("reset_token_expiry", None)
+    if user.get("role") == "customer":
+        user.setdefault("wallet_balance", 0.0)
+        user.setdefault("cart", {"restaurant_id": 0, "cart_items": [], "promo_code": None})
+        user.setdefault("favourites", [])
+    elif user.get("role") == "driver":
+        user.setdefault("vehicle", "bike")
+        user.setdefault("driver_status", "available")
+
+
+@migration("users", 2)
+def _drop_auth_token(user: dict[str, Any]) -> None:
+    """Removes the login token fields, since sessions are stored in their own collection (see session_repo.py)."""
+    user.pop("auth_token", None)
+    user.pop("auth_token_expiry", None)
+
+
+@migration("users", 3)
+def _email_key(user: dict[str, Any]) -> None:
+    """Adds the case-insensitive form of the email that users are indexed under (see user_repo.email_key)."""
+    user["email_key"] = (user.get("email") or "").strip().lower()
+
+
+@migration("restaurants", 1)
+def _restaurant_delivery_and_menu(restaurant: dict[str, Any]) -> None:
+    """Fills in the delivery settings and an empty menu, with the model defaults."""
+    restaurant.setdefault("max_delivery_radius_km", 10.0)
+    restaurant.setdefault("delivery_fee", 0.0)
+    menu = restaurant.setdefault("menu", {})
+    menu.setdefault("items", [])
+    menu.setdefault("combos", [])
+
+
+@migration("restaurants", 2)
+def _menu_price(restaurant: dict[str, Any]) -> None:
+    """Adds the running total and count of the menu prices, and the average price restaurants are sorted by."""
+    prices = [item.get("price", 0) for item in restaurant.get("menu", {}).get("items", [])]
+    restaurant["menu_price_total"] = round(sum(prices), 6)
+    restaurant["menu_item_count"] = len(prices)
+    restaurant["average_price"] = sum(prices) / len(prices) if prices else 0.0
+
+
+@migration("orders", 1)
+def _order_defaults(order: dict[str, Any]) -> None:
+    """Fills in the fields the order model has defaults for."""
+    order.setdefault("restaurant_id", 0)
+    order.setdefault("delivery_id", 0)
+    order.setdefault("receipt_id", 0)
+    order.setdefault("status", "pending")
+    order.setdefault("distance_km", 0.0)
+    order.setdefault("date_created", None)
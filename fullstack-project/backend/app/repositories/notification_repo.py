@@ -1,11 +1,9 @@
 """ This module handles notification data storage in the application. """
 
-from pathlib import Path
-import json
-import os
-from typing import Any
+from typing import Any, Callable, Iterator
+
+from app.repositories.storage_engine import get_engine
 
-NOTIFICATION_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "notifications.json"
 
 def load_notifications() -> list[dict[str, Any]]:
     """
@@ -16,14 +14,7 @@ def load_notifications() -> list[dict[str, Any]]:
     Returns:
     *   **list[dict[str, Any]]**: all notifications
     """
-    if not NOTIFICATION_DATA_PATH.exists():
-        return []
-    with NOTIFICATION_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        else:
-            return json.loads(content)
+    return get_engine().load("notifications")
 
 def save_notifications(items: list[dict[str, Any]]) -> None:
     """
@@ -34,7 +25,68 @@ def save_notifications(items: list[dict[str, Any]]) -> None:
 
     Returns: None
     """
-    tmp = NOTIFICATION_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, NOTIFICATION_DATA_PATH)
+    get_engine().save("notifications", items)
+
+def iter_notifications() -> Iterator[dict[str, Any]]:
+    """
+    **Streams saved notifications one at a time, so a scan can stop early without loading them all.**
+
+    Parameters: None
+
+    Returns:
+    *   **Iterator[dict[str, Any]]**: the notifications, oldest first
+    """
+    return get_engine().iter_records("notifications")
+
+def get_notification(notification_id: int) -> dict[str, Any] | None:
+    """
+    **Loads a single saved notification by its identifier.**
+
+    Parameters:
+    *   **notification_id** (int): the identifier of the notification
+
+    Returns:
+    *   **dict[str, Any] | None**: the notification, or None if it does not exist
+    """
+    return get_engine().get("notifications", notification_id)
+
+def save_notification(notification: dict[str, Any]) -> None:
+    """
+    **Saves a single notification, adding it if it is new.** New notifications are appended without rewriting
+    the others when notifications are stored as JSON Lines.
+
+    Parameters:
+    *   **notification** (dict[str, Any]): the notification to save
+
+    Returns: None
+    """
+    get_engine().upsert("notifications", notification)
+
+def update_notification_record(notification_id: int,
+                               change: Callable[[dict[str, Any]], dict[str, Any]]) -> dict[str, Any] | None:
+    """
+    **Applies a change to a single saved notification, retrying on the latest copy if another request changed it first.**
+
+    Parameters:
+    *   **notification_id** (int): the identifier of the notification
+    *   **change** (Callable[[dict[str, Any]], dict[str, Any]]): returns the updated notification. may be called more than once
+
+    Returns:
+    *   **dict[str, Any] | None**: the saved notification, or None if it does not exist
+
+    Raises:
+    *   **StorageConflictError**: if the notification kept changing on every retry
+    """
+    return get_engine().update("notifications", notification_id, change)
+
+
+def next_notification_id() -> int:
+    """
+    **Allocates the id for a new notification.**
+
+    Parameters: None
+
+    Returns:
+    *   **int**: a notification id that has never been used
+    """
+    return get_engine().next_id("notifications")
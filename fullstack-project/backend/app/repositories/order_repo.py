@@ -1,11 +1,9 @@
 """ This module handles order data storage in the application. """
 
-from pathlib import Path
-import json
-import os
-from typing import Any
+from typing import Any, Callable
+
+from app.repositories.storage_engine import get_engine
 
-ORDER_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "orders.json"
 
 def load_orders() -> list[dict[str, Any]]:
     """
@@ -16,14 +14,7 @@ def load_orders() -> list[dict[str, Any]]:
     Returns:
     *    **list[dict[str, Any]]**: all orders
     """
-    if not ORDER_DATA_PATH.exists():
-        return []
-    with ORDER_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        else:
-            return json.loads(content)
+    return get_engine().load("orders")
 
 def save_orders(items: list[dict[str, Any]]) -> None:
     """
@@ -35,7 +26,68 @@ def save_orders(items: list[dict[str, Any]]) -> None:
     Returns:
         None
     """
-    tmp = ORDER_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, ORDER_DATA_PATH)
+    get_engine().save("orders", items)
+
+def get_order(order_id: int) -> dict[str, Any] | None:
+    """
+    **Loads a single saved order by its identifier.**
+
+    Parameters:
+        order_id (int): the identifier of the order
+
+    Returns:
+        dict[str, Any] | None: the order, or None if it does not exist
+    """
+    return get_engine().get("orders", order_id)
+
+def save_order(order: dict[str, Any]) -> None:
+    """
+    **Saves a single order, replacing the stored order with the same id or adding it if it is new.**
+
+    Parameters:
+        order (dict[str, Any]): the order to save
+
+    Returns:
+        None
+    """
+    get_engine().upsert("orders", order)
+
+def update_order_record(order_id: int, change: Callable[[dict[str, Any]], dict[str, Any]]) -> dict[str, Any] | None:
+    """
+    **Applies a change to a single saved order, retrying on the latest copy if another request changed it first.**
+
+    Parameters:
+        order_id (int): the identifier of the order
+        change (Callable[[dict[str, Any]], dict[str, Any]]): returns the updated order. may be called more than once
+
+    Returns:
+        dict[str, Any] | None: the saved order, or None if it does not exist
+
+    Raises:
+        StorageConflictError: if the order kept changing on every retry
+    """
+    return get_engine().update("orders", order_id, change)
+
+def find_orders_by(field: str, value: Any) -> list[dict[str, Any]]:
+    """
+    **Loads every saved order whose field matches the value, using the field's index.**
+
+    Parameters:
+        field (str): an indexed order field - "customer_id", "restaurant_id" or "status"
+        value (Any): the value to match
+
+    Returns:
+        list[dict[str, Any]]: the matching orders, in the order they were created
+    """
+    return get_engine().find_by("orders", field, value)
+
+def next_order_id() -> int:
+    """
+    **Allocates the id for a new order.**
+
+    Parameters: None
+
+    Returns:
+        int: an order id that has never been used
+    """
+    return get_engine().next_id("orders")
@@ -1,11 +1,9 @@
 """This module handles promo code data storage in the application"""
 
-from pathlib import Path
-import json
-import os
-from typing import Any
+from typing import Any, Callable
+
+from app.repositories.storage_engine import get_engine
 
-PROMO_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "promo_codes.json"
 
 def load_promo_codes() -> list[dict[str, Any]]:
     """
@@ -16,14 +14,7 @@ def load_promo_codes() -> list[dict[str, Any]]:
     Returns:
     *    **list[dict[str, Any]]**: all promo codes
     """
-    if not PROMO_DATA_PATH.exists():
-        return []
-    with PROMO_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        else:
-            return json.loads(content)
+    return get_engine().load("promo_codes")
 
 def save_promo_codes(items: list[dict[str, Any]]) -> None:
     """
@@ -35,7 +26,20 @@ def save_promo_codes(items: list[dict[str, Any]]) -> None:
     Returns:
         None
     """
-    tmp = PROMO_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, PROMO_DATA_PATH)
\ No newline at end of file
+    get_engine().save("promo_codes", items)
+
+def update_promo_record(promo_id: int, change: Callable[[dict[str, Any]], dict[str, Any]]) -> dict[str, Any] | None:
+    """
+    **Applies a change to a single saved promo code, retrying on the latest copy if another request changed it first.**
+
+    Parameters:
+        promo_id (int): the identifier of the promo code
+        change (Callable[[dict[str, Any]], dict[str, Any]]): returns the updated promo code. may be called more than once
+
+    Returns:
+        dict[str, Any] | None: the saved promo code, or None if it does not exist
+
+    Raises:
+        StorageConflictError: if the promo code kept changing on every retry
+    """
+    return get_engine().update("promo_codes", promo_id, change)
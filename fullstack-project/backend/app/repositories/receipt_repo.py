@@ -1,11 +1,10 @@
 """ This module handles receipt data storage in the application. """
 
-from pathlib import Path
-import json
-import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+
+from app.repositories.archive_repo import get_archived
+from app.repositories.storage_engine import get_engine
 
-RECEIPT_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "receipts.json"
 
 
 def load_receipts() -> List[Dict[str, Any]]:
@@ -18,15 +17,7 @@ def load_receipts() -> List[Dict[str, Any]]:
     Returns:
     *   **list[dict[str, Any]]**: a list of all saved reciepts. Return empty list if DNE or empty.
     """
-
-    if not RECEIPT_DATA_PATH.exists():
-        return []
-    with RECEIPT_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        return json.loads(content)
-
+    return get_engine().load("receipts")
 
 def save_receipts(items: List[Dict[str, Any]]) -> None:
     
@@ -39,7 +30,53 @@ def save_receipts(items: List[Dict[str, Any]]) -> None:
  
     Returns: None
     """
-    tmp = RECEIPT_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, RECEIPT_DATA_PATH)
\ No newline at end of file
+    get_engine().save("receipts", items)
+
+def iter_receipts() -> Iterator[Dict[str, Any]]:
+    """
+    **Streams saved receipts one at a time, so a scan can stop early without loading them all.**
+
+    Parameters: None
+
+    Returns:
+        Iterator[dict[str, Any]]: the receipts, oldest first
+    """
+    return get_engine().iter_records("receipts")
+
+def get_receipt_by_id(receipt_id: int, include_archived: bool = True) -> Dict[str, Any] | None:
+    """
+    **Loads a single saved receipt by its identifier, from the archive if it was moved there with its order.**
+
+    Parameters:
+        receipt_id (int): the identifier of the receipt
+        include_archived (bool): False to look in the active receipts only
+
+    Returns:
+        dict[str, Any] | None: the receipt, or None if it does not exist
+    """
+    receipt = get_engine().get("receipts", receipt_id)
+    if receipt is None and include_archived:
+        return get_archived("receipts", receipt_id)
+    return receipt
+
+def save_receipt(receipt: Dict[str, Any]) -> None:
+    """
+    **Saves a single receipt, replacing the stored receipt with the same id or adding it if it is new.**
+
+    Parameters:
+        receipt (dict[str, Any]): the receipt to save
+
+    Returns: None
+    """
+    get_engine().upsert("receipts", receipt)
+
+def next_receipt_id() -> int:
+    """
+    **Allocates the id for a new receipt.**
+
+    Parameters: None
+
+    Returns:
+        int: a receipt id that has never been used
+    """
+    return get_engine().next_id("receipts")
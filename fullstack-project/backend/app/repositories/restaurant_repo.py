@@ -1,11 +1,19 @@
 """ This module handles restaurant data storage in the application. """
 
-from pathlib import Path
-import json
-import os
 from typing import Any
 
-RESTAURANT_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "restaurants.json"
+from app.repositories.search_cache import search_cache
+from app.repositories.storage_engine import current_unit, get_engine
+
+
+def _invalidate() -> None:
+    """Drops the cached search results once a write to a restaurant is stored (see search_cache.py)."""
+    unit = current_unit.get()
+    if unit is not None:
+        # inside a transaction the write is only stored when the unit commits
+        unit.after_commit(search_cache.invalidate)
+    else:
+        search_cache.invalidate()
 
 def load_restaurants() -> list[dict[str, Any]]:
     """
@@ -16,14 +24,7 @@ def load_restaurants() -> list[dict[str, Any]]:
     Returns:
     *    **list[dict[str, Any]]**: all restaurants stored in restaurants.json
     """
-    if not RESTAURANT_DATA_PATH.exists():
-        return []
-    with RESTAURANT_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        else:
-            return json.loads(content)
+    return get_engine().load("restaurants")
 
 def save_restaurants(items: list[dict[str, Any]]) -> None:
     """
@@ -34,7 +35,81 @@ def save_restaurants(items: list[dict[str, Any]]) -> None:
 
     Returns: None
     """
-    tmp = RESTAURANT_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, RESTAURANT_DATA_PATH)
+    get_engine().save("restaurants", items)
+    _invalidate()
+
+def get_restaurant(restaurant_id: int) -> dict[str, Any] | None:
+    """
+    **Loads a single saved restaurant by its identifier.**
+
+    Parameters:
+    *   **restaurant_id** (int): the identifier of the restaurant
+
+    Returns:
+    *   **dict[str, Any] | None**: the restaurant, or None if it does not exist
+    """
+    return get_engine().get("restaurants", restaurant_id)
+
+def save_restaurant(restaurant: dict[str, Any]) -> None:
+    """
+    **Saves a single restaurant, replacing the stored restaurant with the same id or adding it if it is new.**
+
+    Parameters:
+    *   **restaurant** (dict[str, Any]): the restaurant to save
+
+    Returns: None
+    """
+    get_engine().upsert("restaurants", restaurant)
+    _invalidate()
+
+def find_restaurants_by(field: str, value: Any) -> list[dict[str, Any]]:
+    """
+    **Loads every saved restaurant whose field matches the value. List fields match if they contain the value.**
+
+    Parameters:
+    *   **field** (str): the field to match, "manager_ids" is indexed
+    *   **value** (Any): the value to match
+
+    Returns:
+    *   **list[dict[str, Any]]**: the matching restaurants
+    """
+    return get_engine().find_by("restaurants", field, value)
+
+def find_restaurants_containing(field: str, text: str) -> list[dict[str, Any]]:
+    """
+    **Loads every saved restaurant with a value at the dotted path containing the text, ignoring case.**
+
+    Parameters:
+    *   **field** (str): the path to search: "name", "city", "address.street", "address.postal_code" and
+        "menu.items.name" have a trigram index
+    *   **text** (str): the substring to look for
+
+    Returns:
+    *   **list[dict[str, Any]]**: the matching restaurants
+    """
+    return get_engine().search("restaurants", field, text)
+
+def load_restaurants_by_price(descending: bool, start: int, stop: int) -> tuple[list[dict[str, Any]], int]:
+    """
+    **Loads a page of the saved restaurants ordered by the average price of their menu items.**
+
+    Parameters:
+    *   **descending** (bool): True for the most expensive restaurants first
+    *   **start** (int): the position in the order of the first restaurant loaded
+    *   **stop** (int): the position after the last restaurant loaded
+
+    Returns:
+    *   **tuple[list[dict[str, Any]], int]**: the restaurants of the page, and the number of restaurants
+    """
+    return get_engine().sorted_by("restaurants", "average_price", descending, start, stop)
+
+def next_restaurant_id() -> int:
+    """
+    **Allocates the id for a new restaurant.**
+
+    Parameters: None
+
+    Returns:
+    *   **int**: a restaurant id that has never been used
+    """
+    return get_engine().next_id("restaurants")
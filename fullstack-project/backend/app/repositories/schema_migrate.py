@@ -0,0 +1,134 @@
+"""
+This module upgrades whole collections to their current schema version (see migrations.py).
+
+Records are already upgraded lazily as the storage engine reads them. Rewriting the collections as well means the
+files hold the current shape too, so reads stop paying for the upgrade:
+*   **upgrade_stale_collections** runs in the background when the app starts, and rewrites the collections
+    that were read with records at an older version
+*   **migrate** is the offline bulk command, which streams each json file through the migrations instead of
+    loading it, so it can upgrade collections larger than the app would want to hold in memory
+
+Usage of the offline command (from the backend directory, with the app stopped):
+    python -m app.repositories.schema_migrate users restaurants orders
+"""
+
+import argparse
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from app.repositories.config_repo import load_config
+from app.repositories.json_files import (
+    file_lock, iter_json_file, iter_jsonl_file, write_json_records, write_jsonl_records,
+)
+from app.repositories.journal import JOURNAL_SUFFIX, Journal
+from app.repositories.migrations import MIGRATIONS, upgrade_record, upgrade_records
+from app.repositories.storage_engine import (
+    COLLECTION_KEYS, DATA_DIR, LOCK_SUFFIX, SQLITE_DB_NAME, SqliteStorageEngine, get_engine,
+)
+
+
+def upgrade_stale_collections() -> list[str]:
+    """
+    Reads every migrated collection through the active engine, then rewrites the ones that held records
+    at an older schema version. Run by the app at startup, in a background thread.
+
+    Parameters: None
+
+    Returns:
+        list[str]: the collections that were rewritten
+    """
+    engine = get_engine()
+    for collection in MIGRATIONS:
+        # reading upgrades the records and notes the collection as stale if any was behind
+        engine.load(collection)
+    stale = engine.stale_collections()
+    for collection in stale:
+        engine.upgrade(collection)
+    return stale
+
+
+def _upgrading(collection: str, records: Iterable[dict[str, Any]], counter: list[int]) -> Iterator[dict[str, Any]]:
+    """Upgrades records as they are streamed, counting the ones that were behind in counter[0]."""
+    for record in records:
+        counter[0] += upgrade_record(collection, record)
+        yield record
+
+
+def _migrate_file(collection: str, data_dir: Path) -> int:
+    """Upgrades a collection stored by the json engine. Must be called holding the collection's lock."""
+    json_path = data_dir / f"{collection}.json"
+    jsonl_path = data_dir / f"{collection}.jsonl"
+    journal_path = json_path.with_suffix(JOURNAL_SUFFIX)
+    counter = [0]
+    if journal_path.exists():
+        def upgrade(records: list[dict[str, Any]]) -> None:
+            counter[0] += upgrade_records(collection, records)
+        # the journal only applies to its snapshot, so the two are rewritten together
+        Journal(json_path, COLLECTION_KEYS[collection], upgrade=upgrade).rewrite()
+    elif jsonl_path.exists():
+        write_jsonl_records(jsonl_path, _upgrading(collection, iter_jsonl_file(jsonl_path), counter))
+    elif json_path.exists():
+        write_json_records(json_path, _upgrading(collection, iter_json_file(json_path), counter))
+    return counter[0]
+
+
+def migrate(collections: list[str], data_dir: Path = DATA_DIR) -> dict[str, int]:
+    """
+    Upgrades every record of the collections to its current schema version and stores them upgraded.
+
+    Parameters:
+        collections (list[str]): the collections to upgrade, e.g. ["users", "orders"]
+        data_dir (Path): the directory holding the json files (and storage.db, with the sqlite engine)
+
+    Returns:
+        dict[str, int]: the number of records each collection had at an older version
+
+    Raises:
+        ValueError: if a collection has no migrations
+    """
+    for collection in collections:
+        if collection not in MIGRATIONS:
+            raise ValueError(f"Collection '{collection}' has no migrations")
+
+    data_dir = Path(data_dir)
+    upgraded = {}
+    if load_config().get("STORAGE_ENGINE", "json") == "sqlite":
+        # rows are not files, so they are upgraded through the engine; the plain engine reads them as stored
+        plain = SqliteStorageEngine(data_dir / SQLITE_DB_NAME, json_dir=data_dir)
+        engine = SqliteStorageEngine(data_dir / SQLITE_DB_NAME, json_dir=data_dir, migrate=True)
+        try:
+            for collection in collections:
+                upgraded[collection] = upgrade_records(collection, plain.load(collection))
+                if upgraded[collection]:
+                    engine.upgrade(collection)
+        finally:
+            plain.close()
+            engine.close()
+        return upgraded
+
+    for collection in collections:
+        with file_lock(data_dir / f"{collection}{LOCK_SUFFIX}"):
+            upgraded[collection] = _migrate_file(collection, data_dir)
+    return upgraded
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Runs the bulk migration from the command line.
+
+    Parameters:
+        argv (list[str] | None): the command line arguments, read from sys.argv if not provided
+
+    Returns: None
+    """
+    parser = argparse.ArgumentParser(description="Upgrade collections to their current schema version.")
+    parser.add_argument("collections", nargs="*", default=list(MIGRATIONS),
+                        help=f"collections to upgrade (default: {' '.join(MIGRATIONS)})")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="directory holding the json files")
+    args = parser.parse_args(argv)
+    for collection, count in migrate(args.collections, args.data_dir).items():
+        print(f"{collection}: upgraded {count} records")
+
+
+if __name__ == "__main__":
+    main()
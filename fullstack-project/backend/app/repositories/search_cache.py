@@ -0,0 +1,129 @@
+"""
+This module implements the in-process cache of restaurant search results.
+
+Most searches repeat the same few queries, e.g. the first page of the restaurants of a city. For each page asked
+for - the search filters, sort order, page and cursor, normalized - the cache keeps the ids of the restaurants on
+the page, the number of matches and whether more follow, so a repeated search loads only the restaurants on it.
+
+Every write to a restaurant through restaurant_repo.py drops every entry, since a change to any restaurant can
+change the results of any query. Writes made by other processes are only seen once the entry expires, after
+SEARCH_CACHE_TTL_SECONDS. The least recently used queries are evicted first.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Any
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+class SearchCache:
+    """
+    Caches the pages of restaurant search results by query, with a bound on the number of queries kept.
+
+    Attributes:
+        max_entries (int): the most queries kept, the least recently used being evicted first
+        hits (int): searches served from the cache
+        misses (int): searches of queries that were not cached, or had expired
+        evictions (int): entries dropped to stay within max_entries
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # query -> ((ids on the page, number of matches, whether more follow), unix time the entry expires at)
+        self._entries: OrderedDict[tuple, tuple[tuple[list[int], int, bool], float]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, query: tuple) -> tuple[list[int], int, bool] | None:
+        """
+        Returns the cached page of a query. Cached pages are shared between requests, so must not be changed.
+
+        Parameters:
+            query (tuple): the normalized search filters, sort order and page
+
+        Returns:
+            tuple[list[int], int, bool] | None: the ids of the restaurants on the page, the number of matching
+            restaurants and whether any come after the page, or None if the query is not cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[query]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        """
+        Returns a counter of the invalidations so far. Read it before searching, and pass it to put.
+
+        Parameters: None
+
+        Returns:
+            int: the invalidation counter
+        """
+        return self._generation
+
+    def put(self, query: tuple, page: tuple[list[int], int, bool], expires_at: float, generation: int) -> None:
+        """
+        Caches the page of a query, unless a restaurant was written while it was being searched for,
+        since it could then be outdated.
+
+        Parameters:
+            query (tuple): the normalized search filters, sort order and page
+            page (tuple[list[int], int, bool]): the ids of the restaurants on the page, the number of matching
+                restaurants and whether any come after the page
+            expires_at (float): the unix time the entry expires at
+            generation (int): the value of generation() from before the search
+
+        Returns: None
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[query] = (page, expires_at)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """
+        Drops every entry, after a restaurant was written.
+
+        Parameters: None
+
+        Returns: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the cache counters.
+
+        Parameters: None
+
+        Returns:
+            dict[str, Any]: hits, misses, hit_rate, evictions and the number of cached queries
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+        }
+
+
+search_cache = SearchCache()
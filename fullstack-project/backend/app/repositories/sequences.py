@@ -0,0 +1,55 @@
+"""
+This module implements the persisted id sequences used by the json storage engine.
+
+The last id handed out for each collection is kept in sequences.json, so allocating an id reads and rewrites
+one small file instead of scanning the whole collection for its highest id.
+Allocation holds both a thread lock and a file lock, so ids stay unique across requests and worker processes.
+"""
+
+from pathlib import Path
+import threading
+from typing import Callable
+
+from app.repositories.json_files import file_lock, read_json_file, write_json_file
+
+LOCK_SUFFIX = ".lock"
+
+
+class SequenceFile:
+    """
+    Keeps one counter per collection in a json object of {collection: last allocated id}.
+
+    Attributes:
+        path (Path): the json file holding the counters
+        lock_path (Path): the lock file guarding it
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_suffix(LOCK_SUFFIX)
+        self._lock = threading.Lock()
+
+    def next(self, name: str, seed: Callable[[], int], reseed: bool = False) -> int:
+        """
+        Allocates the next id of a sequence.
+
+        Parameters:
+            name (str): the sequence name, usually the collection name
+            seed (Callable[[], int]): returns the highest id in use, called when the sequence has no counter yet
+            reseed (bool): also call seed for an existing counter, and continue from whichever is higher
+
+        Returns:
+            int: the allocated id
+        """
+        with self._lock, file_lock(self.lock_path):
+            counters = read_json_file(self.path)
+            if not isinstance(counters, dict):
+                # a blank file reads as an empty list
+                counters = {}
+            current = counters.get(name)
+            if current is None or reseed:
+                current = max(current or 0, seed())
+            counters[name] = current + 1
+            write_json_file(self.path, counters)
+            return current + 1
+
@@ -0,0 +1,158 @@
+"""
+This module handles login session storage in the application.
+
+Sessions are kept in their own collection, keyed by a hash of the session token, so authenticating a request is a
+single primary key lookup instead of a scan of every user. Only the hash is stored, so the sessions file does not
+hold tokens that could be used to log in.
+
+Signed tokens (see app/auth.py) are not stored. Logging one out adds it to the revocation list instead, a small
+collection holding each revoked token id, or user whose earlier tokens are all revoked, until those tokens expire.
+"""
+
+import hashlib
+from typing import Any
+
+from app.repositories.storage_engine import get_engine
+from app.repositories.unit_of_work import transaction
+
+
+def session_key(token: str) -> str:
+    """
+    **Returns the key a session token is stored under.**
+
+    Parameters:
+    *   **token** (str): the session token given to the user at login
+
+    Returns:
+    *   **str**: the SHA-256 hex digest of the token
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def get_session(token: str) -> dict[str, Any] | None:
+    """
+    **Loads the session of a token.**
+
+    Parameters:
+    *   **token** (str): the session token
+
+    Returns:
+    *   **dict[str, Any] | None**: the session ({"id", "user_id", "expires_at"}), or None if there is none
+    """
+    return get_engine().get("sessions", session_key(token))
+
+def save_session(token: str, user_id: str, expires_at: float) -> dict[str, Any]:
+    """
+    **Saves the session of a newly issued token.**
+
+    Parameters:
+    *   **token** (str): the session token
+    *   **user_id** (str): the identifier of the logged-in user
+    *   **expires_at** (float): the unix time the session expires at
+
+    Returns:
+    *   **dict[str, Any]**: the saved session
+    """
+    session = {"id": session_key(token), "user_id": user_id, "expires_at": expires_at}
+    get_engine().upsert("sessions", session)
+    return session
+
+def find_user_sessions(user_id: str) -> list[dict[str, Any]]:
+    """
+    **Loads every session of a user.**
+
+    Parameters:
+    *   **user_id** (str): the identifier of the user
+
+    Returns:
+    *   **list[dict[str, Any]]**: the user's sessions
+    """
+    return get_engine().find_by("sessions", "user_id", user_id)
+
+def delete_expired_sessions(now: float) -> int:
+    """
+    **Deletes every session that expired before the given time, in a single write.**
+    Sessions saved meanwhile by other requests are kept.
+
+    Parameters:
+    *   **now** (float): the current unix time
+
+    Returns:
+    *   **int**: the number of sessions deleted
+    """
+    with transaction() as unit:
+        expired = [session["id"] for session in unit.iter_records("sessions") if session["expires_at"] < now]
+        for key in expired:
+            unit.delete("sessions", key)
+        # revocations are only needed until the tokens they revoke have expired
+        for revocation in list(unit.iter_records("revoked_tokens")):
+            if revocation["expires_at"] < now:
+                unit.delete("revoked_tokens", revocation["id"])
+    return len(expired)
+
+def delete_session_by_key(key: str) -> bool:
+    """
+    **Deletes a session by the key it is stored under (see session_key).**
+
+    Parameters:
+    *   **key** (str): the session's key
+
+    Returns:
+    *   **bool**: True if the session existed
+    """
+    return get_engine().delete("sessions", key)
+
+def delete_session(token: str) -> bool:
+    """
+    **Deletes the session of a token, logging it out.**
+
+    Parameters:
+    *   **token** (str): the session token
+
+    Returns:
+    *   **bool**: True if the session existed
+    """
+    return get_engine().delete("sessions", session_key(token))
+
+def revoke_token(token_id: str, expires_at: float) -> None:
+    """
+    **Adds a signed token to the revocation list.**
+
+    Parameters:
+    *   **token_id** (str): the token's id (its "jti" claim)
+    *   **expires_at** (float): the unix time the token expires at, after which the revocation is dropped
+
+    Returns: None
+    """
+    get_engine().upsert("revoked_tokens", {"id": token_id, "expires_at": expires_at})
+
+def revoke_user_tokens(user_id: str, issued_before: float, expires_at: float) -> None:
+    """
+    **Revokes every signed token of a user issued before the given time.**
+
+    Parameters:
+    *   **user_id** (str): the identifier of the user
+    *   **issued_before** (float): tokens issued before this unix time are revoked
+    *   **expires_at** (float): the unix time the last of those tokens expires at
+
+    Returns: None
+    """
+    get_engine().upsert("revoked_tokens", {"id": f"user:{user_id}", "issued_before": issued_before,
+                                           "expires_at": expires_at})
+
+def is_token_revoked(token_id: str, user_id: str, issued_at: float) -> bool:
+    """
+    **Checks a signed token against the revocation list.**
+
+    Parameters:
+    *   **token_id** (str): the token's id
+    *   **user_id** (str): the user the token was issued to
+    *   **issued_at** (float): the unix time the token was issued at
+
+    Returns:
+    *   **bool**: True if the token, or every token of the user issued before it, was revoked
+    """
+    engine = get_engine()
+    if engine.get("revoked_tokens", token_id) is not None:
+        return True
+    revocation = engine.get("revoked_tokens", f"user:{user_id}")
+    return revocation is not None and issued_at < revocation["issued_before"]
@@ -0,0 +1,1489 @@
+"""
+This module defines the storage engines behind the repository modules.
+Repositories never touch files directly - every load_*/save_* call goes through the active engine,
+so the storage backend can be changed without touching the services.
+Lookups by primary key (get) and by an indexed field (get_by/find_by) are served from indexes instead of scans.
+New integer ids are allocated by next_id from persisted per-collection counters.
+Every stored record carries a _version that is bumped whenever the record changes, so a single record can be
+updated with compare_and_swap/update instead of holding a lock across a load-modify-save.
+Writes made inside unit_of_work.transaction() are buffered and applied together by commit, one write per collection.
+Orders and receipts have monthly archive partitions, stored as collections of their own (see archive_repo.py).
+The engines the app runs on upgrade records to their collection's current schema version as they are read
+and stamp them with it as they are written (see migrations.py). This cannot be turned off, since the services
+rely on every field of the current shape being present.
+
+Engines are safe to share between worker processes: writes hold a per-collection lock (an flock'd lock file
+for json, a write transaction for sqlite), and a whole-collection save is merged with any change made since
+this request loaded the collection instead of overwriting it (see conflicts.py).
+
+Engines:
+*   **json**: one JSON array per collection in app/data (default), or one JSON Lines file for the collections
+    listed in JSONL_COLLECTIONS
+*   **sqlite**: one table per collection in app/data/storage.db, one row per record (stdlib sqlite3, WAL mode)
+
+The engine is selected by the STORAGE_ENGINE config value. Either engine can run in write-behind mode (WRITE_BEHIND_MS).
+"""
+
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+import hashlib
+import json
+import marshal
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from app.repositories.binary_snapshots import load_frozen, snapshot_path, write_snapshot
+from app.repositories.config_repo import load_config
+from app.repositories.conflicts import StorageConflictError, merge_records
+from app.repositories.json_files import (
+    FileLock, append_jsonl_file, file_lock, file_stamp, iter_jsonl_file, read_json_file, read_jsonl_file,
+    write_json_file, write_jsonl_file,
+)
+from app.repositories.document_cache import DocumentCache, clone, document_cache, freeze
+from app.repositories.indexes import CollectionIndex, index_value, sort_value, text_values
+from app.repositories.journal import Journal, DEFAULT_COMPACT_BYTES
+from app.repositories.migrations import SCHEMA_FIELD, schema_version, upgrade_records
+from app.repositories.sequences import SequenceFile
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+SQLITE_DB_NAME = "storage.db"
+SEQUENCES_NAME = "sequences"
+LOCK_SUFFIX = ".lock"
+VERSION_FIELD = "_version"
+UPDATE_RETRIES = 20
+UPDATE_BACKOFF_SECONDS = 0.005
+DEFAULT_SNAPSHOT_INTERVAL = 60
+
+# primary key field of every collection. collection names match the json file names in app/data
+COLLECTION_KEYS = {
+    "users": "id",
+    "restaurants": "id",
+    "orders": "id",
+    "deliveries": "id",
+    "receipts": "id",
+    "notifications": "id",
+    "promo_codes": "id",
+    "sessions": "id",
+    "revoked_tokens": "id",
+}
+
+# fields with a secondary index, per collection
+INDEXED_FIELDS = {
+    "users": ("role", "email_key", "reset_token"),
+    "restaurants": ("manager_ids",),
+    "orders": ("customer_id", "restaurant_id", "status"),
+    "deliveries": ("order_id", "driver_id"),
+    "receipts": ("customer_id",),
+    "sessions": ("user_id",),
+}
+
+# dotted paths with a trigram index for substring search, per collection
+TEXT_INDEXED_FIELDS = {
+    "restaurants": ("name", "city", "address.street", "address.postal_code", "menu.items.name"),
+}
+
+# numeric fields kept in order, for paging through records in that order, per collection
+SORTED_FIELDS = {
+    "restaurants": ("average_price",),
+}
+
+# collections with monthly archive partitions, each stored as the collection <collection>_archive_<YYYY>_<MM>
+ARCHIVED_COLLECTIONS = ("orders", "receipts")
+ARCHIVE_PARTITION = re.compile(r"^(%s)_archive_(\d{4})_(\d{2})$" % "|".join(ARCHIVED_COLLECTIONS))
+
+# indexed fields holding a list, matched against each element
+MULTI_VALUED_FIELDS = {
+    "restaurants": ("manager_ids",),
+}
+
+
+# (engine, collection) -> (version, frozen records) of the last load or save in the current request, or None
+# outside of track_reads(). the mapping is replaced rather than mutated, so copied contexts never share it
+_reads: ContextVar[dict[tuple["StorageEngine", str], tuple[Any, bytes]] | None] = ContextVar("storage_reads", default=None)
+
+
+# the unit of work opened by unit_of_work.transaction() in the current context, returned by get_engine() while open
+current_unit: ContextVar["StorageEngine | None"] = ContextVar("storage_unit", default=None)
+
+
+@contextmanager
+def track_reads() -> Iterator[None]:
+    """
+    Scopes conflict detection to a unit of work such as a single API request.
+    Inside the scope, a whole-collection save is merged with changes made since the collection was loaded in the
+    same scope. Outside of any scope, saves overwrite the collection as passed.
+
+    Parameters: None
+
+    Returns:
+        Iterator[None]: a context manager for the scope
+    """
+    token = _reads.set({})
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def _record_key(collection: str, record: dict[str, Any]) -> Any:
+    """Returns the primary key value of a record in the given collection."""
+    return record.get(COLLECTION_KEYS.get(collection, "id"))
+
+
+def _upserted(collection: str, items: list[dict[str, Any]], record: dict[str, Any]) -> list[dict[str, Any]]:
+    """Replaces the record with the same primary key in items, or appends it. Returns items."""
+    key = _record_key(collection, record)
+    for idx, existing in enumerate(items):
+        if _record_key(collection, existing) == key:
+            items[idx] = record
+            break
+    else:
+        items.append(record)
+    return items
+
+
+def _without(collection: str, items: list[dict[str, Any]], key: Any) -> list[dict[str, Any]]:
+    """Returns items without the record with the given primary key."""
+    return [record for record in items if _record_key(collection, record) != key]
+
+
+def record_version(record: dict[str, Any] | None) -> int:
+    """
+    Returns the version of a stored record.
+
+    Parameters:
+        record (dict[str, Any] | None): the record, or None for a record that does not exist
+
+    Returns:
+        int: the record's version, 0 for a missing record or one that was never changed after being added
+    """
+    return record.get(VERSION_FIELD, 0) if record else 0
+
+
+def _versioned(record: dict[str, Any], stored: dict[str, Any] | None) -> dict[str, Any]:
+    """
+    Returns the record to write over stored: as passed if it is new or unchanged, otherwise a copy with the next
+    version. A record already versioned past stored (e.g. buffered by write-behind) keeps its own version.
+    """
+    if stored is None or stored == record:
+        return record
+    return {**record, VERSION_FIELD: max(record_version(stored) + 1, record_version(record))}
+
+
+def _versioned_all(collection: str, items: list[dict[str, Any]],
+                   stored: Callable[[Any], dict[str, Any] | None]) -> list[dict[str, Any]]:
+    """Applies _versioned to every record of a whole-collection save, looking up stored records by primary key."""
+    return [_versioned(record, stored(_record_key(collection, record))) for record in items]
+
+
+def _applied(collection: str, items: list[dict[str, Any]], records: dict[Any, dict[str, Any] | None]) -> list[dict[str, Any]]:
+    """Returns items with records written by primary key applied: replaced in place, appended, or removed if None."""
+    pending = dict(records)
+    result = []
+    for record in items:
+        key = _record_key(collection, record)
+        if key in pending:
+            record = pending.pop(key)
+        if record is not None:
+            result.append(record)
+    result.extend(record for record in pending.values() if record is not None)
+    return result
+
+
+class CollectionChanges:
+    """
+    The writes a unit of work made to one collection, applied by StorageEngine.commit.
+
+    Attributes:
+        items (list[dict[str, Any]] | None): the full contents to save, if the collection was saved as a whole
+        records (dict[Any, dict[str, Any] | None]): records written by primary key, None for a deleted record.
+            applied on top of the stored contents when items is None
+        expected (dict[Any, int]): the stored version each conditionally written record must still have
+    """
+
+    def __init__(self):
+        self.items: list[dict[str, Any]] | None = None
+        self.records: dict[Any, dict[str, Any] | None] = {}
+        self.expected: dict[Any, int] = {}
+
+
+def archive_partition(collection: str, month: str) -> str:
+    """
+    Returns the name of the archive partition of a collection for a month.
+
+    Parameters:
+        collection (str): an archived collection, e.g. "orders"
+        month (str): the month, as YYYY-MM
+
+    Returns:
+        str: the partition's collection name, e.g. "orders_archive_2026_01"
+
+    Raises:
+        ValueError: if the collection has no archive or the month is not YYYY-MM
+    """
+    name = f"{collection}_archive_{month.replace('-', '_')}"
+    if not ARCHIVE_PARTITION.match(name) or not 1 <= int(name[-2:]) <= 12:
+        raise ValueError(f"No archive partition of '{collection}' for month '{month}'")
+    return name
+
+
+def _partitions_in(names: Any, collection: str) -> list[str]:
+    """Returns the archive partitions of a collection among names, oldest first."""
+    return sorted({
+        name for name in names
+        if (match := ARCHIVE_PARTITION.match(name)) is not None and match.group(1) == collection
+    })
+
+
+def _max_id(collection: str, items: list[dict[str, Any]]) -> int:
+    """Returns the highest integer primary key in a list of records, 0 if there is none."""
+    keys = (_record_key(collection, record) for record in items)
+    return max((key for key in keys if isinstance(key, int) and not isinstance(key, bool)), default=0)
+
+
+def _matches(record: dict[str, Any], field: str, value: Any) -> bool:
+    """Returns true if the record's field equals the value, or contains it for list fields."""
+    stored = record.get(field)
+    if isinstance(stored, list):
+        return value in [index_value(item) for item in stored]
+    return index_value(stored) == value
+
+
+class StorageEngine:
+    """
+    Defines the interface shared by all storage engines.
+    Whole-collection load/save keeps the existing repository functions working,
+    while get/upsert/delete allow single-record reads and writes.
+
+    Inside track_reads(), engines remember the version of each collection loaded in the current request.
+    If the collection changed by the time it is saved, the request's changes are merged onto the current contents.
+
+    With migrate on, records read at an older schema version are upgraded before they are returned and their
+    collection is noted as stale until upgrade() rewrites it; records written are stamped with the current version.
+
+    Attributes:
+        name (str): the config name of the engine
+        migrate (bool): whether records are upgraded to the current schema version (see migrations.py)
+    """
+    name = ""
+    migrate = False
+
+    @classmethod
+    def from_config(cls, config: dict) -> "StorageEngine":
+        """
+        Creates the engine from the app config.
+
+        Parameters:
+            config (dict): the loaded app config
+
+        Returns:
+            StorageEngine: the new engine
+        """
+        return cls()
+
+    def load(self, collection: str) -> list[dict[str, Any]]:
+        """
+        Loads every record in a collection.
+
+        Parameters:
+            collection (str): the collection name, e.g. "orders"
+
+        Returns:
+            list[dict[str, Any]]: all records, in insertion order
+        """
+        raise NotImplementedError
+
+    def iter_records(self, collection: str) -> Iterator[dict[str, Any]]:
+        """
+        Streams the records of a collection, for scans that may stop early or do not need the whole list at once.
+        Engines that can read records one at a time do so; the others load the collection.
+
+        Parameters:
+            collection (str): the collection name, e.g. "notifications"
+
+        Returns:
+            Iterator[dict[str, Any]]: the records, in insertion order
+        """
+        yield from self.load(collection)
+
+    def save(self, collection: str, items: list[dict[str, Any]]) -> None:
+        """
+        Replaces the contents of a collection with the passed records.
+        Records that differ from the stored record with the same primary key get the next _version.
+        If the collection was loaded earlier in this track_reads() scope and has changed since, only the records
+        added, changed or removed since that load are applied to the current contents.
+
+        Parameters:
+            collection (str): the collection name
+            items (list[dict[str, Any]]): the records to save
+
+        Returns: None
+
+        Raises:
+            StorageConflictError: if another request changed one of the same records in a different way
+        """
+        raise NotImplementedError
+
+    def _remember_read(self, collection: str, version: Any, frozen: bytes) -> None:
+        """Records the version and contents of a collection as loaded or saved by the current request."""
+        reads = _reads.get()
+        if reads is not None:
+            _reads.set({**reads, (self, collection): (version, frozen)})
+
+    def _remember_write(self, collection: str, before: Any, after: Callable[[], tuple[Any, bytes]],
+                        apply: Callable[[list[dict[str, Any]]], list[dict[str, Any]]]) -> None:
+        """
+        Keeps the current request's remembered version of a collection in step with a single-record write it made,
+        so a later save in the same request does not mistake the request's own write for a concurrent change.
+
+        Parameters:
+            collection (str): the collection name
+            before (Any): the stored version just before the write
+            after (Callable[[], tuple[Any, bytes]]): returns the version and frozen records just after the write
+            apply (Callable): applies the same write to a list of records
+        """
+        base = (_reads.get() or {}).get((self, collection))
+        if base is None:
+            return
+        if base[0] == before:
+            self._remember_read(collection, *after())
+        else:
+            # keep the old version so changes made by others since the load are still merged
+            self._remember_read(collection, base[0], freeze(apply(marshal.loads(base[1]))))
+
+    def _merge_with_current(self, collection: str, items: list[dict[str, Any]], version: Any,
+                            current: Callable[[], list[dict[str, Any]]]) -> list[dict[str, Any]]:
+        """
+        Returns the records to write for a save, given the current stored version.
+        Must be called holding the collection's write lock.
+
+        Parameters:
+            collection (str): the collection name
+            items (list[dict[str, Any]]): the records being saved
+            version (Any): the current stored version
+            current (Callable[[], list[dict[str, Any]]]): returns the current stored records
+
+        Returns:
+            list[dict[str, Any]]: items, or items merged with the current records if the collection changed
+        """
+        base = (_reads.get() or {}).get((self, collection))
+        if base is None or base[0] == version:
+            return items
+        return merge_records(
+            collection, COLLECTION_KEYS.get(collection, "id"), marshal.loads(base[1]), items, current()
+        )
+
+    def get(self, collection: str, key: Any) -> dict[str, Any] | None:
+        """
+        Retrieves a single record by its primary key.
+
+        Parameters:
+            collection (str): the collection name
+            key (Any): the primary key value of the record
+
+        Returns:
+            dict[str, Any] | None: the record, or None if it does not exist
+        """
+        for record in self.load(collection):
+            if _record_key(collection, record) == key:
+                return record
+        return None
+
+    def find_by(self, collection: str, field: str, value: Any) -> list[dict[str, Any]]:
+        """
+        Retrieves every record whose field matches the value. For list fields, records containing the value match.
+
+        Parameters:
+            collection (str): the collection name
+            field (str): the field to match, ideally one listed in INDEXED_FIELDS
+            value (Any): the value to match
+
+        Returns:
+            list[dict[str, Any]]: the matching records, in insertion order
+        """
+        value = index_value(value)
+        return [record for record in self.load(collection) if _matches(record, field, value)]
+
+    def get_by(self, collection: str, field: str, value: Any) -> dict[str, Any] | None:
+        """
+        Retrieves the first record whose field matches the value.
+
+        Parameters:
+            collection (str): the collection name
+            field (str): the field to match, ideally one listed in INDEXED_FIELDS
+            value (Any): the value to match
+
+        Returns:
+            dict[str, Any] | None: the record, or None if no record matches
+        """
+        matches = self.find_by(collection, field, value)
+        return matches[0] if matches else None
+
+    def search(self, collection: str, field: str, text: str) -> list[dict[str, Any]]:
+        """
+        Retrieves every record with a value at a dotted path containing the text, ignoring case.
+        Paths go through lists, so "menu.items.name" matches restaurants with a menu item of that name.
+
+        Parameters:
+            collection (str): the collection name
+            field (str): the dotted path to search, ideally one listed in TEXT_INDEXED_FIELDS
+            text (str): the substring to look for
+
+        Returns:
+            list[dict[str, Any]]: the matching records, in insertion order
+        """
+        text = text.lower()
+        return [record for record in self.iter_records(collection)
+                if any(text in value for value in text_values(record, field))]
+
+    def sorted_by(self, collection: str, field: str, descending: bool = False, start: int = 0,
+                  stop: int | None = None) -> tuple[list[dict[str, Any]], int]:
+        """
+        Retrieves a slice of the records ordered by a numeric field, records with the same value in insertion order.
+        Records whose value is not a number are left out.
+
+        Parameters:
+            collection (str): the collection name
+            field (str): the field to order by, ideally one listed in SORTED_FIELDS
+            descending (bool): True for the highest values first
+            start (int): the position in the order of the first record returned
+            stop (int | None): the position after the last record returned, the end of the order if not provided
+
+        Returns:
+            tuple[list[dict[str, Any]], int]: the records in the slice, and the number of records in the order
+        """
+        ordered = [record for record in self.iter_records(collection) if sort_value(record, field) is not None]
+        ordered.sort(key=lambda record: sort_value(record, field), reverse=descending)
+        return ordered[start:stop], len(ordered)
+
+    def upsert(self, collection: str, record: dict[str, Any]) -> None:
+        """
+        Inserts a record, or replaces the stored record with the same primary key.
+        A replaced record that changed gets the next _version.
+
+        Parameters:
+            collection (str): the collection name
+            record (dict[str, Any]): the record to write
+
+        Returns: None
+        """
+        self.save(collection, _upserted(collection, self.load(collection), record))
+
+    def delete(self, collection: str, key: Any) -> bool:
+        """
+        Deletes a single record by its primary key.
+
+        Parameters:
+            collection (str): the collection name
+            key (Any): the primary key value of the record
+
+        Returns:
+            bool: true if a record was deleted, false if it did not exist
+        """
+        items = self.load(collection)
+        remaining = _without(collection, items, key)
+        if len(remaining) == len(items):
+            return False
+        self.save(collection, remaining)
+        return True
+
+    def compare_and_swap(self, collection: str, record: dict[str, Any], expected: int) -> dict[str, Any] | None:
+        """
+        Writes a record only if the stored record with the same primary key still has the expected version.
+        Engines make the check and the write atomic; this fallback is only safe for a single writer.
+
+        Parameters:
+            collection (str): the collection name
+            record (dict[str, Any]): the record to write
+            expected (int): the version the record had when it was read, 0 if it did not exist
+
+        Returns:
+            dict[str, Any] | None: the written record with its new version, or None if the stored version differs
+        """
+        current = self.get(collection, _record_key(collection, record))
+        if record_version(current) != expected:
+            return None
+        written = _versioned(record, current)
+        self.upsert(collection, written)
+        return written
+
+    def update(self, collection: str, key: Any, change: Callable[[dict[str, Any]], dict[str, Any]],
+               retries: int = UPDATE_RETRIES) -> dict[str, Any] | None:
+        """
+        Applies a change to a single record without a lock held across the read and the write.
+        The record is read, passed to change, and written back with compare_and_swap. If another writer changed the
+        record in between, the change is applied again to the new record, up to retries times.
+
+        Parameters:
+            collection (str): the collection name
+            key (Any): the primary key value of the record
+            change (Callable[[dict[str, Any]], dict[str, Any]]): returns the updated record. may modify the record it
+                is passed, and may be called more than once. an exception raised by change aborts the update
+            retries (int): the number of attempts before giving up
+
+        Returns:
+            dict[str, Any] | None: the written record, or None if the record does not exist
+
+        Raises:
+            StorageConflictError: if the record kept changing for every attempt
+        """
+        for attempt in range(retries):
+            if attempt:
+                # a random pause keeps writers that keep colliding from retrying in lockstep
+                time.sleep(random.uniform(0, UPDATE_BACKOFF_SECONDS * attempt))
+            current = self.get(collection, key)
+            if current is None:
+                return None
+            expected = record_version(current)
+            written = self.compare_and_swap(collection, change(current), expected)
+            if written is not None:
+                return written
+        raise StorageConflictError(collection, key)
+
+    def commit(self, changes: dict[str, CollectionChanges]) -> None:
+        """
+        Applies the writes of a unit of work with one save per collection.
+        Every expected version is checked before anything is written. Engines hold all the touched collections'
+        locks for the whole commit and undo partial writes; this fallback is only safe for a single writer.
+
+        Parameters:
+            changes (dict[str, CollectionChanges]): the changes to apply, by collection name
+
+        Returns: None
+
+        Raises:
+            StorageConflictError: if a conditionally written record changed since it was read
+        """
+        for collection, change in changes.items():
+            for key, version in change.expected.items():
+                if record_version(self.get(collection, key)) != version:
+                    raise StorageConflictError(collection, key)
+        for collection, change in changes.items():
+            items = change.items
+            if items is None:
+                items = _applied(collection, self.load(collection), change.records)
+            self.save(collection, items)
+
+    def partitions(self, collection: str) -> list[str]:
+        """
+        Lists the archive partitions of a collection that hold data (see archive_partition).
+
+        Parameters:
+            collection (str): an archived collection, e.g. "orders"
+
+        Returns:
+            list[str]: the partitions' collection names, oldest first
+        """
+        return []
+
+    def _upgraded(self, collection: str, records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Upgrades records just read from storage in place, noting their collection as stale if any was behind."""
+        if self.migrate and upgrade_records(collection, records):
+            self._stale.add(collection)
+        return records
+
+    def _stamped(self, collection: str, records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Upgrades records about to be written in place, so they are stored at the current schema version."""
+        if self.migrate:
+            upgrade_records(collection, records)
+        return records
+
+    def stale_collections(self) -> list[str]:
+        """
+        Lists the collections that were read with records at an older schema version and not rewritten since.
+
+        Parameters: None
+
+        Returns:
+            list[str]: the collection names
+        """
+        return sorted(self._stale) if self.migrate else []
+
+    def upgrade(self, collection: str) -> None:
+        """
+        Rewrites a collection with every record at its current schema version (see migrations.py).
+        Record versions are not changed, since upgrading does not change what a record means.
+
+        Parameters:
+            collection (str): the collection name, e.g. "users"
+
+        Returns: None
+        """
+        self.save(collection, self.load(collection))
+        if self.migrate:
+            self._stale.discard(collection)
+
+    def rebuild(self, collection: str) -> None:
+        """
+        Rebuilds everything derived from a collection's stored records - indexes, cached copies, snapshots -
+        from the records themselves (see fsck.py). Engines that keep nothing derived have nothing to do.
+
+        Parameters:
+            collection (str): the collection name, e.g. "orders"
+
+        Returns: None
+        """
+        return None
+
+    def next_id(self, collection: str) -> int:
+        """
+        Allocates a new integer primary key for a collection. Allocated ids are never handed out twice.
+
+        Parameters:
+            collection (str): the collection name
+
+        Returns:
+            int: the new id
+        """
+        # archived records keep their ids, so the partitions count as much as the collection itself
+        return max(_max_id(collection, self.load(name)) for name in [collection, *self.partitions(collection)]) + 1
+
+    def flush(self) -> None:
+        """Writes out any changes the engine is still holding in memory. Engines that write straight away have none."""
+        return None
+
+    def close(self) -> None:
+        """Releases any resources held by the engine."""
+        return None
+
+
+class JsonStorageEngine(StorageEngine):
+    """
+    Stores each collection as a JSON array in <data_dir>/<collection>.json.
+    Writes go to a temporary file first and are moved into place, so a failed write never corrupts the collection.
+    Collections listed in jsonl are stored as one record per line in <data_dir>/<collection>.jsonl instead:
+    adding records appends their lines to the file, and iter_records streams the file without parsing all of it.
+    Any other change still rewrites the file.
+    With snapshots on, each file also gets a binary snapshot (see binary_snapshots.py) that is read instead of
+    parsing the file on a cache miss. Snapshots are written after a parse, at most once per snapshot_interval for
+    each collection as it is saved, and on flush.
+    Parsed files are kept in a DocumentCache, so a file is only parsed again after it changes on disk.
+    Collections listed in journaled are kept as a snapshot plus an append-only journal instead (see journal.py).
+    With migrate on, files are upgraded as they are parsed, so the cache and snapshots hold upgraded records.
+
+    Writes hold <data_dir>/<collection>.lock, so several worker processes can share the same data_dir.
+
+    Each collection also has a CollectionIndex, built on first lookup and tagged with the file stamp it was built from.
+    Saves made through the engine update the index in place; a change made by anything else shows up as a new stamp
+    and the index is rebuilt. Journaled collections keep their index inside the Journal.
+
+    Attributes:
+        data_dir (Path): the directory holding the json files
+        cache (DocumentCache): the parsed-file cache
+        journals (dict[str, Journal]): the journal of each journaled collection
+        jsonl (set[str]): the collections stored as JSON Lines
+        snapshots (bool): whether files are loaded from and saved to binary snapshots
+        snapshot_interval (float): the least time in seconds between two snapshots of a collection being saved
+        sequences (SequenceFile): the id counters, kept in <data_dir>/sequences.json
+    """
+    name = "json"
+
+    def __init__(self, data_dir: Path = DATA_DIR, journaled: list[str] = (), compact_bytes: int = DEFAULT_COMPACT_BYTES,
+                 cache: DocumentCache = document_cache, jsonl: list[str] = (), snapshots: bool = False,
+                 snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL, migrate: bool = False):
+        self.data_dir = Path(data_dir)
+        self.cache = cache
+        self.migrate = migrate
+        self._stale: set[str] = set()
+        self.snapshots = snapshots
+        self.snapshot_interval = snapshot_interval
+        # journals keep their snapshot in the array format
+        self.jsonl = set(jsonl) - set(journaled)
+        self.journals = {
+            collection: Journal(
+                self.path_for(collection), COLLECTION_KEYS.get(collection, "id"), compact_bytes,
+                INDEXED_FIELDS.get(collection, ()), snapshots,
+                lambda records, collection=collection: self._upgraded(collection, records), self._schema_tag(collection),
+                TEXT_INDEXED_FIELDS.get(collection, ()), SORTED_FIELDS.get(collection, ())
+            )
+            for collection in journaled
+        }
+        self._indexes: dict[str, CollectionIndex] = {}
+        self._index_lock = threading.RLock()
+        # collection -> (monotonic time of its last snapshot, (path, stamp, frozen) saved since then or None)
+        self._snapshot_state: dict[str, tuple[float, tuple[Path, Any, bytes] | None]] = {}
+        self.sequences = SequenceFile(self.path_for(SEQUENCES_NAME))
+
+    @classmethod
+    def from_config(cls, config: dict) -> "JsonStorageEngine":
+        return cls(
+            journaled=config.get("JOURNALED_COLLECTIONS", []),
+            compact_bytes=config.get("JOURNAL_COMPACT_BYTES", DEFAULT_COMPACT_BYTES),
+            jsonl=config.get("JSONL_COLLECTIONS", []),
+            snapshots=config.get("BINARY_SNAPSHOTS", True),
+            snapshot_interval=config.get("SNAPSHOT_INTERVAL_SECONDS", DEFAULT_SNAPSHOT_INTERVAL),
+            migrate=True
+        )
+
+    def path_for(self, collection: str) -> Path:
+        """Returns the json (or jsonl) file path of a collection."""
+        if collection in self.jsonl:
+            return self.data_dir / f"{collection}.jsonl"
+        return self.data_dir / f"{collection}.json"
+
+    def _schema_tag(self, collection: str) -> int:
+        """Returns the tag of a collection's binary snapshot: the schema version its records are upgraded to."""
+        return schema_version(collection) if self.migrate else 0
+
+    def _cached(self, collection: str) -> tuple[Any, bytes]:
+        """Returns the cached snapshot of a non-journaled collection's file, parsed in the collection's format."""
+        read = read_jsonl_file if collection in self.jsonl else read_json_file
+        parser = lambda path: self._upgraded(collection, read(path))
+        if not self.snapshots:
+            return self.cache.snapshot(self.path_for(collection), parser)
+        tag = self._schema_tag(collection)
+        return self.cache.snapshot(
+            self.path_for(collection), parser, lambda path, stamp: load_frozen(path, stamp, parser, tag)
+        )
+
+    def lock_for(self, collection: str) -> FileLock:
+        """Returns the lock held while writing a collection, shared with other processes using the same data_dir."""
+        return file_lock(self.data_dir / f"{collection}{LOCK_SUFFIX}")
+
+    def load(self, collection: str) -> list[dict[str, Any]]:
+        if collection in self.journals:
+            version, frozen = self.journals[collection].snapshot()
+        else:
+            version, frozen = self._cached(collection)
+        self._remember_read(collection, version, frozen)
+        return marshal.loads(frozen)
+
+    def iter_records(self, collection: str) -> Iterator[dict[str, Any]]:
+        if collection not in self.jsonl:
+            yield from self.load(collection)
+            return
+        for record in iter_jsonl_file(self.path_for(collection)):
+            yield self._upgraded(collection, [record])[0]
+
+    def _index(self, collection: str) -> CollectionIndex:
+        """Returns the up to date index of a non-journaled collection. Must be called holding _index_lock."""
+        path = self.path_for(collection)
+        stamp = file_stamp(path)
+        index = self._indexes.get(collection)
+        if index is None or index.version != stamp:
+            index = CollectionIndex(
+                COLLECTION_KEYS.get(collection, "id"), INDEXED_FIELDS.get(collection, ()),
+                marshal.loads(self._cached(collection)[1]), stamp, TEXT_INDEXED_FIELDS.get(collection, ()),
+                SORTED_FIELDS.get(collection, ())
+            )
+            self._indexes[collection] = index
+        return index
+
+    def _write(self, collection: str, items: list[dict[str, Any]], append: bool = True) -> tuple[Any, bytes]:
+        """
+        Writes a non-journaled collection and updates its cache entry and index.
+        A JSON Lines file whose records are unchanged at the start of items only has the new records appended,
+        unless append is False. Must be called holding the collection's lock.
+
+        Returns:
+            tuple[Any, bytes]: the new file stamp, and the written records frozen with freeze()
+        """
+        path = self.path_for(collection)
+        with self._index_lock:
+            before = file_stamp(path)
+            if collection not in self.jsonl:
+                stamp = write_json_file(path, items)
+            else:
+                version, frozen = self._cached(collection)
+                stored = marshal.loads(frozen)
+                if append and version == before and items[:len(stored)] == stored:
+                    stamp = append_jsonl_file(path, items[len(stored):])
+                else:
+                    stamp = write_jsonl_file(path, items)
+            frozen = self.cache.store(path, items, stamp)
+            index = self._indexes.get(collection)
+            if index is not None and index.version == before:
+                index.sync(items, clone)
+                index.version = stamp
+            else:
+                self._indexes.pop(collection, None)
+            if self.snapshots:
+                self._snapshot_saved(collection, (path, stamp, frozen))
+        return stamp, frozen
+
+    def _snapshot_saved(self, collection: str, saved: tuple[Path, Any, bytes]) -> None:
+        """
+        Writes the snapshot of a collection that was just saved, unless its last snapshot is too recent,
+        in which case it is kept for the next save or flush. Must be called holding _index_lock.
+        """
+        last, _ = self._snapshot_state.get(collection, (None, None))
+        now = time.monotonic()
+        if last is None or now - last >= self.snapshot_interval:
+            write_snapshot(*saved, self._schema_tag(collection))
+            self._snapshot_state[collection] = (now, None)
+        else:
+            self._snapshot_state[collection] = (last, saved)
+
+    def flush(self) -> None:
+        """Writes the snapshot of every collection saved since its last snapshot, if it has not changed again since."""
+        with self._index_lock:
+            for collection, (_, saved) in list(self._snapshot_state.items()):
+                if saved is not None:
+                    path, stamp, frozen = saved
+                    if file_stamp(path) == stamp:
+                        write_snapshot(path, stamp, frozen, self._schema_tag(collection))
+                    self._snapshot_state[collection] = (time.monotonic(), None)
+
+    def close(self) -> None:
+        self.flush()
+
+    def upgrade(self, collection: str) -> None:
+        # a plain save would leave the file as is: journals only append changed records, and neither do JSON Lines
+        with self.lock_for(collection):
+            if collection in self.journals:
+                self.journals[collection].rewrite()
+            else:
+                with self._index_lock:
+                    self._write(collection, marshal.loads(self._cached(collection)[1]), append=False)
+        self._stale.discard(collection)
+
+    def rebuild(self, collection: str) -> None:
+        with self.lock_for(collection):
+            if collection in self.journals:
+                self.journals[collection].rebuild()
+                return
+            path = self.path_for(collection)
+            with self._index_lock:
+                snapshot_path(path).unlink(missing_ok=True)
+                self._snapshot_state.pop(collection, None)
+                self.cache.invalidate(path)
+                self._indexes.pop(collection, None)
+                # parses the file again, writing a new binary snapshot if they are on
+                self._index(collection)
+
+    def save(self, collection: str, items: list[dict[str, Any]]) -> None:
+        with self.lock_for(collection):
+            if collection in self.journals:
+                journal = self.journals[collection]
+                version, frozen = journal.snapshot()
+                current = marshal.loads(frozen)
+                items = self._merge_with_current(collection, items, version, lambda: current)
+                stored = {_record_key(collection, record): record for record in current}
+                journal.save(_versioned_all(collection, self._stamped(collection, items), stored.get))
+                self._remember_read(collection, *journal.snapshot())
+            else:
+                path = self.path_for(collection)
+                stamp = file_stamp(path)
+                items = self._merge_with_current(
+                    collection, items, stamp, lambda: marshal.loads(self._cached(collection)[1])
+                )
+                with self._index_lock:
+                    self._stamped(collection, items)
+                    if stamp is not None:
+                        items = _versioned_all(collection, items, self._index(collection).get)
+                    written = self._write(collection, items)
+                self._remember_read(collection, *written)
+
+    def _snapshot(self, collection: str) -> tuple[Any, bytes]:
+        """Returns the stored version and frozen records of a collection, without recording a read."""
+        if collection in self.journals:
+            return self.journals[collection].snapshot()
+        return self._cached(collection)
+
+    def _replace(self, collection: str, items: list[dict[str, Any]]) -> None:
+        """Writes a collection as passed. Must be called holding the collection's lock."""
+        if collection in self.journals:
+            self.journals[collection].save(items)
+        else:
+            self._write(collection, items)
+
+    def commit(self, changes: dict[str, CollectionChanges]) -> None:
+        collections = sorted(changes)
+        with ExitStack() as locks:
+            # locks are always taken in name order, so two commits never wait on each other
+            for collection in collections:
+                locks.enter_context(self.lock_for(collection))
+            for collection in collections:
+                for key, version in changes[collection].expected.items():
+                    if record_version(self.get(collection, key)) != version:
+                        raise StorageConflictError(collection, key)
+
+            planned = {}
+            for collection in collections:
+                change = changes[collection]
+                version, frozen = self._snapshot(collection)
+                current = marshal.loads(frozen)
+                if change.items is not None:
+                    items = self._merge_with_current(collection, change.items, version, lambda: current)
+                else:
+                    items = _applied(collection, current, change.records)
+                stored = {_record_key(collection, record): record for record in current}
+                planned[collection] = (
+                    version, frozen, _versioned_all(collection, self._stamped(collection, items), stored.get)
+                )
+
+            written = []
+            try:
+                for collection in collections:
+                    self._replace(collection, planned[collection][2])
+                    written.append(collection)
+            except BaseException:
+                for collection in written:
+                    self._replace(collection, marshal.loads(planned[collection][1]))
+                raise
+
+            for collection in collections:
+                change = changes[collection]
+                if change.items is not None:
+                    self._remember_read(collection, *self._snapshot(collection))
+                else:
+                    self._remember_write(
+                        collection, planned[collection][0], lambda collection=collection: self._snapshot(collection),
+                        lambda items, records=change.records, collection=collection: _applied(collection, items, records)
+                    )
+
+    def get(self, collection: str, key: Any) -> dict[str, Any] | None:
+        if collection in self.journals:
+            return self.journals[collection].get(key)
+        with self._index_lock:
+            record = self._index(collection).get(key)
+            return clone(record) if record is not None else None
+
+    def find_by(self, collection: str, field: str, value: Any) -> list[dict[str, Any]]:
+        if field not in INDEXED_FIELDS.get(collection, ()):
+            return super().find_by(collection, field, value)
+        if collection in self.journals:
+            return self.journals[collection].find(field, value)
+        with self._index_lock:
+            return clone(self._index(collection).find(field, value))
+
+    def search(self, collection: str, field: str, text: str) -> list[dict[str, Any]]:
+        if field not in TEXT_INDEXED_FIELDS.get(collection, ()):
+            return super().search(collection, field, text)
+        if collection in self.journals:
+            return self.journals[collection].search(field, text)
+        with self._index_lock:
+            return clone(self._index(collection).search(field, text))
+
+    def sorted_by(self, collection: str, field: str, descending: bool = False, start: int = 0,
+                  stop: int | None = None) -> tuple[list[dict[str, Any]], int]:
+        if field not in SORTED_FIELDS.get(collection, ()):
+            return super().sorted_by(collection, field, descending, start, stop)
+        if collection in self.journals:
+            return self.journals[collection].ordered(field, descending, start, stop)
+        with self._index_lock:
+            index = self._index(collection)
+            return clone(index.ordered(field, descending, start, stop)), index.count(field)
+
+    def partitions(self, collection: str) -> list[str]:
+        files = self.data_dir.glob(f"{collection}_archive_*.json*")
+        return _partitions_in((path.name.split(".")[0] for path in files), collection)
+
+    def next_id(self, collection: str) -> int:
+        # archived records keep their ids, so the partitions count as much as the collection itself
+        names = [collection, *self.partitions(collection)]
+        highest = lambda: max(_max_id(collection, self.load(name)) for name in names)
+        new_id = self.sequences.next(collection, highest)
+        if any(self.get(name, new_id) is not None for name in names):
+            # records were written past the counter (e.g. a restored file), so continue after the highest id
+            new_id = self.sequences.next(collection, highest, reseed=True)
+        return new_id
+
+    def upsert(self, collection: str, record: dict[str, Any]) -> None:
+        with self.lock_for(collection):
+            self._put(collection, record, self.get(collection, _record_key(collection, record)))
+
+    def _put(self, collection: str, record: dict[str, Any], stored: dict[str, Any] | None) -> dict[str, Any]:
+        """
+        Writes a single record over the stored one. Must be called holding the collection's lock.
+
+        Returns:
+            dict[str, Any]: the record as written, with its new version
+        """
+        record = _versioned(self._stamped(collection, [record])[0], stored)
+        if collection in self.journals:
+            journal = self.journals[collection]
+            before = journal.version()
+            journal.upsert(record)
+            after = journal.snapshot
+        elif collection in self.jsonl and stored is None:
+            before, after = self._append(collection, record), lambda: self._snapshot(collection)
+        else:
+            path = self.path_for(collection)
+            before = file_stamp(path)
+            written = self._write(collection, _upserted(collection, marshal.loads(self._cached(collection)[1]), record))
+            after = lambda: written
+        self._remember_write(collection, before, after, lambda items: _upserted(collection, items, record))
+        return record
+
+    def _append(self, collection: str, record: dict[str, Any]) -> Any:
+        """
+        Appends a new record to a JSON Lines collection as a single line, without reading the file.
+        The cached contents are dropped rather than rebuilt, and the index is updated in place.
+        Must be called holding the collection's lock.
+
+        Returns:
+            Any: the file stamp just before the append
+        """
+        path = self.path_for(collection)
+        with self._index_lock:
+            before = file_stamp(path)
+            stamp = append_jsonl_file(path, [record])
+            self.cache.invalidate(path)
+            index = self._indexes.get(collection)
+            if index is not None and index.version == before:
+                index.put(clone(record))
+                index.version = stamp
+            else:
+                self._indexes.pop(collection, None)
+        return before
+
+    def compare_and_swap(self, collection: str, record: dict[str, Any], expected: int) -> dict[str, Any] | None:
+        with self.lock_for(collection):
+            current = self.get(collection, _record_key(collection, record))
+            if record_version(current) != expected:
+                return None
+            return self._put(collection, record, current)
+
+    def delete(self, collection: str, key: Any) -> bool:
+        with self.lock_for(collection):
+            if collection in self.journals:
+                journal = self.journals[collection]
+                before = journal.version()
+                if not journal.delete(key):
+                    return False
+                after = journal.snapshot
+            else:
+                path = self.path_for(collection)
+                before = file_stamp(path)
+                items = marshal.loads(self._cached(collection)[1])
+                remaining = _without(collection, items, key)
+                if len(remaining) == len(items):
+                    return False
+                written = self._write(collection, remaining)
+                after = lambda: written
+            self._remember_write(collection, before, after, lambda items: _without(collection, items, key))
+            return True
+
+
+class SqliteStorageEngine(StorageEngine):
+    """
+    Stores each collection as a table of (pk, pos, data) rows in a single SQLite database.
+    Single-record writes only touch their own row, and whole-collection saves only rewrite the rows that changed.
+    The database runs in WAL mode so readers never block the writer.
+    A collection's table is seeded from its json file the first time it is used.
+
+    Attributes:
+        db_path (Path): the SQLite database file
+        json_dir (Path): the directory holding the json files used to seed new tables
+    """
+    name = "sqlite"
+
+    def __init__(self, db_path: Path | None = None, json_dir: Path = DATA_DIR, migrate: bool = False):
+        self.json_dir = Path(json_dir)
+        self.migrate = migrate
+        self._stale: set[str] = set()
+        self.db_path = Path(db_path) if db_path else self.json_dir / SQLITE_DB_NAME
+        self._local = threading.local()
+        self._ready: set[str] = set()
+        self._ready_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SqliteStorageEngine":
+        return cls(migrate=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _table(self, collection: str) -> str:
+        """Returns the quoted table name for a collection, creating and seeding the table on first use."""
+        if collection not in COLLECTION_KEYS and not ARCHIVE_PARTITION.match(collection):
+            raise ValueError(f"Unknown collection '{collection}'")
+        table = f'"{collection}"'
+        if collection in self._ready:
+            return table
+        with self._ready_lock:
+            if collection not in self._ready:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    exists = conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (collection,)
+                    ).fetchone()
+                    if not exists:
+                        conn.execute(f"CREATE TABLE {table} (pk TEXT PRIMARY KEY, pos INTEGER NOT NULL, data TEXT NOT NULL)")
+                        conn.execute(f"CREATE INDEX {collection}_pos ON {table} (pos)")
+                        jsonl_path = self.json_dir / f"{collection}.jsonl"
+                        if jsonl_path.exists():
+                            seed = read_jsonl_file(jsonl_path)
+                        else:
+                            seed = read_json_file(self.json_dir / f"{collection}.json")
+                        conn.executemany(
+                            f"INSERT OR REPLACE INTO {table} (pk, pos, data) VALUES (?, ?, ?)",
+                            # imported at the current schema version, so indexed fields added since are queryable
+                            self._rows(collection, self._stamped(collection, seed))
+                        )
+                    elif self.migrate and schema_version(collection):
+                        # rows left at an older version by a previous run are upgraded before the table is used,
+                        # since queries on fields added since, e.g. the users' email_key, would not find them
+                        stale = conn.execute(
+                            f"SELECT pk, data FROM {table} "
+                            f"WHERE coalesce(json_extract(data, '$.{SCHEMA_FIELD}'), 0) < ?",
+                            (schema_version(collection),)
+                        ).fetchall()
+                        upgraded = [(json.loads(data), pk) for pk, data in stale]
+                        upgrade_records(collection, [record for record, _ in upgraded])
+                        conn.executemany(
+                            f"UPDATE {table} SET data = ? WHERE pk = ?",
+                            [(json.dumps(record, ensure_ascii=False), pk) for record, pk in upgraded]
+                        )
+                    for field in INDEXED_FIELDS.get(collection, ()) + SORTED_FIELDS.get(collection, ()):
+                        if field not in MULTI_VALUED_FIELDS.get(collection, ()):
+                            conn.execute(
+                                f"CREATE INDEX IF NOT EXISTS {collection}_{field} "
+                                f"ON {table} (json_extract(data, '$.{field}'))"
+                            )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                self._ready.add(collection)
+        return table
+
+    @staticmethod
+    def _pk(collection: str, record: dict[str, Any], pos: int) -> str:
+        """Encodes a record's primary key as text so int and str keys share one column."""
+        key = _record_key(collection, record)
+        return json.dumps(key) if key is not None else f"#{pos}"
+
+    def _rows(self, collection: str, items: list[dict[str, Any]]) -> list[tuple[str, int, str]]:
+        return [
+            (self._pk(collection, record, pos), pos, json.dumps(record, ensure_ascii=False))
+            for pos, record in enumerate(items)
+        ]
+
+    def _decode(self, collection: str, data: str) -> dict[str, Any]:
+        """Parses a row's data, upgrading the record to the current schema version."""
+        return self._upgraded(collection, [json.loads(data)])[0]
+
+    @staticmethod
+    def _digest(rows: list[tuple[str, int, str]]) -> str:
+        """Returns a digest of a table's rows, used as the collection version for conflict detection."""
+        digest = hashlib.blake2b(digest_size=16)
+        for pk, pos, data in rows:
+            digest.update(f"{pk}\0{pos}\0{data}\0".encode())
+        return digest.hexdigest()
+
+    def _all_rows(self, table: str) -> list[tuple[str, int, str]]:
+        """Returns every row of a table in position order."""
+        return self._connect().execute(f"SELECT pk, pos, data FROM {table} ORDER BY pos").fetchall()
+
+    def load(self, collection: str) -> list[dict[str, Any]]:
+        table = self._table(collection)
+        if _reads.get() is None:
+            rows = self._connect().execute(f"SELECT data FROM {table} ORDER BY pos").fetchall()
+            return [self._decode(collection, data) for (data,) in rows]
+        rows = self._all_rows(table)
+        items = [self._decode(collection, data) for _, _, data in rows]
+        self._remember_read(collection, self._digest(rows), freeze(items))
+        return items
+
+    def iter_records(self, collection: str) -> Iterator[dict[str, Any]]:
+        for (data,) in self._connect().execute(f"SELECT data FROM {self._table(collection)} ORDER BY pos"):
+            yield self._decode(collection, data)
+
+    def save(self, collection: str, items: list[dict[str, Any]]) -> None:
+        table = self._table(collection)
+        conn = self._connect()
+        tracking = _reads.get() is not None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._all_rows(table)
+            if tracking:
+                items = self._merge_with_current(
+                    collection, items, self._digest(rows),
+                    lambda: [self._decode(collection, data) for _, _, data in rows]
+                )
+            new_rows, items = self._replace_rows(table, collection, rows, items)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if tracking:
+            self._remember_read(collection, self._digest(new_rows), freeze(items))
+
+    def _replace_rows(self, table: str, collection: str, rows: list[tuple[str, int, str]],
+                      items: list[dict[str, Any]]) -> tuple[list[tuple[str, int, str]], list[dict[str, Any]]]:
+        """
+        Rewrites the rows of a table that differ from the passed records. Must be called inside a write transaction.
+
+        Returns:
+            tuple[list, list[dict[str, Any]]]: the new rows, and the records as written with their versions
+        """
+        current = {pk: (pos, data) for pk, pos, data in rows}
+
+        def stored(key: Any) -> dict[str, Any] | None:
+            row = current.get(json.dumps(key))
+            return self._decode(collection, row[1]) if row else None
+
+        items = _versioned_all(collection, self._stamped(collection, items), stored)
+        new_rows = self._rows(collection, items)
+        changed = [row for row in new_rows if current.get(row[0]) != (row[1], row[2])]
+        removed = current.keys() - {row[0] for row in new_rows}
+        conn = self._connect()
+        conn.executemany(f"DELETE FROM {table} WHERE pk = ?", [(pk,) for pk in removed])
+        conn.executemany(f"INSERT OR REPLACE INTO {table} (pk, pos, data) VALUES (?, ?, ?)", changed)
+        return new_rows, items
+
+    def commit(self, changes: dict[str, CollectionChanges]) -> None:
+        tables = {collection: self._table(collection) for collection in sorted(changes)}
+        tracking = _reads.get() is not None
+        conn = self._connect()
+        results = {}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for collection, table in tables.items():
+                for key, version in changes[collection].expected.items():
+                    row = conn.execute(f"SELECT data FROM {table} WHERE pk = ?", (json.dumps(key),)).fetchone()
+                    if record_version(json.loads(row[0]) if row else None) != version:
+                        raise StorageConflictError(collection, key)
+            for collection, table in tables.items():
+                change = changes[collection]
+                rows = self._all_rows(table)
+                current = lambda rows=rows, collection=collection: [
+                    self._decode(collection, data) for _, _, data in rows
+                ]
+                if change.items is None:
+                    items = _applied(collection, current(), change.records)
+                elif tracking:
+                    items = self._merge_with_current(collection, change.items, self._digest(rows), current)
+                else:
+                    items = change.items
+                before = self._digest(rows) if tracking else None
+                results[collection] = (before, *self._replace_rows(table, collection, rows, items))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if tracking:
+            for collection, (before, new_rows, items) in results.items():
+                after = (self._digest(new_rows), freeze(items))
+                records = changes[collection].records
+                if changes[collection].items is not None:
+                    self._remember_read(collection, *after)
+                else:
+                    self._remember_write(
+                        collection, before, lambda after=after: after,
+                        lambda stored, records=records, collection=collection: _applied(collection, stored, records)
+                    )
+
+    def _current(self, collection: str, table: str) -> tuple[str, bytes]:
+        """Returns the version and frozen records of a table, for _remember_write."""
+        rows = self._all_rows(table)
+        return self._digest(rows), freeze([self._decode(collection, data) for _, _, data in rows])
+
+    def get(self, collection: str, key: Any) -> dict[str, Any] | None:
+        table = self._table(collection)
+        row = self._connect().execute(f"SELECT data FROM {table} WHERE pk = ?", (json.dumps(key),)).fetchone()
+        return self._decode(collection, row[0]) if row else None
+
+    def find_by(self, collection: str, field: str, value: Any) -> list[dict[str, Any]]:
+        table = self._table(collection)
+        if not field.isidentifier():
+            raise ValueError(f"Invalid field name '{field}'")
+        if field in MULTI_VALUED_FIELDS.get(collection, ()):
+            where = f"EXISTS (SELECT 1 FROM json_each(data, '$.{field}') WHERE json_each.value = ?)"
+        else:
+            # the path is inlined so the query matches the expression index created in _table
+            where = f"json_extract(data, '$.{field}') = ?"
+        rows = self._connect().execute(
+            f"SELECT data FROM {table} WHERE {where} ORDER BY pos", (index_value(value),)
+        ).fetchall()
+        return [self._decode(collection, data) for (data,) in rows]
+
+    def sorted_by(self, collection: str, field: str, descending: bool = False, start: int = 0,
+                  stop: int | None = None) -> tuple[list[dict[str, Any]], int]:
+        table = self._table(collection)
+        if not field.isidentifier():
+            raise ValueError(f"Invalid field name '{field}'")
+        # the path is inlined so the ordering uses the expression index created in _table
+        where = f"json_type(data, '$.{field}') IN ('integer', 'real')"
+        limit = -1 if stop is None else max(stop - start, 0)
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT data FROM {table} WHERE {where} "
+            f"ORDER BY json_extract(data, '$.{field}') {'DESC' if descending else 'ASC'}, pos LIMIT ? OFFSET ?",
+            (limit, start)
+        ).fetchall()
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()
+        return [self._decode(collection, data) for (data,) in rows], count
+
+    def upsert(self, collection: str, record: dict[str, Any]) -> None:
+        self._put(collection, record)
+
+    def compare_and_swap(self, collection: str, record: dict[str, Any], expected: int) -> dict[str, Any] | None:
+        return self._put(collection, record, expected)
+
+    def _put(self, collection: str, record: dict[str, Any], expected: int | None = None) -> dict[str, Any] | None:
+        """
+        Writes a single record in one transaction, optionally only if the stored version matches expected.
+
+        Returns:
+            dict[str, Any] | None: the record as written, or None if expected was given and did not match
+        """
+        table = self._table(collection)
+        conn = self._connect()
+        pk = json.dumps(_record_key(collection, record))
+        tracked = (self, collection) in (_reads.get() or {})
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self._digest(self._all_rows(table)) if tracked else None
+            row = conn.execute(f"SELECT data FROM {table} WHERE pk = ?", (pk,)).fetchone()
+            stored = self._decode(collection, row[0]) if row else None
+            if expected is not None and record_version(stored) != expected:
+                conn.execute("ROLLBACK")
+                return None
+            record = _versioned(self._stamped(collection, [record])[0], stored)
+            data = json.dumps(record, ensure_ascii=False)
+            if row:
+                conn.execute(f"UPDATE {table} SET data = ? WHERE pk = ?", (data, pk))
+            else:
+                next_pos = conn.execute(f"SELECT COALESCE(MAX(pos), -1) + 1 FROM {table}").fetchone()[0]
+                conn.execute(f"INSERT INTO {table} (pk, pos, data) VALUES (?, ?, ?)", (pk, next_pos, data))
+            after = self._current(collection, table) if tracked else None
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if tracked:
+            self._remember_write(collection, before, lambda: after, lambda items: _upserted(collection, items, record))
+        return record
+
+    def delete(self, collection: str, key: Any) -> bool:
+        table = self._table(collection)
+        conn = self._connect()
+        if (self, collection) not in (_reads.get() or {}):
+            cursor = conn.execute(f"DELETE FROM {table} WHERE pk = ?", (json.dumps(key),))
+            return cursor.rowcount > 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self._digest(self._all_rows(table))
+            cursor = conn.execute(f"DELETE FROM {table} WHERE pk = ?", (json.dumps(key),))
+            after = self._current(collection, table)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._remember_write(collection, before, lambda: after, lambda items: _without(collection, items, key))
+        return cursor.rowcount > 0
+
+    def partitions(self, collection: str) -> list[str]:
+        tables = self._connect().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (f"{collection}_archive_%",)
+        ).fetchall()
+        # partitions still only in json files are seeded into tables on first use
+        files = self.json_dir.glob(f"{collection}_archive_*.json*")
+        return _partitions_in([name for (name,) in tables] + [path.name.split(".")[0] for path in files], collection)
+
+    def next_id(self, collection: str) -> int:
+        # archived records keep their ids, so the partitions count as much as the collection itself
+        tables = [self._table(name) for name in [collection, *self.partitions(collection)]]
+        key_path = f"$.{COLLECTION_KEYS[collection]}"
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "_{SEQUENCES_NAME}" (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            row = conn.execute(f'SELECT value FROM "_{SEQUENCES_NAME}" WHERE name = ?', (collection,)).fetchone()
+            new_id = (row[0] if row else 0) + 1
+            if row is None or any(
+                conn.execute(f"SELECT 1 FROM {table} WHERE pk = ?", (json.dumps(new_id),)).fetchone()
+                for table in tables
+            ):
+                highest = max(
+                    conn.execute(
+                        f"SELECT MAX(json_extract(data, ?)) FROM {table} WHERE json_type(data, ?) = 'integer'",
+                        (key_path, key_path)
+                    ).fetchone()[0] or 0
+                    for table in tables
+                )
+                new_id = max(new_id, highest + 1)
+            conn.execute(
+                f'INSERT OR REPLACE INTO "_{SEQUENCES_NAME}" (name, value) VALUES (?, ?)', (collection, new_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return new_id
+
+    def rebuild(self, collection: str) -> None:
+        self._connect().execute(f"REINDEX {self._table(collection)}")
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+ENGINES = {
+    JsonStorageEngine.name: JsonStorageEngine,
+    SqliteStorageEngine.name: SqliteStorageEngine,
+}
+
+_engine: StorageEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> StorageEngine:
+    """
+    Returns the active storage engine, creating it from the STORAGE_ENGINE config value on first use.
+    With WRITE_BEHIND_MS above 0, the engine is wrapped in a WriteBehindEngine (see write_behind.py).
+    Inside unit_of_work.transaction(), returns the open unit of work instead.
+
+    Parameters: None
+
+    Returns:
+        StorageEngine: the active engine
+
+    Raises:
+        ValueError: if STORAGE_ENGINE names an unknown engine
+    """
+    global _engine
+    unit = current_unit.get()
+    if unit is not None:
+        return unit
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                config = load_config()
+                name = config.get("STORAGE_ENGINE", "json")
+                if name not in ENGINES:
+                    raise ValueError(f"Unknown STORAGE_ENGINE '{name}', expected one of {sorted(ENGINES)}")
+                engine = ENGINES[name].from_config(config)
+                if config.get("WRITE_BEHIND_MS", 0) > 0:
+                    # imported here since write_behind builds on this module
+                    from app.repositories.write_behind import WriteBehindEngine, DEFAULT_MAX_PENDING
+                    engine = WriteBehindEngine(
+                        engine, config["WRITE_BEHIND_MS"], config.get("WRITE_BEHIND_MAX_PENDING", DEFAULT_MAX_PENDING)
+                    )
+                _engine = engine
+    return _engine
+
+
+def set_engine(engine: StorageEngine | None) -> StorageEngine | None:
+    """
+    Replaces the active storage engine. Passing None makes the next get_engine() call re-read the config.
+
+    Parameters:
+        engine (StorageEngine | None): the engine to activate
+
+    Returns:
+        StorageEngine | None: the previously active engine
+    """
+    global _engine
+    with _engine_lock:
+        previous, _engine = _engine, engine
+    return previous
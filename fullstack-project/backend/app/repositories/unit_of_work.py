@@ -0,0 +1,197 @@
+"""
+This module implements units of work: groups of writes that are applied together or not at all.
+
+Inside transaction(), get_engine() returns a UnitOfWork instead of the real engine, so repository functions buffer
+their writes without any changes to the services calling them. Reads see the unit's own pending writes.
+When the block finishes, every touched collection is written once; if the block raises, nothing is written.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from app.repositories.document_cache import clone
+from app.repositories.storage_engine import (
+    CollectionChanges,
+    StorageEngine,
+    _applied,
+    _partitions_in,
+    _record_key,
+    _upserted,
+    _versioned,
+    _without,
+    current_unit,
+    get_engine,
+    record_version,
+)
+
+
+class UnitOfWork(StorageEngine):
+    """
+    Buffers the writes of one business operation in front of a storage engine.
+    Conditional writes (compare_and_swap/update) are checked against the buffered state right away, and against the
+    stored versions again when the unit commits. Deletes of stored records are conditional on the version deleted.
+
+    Attributes:
+        engine (StorageEngine): the engine the writes are committed to
+        changes (dict[str, CollectionChanges]): the pending writes, by collection name
+        callbacks (list[Callable[[], None]]): called once the pending writes are committed
+    """
+
+    def __init__(self, engine: StorageEngine):
+        self.engine = engine
+        self.name = engine.name
+        self.changes: dict[str, CollectionChanges] = {}
+        self.callbacks: list[Callable[[], None]] = []
+
+    def _change(self, collection: str) -> CollectionChanges:
+        """Returns the pending changes of a collection, starting them on the first write."""
+        if collection not in self.changes:
+            self.changes[collection] = CollectionChanges()
+        return self.changes[collection]
+
+    def load(self, collection: str) -> list[dict[str, Any]]:
+        change = self.changes.get(collection)
+        if change is not None and change.items is not None:
+            return clone(change.items)
+        items = self.engine.load(collection)
+        return _applied(collection, items, clone(change.records)) if change is not None else items
+
+    def iter_records(self, collection: str) -> Iterator[dict[str, Any]]:
+        if collection in self.changes:
+            yield from self.load(collection)
+        else:
+            yield from self.engine.iter_records(collection)
+
+    def save(self, collection: str, items: list[dict[str, Any]]) -> None:
+        change = self._change(collection)
+        change.items = clone(items)
+        change.records = {}
+
+    def get(self, collection: str, key: Any) -> dict[str, Any] | None:
+        change = self.changes.get(collection)
+        if change is None:
+            return self.engine.get(collection, key)
+        if change.items is not None:
+            for record in change.items:
+                if _record_key(collection, record) == key:
+                    return clone(record)
+            return None
+        if key in change.records:
+            return clone(change.records[key])
+        return self.engine.get(collection, key)
+
+    def find_by(self, collection: str, field: str, value: Any) -> list[dict[str, Any]]:
+        if collection not in self.changes:
+            return self.engine.find_by(collection, field, value)
+        # pending writes are not indexed, so scan the merged view
+        return super().find_by(collection, field, value)
+
+    def search(self, collection: str, field: str, text: str) -> list[dict[str, Any]]:
+        if collection not in self.changes:
+            return self.engine.search(collection, field, text)
+        return super().search(collection, field, text)
+
+    def sorted_by(self, collection: str, field: str, descending: bool = False, start: int = 0,
+                  stop: int | None = None) -> tuple[list[dict[str, Any]], int]:
+        if collection not in self.changes:
+            return self.engine.sorted_by(collection, field, descending, start, stop)
+        return super().sorted_by(collection, field, descending, start, stop)
+
+    def upsert(self, collection: str, record: dict[str, Any]) -> None:
+        change = self._change(collection)
+        if change.items is not None:
+            _upserted(collection, change.items, clone(record))
+        else:
+            change.records[_record_key(collection, record)] = clone(record)
+
+    def delete(self, collection: str, key: Any) -> bool:
+        current = self.get(collection, key)
+        if current is None:
+            return False
+        change = self._change(collection)
+        if key not in change.expected and key not in change.records and change.items is None:
+            # the record is only deleted if nobody else changes it before the unit commits
+            change.expected[key] = record_version(current)
+        if change.items is not None:
+            change.items = _without(collection, change.items, key)
+        else:
+            change.records[key] = None
+        return True
+
+    def compare_and_swap(self, collection: str, record: dict[str, Any], expected: int) -> dict[str, Any] | None:
+        key = _record_key(collection, record)
+        current = self.get(collection, key)
+        if record_version(current) != expected:
+            return None
+        change = self._change(collection)
+        pending = key in change.records or change.items is not None
+        if key not in change.expected and not pending:
+            change.expected[key] = expected
+        written = _versioned(record, current)
+        self.upsert(collection, written)
+        return written
+
+    def partitions(self, collection: str) -> list[str]:
+        return _partitions_in(self.engine.partitions(collection) + list(self.changes), collection)
+
+    def next_id(self, collection: str) -> int:
+        # ids are allocated straight away; an id from a unit that is rolled back is simply never used
+        return self.engine.next_id(collection)
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a function to call once the unit's writes are committed, e.g. to drop copies cached elsewhere.
+        It is not called if the unit is rolled back.
+
+        Parameters:
+            callback (Callable[[], None]): the function to call
+
+        Returns: None
+        """
+        self.callbacks.append(callback)
+
+    def commit(self) -> None:
+        """
+        Writes every pending change to the engine, one write per collection, then calls the after_commit callbacks.
+
+        Parameters: None
+
+        Returns: None
+
+        Raises:
+            StorageConflictError: if a record written conditionally was changed by someone else in the meantime
+        """
+        if self.changes:
+            self.engine.commit(self.changes)
+        self.changes = {}
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+@contextmanager
+def transaction() -> Iterator[UnitOfWork]:
+    """
+    Runs a block as one unit of work. Repository writes inside the block are buffered, then committed together
+    when it finishes. If the block raises, the buffered writes are discarded.
+    A transaction opened inside another one joins the outer transaction.
+
+    Parameters: None
+
+    Returns:
+        Iterator[UnitOfWork]: a context manager yielding the unit of work
+
+    Raises:
+        StorageConflictError: if the commit finds a conditionally written record was changed by another request
+    """
+    outer = current_unit.get()
+    if outer is not None:
+        yield outer
+        return
+    unit = UnitOfWork(get_engine())
+    token = current_unit.set(unit)
+    try:
+        yield unit
+    finally:
+        current_unit.reset(token)
+    unit.commit()
@@ -0,0 +1,163 @@
+"""
+This module implements the in-process cache of authenticated users, keyed by their bearer token.
+
+Authenticating a request loads the token's user and builds the model of their role from it (see app/auth.py),
+on every request and every WebSocket connect. The cache keeps the built user for a short time instead, so
+dependencies such as get_customer and check_manager reuse it. It is bounded: the least recently used tokens are
+evicted first, and entries expire after their time to live, or when their token does, whichever comes first.
+
+Only the user is cached: the token is still checked against its session or the revocation list on every
+request, so a logout takes effect in every process at once.
+
+Every write to a user through user_repo.py drops the cached copies of that user, so a wallet or cart change is
+seen by the very next request. Writes made by other processes are only seen once the entry expires, which is why
+the time to live is kept short.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Any
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class UserCache:
+    """
+    Caches authenticated users by token, with a bound on the number of entries and a time to live for each.
+
+    Attributes:
+        max_entries (int): the most tokens kept, the least recently used being evicted first
+        hits (int): lookups served from the cache
+        misses (int): lookups of tokens that were not cached, or had expired
+        evictions (int): entries dropped to stay within max_entries
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # token -> (user id, user, unix time the entry expires at)
+        self._entries: OrderedDict[str, tuple[str, Any, float]] = OrderedDict()
+        self._tokens: dict[str, set[str]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Any | None:
+        """
+        Returns the cached user of a token. Cached users are shared between requests, so must not be changed.
+
+        Parameters:
+            token (str): the bearer token
+
+        Returns:
+            Any | None: the user, or None if the token is not cached or its entry has expired
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[2] <= time.time():
+                if entry is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        """
+        Returns a counter of the invalidations so far. Read it before loading a user to cache, and pass it to put.
+
+        Parameters: None
+
+        Returns:
+            int: the invalidation counter
+        """
+        return self._generation
+
+    def put(self, token: str, user_id: str, user: Any, expires_at: float, generation: int) -> None:
+        """
+        Caches the user of a token, unless a user was invalidated while it was being loaded,
+        since it could then be an outdated copy.
+
+        Parameters:
+            token (str): the bearer token
+            user_id (str): the identifier of the user
+            user (Any): the user to cache
+            expires_at (float): the unix time the entry expires at
+            generation (int): the value of generation() from before the user was loaded
+
+        Returns: None
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (user_id, user, expires_at)
+            self._tokens.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, token: str) -> None:
+        """Removes a token's entry. Must be called holding the lock."""
+        user_id = self._entries.pop(token)[0]
+        tokens = self._tokens[user_id]
+        tokens.discard(token)
+        if not tokens:
+            del self._tokens[user_id]
+
+    def discard(self, token: str) -> None:
+        """
+        Drops the entry of a single token, e.g. when it is logged out.
+
+        Parameters:
+            token (str): the bearer token
+
+        Returns: None
+        """
+        with self._lock:
+            self._generation += 1
+            if token in self._entries:
+                self._drop(token)
+
+    def invalidate(self, user_id: str | None = None) -> None:
+        """
+        Drops the entries of every token of a user, or every entry if no user is passed.
+
+        Parameters:
+            user_id (str | None): the identifier of the user that changed
+
+        Returns: None
+        """
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+                self._tokens.clear()
+            else:
+                for token in list(self._tokens.get(user_id, ())):
+                    self._drop(token)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the cache counters.
+
+        Parameters: None
+
+        Returns:
+            dict[str, Any]: hits, misses, hit_rate, evictions and the number of cached tokens
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+        }
+
+
+user_cache = UserCache()
@@ -1,11 +1,42 @@
-"""This module handles user data storage in the application."""
+"""
+This module handles user data storage in the application.
 
-from pathlib import Path
-import json
-import os
-from typing import Any
+Users are indexed by role, by email and by password reset token (see INDEXED_FIELDS in storage_engine.py), so
+sign-up, login and password resets look a user up directly instead of scanning every user. Emails are indexed
+case-insensitively through the email_key field, which every write here derives from the user's email.
+"""
 
-USER_DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "users.json"
+from typing import Any, Callable
+
+from app.repositories.storage_engine import current_unit, get_engine
+from app.repositories.user_cache import user_cache
+
+
+def email_key(email: str) -> str:
+    """
+    **Returns the form of an email that users are indexed under, so that lookups ignore case.**
+
+    Parameters:
+    *   **email** (str): the email, as entered
+
+    Returns:
+    *   **str**: the email without surrounding whitespace, in lower case
+    """
+    return email.strip().lower()
+
+def _keyed(user: dict[str, Any]) -> dict[str, Any]:
+    """Sets the email_key of a user from their email, before they are saved."""
+    user["email_key"] = email_key(user.get("email") or "")
+    return user
+
+def _invalidate(user_id: str | None = None) -> None:
+    """Drops the cached copies of a user, or of every user, once a write to them is stored (see user_cache.py)."""
+    unit = current_unit.get()
+    if unit is not None:
+        # inside a transaction the write is only stored when the unit commits
+        unit.after_commit(lambda: user_cache.invalidate(user_id))
+    else:
+        user_cache.invalidate(user_id)
 
 def load_users() -> list[dict[str, Any]]:
     """
@@ -16,14 +47,7 @@ def load_users() -> list[dict[str, Any]]:
     Returns:
     *   **list[dict[str, Any]]**: all users
     """
-    if not USER_DATA_PATH.exists():
-        return []
-    with USER_DATA_PATH.open("r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        else:
-            return json.loads(content)
+    return get_engine().load("users")
 
 def save_users(items: list[dict[str, Any]]) -> None:
     """
@@ -34,7 +58,89 @@ def save_users(items: list[dict[str, Any]]) -> None:
 
     Returns: None
     """
-    tmp = USER_DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, USER_DATA_PATH)
\ No newline at end of file
+    get_engine().save("users", [_keyed(user) for user in items])
+    _invalidate()
+
+def get_user(user_id: str) -> dict[str, Any] | None:
+    """
+    **Loads a single saved user by their identifier.**
+
+    Parameters:
+    *   **user_id** (str): the identifier of the user
+
+    Returns:
+    *   **dict[str, Any] | None**: the user, or None if they do not exist
+    """
+    return get_engine().get("users", user_id)
+
+def save_user(user: dict[str, Any]) -> None:
+    """
+    **Saves a single user, replacing the stored user with the same id or adding them if they are new.**
+
+    Parameters:
+    *   **user** (dict[str, Any]): the user to save
+
+    Returns: None
+    """
+    get_engine().upsert("users", _keyed(user))
+    _invalidate(user["id"])
+
+def update_user_record(user_id: str, change: Callable[[dict[str, Any]], dict[str, Any]]) -> dict[str, Any] | None:
+    """
+    **Applies a change to a single saved user, retrying on the latest copy if another request changed them first.**
+    Use this instead of get_user/save_user for read-modify-write updates such as wallet balances.
+
+    Parameters:
+    *   **user_id** (str): the identifier of the user
+    *   **change** (Callable[[dict[str, Any]], dict[str, Any]]): returns the updated user. may be called more than once
+
+    Returns:
+    *   **dict[str, Any] | None**: the saved user, or None if they do not exist
+
+    Raises:
+    *   **StorageConflictError**: if the user kept changing on every retry
+    """
+    updated = get_engine().update("users", user_id, lambda user: _keyed(change(user)))
+    _invalidate(user_id)
+    return updated
+
+def find_users_by(field: str, value: Any) -> list[dict[str, Any]]:
+    """
+    **Loads every saved user whose field matches the value.**
+
+    Parameters:
+    *   **field** (str): the field to match, "role", "email_key" and "reset_token" are indexed
+    *   **value** (Any): the value to match
+
+    Returns:
+    *   **list[dict[str, Any]]**: the matching users
+    """
+    return get_engine().find_by("users", field, value)
+
+def find_user_by_email(email: str) -> dict[str, Any] | None:
+    """
+    **Loads the saved user with an email, ignoring case.**
+
+    Parameters:
+    *   **email** (str): the email to look up
+
+    Returns:
+    *   **dict[str, Any] | None**: the user, or None if no user has that email
+    """
+    users = get_engine().find_by("users", "email_key", email_key(email))
+    return users[0] if users else None
+
+def find_user_by_reset_token(reset_token: str) -> dict[str, Any] | None:
+    """
+    **Loads the saved user holding a password reset token.**
+
+    Parameters:
+    *   **reset_token** (str): the token sent in the password reset link
+
+    Returns:
+    *   **dict[str, Any] | None**: the user, or None if no user holds that token
+    """
+    if not reset_token:
+        return None
+    users = get_engine().find_by("users", "reset_token", reset_token)
+    return users[0] if users else None
@@ -0,0 +1,309 @@
+"""
+This module implements the optional write-behind mode of the storage engine.
+
+With WRITE_BEHIND_MS set above 0, saves only update an in-memory copy of the collection, and a background thread
+writes every changed collection once per interval (or as soon as WRITE_BEHIND_MAX_PENDING writes are waiting).
+A burst of saves to the same collection then costs one file write instead of one per save, at the cost of losing
+at most one interval of changes if the process is killed. Buffered changes are flushed when the app shuts down.
+
+Only one process may use write-behind on a data directory: other workers would not see the buffered changes.
+"""
+
+import atexit
+import threading
+from typing import Any, Iterator
+
+from app.repositories.conflicts import StorageConflictError
+from app.repositories.document_cache import clone, freeze
+from app.repositories.indexes import CollectionIndex
+from app.repositories.storage_engine import (
+    COLLECTION_KEYS,
+    INDEXED_FIELDS,
+    SORTED_FIELDS,
+    TEXT_INDEXED_FIELDS,
+    CollectionChanges,
+    StorageEngine,
+    _applied,
+    _partitions_in,
+    _record_key,
+    _upserted,
+    _versioned,
+    _versioned_all,
+    _without,
+    record_version,
+)
+
+DEFAULT_MAX_PENDING = 100
+
+
+class WriteBehindEngine(StorageEngine):
+    """
+    Buffers writes in memory in front of another engine and writes them out in batches.
+    A collection is read from the wrapped engine once, on its first write; after that it is served from memory
+    until it has been flushed with no newer writes.
+
+    Attributes:
+        engine (StorageEngine): the engine the buffered collections are written to
+        interval (float): the longest time in seconds a change is held only in memory
+        max_pending (int): the number of buffered writes that triggers a flush before the interval is up
+    """
+
+    def __init__(self, engine: StorageEngine, interval_ms: int, max_pending: int = DEFAULT_MAX_PENDING):
+        self.engine = engine
+        self.name = engine.name
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self._buffered: dict[str, CollectionIndex] = {}
+        self._generation: dict[str, int] = {}
+        self._dirty: set[str] = set()
+        self._pending_writes = 0
+        self._stats = {"writes": 0, "flushes": 0, "collections_written": 0}
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---- buffered state ----
+
+    def _buffer(self, collection: str) -> CollectionIndex:
+        """Returns the in-memory copy of a collection, reading it from the wrapped engine if needed. Must hold _lock."""
+        buffer = self._buffered.get(collection)
+        if buffer is None:
+            buffer = CollectionIndex(
+                COLLECTION_KEYS.get(collection, "id"), INDEXED_FIELDS.get(collection, ()), self.engine.load(collection),
+                text_fields=TEXT_INDEXED_FIELDS.get(collection, ()), sorted_fields=SORTED_FIELDS.get(collection, ())
+            )
+            self._buffered[collection] = buffer
+        return buffer
+
+    def _replace_buffer(self, collection: str, items: list[dict[str, Any]]) -> None:
+        """Replaces the in-memory copy of a collection. Must hold _lock."""
+        self._buffered[collection] = CollectionIndex(
+            COLLECTION_KEYS.get(collection, "id"), INDEXED_FIELDS.get(collection, ()), items,
+            text_fields=TEXT_INDEXED_FIELDS.get(collection, ()), sorted_fields=SORTED_FIELDS.get(collection, ())
+        )
+
+    def _changed(self, collection: str) -> None:
+        """Marks a collection as changed and wakes the flusher early if enough writes are waiting. Must hold _lock."""
+        self._generation[collection] = self._generation.get(collection, 0) + 1
+        self._dirty.add(collection)
+        self._pending_writes += 1
+        self._stats["writes"] += 1
+        self._start()
+        if self._pending_writes >= self.max_pending:
+            self._wake.set()
+
+    def _state(self, collection: str) -> tuple[int, bytes]:
+        """Returns the generation and frozen records of a buffered collection, for conflict detection."""
+        return self._generation.get(collection, 0), freeze(list(self._buffered[collection].records.values()))
+
+    # ---- StorageEngine ----
+
+    def load(self, collection: str) -> list[dict[str, Any]]:
+        with self._lock:
+            if collection not in self._buffered:
+                items = self.engine.load(collection)
+                self._remember_read(collection, self._generation.get(collection, 0), freeze(items))
+                return items
+            self._remember_read(collection, *self._state(collection))
+            return clone(list(self._buffered[collection].records.values()))
+
+    def iter_records(self, collection: str) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            buffered = collection in self._buffered
+            if buffered:
+                items = clone(list(self._buffered[collection].records.values()))
+        yield from items if buffered else self.engine.iter_records(collection)
+
+    def save(self, collection: str, items: list[dict[str, Any]]) -> None:
+        with self._lock:
+            buffer = self._buffer(collection)
+            current = list(buffer.records.values())
+            items = self._merge_with_current(collection, clone(items), self._generation.get(collection, 0), lambda: current)
+            self._replace_buffer(collection, _versioned_all(collection, items, buffer.get))
+            self._changed(collection)
+            self._remember_read(collection, *self._state(collection))
+
+    def get(self, collection: str, key: Any) -> dict[str, Any] | None:
+        with self._lock:
+            if collection not in self._buffered:
+                return self.engine.get(collection, key)
+            record = self._buffered[collection].get(key)
+            return clone(record) if record is not None else None
+
+    def find_by(self, collection: str, field: str, value: Any) -> list[dict[str, Any]]:
+        with self._lock:
+            if collection not in self._buffered:
+                return self.engine.find_by(collection, field, value)
+            if field in INDEXED_FIELDS.get(collection, ()):
+                return clone(self._buffered[collection].find(field, value))
+        return super().find_by(collection, field, value)
+
+    def search(self, collection: str, field: str, text: str) -> list[dict[str, Any]]:
+        with self._lock:
+            if collection not in self._buffered:
+                return self.engine.search(collection, field, text)
+            if field in TEXT_INDEXED_FIELDS.get(collection, ()):
+                return clone(self._buffered[collection].search(field, text))
+        return super().search(collection, field, text)
+
+    def sorted_by(self, collection: str, field: str, descending: bool = False, start: int = 0,
+                  stop: int | None = None) -> tuple[list[dict[str, Any]], int]:
+        with self._lock:
+            if collection not in self._buffered:
+                return self.engine.sorted_by(collection, field, descending, start, stop)
+            if field in SORTED_FIELDS.get(collection, ()):
+                buffer = self._buffered[collection]
+                return clone(buffer.ordered(field, descending, start, stop)), buffer.count(field)
+        return super().sorted_by(collection, field, descending, start, stop)
+
+    def _put(self, collection: str, record: dict[str, Any], stored: dict[str, Any] | None) -> dict[str, Any]:
+        """Writes a single record over the stored one in the buffer. Must hold _lock."""
+        before = self._generation.get(collection, 0)
+        record = _versioned(clone(record), stored)
+        self._buffer(collection).put(record)
+        self._changed(collection)
+        self._remember_write(
+            collection, before, lambda: self._state(collection), lambda items: _upserted(collection, items, record)
+        )
+        return clone(record)
+
+    def upsert(self, collection: str, record: dict[str, Any]) -> None:
+        with self._lock:
+            self._put(collection, record, self._buffer(collection).get(_record_key(collection, record)))
+
+    def compare_and_swap(self, collection: str, record: dict[str, Any], expected: int) -> dict[str, Any] | None:
+        with self._lock:
+            current = self._buffer(collection).get(_record_key(collection, record))
+            if record_version(current) != expected:
+                return None
+            return self._put(collection, record, current)
+
+    def delete(self, collection: str, key: Any) -> bool:
+        with self._lock:
+            before = self._generation.get(collection, 0)
+            if self._buffer(collection).remove(key) is None:
+                return False
+            self._changed(collection)
+            self._remember_write(
+                collection, before, lambda: self._state(collection), lambda items: _without(collection, items, key)
+            )
+            return True
+
+    def commit(self, changes: dict[str, CollectionChanges]) -> None:
+        with self._lock:
+            for collection, change in changes.items():
+                for key, version in change.expected.items():
+                    if record_version(self._buffer(collection).get(key)) != version:
+                        raise StorageConflictError(collection, key)
+            for collection, change in changes.items():
+                current = list(self._buffer(collection).records.values())
+                if change.items is not None:
+                    items = self._merge_with_current(collection, change.items, self._generation.get(collection, 0),
+                                                     lambda: current)
+                else:
+                    items = _applied(collection, current, change.records)
+                before = self._generation.get(collection, 0)
+                self._replace_buffer(collection, _versioned_all(collection, clone(items), self._buffered[collection].get))
+                self._changed(collection)
+                if change.items is not None:
+                    self._remember_read(collection, *self._state(collection))
+                else:
+                    self._remember_write(
+                        collection, before, lambda collection=collection: self._state(collection),
+                        lambda stored, records=change.records, collection=collection: _applied(collection, stored, records)
+                    )
+
+    def partitions(self, collection: str) -> list[str]:
+        with self._lock:
+            buffered = list(self._buffered)
+        return _partitions_in(self.engine.partitions(collection) + buffered, collection)
+
+    def stale_collections(self) -> list[str]:
+        return self.engine.stale_collections()
+
+    def upgrade(self, collection: str) -> None:
+        self.flush()
+        self.engine.upgrade(collection)
+
+    def rebuild(self, collection: str) -> None:
+        self.flush()
+        self.engine.rebuild(collection)
+
+    def next_id(self, collection: str) -> int:
+        new_id = self.engine.next_id(collection)
+        while self.get(collection, new_id) is not None:
+            # a buffered record already holds the id, so it is not in the wrapped engine yet
+            new_id = self.engine.next_id(collection)
+        return new_id
+
+    # ---- flushing ----
+
+    def _start(self) -> None:
+        """Starts the background flusher on the first buffered write. Must hold _lock."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self) -> None:
+        """Flushes buffered changes once per interval, or early when woken, until the engine is closed."""
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes every changed collection to the wrapped engine, once each.
+
+        Parameters: None
+
+        Returns: None
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = {
+                    collection: (self._generation[collection], list(self._buffered[collection].records.values()))
+                    for collection in self._dirty
+                }
+                self._dirty.clear()
+                self._pending_writes = 0
+            written = []
+            try:
+                for collection, (_, items) in batch.items():
+                    self.engine.save(collection, items)
+                    written.append(collection)
+            finally:
+                with self._lock:
+                    # anything that was not written stays buffered for the next flush
+                    self._dirty.update(collection for collection in batch if collection not in written)
+                    for collection in written:
+                        if self._generation[collection] == batch[collection][0] and collection not in self._dirty:
+                            del self._buffered[collection]
+                    if written:
+                        self._stats["flushes"] += 1
+                        self._stats["collections_written"] += len(written)
+            self.engine.flush()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns counters describing how well writes are being coalesced.
+
+        Parameters: None
+
+        Returns:
+            dict[str, int]: the buffered writes, the flushes that wrote something, the collection writes they made,
+                and the collections currently waiting to be written
+        """
+        with self._lock:
+            return {**self._stats, "dirty": len(self._dirty)}
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        self.engine.close()
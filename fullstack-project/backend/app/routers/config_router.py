@@ -3,7 +3,7 @@
 from fastapi import APIRouter, Depends
 from app.auth import require_role, UserRole
 from app.schemas.user_schema import Admin
-from app.services.config_service import set_tax_rate
+from app.services.config_service import get_cache_stats, set_tax_rate
 
 router = APIRouter(prefix="/config", tags=["config"])
 
@@ -21,4 +21,15 @@ def update_tax_rate_router(new_tax_rate: float, current_user: Admin = Depends(re
     Raises:
     *   **HTTPException** (status_code = 400): if the new tax rate is not between 0 and 1
     """
-    return set_tax_rate(new_tax_rate)
\ No newline at end of file
+    return set_tax_rate(new_tax_rate)
+
+@router.get("/cache-stats")
+def get_cache_stats_router(current_user: Admin = Depends(require_role(UserRole.ADMIN))):
+    """
+    **Allows an admin to see how well the in-process caches are used, to size them.**
+
+    Returns:
+    *   **dict**: the hits, misses, hit_rate, evictions and entries of the user cache and the search cache,
+        and the calls of each coalesced read that shared another call's result, counted since this worker started
+    """
+    return get_cache_stats()
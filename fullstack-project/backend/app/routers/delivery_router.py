@@ -12,8 +12,8 @@ from app.services.delivery_service import (
     get_delivery_by_order,
     check_waiting_orders,
 )
-from app.repositories.user_repo import load_users, save_users
-from app.repositories.delivery_repo import load_deliveries
+from app.repositories.user_repo import get_user, save_user
+from app.repositories.delivery_repo import find_deliveries_by
 
 router = APIRouter(prefix="/delivery", tags=["delivery"])
 
@@ -42,14 +42,10 @@ async def update_driver_status_route(
     if status not in ("available", "unavailable"):
         raise HTTPException(status_code=400, detail="status can only be manually updated to one of available or unavailable")
 
-    users = load_users()
-    updated_user = None
-    for user in users:
-        if user.get("id") == current_user.id:
-            user["driver_status"] = status
-            updated_user = user
-            break
-    save_users(users)
+    updated_user = get_user(current_user.id)
+    if updated_user is not None:
+        updated_user["driver_status"] = status
+        save_user(updated_user)
 
     if status == "available" and updated_user:
         await check_waiting_orders(updated_user)
@@ -75,9 +71,9 @@ def get_my_active_delivery_route(
     *   **HTTPException** (status_code = 403): if user's role is not *driver*
     *   **HTTPException** (status_code = 404): if no active delivery found for this driver
     """
-    deliveries = load_deliveries()
+    deliveries = find_deliveries_by("driver_id", current_user.id)
     for delivery in deliveries:
-        if delivery.get("driver_id") == current_user.id and delivery.get("delivered_at", 0.0) == 0.0:
+        if delivery.get("delivered_at", 0.0) == 0.0:
             return Delivery(**delivery)
     raise HTTPException(status_code=404, detail="No active delivery found")
 
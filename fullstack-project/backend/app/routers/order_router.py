@@ -8,6 +8,8 @@ from app.services.user_service import get_customer
 from app.services.order_service import (
     get_orders_for_customer,
     get_orders_for_restaurant,
+    get_archived_orders_for_customer,
+    get_archived_orders_for_restaurant,
     cancel_order,
     accept_reject_order,
     mark_order_ready,
@@ -57,6 +59,50 @@ def get_orders_for_restaurant_route(restaurant_id: int, current_user: User = Dep
     return get_orders_for_restaurant(restaurant_id=restaurant_id, manager_id=current_user.id)
 
 
+@router.get("/customer/archive", response_model=list[Order], status_code=200)
+def get_archived_orders_for_customer_route(month: str | None = None, current_user: Customer = Depends(get_customer)):
+    """
+    **Retrieves the logged-in customer's archived orders: delivered, cancelled and rejected orders that are no longer
+    returned by** */order/customer.*
+
+    Parameters:
+    *   **month** (str | None): only return orders placed in this month, as YYYY-MM. optional query parameter
+    *   **current_user** (Customer): the authenticated user with role *customer*. automatically passed as argument.
+
+    Returns:
+    *   **list[Order]**: the customer's archived orders, oldest month first
+
+    Raises:
+    *   **HTTPException** (status_code = 400): if month is not in YYYY-MM format
+    *   **HTTPException** (status_code = 401): if user's token is invalid or expired
+    *   **HTTPException** (status_code = 403): if user's role is not *customer*
+    """
+    return get_archived_orders_for_customer(current_customer=current_user, month=month)
+
+
+@router.get("/restaurant/{restaurant_id}/archive", response_model=list[Order], status_code=200)
+def get_archived_orders_for_restaurant_route(restaurant_id: int, month: str | None = None,
+                                             current_user: User = Depends(check_manager)):
+    """
+    **Retrieves the archived orders of a given restaurant. Must be called by one of the restaurant's managers.**
+
+    Parameters:
+    *   **restaurant_id** (int): the identifier of the restaurant whose orders have been requested
+    *   **month** (str | None): only return orders placed in this month, as YYYY-MM. optional query parameter
+    *   **current_user** (User): the authenticated user with role *manager*. automatically passed as argument.
+
+    Returns:
+    *   **list[Order]**: the restaurant's archived orders, oldest month first
+
+    Raises:
+    *   **HTTPException** (status_code = 400): if month is not in YYYY-MM format
+    *   **HTTPException** (status_code = 401): if user's token is invalid or expired
+    *   **HTTPException** (status_code = 403): if user's role is not *manager* or user is not a manager of the provided restaurant
+    *   **HTTPException** (status_code = 404): if restaurant_id is not found
+    """
+    return get_archived_orders_for_restaurant(restaurant_id=restaurant_id, manager_id=current_user.id, month=month)
+
+
 @router.delete("/{order_id}", response_model=Order, status_code=200)
 async def cancel_order_route(order_id: int, current_user: Customer = Depends(get_customer)):
     """
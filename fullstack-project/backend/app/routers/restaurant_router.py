@@ -70,7 +70,8 @@ def search_restaurants_route(
     menu_item: str | None = None,
     sort_price: str | None = None,
     page: int = 1,
-    page_size: int = 5
+    page_size: int = 5,
+    cursor: str | None = None
 ):
     """
     **Searches restaurants by various optional fields. Does not require authentication.**
@@ -83,11 +84,16 @@ def search_restaurants_route(
     *   **postal_code** (str): restaurant postal code
     *   **menu_item** (str): menu item name
     *   **sort_price** (str): "asc" or "desc" for ascending or descending results
+    *   **page** (int): which page to return, starting at 1
+    *   **page_size** (int): how many results are returned per page (1-50)
+    *   **cursor** (str): the next_cursor of the previous page. Pages fetched by cursor do not shift when
+        restaurants are added or removed in between, and cost the same however deep they are
 
     Returns:
     *   **PaginatedRestaurantResults**: a paginated response of restaurants satisfying this criteria
 
     Raises:
+    *   **HTTPException** (status_code = 400): the cursor is invalid, or was issued for another sort order
     *   **HTTPException** (status_code = 422): arguments do not match Restaurant_Search schema
     """
     try:
@@ -100,7 +106,8 @@ def search_restaurants_route(
             menu_item=menu_item,
             sort_price=sort_price,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor=cursor
         )
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
@@ -3,6 +3,7 @@ This module defines the API routes for user management.
 """
 
 from fastapi import APIRouter, status, Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
 from app.schemas.notification_schema import Notification_Response
 from app.schemas.user_schema import (
     User,
@@ -30,7 +31,8 @@ from app.services.user_service import (
     add_favourite,
     remove_favourite
 )
-from app.auth import get_current_user, require_role
+from app.services.session_service import end_session, revoke_user_sessions
+from app.auth import get_current_user, http_bearer, require_role
 
 router = APIRouter(prefix="/user", tags=["user"])
 
@@ -51,7 +53,7 @@ def create_user_route(payload: User_Create):
     return create_user(payload)
 
 @router.post("/login", response_model=LoginResponse)
-def login_user_route(payload: LoginRequest):
+async def login_user_route(payload: LoginRequest):
     """
     **Logs a user into the system.**
 
@@ -64,7 +66,45 @@ def login_user_route(payload: LoginRequest):
     Raises:
     *    **HTTPException** (status_code = 401): if email/password pair is not found in users.json
     """
-    return login_user(payload.email, payload.password)
+    return await login_user(payload.email, payload.password)
+
+@router.post("/logout")
+def logout_user_route(credentials: HTTPAuthorizationCredentials = Depends(http_bearer),
+                      current_user: User = Depends(get_current_user)):
+    """
+    **Logs out the session of the token used for the request. The user's other sessions stay logged in.**
+
+    Parameters:
+    *   **credentials** (HTTPAuthorizationCredentials): the bearer token of the request. automatically passed as argument.
+    *   **current_user** (User): the authenticated user. automatically passed as argument.
+
+    Returns:
+    *   **dict[str, str]**: a message stating that the user was logged out
+
+    Raises:
+    *   **HTTPException** (status_code = 401): if the token is invalid or expired
+    """
+    end_session(credentials.credentials)
+    return {"detail": "Logged out."}
+
+@router.delete("/{user_id}/sessions")
+def revoke_sessions_route(user_id: str, current_user: User = Depends(get_current_user)):
+    """
+    **Logs out every session of a user. Admin accounts can revoke any user's sessions; other users only their own.**
+
+    Parameters:
+    *   **user_id** (str): the identifier of the user whose sessions are revoked
+    *   **current_user** (User): the authenticated user. automatically passed as argument.
+
+    Returns:
+    *   **dict[str, int]**: the number of sessions that were revoked
+
+    Raises:
+    *   **HTTPException** (status_code = 403): user does not have role *admin* and their id does not match user_id in URL
+    """
+    if current_user.role != UserRole.ADMIN and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="You are not authorized to revoke this user's sessions")
+    return {"revoked": revoke_user_sessions(user_id)}
 
 @router.get("/{user_id}", response_model=UserPublic)
 def get_user_route(user_id: str, current_user: User = Depends(get_current_user)):
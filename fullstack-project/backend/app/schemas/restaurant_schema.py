@@ -461,6 +461,7 @@ class Restaurant_Search(BaseModel):
     *   **sort_price** (str): "asc" (sorts ascending) or "desc" (sorts descending)
     *   **page** (str): which page to return from paginated results. starts at 1
     *   **name** (str): how many results should be returned per page (1-50)
+    *   **cursor** (str): the next_cursor of the previous page, to return the page after it instead of page
     """
     name: str | None = None
     city: str | None = None
@@ -471,6 +472,7 @@ class Restaurant_Search(BaseModel):
     sort_price: str | None = None
     page: int = 1
     page_size: int = 5
+    cursor: str | None = None
 
     @field_validator("sort_price")
     @classmethod
@@ -503,12 +505,14 @@ class PaginatedRestaurantResults(BaseModel):
     *   **page** (int): current page number
     *   **page_size** (int): number of results returned per page
     *   **total_pages** (int): total number of pages returned
+    *   **next_cursor** (str): pass as cursor to get the page after this one, None on the last page
     """
     results: list[Restaurant]
     total: int
     page: int
     page_size: int
     total_pages: int
+    next_cursor: str | None = None
 
 class Restaurant_Details_Update(BaseModel):
     """
@@ -2,7 +2,7 @@
 
 from fastapi import HTTPException
 
-from app.repositories.user_repo import load_users, save_users
+from app.repositories.user_repo import get_user, save_user
 from app.services.restaurant_service import get_restaurant_by_id
 from app.schemas.restaurant_schema import Restaurant
 from app.schemas.user_schema import Customer
@@ -42,15 +42,14 @@ def update_cart_restaurant(restaurant_id: int, current_user: Customer) -> Cart:
     Raises:
         HTTPException (status_code = 404): current_user's user_id not found in users.json
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            if user["cart"]["restaurant_id"] == restaurant_id:
-                return Cart(**user["cart"])
-            user["cart"] = Cart(restaurant_id=restaurant_id).model_dump()
-            save_users(users)
-            return Cart(**user["cart"])
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    if user["cart"]["restaurant_id"] == restaurant_id:
+        return Cart(**user["cart"])
+    user["cart"] = Cart(restaurant_id=restaurant_id).model_dump()
+    save_user(user)
+    return Cart(**user["cart"])
 
 def get_cart(current_user: Customer) -> Cart:
     """
@@ -65,11 +64,10 @@ def get_cart(current_user: Customer) -> Cart:
     Raises:
         HTTPException (status_code = 404): current_user's user_id not found in users.json
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            return Cart(**user["cart"])
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    return Cart(**user["cart"])
 
 def empty_cart(current_user: Customer) -> None:
     """
@@ -83,13 +81,12 @@ def empty_cart(current_user: Customer) -> None:
     Raises:
         HTTPException (status_code = 404): current_user's user_id not found in users.json
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            user["cart"] = Cart().model_dump()
-            save_users(users)
-            return None
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user["cart"] = Cart().model_dump()
+    save_user(user)
+    return None
 
 def apply_promo_to_cart(code: str, current_user: Customer) -> Cart:
     """
@@ -111,13 +108,12 @@ def apply_promo_to_cart(code: str, current_user: Customer) -> Cart:
     if not promo.is_active:
         raise HTTPException(status_code=400, detail="This promo code is no longer active.")
     
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            user["cart"]["promo_code"] = promo.code
-            save_users(users)
-            return Cart(**user["cart"])
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user["cart"]["promo_code"] = promo.code
+    save_user(user)
+    return Cart(**user["cart"])
 
 def remove_promo_from_cart(current_user: Customer) -> Cart:
     """
@@ -132,13 +128,12 @@ def remove_promo_from_cart(current_user: Customer) -> Cart:
     Raises:
         HTTPException (status_code = 404): current_user's user_id not found in users.json
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            user["cart"]["promo_code"] = None
-            save_users(users)
-            return Cart(**user["cart"])
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user["cart"]["promo_code"] = None
+    save_user(user)
+    return Cart(**user["cart"])
 
 def create_cart_item(payload: CartItem_Create, current_user: Customer) -> CartItem:
     """
@@ -157,7 +152,6 @@ def create_cart_item(payload: CartItem_Create, current_user: Customer) -> CartIt
                                            or current user's id not found in users.json,
                                            or new cart item's id not found in restaurant's menu
     """
-    users = load_users()
     restaurant_id = current_user.cart.restaurant_id
 
     if restaurant_id == 0:
@@ -165,13 +159,13 @@ def create_cart_item(payload: CartItem_Create, current_user: Customer) -> CartIt
 
     restaurant = get_restaurant_by_id(restaurant_id)
     if _restaurant_has_menu_item(restaurant, payload.menu_item_id):
-        for user in users:
-            if user.get("id") == current_user.id:
-                new_item = payload.model_dump()
-                user["cart"]["cart_items"].append(new_item)
-                save_users(users)
-                return CartItem(**new_item)
-        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+        user = get_user(current_user.id)
+        if user is None:
+            raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+        new_item = payload.model_dump()
+        user["cart"]["cart_items"].append(new_item)
+        save_user(user)
+        return CartItem(**new_item)
     raise HTTPException(404, detail=f"Item {payload.menu_item_id} not found in restaurant {restaurant_id} menu")
 
 def get_cart_item(item_id: int, current_user: Customer) -> CartItem:
@@ -188,14 +182,13 @@ def get_cart_item(item_id: int, current_user: Customer) -> CartItem:
     Raises:
         HTTPException (status_code = 404): current user's id not found in users.json or cart item id not found in user's cart
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            for item in user["cart"]["cart_items"]:
-                if item.get("menu_item_id") == item_id:
-                    return CartItem(**item)
-            raise HTTPException(404, detail=f"Item '{item_id}' not found in user '{current_user.id}' cart")
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    for item in user["cart"]["cart_items"]:
+        if item.get("menu_item_id") == item_id:
+            return CartItem(**item)
+    raise HTTPException(404, detail=f"Item '{item_id}' not found in user '{current_user.id}' cart")
 
 def update_cart_item(item_id: int, payload: CartItem_Update, current_user: Customer) -> CartItem:
     """
@@ -212,16 +205,15 @@ def update_cart_item(item_id: int, payload: CartItem_Update, current_user: Custo
     Raises:
         HTTPException (status_code = 404): current user's id not found in users.json or cart item id not found in user's cart
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            for item in user["cart"]["cart_items"]:
-                if item.get("menu_item_id") == item_id:
-                    item["qty"] = payload.new_qty
-                    save_users(users)
-                    return CartItem(**item)
-            raise HTTPException(404, detail=f"Item '{item_id}' not found in user '{current_user.id}' cart")
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    for item in user["cart"]["cart_items"]:
+        if item.get("menu_item_id") == item_id:
+            item["qty"] = payload.new_qty
+            save_user(user)
+            return CartItem(**item)
+    raise HTTPException(404, detail=f"Item '{item_id}' not found in user '{current_user.id}' cart")
 
 def delete_cart_item(item_id: int, current_user: Customer) -> CartItem:
     """
@@ -237,13 +229,12 @@ def delete_cart_item(item_id: int, current_user: Customer) -> CartItem:
     Raises:
         HTTPException (status_code = 404): current user's id not found in users.json or cart item id not found in user's cart
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            for item in user["cart"]["cart_items"]:
-                if item.get("menu_item_id") == item_id:
-                    user["cart"]["cart_items"].remove(item)
-                    save_users(users)
-                    return CartItem(**item)
-            raise HTTPException(404, detail=f"Item '{item_id}' not found in user '{current_user.id}' cart")
-    raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(404, detail=f"User '{current_user.id}' not found")
+    for item in user["cart"]["cart_items"]:
+        if item.get("menu_item_id") == item_id:
+            user["cart"]["cart_items"].remove(item)
+            save_user(user)
+            return CartItem(**item)
+    raise HTTPException(404, detail=f"Item '{item_id}' not found in user '{current_user.id}' cart")
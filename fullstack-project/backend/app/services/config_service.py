@@ -2,6 +2,9 @@
 
 from fastapi import HTTPException
 from app.repositories.config_repo import load_config, save_config
+from app.repositories.search_cache import search_cache
+from app.repositories.user_cache import user_cache
+from app.services.single_flight import single_flight_stats
 
 def get_tax_rate() -> float:
     """
@@ -36,6 +39,22 @@ def set_tax_rate(new_tax_rate: float) -> float:
     
     return new_tax_rate
 
+def get_cache_stats() -> dict:
+    """
+    **Retrieves the counters of the in-process caches, to size them.**
+
+    Parameters: None
+
+    Returns:
+        **dict**: the hits, misses, hit_rate, evictions and entries of the user cache and the search cache,
+        and the calls of each coalesced read that shared another call's result
+    """
+    return {
+        "user_cache": user_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "single_flight": single_flight_stats(),
+    }
+
 def get_bike_speed_default() -> float:
     return load_config().get("BIKE_SPEED_KMH", 20.0)
 
@@ -49,4 +68,34 @@ def get_reset_token_expiry_default() -> float:
     return load_config().get("RESET_TOKEN_EXPIRY", 900)
 
 def get_session_token_expiry_default() -> float:
-    return load_config().get("SESSION_TOKEN_EXPIRY", 86400)
\ No newline at end of file
+    return load_config().get("SESSION_TOKEN_EXPIRY", 86400)
+
+def get_archive_after_days_default() -> float:
+    return load_config().get("ARCHIVE_AFTER_DAYS", 30)
+
+def get_archive_interval_default() -> float:
+    return load_config().get("ARCHIVE_INTERVAL_SECONDS", 3600)
+
+def get_session_purge_interval_default() -> float:
+    return load_config().get("SESSION_PURGE_INTERVAL_SECONDS", 3600)
+
+def get_session_token_mode_default() -> str:
+    return load_config().get("SESSION_TOKEN_MODE", "stored")
+
+def get_session_signing_key_default() -> str:
+    return load_config().get("SESSION_SIGNING_KEY", "")
+
+def get_user_cache_ttl_default() -> float:
+    return load_config().get("USER_CACHE_TTL_SECONDS", 30)
+
+def get_search_cache_ttl_default() -> float:
+    return load_config().get("SEARCH_CACHE_TTL_SECONDS", 60)
+
+def get_password_hash_iterations_default() -> int:
+    return load_config().get("PASSWORD_HASH_ITERATIONS", 600000)
+
+def get_password_hash_workers_default() -> int:
+    return load_config().get("PASSWORD_HASH_WORKERS", 2)
+
+def get_password_rehash_on_login_default() -> bool:
+    return load_config().get("PASSWORD_REHASH_ON_LOGIN", True)
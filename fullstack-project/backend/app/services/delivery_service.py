@@ -7,12 +7,12 @@ Any updates to delivery logic should follow this module.
 
 import time
 from fastapi import HTTPException
-from app.repositories.delivery_repo import load_deliveries, save_deliveries
-from app.repositories.user_repo import load_users, save_users
+from app.repositories.delivery_repo import next_delivery_id, save_delivery, get_delivery_for_order
+from app.repositories.user_repo import find_users_by, get_user, save_user
 from app.schemas.order_schema import OrderStatus
 from app.services.order_service import _set_order_status, get_order_by_id, send_status_notification
 from app.services.restaurant_service import get_managers, get_restaurant_by_id
-from app.repositories.order_repo import load_orders, save_orders
+from app.repositories.order_repo import find_orders_by, save_order
 from app.services.notification_service import Notification
 from app.schemas.delivery_schema import Delivery
 from app.schemas.user_schema import DeliveryDriver
@@ -60,12 +60,11 @@ def find_available_driver(required_vehicle: str) -> DeliveryDriver | None:
     Returns:
         DeliveryDriver | None: an available DeliveryDriver, otherwise None
     """
-    users = load_users()
+    drivers = find_users_by("role", "driver")
     candidates = [
-        u for u in users
-        if u.get("role") == "driver"
-        and u.get("driver_status") == "available"
-        and u.get("vehicle") == required_vehicle
+        u for u in drivers
+        if u["driver_status"] == "available"
+        and u["vehicle"] == required_vehicle
     ]
     if not candidates:
         return None
@@ -82,12 +81,10 @@ def set_driver_status_to_delivering(driver_id: str) -> None:
     Returns:
         None
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == driver_id:
-            user["driver_status"] = "delivering"
-            break
-    save_users(users)
+    user = get_user(driver_id)
+    if user is not None:
+        user["driver_status"] = "delivering"
+        save_user(user)
 
 
 async def create_delivery(order_id: int, driver_id: str, distance_km: float) -> Delivery:
@@ -104,8 +101,7 @@ async def create_delivery(order_id: int, driver_id: str, distance_km: float) ->
         Delivery: the newly created delivery record
     """
     vehicle = get_required_vehicle(distance_km)
-    deliveries = load_deliveries()
-    new_id = max((d.get("id", 0) for d in deliveries), default=0) + 1
+    new_id = next_delivery_id()
 
     new_delivery = {
         "id": new_id,
@@ -120,8 +116,7 @@ async def create_delivery(order_id: int, driver_id: str, distance_km: float) ->
         "delay_minutes": 0.0,
     }
 
-    deliveries.append(new_delivery)
-    save_deliveries(deliveries)
+    save_delivery(new_delivery)
 
     created_delivery = Delivery(**new_delivery)
     await send_delivery_created_notification(created_delivery)
@@ -146,35 +141,33 @@ async def start_delivery(order_id: int, driver_id: str) -> Delivery:
         HTTPException (status_code = 400): if the delivery has already been started or if the order is not ready for delivery
         HTTPException (status_code = 404): if no delivery record is found for this order
     """
-    deliveries = load_deliveries()
-    for delivery in deliveries:
-        if delivery.get("order_id") == order_id:
-            if delivery.get("driver_id") != driver_id:
-                raise HTTPException(status_code=403, detail="You are not assigned to this delivery.")
-            if delivery.get("started_at") != 0.0:
-                raise HTTPException(status_code=400, detail="Delivery already started.")
-            
-            order = get_order_by_id(order_id)
-            if order.status != OrderStatus.READY:
-                raise HTTPException(status_code=400, detail=f"Order is not ready for delivery. Current status: {order.status}")
+    delivery = get_delivery_for_order(order_id)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail=f"Delivery for order '{order_id}' not found.")
+    if delivery.get("driver_id") != driver_id:
+        raise HTTPException(status_code=403, detail="You are not assigned to this delivery.")
+    if delivery.get("started_at") != 0.0:
+        raise HTTPException(status_code=400, detail="Delivery already started.")
 
-            now = time.time()
-            vehicle = delivery.get("method")
-            distance_km = delivery.get("distance_km")
-            delivery["started_at"] = now
-            eta = calculate_eta(distance_km, vehicle)
-            delivery["eta_minutes"] = eta
-            save_deliveries(deliveries)
+    order = get_order_by_id(order_id)
+    if order.status != OrderStatus.READY:
+        raise HTTPException(status_code=400, detail=f"Order is not ready for delivery. Current status: {order.status}")
 
-            order = _set_order_status(order_id, OrderStatus.DELIVERING)
-            await send_status_notification(order)
+    now = time.time()
+    vehicle = delivery.get("method")
+    distance_km = delivery.get("distance_km")
+    delivery["started_at"] = now
+    eta = calculate_eta(distance_km, vehicle)
+    delivery["eta_minutes"] = eta
+    save_delivery(delivery)
 
-            delivery = Delivery(**delivery)
-            await send_delivery_started_notification(delivery, eta)
+    order = _set_order_status(order_id, OrderStatus.DELIVERING)
+    await send_status_notification(order)
 
-            return delivery
+    delivery = Delivery(**delivery)
+    await send_delivery_started_notification(delivery, eta)
 
-    raise HTTPException(status_code=404, detail=f"Delivery for order '{order_id}' not found.")
+    return delivery
 
 
 async def complete_delivery(order_id: int, driver_id: str) -> Delivery:
@@ -196,40 +189,36 @@ async def complete_delivery(order_id: int, driver_id: str) -> Delivery:
         HTTPException (status_code = 400): if the delivery has already been completed
         HTTPException (status_code = 404): if no delivery record is found for this order
     """
-    deliveries = load_deliveries()
-    for delivery in deliveries:
-        if delivery.get("order_id") == order_id:
-            if delivery.get("driver_id") != driver_id:
-                raise HTTPException(status_code=403, detail="You are not assigned to this delivery.")
-            if delivery.get("started_at") == 0.0:
-                raise HTTPException(status_code=400, detail="Delivery has not started yet.")
-            if delivery.get("delivered_at") != 0.0:
-                raise HTTPException(status_code=400, detail="Delivery already completed.")
+    delivery = get_delivery_for_order(order_id)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail=f"Delivery for order '{order_id}' not found.")
+    if delivery.get("driver_id") != driver_id:
+        raise HTTPException(status_code=403, detail="You are not assigned to this delivery.")
+    if delivery.get("started_at") == 0.0:
+        raise HTTPException(status_code=400, detail="Delivery has not started yet.")
+    if delivery.get("delivered_at") != 0.0:
+        raise HTTPException(status_code=400, detail="Delivery already completed.")
 
-            now = time.time()
-            actual_minutes = round((now - delivery["started_at"]) / 60, 2)
-            delivery["delivered_at"] = now
-            delivery["actual_minutes"] = actual_minutes
-            delivery["delay_minutes"] = round(actual_minutes - delivery.get("eta_minutes", 0.0), 2)
-            save_deliveries(deliveries)
+    now = time.time()
+    actual_minutes = round((now - delivery["started_at"]) / 60, 2)
+    delivery["delivered_at"] = now
+    delivery["actual_minutes"] = actual_minutes
+    delivery["delay_minutes"] = round(actual_minutes - delivery.get("eta_minutes", 0.0), 2)
+    save_delivery(delivery)
 
-            order = _set_order_status(order_id, OrderStatus.DELIVERED)
-            await send_status_notification(order)
+    order = _set_order_status(order_id, OrderStatus.DELIVERED)
+    await send_status_notification(order)
 
-            delivery = Delivery(**delivery)
+    delivery = Delivery(**delivery)
 
-            await send_complete_delivery_notification(delivery)
+    await send_complete_delivery_notification(delivery)
 
-            users = load_users()
-            for user in users:
-                if user.get("id") == driver_id:
-                    user["driver_status"] = "available"
-                    break
-            save_users(users)
+    user = get_user(driver_id)
+    if user is not None:
+        user["driver_status"] = "available"
+        save_user(user)
 
-            return delivery
-
-    raise HTTPException(status_code=404, detail=f"Delivery for order '{order_id}' not found.")
+    return delivery
 
 
 def get_delivery_by_order(order_id: int) -> Delivery:
@@ -245,11 +234,10 @@ def get_delivery_by_order(order_id: int) -> Delivery:
     Raises:
         HTTPException (status_code = 404): if no delivery record is found for this order
     """
-    deliveries = load_deliveries()
-    for delivery in deliveries:
-        if delivery.get("order_id") == order_id:
-            return Delivery(**delivery)
-    raise HTTPException(status_code=404, detail=f"Delivery for order '{order_id}' not found.")
+    delivery = get_delivery_for_order(order_id)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail=f"Delivery for order '{order_id}' not found.")
+    return Delivery(**delivery)
 
 
 async def check_waiting_orders(driver: dict) -> None:
@@ -264,13 +252,12 @@ async def check_waiting_orders(driver: dict) -> None:
     Returns:
         None
     """
-    orders = load_orders()
-    required_vehicle = driver.get("vehicle")
+    orders = find_orders_by("status", OrderStatus.WAITING_FOR_DRIVER)
+    required_vehicle = driver["vehicle"]
 
     waiting = [
         o for o in orders
-        if o.get("status") == OrderStatus.WAITING_FOR_DRIVER
-        and get_required_vehicle(o.get("distance_km", 0.0)) == required_vehicle
+        if get_required_vehicle(o["distance_km"]) == required_vehicle
     ]
 
     if not waiting:
@@ -279,15 +266,12 @@ async def check_waiting_orders(driver: dict) -> None:
     waiting.sort(key=lambda o: o["id"])
     order = waiting[0]
 
-    delivery = await create_delivery(order["id"], driver["id"], order.get("distance_km", 0.0))
+    delivery = await create_delivery(order["id"], driver["id"], order["distance_km"])
     set_driver_status_to_delivering(driver["id"])
 
-    for o in orders:
-        if o["id"] == order["id"]:
-            o["status"] = OrderStatus.PREPARING
-            o["delivery_id"] = delivery.id
-            break
-    save_orders(orders)
+    order["status"] = OrderStatus.PREPARING
+    order["delivery_id"] = delivery.id
+    save_order(order)
 
 async def send_delivery_created_notification(delivery: Delivery):
     """
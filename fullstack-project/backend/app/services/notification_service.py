@@ -5,7 +5,9 @@ This module defines notification class and its methods.
 from datetime import datetime
 from fastapi import HTTPException
 
-from app.repositories.notification_repo import load_notifications, save_notifications
+from app.repositories.notification_repo import (
+    save_notification, update_notification_record, next_notification_id
+)
 from app.realtime.connection_manager import ConnectionManager
 from app.schemas.notification_schema import Notification_Response
 
@@ -22,7 +24,7 @@ class Notification():
         is_read (bool): true if notification has been read, false otherwise
         time (str): time (YYYY/MM/DD HH:MM) that notification was sent, or time created if not yet sent
     """
-    def __init__(self, message: str, user_ids: list[str]):
+    def __init__(self, message: str, user_ids: list[str], id: int | None = None):
         """
         Creates a new notification object. It is not saved to the database until it is sent.
         id and time are set automatically, and is_read is initially set to False for all users. 
@@ -31,6 +33,7 @@ class Notification():
         Parameters:
             message (str): the body text to be sent in the notification
             user_ids (list[str]): list of users who will receive this notification when sent
+            id (int | None): the id of an existing notification. a new id is allocated if not provided
         
         Returns:
             Notification: the newly created notification object
@@ -40,7 +43,7 @@ class Notification():
         """
         if len(user_ids) == 0:
             raise HTTPException(status_code=400, detail="Notification must have at least one recipient")
-        self.id = self._get_next_id()
+        self.id = id if id is not None else self._get_next_id()
         self.message = message
         self.user_ids = user_ids
         self.is_read = {user_id: False for user_id in user_ids}
@@ -48,17 +51,14 @@ class Notification():
 
     def _get_next_id(self) -> int:
         """
-        Computes the next available identifier for a new notification object.
+        Allocates the identifier for a new notification object from the notification id sequence.
 
         Parameters: None
 
         Returns:
             int: the next available id
         """
-        notifs = load_notifications()
-        if len(notifs) == 0:
-            return 1
-        return max(notif["id"] for notif in notifs) + 1
+        return next_notification_id()
 
     @classmethod
     def model_to_Notification(cls, notif_data: Notification_Response):
@@ -73,8 +73,7 @@ class Notification():
             Notification: a Notification object with the same data as the pydantic model
         """
         notif_data = notif_data.model_dump()
-        notif = cls(notif_data["message"], notif_data["user_ids"])
-        notif.id = notif_data["id"]
+        notif = cls(notif_data["message"], notif_data["user_ids"], notif_data["id"])
         notif.is_read = notif_data["is_read"]
         notif.time = notif_data["time"]
         return notif
@@ -104,9 +103,7 @@ class Notification():
 
         Returns: None
         """
-        notifs = load_notifications()
-        notifs.append(self.to_model().model_dump())
-        save_notifications(notifs)
+        save_notification(self.to_model().model_dump())
     
     def mark_as_read(self, user_id) -> Notification_Response:
         """
@@ -121,15 +118,15 @@ class Notification():
             HTTPException (status_code = 404): if this notifications id not found in notifications.json
             HTTPException (status_code = 404): if user_id is not in list of readers (which matches recipient list)
         """
-        notifs = load_notifications()
-        for notif in notifs:
-            if notif["id"] == self.id:
-                if user_id not in notif["is_read"]:
-                    raise HTTPException(status_code=404, detail=f"User '{user_id}' cannot read notification '{self.id}'")
-                notif["is_read"][user_id] = True
-                save_notifications(notifs)
-                return self.to_model()
-        raise HTTPException(status_code=404, detail=f"Notification '{self.id}' not found")
+        def mark_read(notif: dict) -> dict:
+            if user_id not in notif["is_read"]:
+                raise HTTPException(status_code=404, detail=f"User '{user_id}' cannot read notification '{self.id}'")
+            notif["is_read"][user_id] = True
+            return notif
+
+        if update_notification_record(self.id, mark_read) is None:
+            raise HTTPException(status_code=404, detail=f"Notification '{self.id}' not found")
+        return self.to_model()
     
     async def send_to_users(self) -> None:
         """
@@ -3,11 +3,17 @@ This module implements business logic for order management.
 Any updates to order logic should follow this module.
 """
 
+import asyncio
 import datetime
 
 from fastapi import HTTPException
 
-from app.repositories.order_repo import load_orders, save_orders
+from app.repositories.archive_repo import archive_record, find_archived, get_archived, has_archived
+from app.repositories.conflicts import StorageConflictError
+from app.repositories.order_repo import get_order, save_order, update_order_record, find_orders_by, next_order_id
+from app.repositories.receipt_repo import get_receipt_by_id
+from app.repositories.unit_of_work import transaction
+from app.services.config_service import get_archive_after_days_default, get_archive_interval_default
 from app.services.restaurant_service import get_restaurant_by_id, get_managers
 from app.schemas.user_schema import Customer
 from app.services.cart_service import empty_cart
@@ -15,13 +21,16 @@ from app.services.notification_service import Notification
 from app.schemas.order_schema import Order, OrderStatus
 from app.schemas.receipt_schema import Receipt
 from app.services.receipt_service import get_receipt
+from app.services.single_flight import single_flight
 
+# orders in these statuses never change again, so they are moved to the archive once they are old enough
+FINAL_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED, OrderStatus.REJECTED)
 
 async def create_order_from_receipt(current_user: Customer, receipt: Receipt) -> Order:
     """
     Converts a receipt into a pending order after successful payment.
     Pricing and item details are stored in the receipt - the order only references the receipt id.
-    Cart is emptied once the order is saved.
+    Cart is emptied once the order is saved. The caller sends the new order's status notification.
 
     Parameters:
         current_user (Customer): the current logged-in user. must have role "customer"
@@ -29,14 +38,8 @@ async def create_order_from_receipt(current_user: Customer, receipt: Receipt) ->
 
     Returns:
         Order: the newly created order
-
-    Raises:
-        HTTPException (status_code = 409): if generated id collides with an existing order id
     """
-    orders = load_orders()
-    new_id = max((order.get("id", 0) for order in orders), default=0) + 1
-    if any(order.get("id") == new_id for order in orders):
-        raise HTTPException(status_code=409, detail="ID collision; retry.")
+    new_id = next_order_id()
 
     new_order = {
         "id": new_id,
@@ -49,18 +52,15 @@ async def create_order_from_receipt(current_user: Customer, receipt: Receipt) ->
         "date_created": datetime.datetime.now(datetime.timezone.utc).isoformat()
     }
 
-    orders.append(new_order)
-    save_orders(orders)
+    save_order(new_order)
     empty_cart(current_user)
 
-    created_order = Order(**new_order)
-    await send_status_notification(created_order)
-
-    return created_order
+    return Order(**new_order)
 
+@single_flight
 def get_order_by_id(order_id: int) -> Order:
     """
-    Retrieves an order by its identifier.
+    Retrieves an order by its identifier, looking in the archive if it is no longer active.
 
     Parameters:
         order_id (int): the identifier of the order to retrieve
@@ -71,11 +71,10 @@ def get_order_by_id(order_id: int) -> Order:
     Raises:
         HTTPException (status_code = 404): if no order with the provided id exists
     """
-    orders = load_orders()
-    for order in orders:
-        if order.get("id") == order_id:
-            return Order(**order)
-    raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+    order = get_order(order_id) or get_archived("orders", order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+    return Order(**order)
 
 def get_orders_for_customer(current_customer: Customer) -> list[Order]:
     """
@@ -87,10 +86,11 @@ def get_orders_for_customer(current_customer: Customer) -> list[Order]:
     Returns:
         list[Order]: a list of all orders this customer has placed
     """
-    orders = load_orders()
-    return [Order(**order) for order in orders if order.get("customer_id") == current_customer.id]
+    orders = find_orders_by("customer_id", current_customer.id)
+    return [Order(**order) for order in orders]
 
 
+@single_flight
 def get_orders_for_restaurant(restaurant_id: int, manager_id: str) -> list[Order]:
     """
     Retrieves all orders associated with a restaurant.
@@ -111,8 +111,138 @@ def get_orders_for_restaurant(restaurant_id: int, manager_id: str) -> list[Order
     if manager_id not in restaurant.manager_ids:
         raise HTTPException(status_code=403, detail="Unauthorized to view orders for this restaurant.")
 
-    orders = load_orders()
-    return [Order(**order) for order in orders if order.get("restaurant_id") == restaurant_id]
+    orders = find_orders_by("restaurant_id", restaurant_id)
+    return [Order(**order) for order in orders]
+
+
+def has_placed_orders(current_customer: Customer) -> bool:
+    """
+    Checks whether a customer has ever placed an order, including orders that have been archived.
+
+    Parameters:
+        current_customer (Customer): the customer to check
+
+    Returns:
+        bool: True if the customer has an active or archived order
+    """
+    if find_orders_by("customer_id", current_customer.id):
+        return True
+    return has_archived("orders", "customer_id", current_customer.id)
+
+
+def _archived_orders(field: str, value, month: str | None) -> list[Order]:
+    """
+    Retrieves the archived orders whose field matches the value, from one month or from the whole archive.
+
+    Raises:
+        HTTPException (status_code = 400): if month is not in YYYY-MM format
+    """
+    try:
+        orders = find_archived("orders", field, value, [month] if month is not None else None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Month '{month}' must be in YYYY-MM format.")
+    return [Order(**order) for order in orders]
+
+
+def get_archived_orders_for_customer(current_customer: Customer, month: str | None = None) -> list[Order]:
+    """
+    Retrieves the archived orders placed by the provided customer.
+
+    Parameters:
+        current_customer (Customer): the current logged-in user. must have role "customer"
+        month (str | None): the month the orders were placed in, as YYYY-MM. every month if not provided
+
+    Returns:
+        list[Order]: the customer's archived orders, oldest month first
+
+    Raises:
+        HTTPException (status_code = 400): if month is not in YYYY-MM format
+    """
+    return _archived_orders("customer_id", current_customer.id, month)
+
+
+def get_archived_orders_for_restaurant(restaurant_id: int, manager_id: str, month: str | None = None) -> list[Order]:
+    """
+    Retrieves the archived orders of a restaurant.
+    May only be accessed by a valid manager of that restaurant.
+
+    Parameters:
+        restaurant_id (int): the identifier of the restaurant
+        manager_id (str): the identifier of the manager making the request
+        month (str | None): the month the orders were placed in, as YYYY-MM. every month if not provided
+
+    Returns:
+        list[Order]: the restaurant's archived orders, oldest month first
+
+    Raises:
+        HTTPException (status_code = 400): if month is not in YYYY-MM format
+        HTTPException (status_code = 403): if the manager is not associated with this restaurant
+        HTTPException (status_code = 404): if restaurant_id is not found
+    """
+    restaurant = get_restaurant_by_id(restaurant_id)
+    if manager_id not in restaurant.manager_ids:
+        raise HTTPException(status_code=403, detail="Unauthorized to view orders for this restaurant.")
+    return _archived_orders("restaurant_id", restaurant_id, month)
+
+
+def _created_at(order: dict) -> datetime.datetime | None:
+    """Returns when an order was created, as an aware datetime, or None if it has no valid date."""
+    try:
+        created = datetime.datetime.fromisoformat(order.get("date_created") or "")
+    except ValueError:
+        return None
+    return created if created.tzinfo is not None else created.replace(tzinfo=datetime.timezone.utc)
+
+
+def archive_old_orders(now: datetime.datetime | None = None) -> int:
+    """
+    Moves delivered, cancelled and rejected orders created more than ARCHIVE_AFTER_DAYS ago, and their receipts,
+    into the archive partition of the month they were created in. All moves are saved together.
+
+    Parameters:
+        now (datetime.datetime | None): the current time, defaults to now
+
+    Returns:
+        int: the number of orders archived
+
+    Raises:
+        StorageConflictError: if another request changed the same records while they were being archived
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(days=get_archive_after_days_default())
+    with transaction():
+        # read inside the transaction, so an order changed by another request before the commit is not archived
+        due = []
+        for status in FINAL_STATUSES:
+            for order in find_orders_by("status", status):
+                created = _created_at(order)
+                if created is not None and created < cutoff:
+                    due.append((created.strftime("%Y-%m"), order))
+        for month, order in due:
+            archive_record("orders", month, order)
+            receipt = get_receipt_by_id(order["receipt_id"], include_archived=False)
+            if receipt is not None:
+                archive_record("receipts", month, receipt)
+    return len(due)
+
+
+async def archive_orders_periodically() -> None:
+    """
+    Runs archive_old_orders every ARCHIVE_INTERVAL_SECONDS until cancelled. Started when the app starts.
+
+    Parameters: None
+
+    Returns: None
+    """
+    while True:
+        interval = get_archive_interval_default()
+        if interval > 0:
+            try:
+                await asyncio.to_thread(archive_old_orders)
+            except StorageConflictError:
+                # another worker archived at the same time, whatever is left is picked up next time
+                pass
+        await asyncio.sleep(interval if interval > 0 else 60)
 
 
 async def cancel_order(order_id: int, current_user: Customer) -> Order:
@@ -132,24 +262,22 @@ async def cancel_order(order_id: int, current_user: Customer) -> Order:
         HTTPException (status_code = 400): if the order status is not "pending"
         HTTPException (status_code = 404): if the order is not found
     """
-    orders = load_orders()
+    order_data = get_order(order_id)
+    if order_data is None:
+        raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
 
-    for order_data in orders:
-        if order_data.get("id") == order_id:
-            order = Order(**order_data)
-            if order.customer_id != current_user.id:
-                raise HTTPException(status_code=403, detail="You are not authorized to cancel this order.")
-            if order.status != OrderStatus.PENDING:
-                raise HTTPException(status_code=400, detail=f"Order cannot be cancelled, order is already '{order.status}'.")
+    order = Order(**order_data)
+    if order.customer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="You are not authorized to cancel this order.")
+    if order.status != OrderStatus.PENDING:
+        raise HTTPException(status_code=400, detail=f"Order cannot be cancelled, order is already '{order.status}'.")
 
-            order.status = OrderStatus.CANCELLED
-            order_data["status"] = OrderStatus.CANCELLED
-            save_orders(orders)
-            await send_status_notification(order)
-            await send_refund_notification(order, "Order cancelled by customer")
-            return order
-
-    raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+    order.status = OrderStatus.CANCELLED
+    order_data["status"] = OrderStatus.CANCELLED
+    save_order(order_data)
+    await send_status_notification(order)
+    await send_refund_notification(order, "Order cancelled by customer")
+    return order
 
 
 async def accept_reject_order(order_id: int, new_status: str, manager_id: str) -> Order:
@@ -176,56 +304,54 @@ async def accept_reject_order(order_id: int, new_status: str, manager_id: str) -
     from app.services.delivery_service import (
         create_delivery, set_driver_status_to_delivering, find_available_driver, get_required_vehicle
     )
-    orders = load_orders()
-
-    for order_data in orders:
-        if order_data.get("id") == order_id:
-            order = Order(**order_data)
-            restaurant = get_restaurant_by_id(order.restaurant_id)
-            if manager_id not in restaurant.manager_ids:
-                raise HTTPException(status_code=403, detail="You are not authorized to manage orders for this restaurant.")
-
-            current_status = order.status
-            if current_status != OrderStatus.PENDING:
-                raise HTTPException(status_code=400, detail=f"Order cannot be updated - current status is '{current_status}'.")
-
-            if new_status == OrderStatus.REJECTED:
-                order.status = OrderStatus.REJECTED
-                order_data["status"] = OrderStatus.REJECTED
-                save_orders(orders)
-                await send_status_notification(order)
-                await send_refund_notification(order, f"Rejected by restaurant")
-                return order
-
-            distance_km = order.distance_km
-            delivery_radius = restaurant.max_delivery_radius_km
-            if delivery_radius > 0 and distance_km > delivery_radius:
-                order.status = OrderStatus.REJECTED
-                order_data["status"] = OrderStatus.REJECTED
-                save_orders(orders)
-                await send_status_notification(order)
-                await send_refund_notification(order, "Restaurant max delivery distance exceeded")
-                return order
-
-            required_vehicle = get_required_vehicle(distance_km)
-            driver = find_available_driver(required_vehicle)
-
-            if driver:
-                delivery = await create_delivery(order_id, driver.id, distance_km)
-                set_driver_status_to_delivering(driver.id)
-                order.status = OrderStatus.PREPARING
-                order.delivery_id = delivery.id
-                order_data["status"] = OrderStatus.PREPARING
-                order_data["delivery_id"] = delivery.id
-            else:
-                order.status = OrderStatus.WAITING_FOR_DRIVER
-                order_data["status"] = OrderStatus.WAITING_FOR_DRIVER
-
-            save_orders(orders)
-            await send_status_notification(order)
-            return order
-
-    raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+    order_data = get_order(order_id)
+    if order_data is None:
+        raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+
+    order = Order(**order_data)
+    restaurant = get_restaurant_by_id(order.restaurant_id)
+    if manager_id not in restaurant.manager_ids:
+        raise HTTPException(status_code=403, detail="You are not authorized to manage orders for this restaurant.")
+
+    current_status = order.status
+    if current_status != OrderStatus.PENDING:
+        raise HTTPException(status_code=400, detail=f"Order cannot be updated - current status is '{current_status}'.")
+
+    if new_status == OrderStatus.REJECTED:
+        order.status = OrderStatus.REJECTED
+        order_data["status"] = OrderStatus.REJECTED
+        save_order(order_data)
+        await send_status_notification(order)
+        await send_refund_notification(order, f"Rejected by restaurant")
+        return order
+
+    distance_km = order.distance_km
+    delivery_radius = restaurant.max_delivery_radius_km
+    if delivery_radius > 0 and distance_km > delivery_radius:
+        order.status = OrderStatus.REJECTED
+        order_data["status"] = OrderStatus.REJECTED
+        save_order(order_data)
+        await send_status_notification(order)
+        await send_refund_notification(order, "Restaurant max delivery distance exceeded")
+        return order
+
+    required_vehicle = get_required_vehicle(distance_km)
+    driver = find_available_driver(required_vehicle)
+
+    if driver:
+        delivery = await create_delivery(order_id, driver.id, distance_km)
+        set_driver_status_to_delivering(driver.id)
+        order.status = OrderStatus.PREPARING
+        order.delivery_id = delivery.id
+        order_data["status"] = OrderStatus.PREPARING
+        order_data["delivery_id"] = delivery.id
+    else:
+        order.status = OrderStatus.WAITING_FOR_DRIVER
+        order_data["status"] = OrderStatus.WAITING_FOR_DRIVER
+
+    save_order(order_data)
+    await send_status_notification(order)
+    return order
 
 async def mark_order_ready(order_id: int, manager_id: str) -> Order:
     """
@@ -244,21 +370,21 @@ async def mark_order_ready(order_id: int, manager_id: str) -> Order:
         HTTPException (status_code = 400): if the order status is not "preparing"
         HTTPException (status_code = 404): if the order or restaurant is not found
     """
-    orders = load_orders()
-    for order_data in orders:
-        if order_data.get("id") == order_id:
-            order = Order(**order_data)
-            restaurant = get_restaurant_by_id(order.restaurant_id)
-            if manager_id not in restaurant.manager_ids:
-                raise HTTPException(status_code=403, detail="You are not authorized to manage orders for this restaurant.")
-            if order.status != OrderStatus.PREPARING:
-                raise HTTPException(status_code=400, detail=f"Order must be 'preparing' to mark ready, current status: '{order.status}'.")
-            order.status = OrderStatus.READY
-            order_data["status"] = OrderStatus.READY
-            save_orders(orders)
-            await send_status_notification(order)
-            return order
-    raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+    order_data = get_order(order_id)
+    if order_data is None:
+        raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+
+    order = Order(**order_data)
+    restaurant = get_restaurant_by_id(order.restaurant_id)
+    if manager_id not in restaurant.manager_ids:
+        raise HTTPException(status_code=403, detail="You are not authorized to manage orders for this restaurant.")
+    if order.status != OrderStatus.PREPARING:
+        raise HTTPException(status_code=400, detail=f"Order must be 'preparing' to mark ready, current status: '{order.status}'.")
+    order.status = OrderStatus.READY
+    order_data["status"] = OrderStatus.READY
+    save_order(order_data)
+    await send_status_notification(order)
+    return order
 
 async def send_status_notification(order: Order) -> None:
     """
@@ -308,7 +434,7 @@ async def send_refund_notification(order: Order, reason: str = None) -> None:
 
 def _set_order_status(order_id: int, status: OrderStatus) -> Order:
     """
-    Updates the status of an order.
+    Updates the status of an order with a conditional write, retried if the order changed concurrently.
 
     Parameters:
         order_id (int): the identifier of the order to update
@@ -320,11 +446,11 @@ def _set_order_status(order_id: int, status: OrderStatus) -> Order:
     Raises:
         HTTPException (status_code = 404): if order is not found
     """
-    orders = load_orders()
-    for order in orders:
-        if order.get("id") == order_id:
-            order["status"] = status
-            save_orders(orders)
-            return Order(**order)
-
-    raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
\ No newline at end of file
+    def set_status(order: dict) -> dict:
+        order["status"] = status
+        return order
+
+    order = update_order_record(order_id, set_status)
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"Order '{order_id}' not found.")
+    return Order(**order)
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+This module benchmarks password checking at different costs, to help choose PASSWORD_HASH_ITERATIONS.
+
+A burst of logins is simulated by checking the same number of passwords at once through the password worker pool,
+the way login_user does. The result is the most logins per second the pool can sustain at each cost. The rest of a
+login (the email lookup and saving the session) is not included, since it does not depend on the cost.
+
+Usage (from the backend directory):
+    python -m app.services.password_benchmark                          # the default costs
+    python -m app.services.password_benchmark --costs 100000 600000 --logins 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.services.password_service import hash_password, verify_password_async
+
+DEFAULT_COSTS = [10000, 100000, 310000, 600000]
+DEFAULT_LOGINS = 20
+
+
+async def _burst(stored: str, logins: int) -> None:
+    """Checks a password as many times as there are logins, all at once."""
+    results = await asyncio.gather(*(verify_password_async("Password123", stored) for _ in range(logins)))
+    if not all(results):
+        raise RuntimeError("A password check failed during the benchmark")
+
+
+def benchmark(costs: list[int], logins: int = DEFAULT_LOGINS) -> dict[int, float]:
+    """
+    Measures how many logins per second the password pool can check at each cost.
+
+    Parameters:
+        costs (list[int]): the pbkdf2 iteration counts to measure
+        logins (int): the number of logins in each burst
+
+    Returns:
+        dict[int, float]: the logins per second, by cost
+    """
+    rates = {}
+    for cost in costs:
+        stored = hash_password("Password123", iterations=cost)
+        started = time.perf_counter()
+        asyncio.run(_burst(stored, logins))
+        rates[cost] = logins / (time.perf_counter() - started)
+    return rates
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Runs the benchmark from the command line, printing a line per cost.
+
+    Parameters:
+        argv (list[str] | None): the command line arguments, read from sys.argv if not provided
+
+    Returns: None
+    """
+    parser = argparse.ArgumentParser(description="Measure logins per second at different password hashing costs.")
+    parser.add_argument("--costs", type=int, nargs="+", default=DEFAULT_COSTS, help="pbkdf2 iteration counts")
+    parser.add_argument("--logins", type=int, default=DEFAULT_LOGINS, help="logins in each burst")
+    args = parser.parse_args(argv)
+    for cost, rate in benchmark(args.costs, args.logins).items():
+        print(f"{cost:>9} iterations: {rate:8.1f} logins/s (one every {1000 / rate:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
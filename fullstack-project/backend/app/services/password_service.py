@@ -0,0 +1,162 @@
+"""
+This module hashes and verifies user passwords.
+
+Passwords are stored as "pbkdf2_sha256$<iterations>$<salt>$<hash>", derived with hashlib.pbkdf2_hmac. The number of
+iterations is the cost: PASSWORD_HASH_ITERATIONS sets it for new hashes, and with PASSWORD_REHASH_ON_LOGIN a user's
+password is hashed again at the new cost the next time they log in. Passwords stored before hashing was added are
+plain text; they are still accepted, and rehashed on login in the same way.
+
+Hashing is deliberately slow, so it never runs on the event loop or the request threads: every hash and check is
+done by a small pool of PASSWORD_HASH_WORKERS threads (pbkdf2_hmac releases the GIL, so they run in parallel).
+The pool bounds the CPU a burst of logins can take, and login awaits it without holding a request thread,
+so the other requests are still served.
+"""
+
+import asyncio
+import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import hmac
+import secrets
+import threading
+from typing import Callable
+
+from app.services.config_service import (
+    get_password_hash_iterations_default, get_password_hash_workers_default, get_password_rehash_on_login_default,
+)
+
+PASSWORD_SCHEME = "pbkdf2_sha256"
+SALT_BYTES = 16
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_dummy_hash: str | None = None
+
+
+def _workers() -> ThreadPoolExecutor:
+    """Returns the pool passwords are hashed in, starting it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=get_password_hash_workers_default(),
+                                           thread_name_prefix="password")
+    return _pool
+
+
+def _submit(function: Callable, *args) -> Future:
+    """Runs a function in the pool."""
+    return _workers().submit(function, *args)
+
+
+def _derive(password: str, salt: bytes, iterations: int) -> bytes:
+    """Derives the hash of a password, the slow part of hashing and checking."""
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def _hash(password: str, iterations: int) -> str:
+    """Hashes a password with a new salt, returning it in the stored format."""
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _derive(password, salt, iterations)
+    encoded_salt, encoded_digest = base64.b64encode(salt).decode(), base64.b64encode(digest).decode()
+    return "$".join((PASSWORD_SCHEME, str(iterations), encoded_salt, encoded_digest))
+
+
+def _verify(password: str, stored: str) -> bool:
+    """Checks a password against a stored hash, in constant time."""
+    parts = stored.split("$")
+    try:
+        if len(parts) == 4 and parts[0] == PASSWORD_SCHEME:
+            _, iterations, salt, digest = parts
+            return hmac.compare_digest(
+                _derive(password, base64.b64decode(salt), int(iterations)), base64.b64decode(digest)
+            )
+    except ValueError:
+        # shaped like a hash but not one
+        pass
+    # a password stored before hashing was added
+    return hmac.compare_digest(password.encode(), stored.encode())
+
+
+def hash_password(password: str, iterations: int | None = None) -> str:
+    """
+    Hashes a password in the worker pool, waiting for the result.
+
+    Parameters:
+        password (str): the password
+        iterations (int | None): the cost, PASSWORD_HASH_ITERATIONS if not provided
+
+    Returns:
+        str: the hash to store
+    """
+    return _submit(_hash, password, iterations or get_password_hash_iterations_default()).result()
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """
+    Checks a password against a stored hash in the worker pool, waiting for the result.
+
+    Parameters:
+        password (str): the password entered
+        stored (str): the stored hash, or a plain text password stored before hashing was added
+
+    Returns:
+        bool: True if the password matches
+    """
+    return _submit(_verify, password, stored).result()
+
+
+async def hash_password_async(password: str, iterations: int | None = None) -> str:
+    """
+    Hashes a password in the worker pool, without blocking the event loop or a request thread while it waits.
+
+    Parameters:
+        password (str): the password
+        iterations (int | None): the cost, PASSWORD_HASH_ITERATIONS if not provided
+
+    Returns:
+        str: the hash to store
+    """
+    return await asyncio.wrap_future(_submit(_hash, password, iterations or get_password_hash_iterations_default()))
+
+
+async def verify_password_async(password: str, stored: str | None) -> bool:
+    """
+    Checks a password in the worker pool, without blocking the event loop or a request thread while it waits.
+    Without a stored hash, a dummy one is checked instead, so unknown emails take as long as wrong passwords.
+
+    Parameters:
+        password (str): the password entered
+        stored (str | None): the stored hash, or None if there is no such user
+
+    Returns:
+        bool: True if the password matches
+    """
+    global _dummy_hash
+    if stored is None:
+        if _dummy_hash is None:
+            _dummy_hash = await hash_password_async(secrets.token_urlsafe(16))
+        await asyncio.wrap_future(_submit(_verify, "", _dummy_hash))
+        return False
+    return await asyncio.wrap_future(_submit(_verify, password, stored))
+
+
+def needs_rehash(stored: str) -> bool:
+    """
+    Tells whether a stored password should be hashed again when the user next logs in:
+    it is plain text, or was hashed at another cost than PASSWORD_HASH_ITERATIONS.
+
+    Parameters:
+        stored (str): the stored hash
+
+    Returns:
+        bool: True if PASSWORD_REHASH_ON_LOGIN is on and the stored password is outdated
+    """
+    if not get_password_rehash_on_login_default():
+        return False
+    parts = stored.split("$")
+    try:
+        return len(parts) != 4 or parts[0] != PASSWORD_SCHEME or int(parts[1]) != get_password_hash_iterations_default()
+    except ValueError:
+        # not a hash after all, like a password stored before hashing was added
+        return True
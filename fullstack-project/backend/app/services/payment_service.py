@@ -14,7 +14,8 @@ from app.schemas.payment_schema import (
     PaymentResponse
 )
 from app.schemas.receipt_schema import Receipt
-from app.services.order_service import create_order_from_receipt
+from app.repositories.unit_of_work import transaction
+from app.services.order_service import create_order_from_receipt, send_status_notification
 from app.services.notification_service import Notification
 from app.services.receipt_service import refresh_receipt, get_receipt
 from app.services.restaurant_service import get_restaurant_by_id
@@ -140,7 +141,11 @@ async def checkout(receipt_id: int, current_user: Customer) -> OrderPaymentRespo
     2. Loads and validates the receipt
     3. Checks updates on delivery fee and taxes, refresh receipt
     4. Create order if payment is successful
-    6. Redeems promo code if any was applied
+    5. Redeems promo code if any was applied
+    6. Notifies the customer and restaurant of the new order
+
+    Steps 4 and 5 run as one unit of work: the wallet, cart, order and promo code changes are written together once
+    everything succeeded, with one write per collection, and none of them are written if any step fails.
 
     Parameters:
         receipt_id (int): the identifier of the receipt to be paid for
@@ -153,6 +158,7 @@ async def checkout(receipt_id: int, current_user: Customer) -> OrderPaymentRespo
         HTTPException (status_code = 400): if duplicate payments or failed payment validation
         HTTPException (status_code = 404): if user id is not found
         HTTPException (status_code = 409): if either the delivery fee or tax rate has changed since the receipt was created. Will auto-refresh the receipt.
+        StorageConflictError: if the customer's wallet or the promo code was changed by another request during checkout
     """
     receipt = get_receipt(receipt_id)
     await _check_duplicate(receipt_id, current_user)
@@ -161,12 +167,15 @@ async def checkout(receipt_id: int, current_user: Customer) -> OrderPaymentRespo
  
     try:
         await _check_fees(receipt, current_user)
-        withdraw_from_wallet(receipt.total, current_user)
+        with transaction():
+            withdraw_from_wallet(receipt.total, current_user)
+
+            order = await create_order_from_receipt(current_user, receipt)
 
-        order = await create_order_from_receipt(current_user, receipt)
+            if receipt.promo_code:
+                redeem_promo(receipt.promo_code, current_user.id)
 
-        if receipt.promo_code:
-            redeem_promo(receipt.promo_code, current_user.id)
+        await send_status_notification(order)
 
         return OrderPaymentResponse(
             payment_status="success",
@@ -7,7 +7,7 @@ import datetime
 
 from fastapi import HTTPException
 
-from app.repositories.promo_repo import load_promo_codes, save_promo_codes
+from app.repositories.promo_repo import load_promo_codes, save_promo_codes, update_promo_record
 from app.schemas.promo_schema import PromoCode, PromoType, PromoPublic, PromoCode_Create
 from app.schemas.user_schema import Customer
 
@@ -116,9 +116,8 @@ def validate_promo(code: str, subtotal: float, current_user: Customer) -> PromoC
         raise HTTPException(status_code=400, detail="You have already used this promo code.")
 
     if promo.is_first_order_only:
-        from app.services.order_service import get_orders_for_customer
-        past_orders = get_orders_for_customer(current_user)
-        if len(past_orders) > 0:
+        from app.services.order_service import has_placed_orders
+        if has_placed_orders(current_user):
             raise HTTPException(status_code=400, detail="This promo code is only valid on your first order.")
 
     return promo
@@ -157,7 +156,7 @@ def redeem_promo(code: str, customer_id: str) -> None:
     """
     **Records a promo code redemption after a successful payment.**
     Adds the customer to the used_by list and deactivates code
-    Called by payment_service after checkout succeeds.
+    Called by payment_service after checkout succeeds. The promo code is updated with a conditional write.
 
     Parameters:
         code (str): the promo code string that was redeemed
@@ -166,15 +165,17 @@ def redeem_promo(code: str, customer_id: str) -> None:
     Returns:
         None
     """
-    promos = load_promo_codes()
-    for promo in promos:
+    def redeem(promo: dict) -> dict:
+        used_by = promo.get("used_by_customer_ids", [])
+        if customer_id not in used_by:
+            used_by.append(customer_id)
+        promo["used_by_customer_ids"] = used_by
+        promo["is_active"] = False
+        return promo
+
+    for promo in load_promo_codes():
         if promo.get("code", "").upper() == code.strip().upper():
-            used_by = promo.get("used_by_customer_ids", [])
-            if customer_id not in used_by:
-                used_by.append(customer_id)
-            promo["used_by_customer_ids"] = used_by
-            promo["is_active"] = False
-            save_promo_codes(promos)
+            update_promo_record(promo["id"], redeem)
             return
 
 
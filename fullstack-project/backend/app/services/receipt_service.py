@@ -11,11 +11,12 @@ from fastapi import HTTPException
 from app.schemas.user_schema import Customer
 from app.schemas.receipt_schema import Receipt, ReceiptItem
 from app.schemas.restaurant_schema import Combo, ComboType, MenuItem
-from app.repositories.receipt_repo import load_receipts, save_receipts
+from app.repositories.receipt_repo import get_receipt_by_id, save_receipt, next_receipt_id
 from app.services.cart_service import get_cart
 from app.services.restaurant_service import get_restaurant_by_id
 from app.services.config_service import get_tax_rate
 from app.services.promo_service import validate_promo, calculate_discount
+from app.services.single_flight import single_flight
 
 
 def _calculate_combo_discount(cart_item_qty: dict[int, int], combos: list[Combo], menu_items: dict[int, MenuItem]) -> float:
@@ -96,8 +97,7 @@ def create_receipt(current_user: Customer, distance_km: float = 0.0) -> Receipt:
         
     total = round(subtotal + tax + delivery_fee - discount, 2)
 
-    receipts = load_receipts()
-    new_id = max((r.get("id", 0) for r in receipts), default=0) + 1
+    new_id = next_receipt_id()
 
     new_receipt = Receipt(
         id=new_id,
@@ -113,11 +113,11 @@ def create_receipt(current_user: Customer, distance_km: float = 0.0) -> Receipt:
         total=total,
     )
 
-    receipts.append(new_receipt.model_dump())
-    save_receipts(receipts)
+    save_receipt(new_receipt.model_dump())
 
     return new_receipt
 
+@single_flight
 def get_receipt(receipt_id: int) -> Receipt:
     """
     **Retrieves a saved receipt by its identifier.**
@@ -131,11 +131,10 @@ def get_receipt(receipt_id: int) -> Receipt:
     Raises:
         **HTTPException** (status_code = 404): if receipt is not found
     """
-    receipts = load_receipts()
-    for receipt in receipts:
-        if receipt.get("id") == receipt_id:
-            return Receipt(**receipt)
-    raise HTTPException(status_code=404, detail=f"Receipt '{receipt_id}' not found.")
+    receipt = get_receipt_by_id(receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail=f"Receipt '{receipt_id}' not found.")
+    return Receipt(**receipt)
 
 def refresh_receipt(receipt_id: int, current_user: Customer) -> Receipt:
     """
@@ -1,5 +1,10 @@
 """ This module implements business logic for restaurant management. """
 
+import base64
+import heapq
+import json
+import time
+
 from fastapi import Depends, HTTPException
 from app.schemas.restaurant_schema import (
     Combo,
@@ -17,7 +22,13 @@ from app.schemas.restaurant_schema import (
     Restaurant_Search,
     PaginatedRestaurantResults
 )
-from app.repositories.restaurant_repo import load_restaurants, save_restaurants
+from app.repositories.restaurant_repo import (
+    load_restaurants, get_restaurant, save_restaurant, next_restaurant_id, find_restaurants_containing,
+    load_restaurants_by_price,
+)
+from app.repositories.search_cache import search_cache
+from app.services.config_service import get_search_cache_ttl_default
+from app.services.single_flight import single_flight
 from app.auth import require_role
 from app.schemas.user_schema import User, UserRole
 
@@ -30,21 +41,24 @@ def _address_to_dict(address) -> dict:
         "postal_code": address.postal_code
     }
 
-def _calculate_average_price(restaurant: dict) -> float:
+def _update_menu_price(restaurant: dict, added: list[float] = (), removed: list[float] = ()) -> None:
     """
-    Computes the average price of all menu items for a given restaurant dictionary.
+    Updates the running total and count of a restaurant's menu item prices, and the average price
+    restaurants are sorted by, without summing the whole menu again.
 
     Parameters:
-        restaurant (dict): the restaurant whose average item price is desired
-    
-    Returns:
-        float: the average price of all menu items, 0 if no menu items exist
+        restaurant (dict): the restaurant whose menu changed
+        added (list[float]): the prices of the items added to the menu, and the new prices of updated items
+        removed (list[float]): the prices of the items removed from the menu, and the old prices of updated items
+
+    Returns: None
     """
-    items = restaurant.get("menu",{}).get("items", [])
-    if not items:
-        return 0.0
-    total_price = sum(item.get("price", 0) for item in items)
-    return total_price / len(items)
+    # rounded so the small errors of adding and subtracting floats do not build up over many updates
+    total = round(restaurant.get("menu_price_total", 0.0) + sum(added) - sum(removed), 6)
+    count = restaurant.get("menu_item_count", 0) + len(added) - len(removed)
+    restaurant["menu_price_total"] = total
+    restaurant["menu_item_count"] = count
+    restaurant["average_price"] = total / count if count else 0.0
 
 def _validate_combo_item_ids(restaurant: dict, item_ids: list[int]) -> None:
     """
@@ -57,7 +71,7 @@ def _validate_combo_item_ids(restaurant: dict, item_ids: list[int]) -> None:
     Raises:
         HTTPException (status_code = 400): if any item id in item_ids is not found in restaurant's menu items. Returns a sorted list of offending ids.
     """
-    valid_item_ids = {item.get("id") for item in restaurant.get("menu", {}).get("items", [])}
+    valid_item_ids = {item["id"] for item in restaurant["menu"]["items"]}
     invalid = sorted({item_id for item_id in item_ids if item_id not in valid_item_ids})
     if invalid:
         raise HTTPException(
@@ -65,20 +79,16 @@ def _validate_combo_item_ids(restaurant: dict, item_ids: list[int]) -> None:
             detail=f"Combo contains unknown menu item ids: {invalid}"
         )
 
-def get_new_id(restaurants) -> int:
+def get_new_id() -> int:
     """
-    Generates the next available id for the next restaurant to be created based on the given list of restaurants.
+    Allocates the id for the next restaurant to be created.
 
-    Parameters:
-        restaurants (list[dict]): list of all restaurants in restaurants.json
+    Parameters: None
     
     Returns:
         int: the next available restaurant id
     """
-    new_id = max((restaurant.get("id", 0) for restaurant in restaurants), default=0) + 1
-    if any(restaurant.get("id") == new_id for restaurant in restaurants):
-        raise HTTPException(status_code=409, detail="ID collision; retry.")
-    return new_id
+    return next_restaurant_id()
 
 def create_restaurant(payload: Restaurant_Create, manager_id: str) -> Restaurant:
     """
@@ -92,8 +102,7 @@ def create_restaurant(payload: Restaurant_Create, manager_id: str) -> Restaurant
     Returns:   
         Restaurant: the newly created restaurant
     """
-    restaurants = load_restaurants()
-    new_id = get_new_id(restaurants)
+    new_id = get_new_id()
 
     menu_items = [{
         "id": idx + 1, **item.model_dump()}
@@ -131,58 +140,165 @@ def create_restaurant(payload: Restaurant_Create, manager_id: str) -> Restaurant
             "combos": combos,
         }
     }
-    restaurants.append(new_restaurant)
-    save_restaurants(restaurants)
+    _update_menu_price(new_restaurant, added=[item["price"] for item in menu_items])
+    save_restaurant(new_restaurant)
     return Restaurant(**new_restaurant)
 
+def _average_price(restaurant: dict) -> float:
+    """
+    Returns the average price of a restaurant's menu items, from the menu itself for a restaurant stored
+    before the average was recorded.
+    """
+    if "average_price" in restaurant:
+        return restaurant["average_price"]
+    prices = [item.get("price", 0) for item in restaurant.get("menu", {}).get("items", [])]
+    return sum(prices) / len(prices) if prices else 0.0
+
+def _search_key(restaurant: dict, sort_price: str | None) -> tuple:
+    """
+    Returns the key restaurants are ordered by in search results: the average price, or its negation for
+    descending order, then the id, so every restaurant has its own place in the order.
+    """
+    if sort_price == "asc":
+        return (_average_price(restaurant), restaurant["id"])
+    if sort_price == "desc":
+        return (-_average_price(restaurant), restaurant["id"])
+    return (restaurant["id"],)
+
+def _encode_cursor(sort_price: str | None, key: tuple) -> str:
+    """Returns the opaque cursor pointing after the restaurant with the given search key."""
+    return base64.urlsafe_b64encode(json.dumps([sort_price, list(key)]).encode()).decode()
+
+def _decode_cursor(cursor: str, sort_price: str | None) -> tuple:
+    """
+    Returns the search key a cursor points after.
+
+    Raises:
+        HTTPException (status_code = 400): the cursor is invalid, or was issued for another sort order
+    """
+    try:
+        issued_for, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key = tuple(key)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not all(isinstance(value, (int, float)) for value in key):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if issued_for != sort_price or len(key) != (1 if sort_price is None else 2):
+        raise HTTPException(status_code=400, detail="Cursor was issued for another sort order")
+    return key
+
+def _matching_restaurants(text_filters: list[tuple[str, str]], province: str | None) -> list[dict]:
+    """
+    Returns every restaurant matching the search filters, in insertion order.
+
+    Parameters:
+        text_filters (list[tuple[str, str]]): (dotted path, text) pairs the restaurants must contain, ignoring case
+        province (str | None): the province the restaurants must be in, if any
+
+    Returns:
+        list[dict]: the matching restaurants
+    """
+    # the text filters are answered by the trigram index, and only the restaurants matching all of them are kept
+    matches = [find_restaurants_containing(field, text) for field, text in text_filters]
+    if matches:
+        matches.sort(key=len)
+        ids = [{restaurant["id"] for restaurant in match} for match in matches[1:]]
+        restaurants = [restaurant for restaurant in matches[0] if all(restaurant["id"] in match for match in ids)]
+    else:
+        restaurants = load_restaurants()
+    return [
+        restaurant for restaurant in restaurants
+        if not province or province.upper() == restaurant.get("address", {}).get("province", "").upper()
+    ]
+
+def _search_page(payload: Restaurant_Search, text_filters: list[tuple[str, str]]) -> tuple[list[dict], int, bool]:
+    """
+    Finds the restaurants on the page of search results asked for, by number or by cursor.
+    Without sort_price, restaurants are ordered by id.
+
+    Parameters:
+        payload (Restaurant_Search): the search criteria
+        text_filters (list[tuple[str, str]]): (dotted path, text) pairs the restaurants must contain, ignoring case
+
+    Returns:
+        tuple[list[dict], int, bool]: the restaurants on the page, the number of matching restaurants,
+        and whether any come after the page
+
+    Raises:
+        HTTPException (status_code = 400): the cursor is invalid, or was issued for another sort order
+    """
+    start = (payload.page - 1) * payload.page_size
+    end = start + payload.page_size
+    key = lambda restaurant: _search_key(restaurant, payload.sort_price)
+    if payload.sort_price and not text_filters and not payload.province and payload.cursor is None:
+        # every restaurant matches, so the page is read straight from the order of their average prices
+        page, total = load_restaurants_by_price(payload.sort_price == "desc", start, end)
+        return page, total, end < total
+    results = _matching_restaurants(text_filters, payload.province)
+    if payload.cursor is not None:
+        # the page is the page_size restaurants right after the cursor, however deep it is
+        after = _decode_cursor(payload.cursor, payload.sort_price)
+        remaining = [restaurant for restaurant in results if key(restaurant) > after]
+        page = heapq.nsmallest(payload.page_size, remaining, key=key)
+        return page, len(results), len(remaining) > payload.page_size
+    # only the first pages are ever asked for by number, so a heap of end restaurants beats a full sort
+    return heapq.nsmallest(end, results, key=key)[start:], len(results), end < len(results)
+
+@single_flight
 def search_restaurants(payload: Restaurant_Search) -> PaginatedRestaurantResults:
     """
     Searches for restaurants by the filters provided in Restaurant_Search.
     May be sorted ascending, descending, or not sorted at all, depending on what is specified in payload.
+    Returns the page asked for by number, or the page after the cursor if one is provided.
+    Each page of results is cached for SEARCH_CACHE_TTL_SECONDS, or until a restaurant changes.
 
     Parameters:
         payload (Restaurant_Search): the search criteria, which may include name, address, menu item, etc.
     
     Returns:
         PaginatedSearchResults: the restaurant search results in paginated form
+
+    Raises:
+        HTTPException (status_code = 400): the cursor is invalid, or was issued for another sort order
     """
-    restaurants = load_restaurants()
-    results = []
-    for restaurant in restaurants:
-        if payload.name and payload.name.lower() not in restaurant.get("name", "").lower():
-            continue
-        if payload.city and payload.city.lower() not in restaurant.get("city", "").lower():
-            continue
-        addr = restaurant.get("address", {})
-        if payload.street and payload.street.lower() not in addr.get("street", "").lower():
-            continue
-        if payload.province and payload.province.upper() != addr.get("province", "").upper():
-            continue
-        if payload.postal_code and payload.postal_code.lower() not in addr.get("postal_code", "").lower():
-            continue
-        if payload.menu_item:
-            menu_items = restaurant.get("menu", {}).get("items", [])
-            if not any(payload.menu_item.lower() in item.get("name", "").lower() for item in menu_items):
-                continue
-        results.append(restaurant)
-
-    if payload.sort_price == "asc":
-        results.sort(key=_calculate_average_price)
-    elif payload.sort_price == "desc":
-        results.sort(key=_calculate_average_price, reverse=True)
-
-    total = len(results)
+    text_filters = [
+        (field, text) for field, text in [
+            ("name", payload.name), ("city", payload.city), ("address.street", payload.street),
+            ("address.postal_code", payload.postal_code), ("menu.items.name", payload.menu_item),
+        ] if text
+    ]
+    key = lambda restaurant: _search_key(restaurant, payload.sort_price)
+    ttl = get_search_cache_ttl_default()
+    query = (
+        tuple((field, text.lower()) for field, text in text_filters),
+        payload.province.upper() if payload.province else None,
+        payload.sort_price,
+        payload.page,
+        payload.page_size,
+        payload.cursor,
+    )
+    cached = search_cache.get(query) if ttl > 0 else None
+    if cached is not None:
+        # only the restaurants on the page are loaded
+        ids, total, more = cached
+        page = [restaurant for restaurant in map(get_restaurant, ids) if restaurant is not None]
+    else:
+        generation = search_cache.generation()
+        page, total, more = _search_page(payload, text_filters)
+        if ttl > 0:
+            ids = [restaurant["id"] for restaurant in page]
+            search_cache.put(query, (ids, total, more), time.time() + ttl, generation)
     total_pages = max(1, -(-total // payload.page_size))
-    start = (payload.page - 1) * payload.page_size
-    end = start + payload.page_size
-    page_results = [Restaurant(**r) for r in results[start:end]]
+    page_results = [Restaurant(**r) for r in page]
+    next_cursor = _encode_cursor(payload.sort_price, key(page[-1])) if page and more else None
 
     return PaginatedRestaurantResults(
         results=page_results,
         total=total,
         page=payload.page,
         page_size=payload.page_size,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor
     )
 
 
@@ -199,17 +315,16 @@ def update_restaurant_details(payload: Restaurant_Details_Update) -> Restaurant:
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == payload.id:
-            restaurant["name"] = payload.name.strip()
-            restaurant["city"] = payload.city.strip()
-            restaurant["address"] = _address_to_dict(payload.address)
-            restaurant["max_delivery_radius_km"] = payload.max_delivery_radius_km
-            restaurant["delivery_fee"] = round(payload.delivery_fee, 2)
-            save_restaurants(restaurants)
-            return Restaurant(**restaurant)
-    raise HTTPException(status_code=404, detail=f"Restaurant '{payload.id}' not found")
+    restaurant = get_restaurant(payload.id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{payload.id}' not found")
+    restaurant["name"] = payload.name.strip()
+    restaurant["city"] = payload.city.strip()
+    restaurant["address"] = _address_to_dict(payload.address)
+    restaurant["max_delivery_radius_km"] = payload.max_delivery_radius_km
+    restaurant["delivery_fee"] = round(payload.delivery_fee, 2)
+    save_restaurant(restaurant)
+    return Restaurant(**restaurant)
 
 def update_restaurant_managers(payload: Restaurant_Managers_Update) -> Restaurant:
     """
@@ -224,13 +339,12 @@ def update_restaurant_managers(payload: Restaurant_Managers_Update) -> Restauran
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == payload.id:
-            restaurant["manager_ids"] = [manager_id.strip() for manager_id in payload.manager_ids]
-            save_restaurants(restaurants)
-            return Restaurant(**restaurant)
-    raise HTTPException(status_code=404, detail=f"Restaurant '{payload.id}' not found")
+    restaurant = get_restaurant(payload.id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{payload.id}' not found")
+    restaurant["manager_ids"] = [manager_id.strip() for manager_id in payload.manager_ids]
+    save_restaurant(restaurant)
+    return Restaurant(**restaurant)
 
 def create_menu_item(restaurant_id: int, payload: MenuItem_Create) -> MenuItem:
     """
@@ -247,20 +361,20 @@ def create_menu_item(restaurant_id: int, payload: MenuItem_Create) -> MenuItem:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
 
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            new_item_id = max((item.get("id", 0) for item in restaurant["menu"]["items"]), default=0) + 1
-            new_item = {
-                "id": new_item_id,
-                "name": payload.name.strip(),
-                "price": payload.price,
-                "tags": [tag.strip() for tag in payload.tags]
-            }
-            restaurant["menu"]["items"].append(new_item)
-            save_restaurants(restaurants)
-            return MenuItem(**new_item)
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    new_item_id = max((item.get("id", 0) for item in restaurant["menu"]["items"]), default=0) + 1
+    new_item = {
+        "id": new_item_id,
+        "name": payload.name.strip(),
+        "price": payload.price,
+        "tags": [tag.strip() for tag in payload.tags]
+    }
+    restaurant["menu"]["items"].append(new_item)
+    _update_menu_price(restaurant, added=[new_item["price"]])
+    save_restaurant(restaurant)
+    return MenuItem(**new_item)
 
 def update_menu_item(restaurant_id: int, payload: MenuItem_Update) -> MenuItem:
     """
@@ -276,18 +390,18 @@ def update_menu_item(restaurant_id: int, payload: MenuItem_Update) -> MenuItem:
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json or menu item not found in restaurant
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            for item in restaurant["menu"]["items"]:
-                if item.get("id") == payload.id:
-                    item["name"] = payload.name.strip()
-                    item["price"] = payload.price
-                    item["tags"] = [tag.strip() for tag in payload.tags]
-                    save_restaurants(restaurants)
-                    return MenuItem(**item)
-            raise HTTPException(status_code=404, detail=f"Menu item '{payload.id}' not found in restaurant '{restaurant_id}'")
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    for item in restaurant["menu"]["items"]:
+        if item.get("id") == payload.id:
+            _update_menu_price(restaurant, added=[payload.price], removed=[item.get("price", 0)])
+            item["name"] = payload.name.strip()
+            item["price"] = payload.price
+            item["tags"] = [tag.strip() for tag in payload.tags]
+            save_restaurant(restaurant)
+            return MenuItem(**item)
+    raise HTTPException(status_code=404, detail=f"Menu item '{payload.id}' not found in restaurant '{restaurant_id}'")
 
 def bulk_menu_item_create(restaurant_id: int, payload: MenuItem_Bulk_Create) -> list[MenuItem]:
     """
@@ -303,23 +417,23 @@ def bulk_menu_item_create(restaurant_id: int, payload: MenuItem_Bulk_Create) ->
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            new_items = []
-            for item_payload in payload.items:
-                new_item_id = max((item.get("id", 0) for item in restaurant["menu"]["items"]), default=0) + 1
-                new_item = {
-                    "id": new_item_id,
-                    "name": item_payload.name.strip(),
-                    "price": item_payload.price,
-                    "tags": [tag.strip() for tag in item_payload.tags]
-                }
-                restaurant["menu"]["items"].append(new_item)
-                new_items.append(MenuItem(**new_item))
-            save_restaurants(restaurants)
-            return new_items
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    new_items = []
+    for item_payload in payload.items:
+        new_item_id = max((item.get("id", 0) for item in restaurant["menu"]["items"]), default=0) + 1
+        new_item = {
+            "id": new_item_id,
+            "name": item_payload.name.strip(),
+            "price": item_payload.price,
+            "tags": [tag.strip() for tag in item_payload.tags]
+        }
+        restaurant["menu"]["items"].append(new_item)
+        new_items.append(MenuItem(**new_item))
+    _update_menu_price(restaurant, added=[item.price for item in new_items])
+    save_restaurant(restaurant)
+    return new_items
 
 def bulk_menu_item_update(restaurant_id: int, payload: MenuItem_Bulk_Update) -> list[MenuItem]:
     """
@@ -335,23 +449,23 @@ def bulk_menu_item_update(restaurant_id: int, payload: MenuItem_Bulk_Update) ->
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json or menu item not found in restaurant
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            updated_items = []
-            for item_payload in payload.items:
-                for item in restaurant["menu"]["items"]:
-                    if item.get("id") == item_payload.id:
-                        item["name"] = item_payload.name.strip()
-                        item["price"] = item_payload.price
-                        item["tags"] = [tag.strip() for tag in item_payload.tags]
-                        updated_items.append(MenuItem(**item))
-                        break
-                else:
-                    raise HTTPException(status_code=404, detail=f"Menu item '{item_payload.id}' not found in restaurant '{restaurant_id}'")
-            save_restaurants(restaurants)
-            return updated_items
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    updated_items = []
+    for item_payload in payload.items:
+        for item in restaurant["menu"]["items"]:
+            if item.get("id") == item_payload.id:
+                _update_menu_price(restaurant, added=[item_payload.price], removed=[item.get("price", 0)])
+                item["name"] = item_payload.name.strip()
+                item["price"] = item_payload.price
+                item["tags"] = [tag.strip() for tag in item_payload.tags]
+                updated_items.append(MenuItem(**item))
+                break
+        else:
+            raise HTTPException(status_code=404, detail=f"Menu item '{item_payload.id}' not found in restaurant '{restaurant_id}'")
+    save_restaurant(restaurant)
+    return updated_items
 
 def create_combo(restaurant_id: int, payload: Combo_Create) -> Combo:
     """
@@ -365,24 +479,23 @@ def create_combo(restaurant_id: int, payload: Combo_Create) -> Combo:
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            _validate_combo_item_ids(restaurant, payload.item_ids)
-            combos = restaurant["menu"]["combos"]
-            new_combo_id = max((combo.get("id", 0) for combo in combos), default=0) + 1
-            new_combo = {
-                "id": new_combo_id,
-                "name": payload.name.strip(),
-                "type": payload.type,
-                "discount": payload.discount,
-                "is_active": payload.is_active,
-                "item_ids": payload.item_ids
-            }
-            combos.append(new_combo)
-            save_restaurants(restaurants)
-            return Combo(**new_combo)
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    _validate_combo_item_ids(restaurant, payload.item_ids)
+    combos = restaurant["menu"]["combos"]
+    new_combo_id = max((combo.get("id", 0) for combo in combos), default=0) + 1
+    new_combo = {
+        "id": new_combo_id,
+        "name": payload.name.strip(),
+        "type": payload.type,
+        "discount": payload.discount,
+        "is_active": payload.is_active,
+        "item_ids": payload.item_ids
+    }
+    combos.append(new_combo)
+    save_restaurant(restaurant)
+    return Combo(**new_combo)
 
 def update_combo(restaurant_id: int, payload: Combo_Update) -> Combo:
     """
@@ -396,23 +509,23 @@ def update_combo(restaurant_id: int, payload: Combo_Update) -> Combo:
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json or combo not found in restaurant
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            _validate_combo_item_ids(restaurant, payload.item_ids)
-            combos = restaurant["menu"]["combos"]
-            for combo in combos:
-                if combo.get("id") == payload.id:
-                    combo["name"] = payload.name.strip()
-                    combo["type"] = payload.type
-                    combo["discount"] = payload.discount
-                    combo["item_ids"] = payload.item_ids
-                    combo["is_active"] = payload.is_active
-                    save_restaurants(restaurants)
-                    return Combo(**combo)
-            raise HTTPException(status_code=404, detail=f"Combo '{payload.id}' not found in restaurant '{restaurant_id}'")
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
-
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    _validate_combo_item_ids(restaurant, payload.item_ids)
+    combos = restaurant["menu"]["combos"]
+    for combo in combos:
+        if combo.get("id") == payload.id:
+            combo["name"] = payload.name.strip()
+            combo["type"] = payload.type
+            combo["discount"] = payload.discount
+            combo["item_ids"] = payload.item_ids
+            combo["is_active"] = payload.is_active
+            save_restaurant(restaurant)
+            return Combo(**combo)
+    raise HTTPException(status_code=404, detail=f"Combo '{payload.id}' not found in restaurant '{restaurant_id}'")
+
+@single_flight
 def get_restaurant_by_id(restaurant_id: int) -> Restaurant:
     """
     Retrieves the restaurant with matching id to the provided id.
@@ -426,11 +539,10 @@ def get_restaurant_by_id(restaurant_id: int) -> Restaurant:
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            return Restaurant(**restaurant)
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    return Restaurant(**restaurant)
 
 def get_managers(restaurant_id: int) -> list[str]:
     """
@@ -444,11 +556,10 @@ def get_managers(restaurant_id: int) -> list[str]:
     Raises:
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            return restaurant["manager_ids"]
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    return restaurant["manager_ids"]
 
 def check_manager(restaurant_id: int, current_user: User = Depends(require_role(UserRole.RESTAURANT_MANAGER))) -> User:
     """
@@ -466,10 +577,9 @@ def check_manager(restaurant_id: int, current_user: User = Depends(require_role(
         HTTPException (status_code = 403): if user's role is not "manager" or user is not a manager of the provided restaurant
         HTTPException (status_code = 404): restaurant_id not found in restaurants.json
     """
-    restaurants = load_restaurants()
-    for restaurant in restaurants:
-        if restaurant.get("id") == restaurant_id:
-            if current_user.id in restaurant.get("manager_ids"):
-                return current_user
-            raise HTTPException(status_code=403, detail="User is not a manager of this restaurant")
-    raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    restaurant = get_restaurant(restaurant_id)
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
+    if current_user.id in restaurant.get("manager_ids"):
+        return current_user
+    raise HTTPException(status_code=403, detail="User is not a manager of this restaurant")
@@ -0,0 +1,114 @@
+"""
+This module implements business logic for login sessions.
+
+Sessions live in their own collection (see session_repo.py), apart from the user records, so logging in and out
+never rewrites users. A user can hold several sessions at once, e.g. one per device, and each expires on its own.
+
+With SESSION_TOKEN_MODE set to "signed", logins are given signed tokens instead (see app/auth.py), which are not
+stored at all. Logging those out goes through the revocation list.
+"""
+
+import asyncio
+import secrets
+import time
+
+from app.repositories.conflicts import StorageConflictError
+from app.auth import read_signed_token, sign_token
+from app.repositories.session_repo import (
+    delete_expired_sessions, delete_session, delete_session_by_key, find_user_sessions, revoke_token,
+    revoke_user_tokens, save_session,
+)
+from app.repositories.unit_of_work import transaction
+from app.repositories.user_cache import user_cache
+from app.schemas.user_schema import UserRole
+from app.services.config_service import (
+    get_session_purge_interval_default, get_session_token_expiry_default, get_session_token_mode_default,
+)
+
+
+def create_session(user_id: str, role: UserRole | str) -> str:
+    """
+    Starts a new session for a user, alongside any sessions they already have.
+
+    Parameters:
+        user_id (str): the identifier of the user logging in
+        role (UserRole | str): the user's role, carried by signed tokens
+
+    Returns:
+        str: the new session token
+
+    Raises:
+        ValueError: if SESSION_TOKEN_MODE is "signed" and SESSION_SIGNING_KEY is blank
+    """
+    expires_at = time.time() + get_session_token_expiry_default()
+    if get_session_token_mode_default() == "signed":
+        return sign_token(user_id, role, expires_at)
+    token = secrets.token_urlsafe(32)
+    save_session(token, user_id, expires_at)
+    return token
+
+def end_session(token: str) -> None:
+    """
+    Ends a single session, logging that token out.
+
+    Parameters:
+        token (str): the session token
+
+    Returns: None
+    """
+    claims = read_signed_token(token)
+    if claims is not None:
+        revoke_token(claims["jti"], claims["exp"])
+    else:
+        delete_session(token)
+    user_cache.discard(token)
+
+def revoke_user_sessions(user_id: str) -> int:
+    """
+    Ends every session of a user, e.g. after their password was reset. Saved in a single write.
+    The user's signed tokens issued until now are revoked too.
+
+    Parameters:
+        user_id (str): the identifier of the user
+
+    Returns:
+        int: the number of stored sessions ended
+    """
+    now = time.time()
+    with transaction():
+        sessions = find_user_sessions(user_id)
+        for session in sessions:
+            delete_session_by_key(session["id"])
+        revoke_user_tokens(user_id, now, now + get_session_token_expiry_default())
+    user_cache.invalidate(user_id)
+    return len(sessions)
+
+def purge_expired_sessions(now: float | None = None) -> int:
+    """
+    Deletes every expired session. Expired sessions are already rejected, this only keeps the store small.
+
+    Parameters:
+        now (float | None): the current unix time, defaults to the actual time
+
+    Returns:
+        int: the number of sessions deleted
+    """
+    return delete_expired_sessions(time.time() if now is None else now)
+
+async def purge_sessions_periodically() -> None:
+    """
+    Runs purge_expired_sessions every SESSION_PURGE_INTERVAL_SECONDS until cancelled. Started when the app starts.
+
+    Parameters: None
+
+    Returns: None
+    """
+    while True:
+        interval = get_session_purge_interval_default()
+        if interval > 0:
+            try:
+                await asyncio.to_thread(purge_expired_sessions)
+            except StorageConflictError:
+                # a session was changed by another worker meanwhile, so the expired ones are purged next time
+                pass
+        await asyncio.sleep(interval if interval > 0 else 60)
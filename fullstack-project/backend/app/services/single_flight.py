@@ -0,0 +1,193 @@
+"""
+This module implements request coalescing ("single flight") for read-only service functions.
+
+Bursts of identical reads, such as many customers opening the same search at once, would each parse and scan the
+same data. A function decorated with @single_flight runs once for every set of identical calls in flight at the
+same time: the first caller computes the result, and the callers arriving while it runs wait for it and receive
+a copy of it (or a copy of the same exception). The copies are taken from a snapshot made as the call returns, so changes
+the first caller makes to its result are not seen by the others. Nothing is kept once the call returns, so a caller never receives a result
+older than the call it joined, which started at most one call's duration before it.
+
+Calls are identical when their arguments are equal; pydantic models are compared by their content. Sync functions
+are coalesced across the threads running sync routes, and async functions across the tasks of an event loop.
+Calls made inside a transaction are not coalesced, since they see the transaction's pending writes, and neither
+are sync calls made from a coroutine, since waiting for another thread's call would block the event loop.
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+import threading
+from typing import Any, Callable
+
+from pydantic import BaseModel
+
+from app.repositories.storage_engine import current_unit
+
+# function name -> {"calls": calls made, "shared": calls that received another call's result}
+_stats: dict[str, dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+class _Flight:
+    """A call in flight, which the identical calls made while it runs wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        # identical calls waiting for this one, counted under the lock while the flight is registered
+        self.waiters = 0
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+def _hashable(value: Any) -> Any:
+    """Returns a hashable value equal for equal arguments."""
+    if isinstance(value, BaseModel):
+        return type(value).__qualname__, value.model_dump_json()
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return type(value).__qualname__, repr(value)
+
+
+def _call_key(args: tuple, kwargs: dict) -> tuple:
+    """Returns the key identical calls share."""
+    return tuple(map(_hashable, args)), tuple((name, _hashable(kwargs[name])) for name in sorted(kwargs))
+
+
+def _in_event_loop() -> bool:
+    """Returns True if the calling thread is running an event loop, which a sync call must not block."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _copied_error(error: BaseException) -> BaseException:
+    """Returns a copy of an error shared by coalesced calls, so raising it leaves the shared one's traceback alone."""
+    clone = type(error).__new__(type(error), *error.args)
+    clone.__dict__.update(error.__dict__)
+    clone.args = error.args
+    return clone
+
+
+def _count(name: str, shared: bool) -> None:
+    """Counts a call of a coalesced function."""
+    with _stats_lock:
+        counters = _stats.setdefault(name, {"calls": 0, "shared": 0})
+        counters["calls"] += 1
+        counters["shared"] += shared
+
+
+def single_flight(function: Callable) -> Callable:
+    """
+    Coalesces the identical calls of a read-only function that are in flight at the same time into one.
+
+    Parameters:
+        function (Callable): the sync or async function to coalesce, whose arguments identify its result
+
+    Returns:
+        Callable: the coalescing function
+    """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    if inspect.iscoroutinefunction(function):
+        # (event loop, call key) -> the future of the call in flight, and the number of identical calls waiting
+        futures: dict[tuple, asyncio.Future] = {}
+        waiters: dict[tuple, int] = {}
+
+        @functools.wraps(function)
+        async def coalesced_async(*args, **kwargs):
+            if current_unit.get() is not None:
+                return await function(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            key = (loop, _call_key(args, kwargs))
+            future = futures.get(key)
+            _count(name, future is not None)
+            if future is not None:
+                waiters[key] = waiters.get(key, 0) + 1
+                # waited for without cancelling the call the others wait for if this waiter is cancelled, and
+                # without raising the shared error itself
+                await asyncio.wait((future,))
+                if future.cancelled():
+                    raise asyncio.CancelledError()
+                if future.exception() is not None:
+                    raise _copied_error(future.exception()) from future.exception()
+                return copy.deepcopy(future.result())
+            future = futures[key] = loop.create_future()
+            try:
+                result = await function(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as error:
+                future.set_exception(error)
+                # retrieved here, so an error nobody else waited for is not reported as never retrieved
+                future.exception()
+                raise
+            else:
+                # the waiters copy a snapshot, since the result returned here may be changed by its caller
+                future.set_result(copy.deepcopy(result) if waiters.get(key) else result)
+                return result
+            finally:
+                del futures[key]
+                waiters.pop(key, None)
+
+        return coalesced_async
+
+    flights: dict[tuple, _Flight] = {}
+    lock = threading.Lock()
+
+    @functools.wraps(function)
+    def coalesced(*args, **kwargs):
+        if current_unit.get() is not None or _in_event_loop():
+            return function(*args, **kwargs)
+        key = _call_key(args, kwargs)
+        with lock:
+            flight = flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+        _count(name, not leader)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise _copied_error(flight.error) from flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with lock:
+                del flights[key]
+            # no call joins once the flight is unregistered, so the waiters counted now are all there are
+            if flight.waiters and flight.error is None:
+                # the waiters copy a snapshot, since the result returned here may be changed by its caller
+                try:
+                    flight.result = copy.deepcopy(result)
+                except BaseException as error:
+                    flight.error = error
+            flight.done.set()
+        return result
+
+    return coalesced
+
+
+def single_flight_stats() -> dict[str, dict[str, int]]:
+    """
+    Returns the counters of every coalesced function.
+
+    Parameters: None
+
+    Returns:
+        dict[str, dict[str, int]]: function name -> calls made, and calls that received another call's result
+    """
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
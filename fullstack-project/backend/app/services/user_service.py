@@ -1,14 +1,21 @@
 """This module implements business logic for user management."""
 
+import asyncio
 import secrets
 import time
 import uuid
 from fastapi import HTTPException, Depends
 from app.auth import require_role
-from app.repositories.user_repo import load_users, save_users
-from app.repositories.notification_repo import load_notifications
+from app.repositories.user_repo import (
+    find_user_by_email, find_user_by_reset_token, get_user, save_user, update_user_record,
+)
+from app.repositories.notification_repo import iter_notifications, get_notification
 from app.schemas.notification_schema import Notification_Response
 from app.services.notification_service import Notification
+from app.services.password_service import (
+    hash_password, hash_password_async, needs_rehash, verify_password, verify_password_async,
+)
+from app.services.session_service import create_session, revoke_user_sessions
 from app.schemas.user_schema import (
     User, 
     User_Create,
@@ -19,9 +26,9 @@ from app.schemas.user_schema import (
     Customer,
     ROLE_TO_CLASS
 )
-from app.services.config_service import get_reset_token_expiry_default, get_session_token_expiry_default
+from app.services.config_service import get_reset_token_expiry_default
 
-RESET_TOKEN_EXPIRY, SESSION_TOKEN_EXPIRY = get_reset_token_expiry_default(), get_session_token_expiry_default()
+RESET_TOKEN_EXPIRY = get_reset_token_expiry_default()
 
 def create_user(payload: User_Create) -> User:
     """
@@ -36,21 +43,20 @@ def create_user(payload: User_Create) -> User:
     Raises:
         HTTPException (status_code = 409): if generated ID matches an existing ID, or if email exists already.
     """
-    users = load_users()
     new_id = str(uuid.uuid4())
     new_email = payload.email.strip()
-    for user in users:
-        if user.get("id") == new_id:
-            raise HTTPException(status_code=409, detail="ID collision; retry.")
-        if user.get("email") == new_email:
-            raise HTTPException(status_code=409, detail="An account with this email already exists.")
+    if get_user(new_id) is not None:
+        raise HTTPException(status_code=409, detail="ID collision; retry.")
+    # emails are matched ignoring case, through the email index
+    if find_user_by_email(new_email) is not None:
+        raise HTTPException(status_code=409, detail="An account with this email already exists.")
     
     user_class = ROLE_TO_CLASS[payload.role]
 
     new_user = user_class(
         id = new_id,
         email = new_email,
-        password = payload.password.strip(),
+        password = hash_password(payload.password.strip()),
         name = payload.name.strip(),
         age = payload.age,
         gender = payload.gender.strip(),
@@ -58,8 +64,7 @@ def create_user(payload: User_Create) -> User:
         reset_token_expiry = None
     )
 
-    users.append(new_user.model_dump())
-    save_users(users)
+    save_user(new_user.model_dump())
     return new_user
 
 def get_user_by_id(user_id: str) -> User:
@@ -75,17 +80,18 @@ def get_user_by_id(user_id: str) -> User:
     Raises:
         HTTPException (status_code = 404): user_id not found in users.json
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == user_id:
-            if isinstance(user.get("role"), str):
-                user["role"] = UserRole(user["role"]) 
-            return User(**user)
-    raise HTTPException(status_code=404, detail=f"User '{user_id}' not found")
-
-def login_user(email: str, password: str) -> LoginResponse:
+    user = get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{user_id}' not found")
+    if isinstance(user.get("role"), str):
+        user["role"] = UserRole(user["role"]) 
+    return User(**user)
+
+async def login_user(email: str, password: str) -> LoginResponse:
     """
     Authenticates and logs in the user based on the provided email and password.
+    The password is checked in the password worker pool, and rehashed if it was stored at an outdated cost.
+    Storage calls run in worker threads, so a burst of logins does not hold up the event loop with disk I/O.
 
     Parameters:
         email (str): user's email
@@ -97,32 +103,32 @@ def login_user(email: str, password: str) -> LoginResponse:
     Raises:
         HTTPException (status_code = 401): if email/password pair is not found in users.json
     """
-    users = load_users()
-    email = email.strip()
+    user = await asyncio.to_thread(find_user_by_email, email)
     password = password.strip()
-    for user in users:
-        if user.get("email") == email:
-            if user.get("password") != password:
-                raise HTTPException(status_code=401, detail="Invalid email or password")
-            
-            token = secrets.token_urlsafe(32)
-            user["auth_token"] = token
-            user["auth_token_expiry"] = time.time() + SESSION_TOKEN_EXPIRY
-            save_users(users)
-            role = UserRole(user["role"]) if isinstance(user.get("role"), str) else user["role"]
-            return LoginResponse(
-                token = token,
-                user_id= user.get("id"),
-                email = user.get("email"),
-                role= role,
-                age= user.get("age"),
-                gender= user.get("gender"),
-                name=user.get("name"),
-                wallet_balance=user.get("wallet_balance"),
-                vehicle=user.get("vehicle"),
-                driver_status=user.get("driver_status")
-            )
-    raise HTTPException(status_code=401, detail="Invalid email or password")
+    if not await verify_password_async(password, user["password"] if user is not None else None):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if needs_rehash(user["password"]):
+        rehashed = await hash_password_async(password)
+        def set_hash(user: dict) -> dict:
+            user["password"] = rehashed
+            return user
+        await asyncio.to_thread(update_user_record, user["id"], set_hash)
+
+    # the session is stored apart from the user, so logging in does not rewrite users.json
+    token = await asyncio.to_thread(create_session, user["id"], user["role"])
+    role = UserRole(user["role"]) if isinstance(user.get("role"), str) else user["role"]
+    return LoginResponse(
+        token = token,
+        user_id= user.get("id"),
+        email = user.get("email"),
+        role= role,
+        age= user.get("age"),
+        gender= user.get("gender"),
+        name=user.get("name"),
+        wallet_balance=user.get("wallet_balance"),
+        vehicle=user.get("vehicle"),
+        driver_status=user.get("driver_status")
+    )
 
 def reset_password_request(user_email: str) -> None:
     """
@@ -136,18 +142,19 @@ def reset_password_request(user_email: str) -> None:
 
     Returns: None
     """
-    users = load_users()
-    for user in users:
-        if user.get("email") == user_email:
-            token = secrets.token_urlsafe(32)
-            user["reset_token"] = token
-            user["reset_token_expiry"] = time.time() + RESET_TOKEN_EXPIRY
-            save_users(users)
-
-            print(f"\nPassword reset link:")
-            print(f"http://localhost:5173/reset-password?token={token}\n")
-
-            return None
+    user = find_user_by_email(user_email)
+    if user is None:
+        return None
+
+    token = secrets.token_urlsafe(32)
+    def attach_token(user: dict) -> dict:
+        user["reset_token"] = token
+        user["reset_token_expiry"] = time.time() + RESET_TOKEN_EXPIRY
+        return user
+    update_user_record(user["id"], attach_token)
+
+    print(f"\nPassword reset link:")
+    print(f"http://localhost:5173/reset-password?token={token}\n")
     return None
 
 def reset_password(new_password: str, reset_token: str) -> None:
@@ -164,18 +171,22 @@ def reset_password(new_password: str, reset_token: str) -> None:
     Raises:
         HTTPException (status_code = 400): if user's reset token is invalid or expired
     """
-    users = load_users()
-    for user in users:
-        if user.get("reset_token") == reset_token:
-            if user.get("reset_token_expiry", 0) < time.time():
-                raise HTTPException(status_code=400, detail="Reset token has expired")
-
-            user["password"] = new_password.strip()
-            user["reset_token"] = None
-            user["reset_token_expiry"] = None
-            save_users(users)
-            return None
-    raise HTTPException(status_code=400, detail="Invalid reset token")
+    user = find_user_by_reset_token(reset_token)
+    if user is None:
+        raise HTTPException(status_code=400, detail="Invalid reset token")
+    if (user.get("reset_token_expiry") or 0) < time.time():
+        raise HTTPException(status_code=400, detail="Reset token has expired")
+
+    hashed = hash_password(new_password.strip())
+    def set_password(user: dict) -> dict:
+        user["password"] = hashed
+        user["reset_token"] = None
+        user["reset_token_expiry"] = None
+        return user
+    update_user_record(user["id"], set_password)
+    # sessions opened with the old password are logged out
+    revoke_user_sessions(user["id"])
+    return None
 
 def update_password_when_logged_in(user_id: str, old_password: str, new_password: str) -> None:
     """
@@ -192,15 +203,14 @@ def update_password_when_logged_in(user_id: str, old_password: str, new_password
         HTTPException (status_code = 400): if password is incorrect
         HTTPException (status_code = 404): if user_id is not found in users.json
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == user_id:
-            if user.get("password") != old_password:
-                raise HTTPException(status_code=400, detail="Old password is incorrect")
-            user["password"] = new_password.strip()
-            save_users(users)
-            return None
-    raise HTTPException(status_code=404, detail=f"User '{user_id}' not found")
+    user = get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{user_id}' not found")
+    if not verify_password(old_password, user["password"]):
+        raise HTTPException(status_code=400, detail="Old password is incorrect")
+    user["password"] = hash_password(new_password.strip())
+    save_user(user)
+    return None
 
 
 def update_user(user_id: str, payload: User_Update) -> UserPublic:
@@ -217,35 +227,33 @@ def update_user(user_id: str, payload: User_Update) -> UserPublic:
     Raises:
         HTTPException (status_code = 404): if user_id is not found in users.json
     """
-    users = load_users()
-    for idx, user in enumerate(users):
-        if user.get("id") == user_id:
-
-            user["name"] = payload.name.strip()
-            user["email"] = payload.email.strip()
-            user["age"] = payload.age
-            user["gender"] = payload.gender.strip()
-            if payload.vehicle is not None and user["role"] == UserRole.DELIVERY_DRIVER:
-                user["vehicle"] = payload.vehicle.strip()
-            users[idx] = user
-            save_users(users)
-            role = UserRole(user["role"]) if isinstance(user.get("role"), str) else user["role"]
-            return UserPublic(
-                id=user["id"],
-                email=user["email"],
-                name=user["name"],
-                age=user["age"],
-                gender=user["gender"],
-                role=role,
-                wallet_balance=user.get("wallet_balance"),
-                vehicle=user.get("vehicle"),
-                driver_status=user.get("driver_status")
-            )
-    raise HTTPException(status_code=404, detail=f"User '{user_id}' not found")
+    user = get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{user_id}' not found")
+    user["name"] = payload.name.strip()
+    user["email"] = payload.email.strip()
+    user["age"] = payload.age
+    user["gender"] = payload.gender.strip()
+    if payload.vehicle is not None and user["role"] == UserRole.DELIVERY_DRIVER:
+        user["vehicle"] = payload.vehicle.strip()
+    save_user(user)
+    role = UserRole(user["role"]) if isinstance(user.get("role"), str) else user["role"]
+    return UserPublic(
+        id=user["id"],
+        email=user["email"],
+        name=user["name"],
+        age=user["age"],
+        gender=user["gender"],
+        role=role,
+        wallet_balance=user.get("wallet_balance"),
+        vehicle=user.get("vehicle"),
+        driver_status=user.get("driver_status")
+    )
 
 def withdraw_from_wallet(payment_amount: float, current_user: Customer) -> float:
     """
     Withdraws payment amount from customer's wallet. Verifies that balance is adequate.
+    The balance is updated with a conditional write, so concurrent payments and deposits are never lost.
 
     Parameters:
         payment_amount: float
@@ -261,20 +269,21 @@ def withdraw_from_wallet(payment_amount: float, current_user: Customer) -> float
     if payment_amount < 0:
         raise HTTPException(status_code=400, detail="A negative amount cannot be withdrawn from wallet")
 
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            balance = user.get("wallet_balance")
-            if balance - payment_amount < 0:
-                raise HTTPException(status_code=400, detail="Customer does not have sufficient wallet funds.")
-            user["wallet_balance"] = balance - payment_amount
-            save_users(users)
-            return balance - payment_amount
-    raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    def withdraw(user: dict) -> dict:
+        balance = user.get("wallet_balance")
+        if balance - payment_amount < 0:
+            raise HTTPException(status_code=400, detail="Customer does not have sufficient wallet funds.")
+        user["wallet_balance"] = balance - payment_amount
+        return user
+
+    user = update_user_record(current_user.id, withdraw)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    return user["wallet_balance"]
 
 def deposit_to_wallet(balance_increase: float, current_user: Customer) -> float:
     """
-    Increases customer's wallet balance.
+    Increases customer's wallet balance with a conditional write, so concurrent payments and deposits are never lost.
 
     Parameters:
         balance_increase: float
@@ -290,14 +299,14 @@ def deposit_to_wallet(balance_increase: float, current_user: Customer) -> float:
     if balance_increase <= 0:
         raise HTTPException(status_code=400, detail="Deposit to wallet must be greater than 0")
 
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            new_balance = user.get("wallet_balance") + balance_increase
-            user["wallet_balance"] = new_balance
-            save_users(users)
-            return new_balance
-    raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    def deposit(user: dict) -> dict:
+        user["wallet_balance"] = user.get("wallet_balance") + balance_increase
+        return user
+
+    user = update_user_record(current_user.id, deposit)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    return user["wallet_balance"]
 
 def get_notifications(user_id: str) -> list[Notification_Response]:
     """
@@ -309,9 +318,8 @@ def get_notifications(user_id: str) -> list[Notification_Response]:
     Returns:
         list[Notification_Response]: the user's notifications
     """
-    notifs = load_notifications()
     user_notifs = []
-    for notif in notifs:
+    for notif in iter_notifications():
         if user_id in notif["user_ids"]:
             user_notifs.append(Notification_Response(**notif))
     return user_notifs
@@ -328,12 +336,11 @@ def read_notification(notification_id: int, user_id: str) -> Notification_Respon
         HTTPException (status_code = 404): if this notifications id not found in notifications.json
         HTTPException (status_code = 404): if user_id is not in list of readers (which matches recipient list)
     """
-    notifs = load_notifications()
-    for notif in notifs:
-        if notif.get("id") == notification_id:
-            notif_object = Notification.model_to_Notification(Notification_Response(**notif))
-            return notif_object.mark_as_read(user_id)
-    raise HTTPException(status_code=404, detail=f"Notification '{notification_id}' not found")
+    notif = get_notification(notification_id)
+    if notif is None:
+        raise HTTPException(status_code=404, detail=f"Notification '{notification_id}' not found")
+    notif_object = Notification.model_to_Notification(Notification_Response(**notif))
+    return notif_object.mark_as_read(user_id)
 
 def get_customer(customer: Customer = Depends(require_role(UserRole.CUSTOMER))) -> Customer:
     """
@@ -365,13 +372,12 @@ def get_favourites(current_user: Customer) -> list:
         HTTPException (status_code = 404): if current_user id not found in users.json
     """
     from app.repositories.restaurant_repo import load_restaurants
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            favourite_ids = user.get("favourites", [])
-            restaurants = load_restaurants()
-            return [r for r in restaurants if r.get("id") in favourite_ids]
-    raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    favourite_ids = user.get("favourites", [])
+    restaurants = load_restaurants()
+    return [r for r in restaurants if r.get("id") in favourite_ids]
 
 
 def add_favourite(restaurant_id: int, current_user: Customer) -> list[int]:
@@ -389,22 +395,20 @@ def add_favourite(restaurant_id: int, current_user: Customer) -> list[int]:
         HTTPException (status_code = 404): if restaurant_id not found or user not found
         HTTPException (status_code = 409): if restaurant is already in favourites
     """
-    from app.repositories.restaurant_repo import load_restaurants
-    restaurants = load_restaurants()
-    if not any(r.get("id") == restaurant_id for r in restaurants):
+    from app.repositories.restaurant_repo import get_restaurant
+    if get_restaurant(restaurant_id) is None:
         raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not found")
 
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            favourites = user.get("favourites", [])
-            if restaurant_id in favourites:
-                raise HTTPException(status_code=409, detail=f"Restaurant '{restaurant_id}' is already in favourites")
-            favourites.append(restaurant_id)
-            user["favourites"] = favourites
-            save_users(users)
-            return favourites
-    raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    favourites = user.get("favourites", [])
+    if restaurant_id in favourites:
+        raise HTTPException(status_code=409, detail=f"Restaurant '{restaurant_id}' is already in favourites")
+    favourites.append(restaurant_id)
+    user["favourites"] = favourites
+    save_user(user)
+    return favourites
 
 
 def remove_favourite(restaurant_id: int, current_user: Customer) -> list[int]:
@@ -421,14 +425,13 @@ def remove_favourite(restaurant_id: int, current_user: Customer) -> list[int]:
     Raises:
         HTTPException (status_code = 404): if restaurant is not in favourites or user not found
     """
-    users = load_users()
-    for user in users:
-        if user.get("id") == current_user.id:
-            favourites = user.get("favourites", [])
-            if restaurant_id not in favourites:
-                raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not in favourites")
-            favourites.remove(restaurant_id)
-            user["favourites"] = favourites
-            save_users(users)
-            return favourites
-    raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
\ No newline at end of file
+    user = get_user(current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User '{current_user.id}' not found")
+    favourites = user.get("favourites", [])
+    if restaurant_id not in favourites:
+        raise HTTPException(status_code=404, detail=f"Restaurant '{restaurant_id}' not in favourites")
+    favourites.remove(restaurant_id)
+    user["favourites"] = favourites
+    save_user(user)
+    return favourites
\ No newline at end of file
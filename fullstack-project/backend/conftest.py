@@ -7,6 +7,8 @@ import json
 # Add the backend directory to sys.path so pytest can find 'app'
 sys.path.insert(0, str(Path(__file__).parent))
 
+from app.repositories.search_cache import search_cache
+
 DATA_PATH = Path(__file__).resolve().parent / "app" / "data"
 
 @pytest.fixture(autouse=True)
@@ -18,9 +20,12 @@ def backup_and_restore_data():
     for f in json_files:
         shutil.copy(f, f.with_suffix(".backup"))
         if (f.name == "config.json"):
-            f.write_text(json.dumps({}))
+            # passwords are hashed at a low cost so the many sign-ups and logins stay fast
+            f.write_text(json.dumps({"PASSWORD_HASH_ITERATIONS": 1000}))
         else:
             f.write_text(json.dumps([]))
+    # the files were changed behind the app's back, so results cached from the previous test's data are dropped
+    search_cache.invalidate()
 
     yield  # Run all tests
 
@@ -0,0 +1,83 @@
+"""Testing the binary snapshots that let data files be loaded without parsing the json."""
+
+import json
+import marshal
+import pytest
+
+from app.repositories import binary_snapshots
+from app.repositories.binary_snapshots import load_frozen, read_snapshot, snapshot_path, write_snapshot
+from app.repositories.document_cache import DocumentCache, freeze
+from app.repositories.json_files import file_stamp, read_json_file
+from app.repositories.journal import Journal
+from app.repositories.storage_engine import JsonStorageEngine
+
+ORDERS = [{"id": 1, "status": "pending"}, {"id": 2, "status": "delivered"}]
+
+def fail_parse(path):
+    raise AssertionError(f"{path.name} was parsed")
+
+@pytest.fixture
+def orders_file(tmp_path):
+    path = tmp_path / "orders.json"
+    path.write_text(json.dumps(ORDERS, indent=2))
+    return path
+
+# test that the first load parses the file and writes a snapshot that later loads use instead
+def test_load_frozen(orders_file):
+    stamp = file_stamp(orders_file)
+    assert marshal.loads(load_frozen(orders_file, stamp, read_json_file)) == ORDERS
+    assert snapshot_path(orders_file).name == "orders.json.snap"
+    assert marshal.loads(load_frozen(orders_file, stamp, fail_parse)) == ORDERS
+
+# test that snapshots of an older file, a broken snapshot or one from another python version are not used
+def test_unusable_snapshots(orders_file, monkeypatch):
+    stamp = file_stamp(orders_file)
+    write_snapshot(orders_file, stamp, freeze(ORDERS))
+    orders_file.write_text(json.dumps(ORDERS[:1]))
+    assert read_snapshot(orders_file, file_stamp(orders_file)) is None
+
+    stamp = file_stamp(orders_file)
+    write_snapshot(orders_file, stamp, freeze(ORDERS[:1]))
+    data = snapshot_path(orders_file).read_bytes()
+    snapshot_path(orders_file).write_bytes(data[:-1])
+    assert read_snapshot(orders_file, stamp) is None
+
+    snapshot_path(orders_file).write_bytes(data)
+    assert read_snapshot(orders_file, stamp) is not None
+    monkeypatch.setattr(binary_snapshots.sys, "version_info", (2, 7))
+    assert read_snapshot(orders_file, stamp) is None
+
+# test that an engine with snapshots on reloads files from them after a cache miss
+def test_engine_loads_snapshots(tmp_path, monkeypatch):
+    engine = JsonStorageEngine(tmp_path, snapshots=True, cache=DocumentCache())
+    engine.save("orders", ORDERS)
+    assert snapshot_path(engine.path_for("orders")).exists()
+
+    monkeypatch.setattr("app.repositories.storage_engine.read_json_file", fail_parse)
+    fresh = JsonStorageEngine(tmp_path, snapshots=True, cache=DocumentCache())
+    assert fresh.load("orders") == ORDERS
+    assert fresh.get("orders", 2)["status"] == "delivered"
+
+# test that saves only snapshot once per interval, and flush writes what is left
+def test_snapshot_interval(tmp_path):
+    engine = JsonStorageEngine(tmp_path, snapshots=True, snapshot_interval=60, cache=DocumentCache())
+    path = engine.path_for("orders")
+    engine.save("orders", ORDERS)
+    engine.upsert("orders", {"id": 3, "status": "pending"})
+    assert read_snapshot(path, file_stamp(path)) is None
+
+    engine.flush()
+    assert len(marshal.loads(read_snapshot(path, file_stamp(path)))) == 3
+
+    engine.upsert("orders", {"id": 4, "status": "pending"})
+    path.write_text(json.dumps(ORDERS))
+    engine.close()
+    assert read_snapshot(path, file_stamp(path)) is None
+
+# test that a compacted journal snapshot is written with its binary snapshot
+def test_journal_snapshots(orders_file):
+    journal = Journal(orders_file, compact_bytes=1 << 20, binary=True)
+    journal.upsert({"id": 3, "status": "pending"})
+    journal.compact()
+    assert marshal.loads(read_snapshot(orders_file, file_stamp(orders_file))) == journal.load()
+    assert Journal(orders_file, binary=True).load() == journal.load()
@@ -0,0 +1,121 @@
+"""Testing conflict detection between concurrent writers to the same collection."""
+
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repositories.conflicts import StorageConflictError, merge_records
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine, track_reads
+from app.repositories.document_cache import DocumentCache
+
+ORDERS = [{"id": 1, "status": "pending"}, {"id": 2, "status": "pending"}]
+
+def make_engine(kind, path):
+    if kind == "json":
+        return JsonStorageEngine(path, cache=DocumentCache())
+    if kind == "journaled":
+        return JsonStorageEngine(path, journaled=["orders"], cache=DocumentCache())
+    return SqliteStorageEngine(path / "storage.db", json_dir=path)
+
+def append_orders(kind, path, start, count):
+    engine = make_engine(kind, path)
+    try:
+        for order_id in range(start, start + count):
+            with track_reads():
+                orders = engine.load("orders")
+                orders.append({"id": order_id, "status": "pending"})
+                engine.save("orders", orders)
+    finally:
+        engine.close()
+
+@pytest.fixture(params=["json", "journaled", "sqlite"])
+def kind(request):
+    return request.param
+
+# test that changes to different records are merged
+def test_merge_records():
+    base = [{"id": 1, "v": 0}, {"id": 2, "v": 0}, {"id": 3, "v": 0}]
+    ours = [{"id": 1, "v": 1}, {"id": 3, "v": 0}, {"id": 4, "v": 0}]
+    theirs = [{"id": 1, "v": 0}, {"id": 2, "v": 0}, {"id": 3, "v": 2}, {"id": 5, "v": 0}]
+    assert merge_records("orders", "id", base, ours, theirs) == [
+        {"id": 1, "v": 1}, {"id": 3, "v": 2}, {"id": 5, "v": 0}, {"id": 4, "v": 0}
+    ]
+
+# test that changing the same record on both sides is a conflict, unless both made the same change
+def test_merge_records_conflicts():
+    base = [{"id": 1, "v": 0}]
+    assert merge_records("orders", "id", base, [{"id": 1, "v": 1}], [{"id": 1, "v": 1}]) == [{"id": 1, "v": 1}]
+    with pytest.raises(StorageConflictError):
+        merge_records("orders", "id", base, [{"id": 1, "v": 1}], [{"id": 1, "v": 2}])
+    with pytest.raises(StorageConflictError):
+        merge_records("orders", "id", base, [{"id": 1, "v": 1}], [])
+    with pytest.raises(StorageConflictError):
+        merge_records("orders", "id", base, [], [{"id": 1, "v": 2}])
+
+# test that a save inside a scope keeps a concurrent change to another record
+def test_save_merges_concurrent_change(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    other = make_engine(kind, tmp_path)
+    engine.save("orders", ORDERS)
+    with track_reads():
+        orders = engine.load("orders")
+        other.upsert("orders", {"id": 2, "status": "accepted"})
+        orders[0]["status"] = "rejected"
+        engine.save("orders", orders)
+    assert engine.load("orders") == [
+        {"id": 1, "status": "rejected", "_version": 1}, {"id": 2, "status": "accepted", "_version": 1}
+    ]
+    engine.close()
+    other.close()
+
+# test that a save inside a scope refuses to overwrite a concurrent change to the same record
+def test_save_detects_conflict(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    other = make_engine(kind, tmp_path)
+    engine.save("orders", ORDERS)
+    with track_reads():
+        orders = engine.load("orders")
+        other.upsert("orders", {"id": 1, "status": "accepted"})
+        orders[0]["status"] = "rejected"
+        with pytest.raises(StorageConflictError):
+            engine.save("orders", orders)
+    assert engine.get("orders", 1)["status"] == "accepted"
+    engine.close()
+    other.close()
+
+# test that the scope's own single-record writes are not mistaken for concurrent changes
+def test_own_writes_are_not_conflicts(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    engine.save("orders", ORDERS)
+    with track_reads():
+        orders = engine.load("orders")
+        engine.upsert("orders", {"id": 1, "status": "accepted"})
+        engine.delete("orders", 2)
+        orders = [order for order in orders if order["id"] != 2]
+        orders[0]["status"] = "accepted"
+        orders.append({"id": 3, "status": "pending"})
+        engine.save("orders", orders)
+    assert [(order["id"], order["status"]) for order in engine.load("orders")] == [(1, "accepted"), (3, "pending")]
+    engine.close()
+
+# test that processes appending to the same collection never lose each other's records
+def test_no_lost_updates_across_processes(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    engine.save("orders", [])
+    engine.close()
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(append_orders, [kind] * 4, [tmp_path] * 4, [1, 101, 201, 301], [15] * 4))
+    engine = make_engine(kind, tmp_path)
+    ids = sorted(order["id"] for order in engine.load("orders"))
+    engine.close()
+    assert ids == [start + i for start in (1, 101, 201, 301) for i in range(15)]
+
+# test that a conflict reaching the API is returned as 409
+def test_conflict_returns_409(monkeypatch):
+    def raise_conflict():
+        raise StorageConflictError("orders", 1)
+    monkeypatch.setattr("app.routers.promo_router.get_public_promos", raise_conflict)
+    response = TestClient(app).get("/promo")
+    assert response.status_code == 409
+    assert "orders record '1'" in response.json()["detail"]
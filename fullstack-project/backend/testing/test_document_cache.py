@@ -0,0 +1,71 @@
+"""Testing the parsed json document cache in front of the repositories."""
+
+import json
+
+from app.repositories.document_cache import DocumentCache, clone
+from app.repositories.storage_engine import JsonStorageEngine
+from app.schemas.order_schema import OrderStatus
+
+ORDERS = [{"id": 1, "status": "pending", "items": [1, 2]}]
+
+def make_engine(tmp_path):
+    cache = DocumentCache()
+    return JsonStorageEngine(tmp_path, cache=cache), cache
+
+# test that repeated loads of an unchanged file are served from the cache
+def test_repeated_loads_hit(tmp_path):
+    (tmp_path / "orders.json").write_text(json.dumps(ORDERS))
+    engine, cache = make_engine(tmp_path)
+
+    assert engine.load("orders") == ORDERS
+    assert engine.load("orders") == ORDERS
+    assert engine.load("orders") == ORDERS
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 2
+
+# test that a file changed by another writer is parsed again
+def test_external_change_misses(tmp_path):
+    (tmp_path / "orders.json").write_text(json.dumps(ORDERS))
+    engine, cache = make_engine(tmp_path)
+    engine.load("orders")
+
+    (tmp_path / "orders.json").write_text(json.dumps([{"id": 2, "status": "ready"}]))
+
+    assert engine.load("orders") == [{"id": 2, "status": "ready"}]
+    assert cache.stats()["misses"] == 2
+
+# test that callers get private copies they can mutate
+def test_loads_are_private_copies(tmp_path):
+    (tmp_path / "orders.json").write_text(json.dumps(ORDERS))
+    engine, _ = make_engine(tmp_path)
+
+    first = engine.load("orders")
+    first[0]["items"].append(3)
+    first[0]["status"] = "changed"
+
+    assert engine.load("orders") == ORDERS
+
+# test that saving refreshes the cache so the next load does not parse the file
+def test_save_refreshes_cache(tmp_path):
+    engine, cache = make_engine(tmp_path)
+    engine.save("orders", ORDERS)
+
+    assert engine.load("orders") == ORDERS
+    assert cache.stats() == {"hits": 1, "misses": 0, "hit_rate": 1.0, "entries": 1}
+
+# test that saved str enums are cached the same way json writes them
+def test_enum_values_are_cached_as_str(tmp_path):
+    engine, _ = make_engine(tmp_path)
+    engine.save("orders", [{"id": 1, "status": OrderStatus.READY}])
+
+    loaded = engine.load("orders")
+    assert loaded == [{"id": 1, "status": "ready"}]
+    assert type(loaded[0]["status"]) is str
+    assert json.loads((tmp_path / "orders.json").read_text()) == loaded
+
+# test that clone returns an independent copy
+def test_clone():
+    original = {"a": [1, {"b": 2}]}
+    copied = clone(original)
+    copied["a"][1]["b"] = 3
+    assert original == {"a": [1, {"b": 2}]}
@@ -0,0 +1,65 @@
+"""Testing the consistency checker and the rebuild of indexes and snapshots."""
+
+import json
+import pytest
+
+from app.repositories.binary_snapshots import write_snapshot
+from app.repositories.document_cache import DocumentCache, freeze
+from app.repositories.fsck import check, rebuild
+from app.repositories.json_files import file_stamp
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine, archive_partition
+
+USERS = [{"id": "m1", "role": "manager"}, {"id": "c1", "role": "customer"}]
+RESTAURANTS = [{"id": 1, "manager_ids": ["m1"]}]
+RECEIPTS = [{"id": 10, "customer_id": "c1"}]
+DELIVERIES = [{"id": 20, "order_id": 1, "driver_id": "d1"}]
+ORDERS = [{"id": 1, "customer_id": "c1", "restaurant_id": 1, "receipt_id": 10, "delivery_id": 20, "status": "delivered"},
+          {"id": 2, "customer_id": "c1", "restaurant_id": 1, "receipt_id": 0, "delivery_id": 0, "status": "pending"}]
+
+def write_data(path, **collections):
+    data = {"users": USERS, "restaurants": RESTAURANTS, "receipts": RECEIPTS, "deliveries": DELIVERIES,
+            "orders": ORDERS, **collections}
+    for collection, records in data.items():
+        (path / f"{collection}.json").write_text(json.dumps(records, indent=2))
+
+def make_engine(kind, path, **options):
+    if kind == "sqlite":
+        return SqliteStorageEngine(path / "storage.db", json_dir=path)
+    if kind == "journal":
+        options["journaled"] = ["orders", "users"]
+    return JsonStorageEngine(path, cache=DocumentCache(), **options)
+
+# test that consistent data passes on every engine, including archive partitions
+@pytest.mark.parametrize("kind", ["json", "journal", "sqlite"])
+def test_consistent(tmp_path, kind):
+    write_data(tmp_path)
+    engine = make_engine(kind, tmp_path)
+    engine.upsert(archive_partition("receipts", "2026-01"), {"id": 11, "customer_id": "c1"})
+    engine.upsert(archive_partition("orders", "2026-01"), {"id": 3, "customer_id": "c1", "receipt_id": 11})
+    engine.upsert("orders", {"id": 4, "customer_id": "c1", "status": "pending"})
+    assert check(engine) == []
+    engine.close()
+
+# test that duplicate or missing primary keys and dangling references are reported
+def test_keys_and_references(tmp_path):
+    write_data(tmp_path, restaurants=[{"id": 1, "manager_ids": ["m1", "m9"]}],
+               orders=ORDERS + [{"id": 2, "customer_id": "c1", "receipt_id": 99}, {"customer_id": "c1"}])
+    problems = check(make_engine("json", tmp_path))
+    assert "orders 2: primary key is used by more than one record" in problems
+    assert "orders: record #3 has no primary key" in problems
+    assert "restaurants 1: manager_ids 'm9' is not in users" in problems
+    assert len(problems) == 3
+
+# test that a binary snapshot that disagrees with its file is caught, and rebuilt from the file
+def test_rebuild(tmp_path):
+    write_data(tmp_path)
+    path = tmp_path / "orders.json"
+    write_snapshot(path, file_stamp(path), freeze([{**ORDERS[0], "status": "pending"}, ORDERS[1]]))
+    engine = make_engine("json", tmp_path, snapshots=True)
+    problems = check(engine)
+    assert "orders 1: lookup by key does not return the stored record" in problems
+    assert "orders 1: lookup by status='delivered' does not find the record" in problems
+
+    assert "orders" in rebuild(engine)
+    assert check(engine) == []
+    assert check(make_engine("json", tmp_path, snapshots=True)) == []
@@ -0,0 +1,153 @@
+"""Testing the primary key and secondary indexes kept by the storage engines."""
+
+import json
+import pytest
+
+from app.repositories.indexes import CollectionIndex
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine
+from app.repositories.document_cache import DocumentCache
+from app.schemas.order_schema import OrderStatus
+
+ORDERS = [
+    {"id": 1, "customer_id": "c1", "restaurant_id": 10, "status": "pending"},
+    {"id": 2, "customer_id": "c2", "restaurant_id": 10, "status": "accepted"},
+    {"id": 3, "customer_id": "c1", "restaurant_id": 20, "status": "pending"},
+]
+
+@pytest.fixture(params=["json", "journaled", "sqlite"])
+def engine(request, tmp_path):
+    if request.param == "json":
+        engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    elif request.param == "journaled":
+        engine = JsonStorageEngine(tmp_path, journaled=["orders"], cache=DocumentCache())
+    else:
+        engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    yield engine
+    engine.close()
+
+# test lookups by primary key and by indexed fields
+def test_find_by(engine):
+    engine.save("orders", ORDERS)
+    assert engine.get("orders", 3) == ORDERS[2]
+    assert [o["id"] for o in engine.find_by("orders", "customer_id", "c1")] == [1, 3]
+    assert [o["id"] for o in engine.find_by("orders", "restaurant_id", 10)] == [1, 2]
+    assert engine.find_by("orders", "customer_id", "nobody") == []
+    assert engine.get_by("orders", "status", "accepted")["id"] == 2
+    assert engine.get_by("orders", "status", "rejected") is None
+
+# test that str enums match their stored value
+def test_find_by_enum(engine):
+    engine.save("orders", ORDERS)
+    assert [o["id"] for o in engine.find_by("orders", "status", OrderStatus.PENDING)] == [1, 3]
+
+# test that indexes follow upserts, deletes and whole-collection saves
+def test_index_follows_writes(engine):
+    engine.save("orders", ORDERS)
+    engine.find_by("orders", "status", "pending")
+
+    engine.upsert("orders", {**ORDERS[0], "status": "accepted"})
+    engine.upsert("orders", {"id": 4, "customer_id": "c4", "restaurant_id": 20, "status": "pending"})
+    assert [o["id"] for o in engine.find_by("orders", "status", "pending")] == [3, 4]
+    assert [o["id"] for o in engine.find_by("orders", "status", "accepted")] == [1, 2]
+
+    engine.delete("orders", 3)
+    assert [o["id"] for o in engine.find_by("orders", "status", "pending")] == [4]
+
+    engine.save("orders", ORDERS[:1])
+    assert engine.find_by("orders", "status", "pending") == [{**ORDERS[0], "_version": 2}]
+    assert engine.get("orders", 4) is None
+
+# test that list fields match on any of their elements
+def test_find_by_list_field(engine):
+    engine.save("restaurants", [
+        {"id": 1, "manager_ids": ["m1", "m2"]},
+        {"id": 2, "manager_ids": ["m2"]},
+    ])
+    assert [r["id"] for r in engine.find_by("restaurants", "manager_ids", "m2")] == [1, 2]
+    assert [r["id"] for r in engine.find_by("restaurants", "manager_ids", "m1")] == [1]
+
+# test that records returned from an index can be changed without affecting it
+def test_results_are_copies(engine):
+    engine.save("orders", ORDERS)
+    engine.find_by("orders", "customer_id", "c1")[0]["status"] = "changed"
+    engine.get("orders", 1)["status"] = "changed"
+    assert engine.get("orders", 1)["status"] == "pending"
+
+# test that the json engine rebuilds its index when the file is changed by something else
+def test_json_index_detects_external_change(tmp_path):
+    engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    engine.save("orders", ORDERS)
+    assert len(engine.find_by("orders", "customer_id", "c1")) == 2
+
+    (tmp_path / "orders.json").write_text(json.dumps(ORDERS[1:]), encoding="utf-8")
+    assert [o["id"] for o in engine.find_by("orders", "customer_id", "c1")] == [3]
+    assert engine.get("orders", 1) is None
+
+# test the index structure directly, including key ordering after updates
+def test_collection_index():
+    index = CollectionIndex("id", ("status",), [dict(order) for order in ORDERS])
+    index.put({"id": 1, "status": "accepted"})
+    assert [o["id"] for o in index.find("status", "accepted")] == [1, 2]
+    assert index.remove(2)["id"] == 2
+    assert index.remove(2) is None
+    assert list(index.records) == [1, 3]
+    with pytest.raises(KeyError):
+        index.find("customer_id", "c1")
+
+RESTAURANTS = [
+    {"id": 1, "name": "Pizza Placard", "address": {"street": "12 Main St"}, "menu": {"items": [{"name": "Pepperoni"}]}},
+    {"id": 2, "name": "Sushi Spot", "address": {"street": "4 Bay Rd"}, "menu": {"items": [{"name": "Salmon Roll"}]}},
+    {"id": 3, "name": "Pasta Place", "address": {"street": "9 Main Ave"}, "menu": {"items": []}},
+]
+
+# test substring search through the trigram index, including short queries and nested paths
+def test_search(engine):
+    engine.save("restaurants", RESTAURANTS)
+    assert [r["id"] for r in engine.search("restaurants", "name", "PlAC")] == [1, 3]
+    assert [r["id"] for r in engine.search("restaurants", "name", "P")] == [1, 2, 3]
+    assert [r["id"] for r in engine.search("restaurants", "address.street", "main")] == [1, 3]
+    assert [r["id"] for r in engine.search("restaurants", "menu.items.name", "roll")] == [2]
+    assert engine.search("restaurants", "name", "placard place") == []
+
+    engine.upsert("restaurants", {**RESTAURANTS[2], "menu": {"items": [{"name": "Spring Roll"}]}})
+    engine.delete("restaurants", 2)
+    assert [r["id"] for r in engine.search("restaurants", "menu.items.name", "roll")] == [3]
+
+# test the trigram index directly: candidates sharing every trigram are checked for the whole substring
+def test_collection_index_search():
+    index = CollectionIndex("id", (), [dict(r) for r in RESTAURANTS], text_fields=("name",))
+    assert [r["id"] for r in index.search("name", "lac")] == [1, 3]
+    index.put({"id": 1, "name": "Taco Town"})
+    assert [r["id"] for r in index.search("name", "lac")] == [3]
+    assert [r["id"] for r in index.search("name", "co t")] == [1]
+    assert index.remove(3)["id"] == 3
+    assert index.search("name", "lac") == []
+    with pytest.raises(KeyError):
+        index.search("city", "kel")
+
+# test paging through records in the order of a numeric field, both ways, ties kept in insertion order
+def test_sorted_by(engine):
+    engine.save("restaurants", [
+        {"id": 1, "average_price": 12.5}, {"id": 2, "average_price": 8.0},
+        {"id": 3, "average_price": 12.5}, {"id": 4}, {"id": 5, "average_price": 20},
+    ])
+    page, total = engine.sorted_by("restaurants", "average_price", start=1, stop=3)
+    assert [r["id"] for r in page] == [1, 3] and total == 4
+    page, total = engine.sorted_by("restaurants", "average_price", descending=True)
+    assert [r["id"] for r in page] == [5, 1, 3, 2]
+
+    engine.upsert("restaurants", {"id": 2, "average_price": 30.0})
+    engine.delete("restaurants", 5)
+    page, total = engine.sorted_by("restaurants", "average_price", descending=True, start=0, stop=2)
+    assert [r["id"] for r in page] == [2, 1] and total == 3
+
+# test the sorted lists directly, following puts and removes
+def test_collection_index_ordered():
+    index = CollectionIndex("id", (), [{"id": i, "price": p} for i, p in [(1, 3.0), (2, 1.0), (3, 3.0)]],
+                            sorted_fields=("price",))
+    assert [r["id"] for r in index.ordered("price")] == [2, 1, 3]
+    assert [r["id"] for r in index.ordered("price", descending=True)] == [1, 3, 2]
+    index.put({"id": 2, "price": 5.0})
+    index.remove(1)
+    assert [r["id"] for r in index.ordered("price", start=1)] == [2]
+    assert index.count("price") == 2
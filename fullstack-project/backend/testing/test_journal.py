@@ -0,0 +1,114 @@
+"""Testing the append-only journal used for journaled json collections."""
+
+import json
+import time
+
+from app.repositories.journal import Journal
+from app.repositories.json_files import file_stamp
+from app.repositories.storage_engine import JsonStorageEngine
+
+ORDERS = [
+    {"id": 1, "status": "pending"},
+    {"id": 2, "status": "pending"},
+]
+
+def make_journal(tmp_path, compact_bytes=1024 * 1024):
+    return Journal(tmp_path / "orders.json", compact_bytes=compact_bytes)
+
+# test that single record writes are appended without rewriting the snapshot
+def test_upsert_appends_to_journal(tmp_path):
+    (tmp_path / "orders.json").write_text(json.dumps(ORDERS))
+    journal = make_journal(tmp_path)
+    snapshot = file_stamp(tmp_path / "orders.json")
+
+    journal.upsert({"id": 1, "status": "accepted"})
+    journal.upsert({"id": 3, "status": "pending"})
+
+    assert file_stamp(tmp_path / "orders.json") == snapshot
+    lines = (tmp_path / "orders.journal").read_text().splitlines()
+    assert len(lines) == 3  # header + 2 entries
+    assert journal.get(1)["status"] == "accepted"
+    assert [o["id"] for o in journal.load()] == [1, 2, 3]
+
+# test that state is rebuilt from the snapshot plus the journal on startup
+def test_rebuild_on_startup(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.save(ORDERS)
+    journal.upsert({"id": 2, "status": "ready"})
+    journal.delete(1)
+
+    restarted = make_journal(tmp_path)
+    assert restarted.load() == [{"id": 2, "status": "ready"}]
+
+# test that saving a full list only journals the records that changed
+def test_save_appends_only_changes(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.upsert(ORDERS[0])
+    journal.upsert(ORDERS[1])
+    before = journal.journal_size()
+
+    journal.save([ORDERS[0], {"id": 2, "status": "rejected"}])
+
+    added = (tmp_path / "orders.journal").read_bytes()[before:].decode().splitlines()
+    assert [json.loads(line)["record"]["id"] for line in added] == [2]
+
+# test that loaded records are copies and do not change the stored state
+def test_load_returns_copies(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.save(ORDERS)
+    journal.load()[0]["status"] = "changed"
+    assert journal.get(1)["status"] == "pending"
+
+# test that compaction rolls the journal into a new snapshot
+def test_compact(tmp_path):
+    journal = make_journal(tmp_path)
+    for order in ORDERS:
+        journal.upsert(order)
+    journal.compact()
+
+    assert json.loads((tmp_path / "orders.json").read_text()) == ORDERS
+    assert len((tmp_path / "orders.journal").read_text().splitlines()) == 1
+    assert make_journal(tmp_path).load() == ORDERS
+
+# test that passing the size threshold compacts in the background
+def test_background_compaction(tmp_path):
+    journal = make_journal(tmp_path, compact_bytes=200)
+    for i in range(10):
+        journal.upsert({"id": i, "status": "pending"})
+
+    deadline = time.time() + 5
+    while journal.journal_size() >= 200 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert journal.journal_size() < 200
+    assert len(make_journal(tmp_path).load()) == 10
+
+# test that a journal is ignored once its snapshot is replaced by another writer
+def test_replaced_snapshot_ignores_journal(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.save(ORDERS)
+    journal.upsert({"id": 3, "status": "pending"})
+
+    (tmp_path / "orders.json").write_text(json.dumps([{"id": 9, "status": "pending"}]))
+
+    assert journal.load() == [{"id": 9, "status": "pending"}]
+    assert make_journal(tmp_path).load() == [{"id": 9, "status": "pending"}]
+
+# test that a partially written last line is not applied
+def test_torn_write_ignored(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.save(ORDERS)
+    with (tmp_path / "orders.journal").open("a") as f:
+        f.write('{"op": "put", "record": {"id": 3')
+    assert [o["id"] for o in make_journal(tmp_path).load()] == [1, 2]
+
+# test that the json engine routes journaled collections through the journal
+def test_engine_journaled_collection(tmp_path):
+    engine = JsonStorageEngine(tmp_path, journaled=["orders"])
+    engine.save("orders", ORDERS)
+    engine.upsert("orders", {"id": 2, "status": "ready"})
+    engine.save("users", [{"id": "u1"}])
+
+    assert (tmp_path / "orders.journal").exists()
+    assert not (tmp_path / "users.journal").exists()
+    assert engine.get("orders", 2)["status"] == "ready"
@@ -0,0 +1,87 @@
+"""Testing the JSON Lines format for append-heavy collections and the migration to it."""
+
+import json
+import pytest
+
+from app.repositories.config_repo import load_config
+from app.repositories.document_cache import DocumentCache
+from app.repositories.json_files import append_jsonl_file, read_jsonl_file
+from app.repositories.jsonl_migrate import migrate
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine, record_version
+from app.repositories.unit_of_work import UnitOfWork
+
+RECEIPTS = [{"id": 1, "customer_id": "u1"}, {"id": 2, "customer_id": "u2"}]
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = JsonStorageEngine(tmp_path, jsonl=["receipts"], cache=DocumentCache())
+    engine.save("receipts", RECEIPTS)
+    return engine
+
+def lines(engine, collection="receipts"):
+    return engine.path_for(collection).read_text().splitlines()
+
+# test that new records are appended as single lines, and other changes rewrite the file
+def test_appends_and_rewrites(engine):
+    assert engine.path_for("receipts").name == "receipts.jsonl"
+    assert [json.loads(line) for line in lines(engine)] == RECEIPTS
+
+    before = engine.path_for("receipts").stat().st_ino
+    engine.upsert("receipts", {"id": 3, "customer_id": "u1"})
+    engine.save("receipts", engine.load("receipts") + [{"id": 4, "customer_id": "u2"}])
+    assert engine.path_for("receipts").stat().st_ino == before
+    assert [json.loads(line)["id"] for line in lines(engine)] == [1, 2, 3, 4]
+    assert [r["id"] for r in engine.find_by("receipts", "customer_id", "u1")] == [1, 3]
+
+    engine.upsert("receipts", {"id": 1, "customer_id": "u3"})
+    assert engine.delete("receipts", 2)
+    stored = [json.loads(line) for line in lines(engine)]
+    assert [(r["id"], r["customer_id"]) for r in stored] == [(1, "u3"), (3, "u1"), (4, "u2")]
+    assert record_version(engine.get("receipts", 1)) == 1
+
+# test that streaming reads records lazily and can stop early
+def test_iter_records(engine):
+    misses = engine.cache.stats()["misses"]
+    records = engine.iter_records("receipts")
+    assert next(records) == RECEIPTS[0]
+    records.close()
+    assert list(engine.iter_records("receipts")) == RECEIPTS
+    assert engine.cache.stats()["misses"] == misses
+
+    unit = UnitOfWork(engine)
+    unit.upsert("receipts", {"id": 3, "customer_id": "u1"})
+    assert [r["id"] for r in unit.iter_records("receipts")] == [1, 2, 3]
+
+# test that every engine can stream a collection
+def test_iter_records_other_engines(tmp_path):
+    engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    engine.save("receipts", RECEIPTS)
+    assert list(engine.iter_records("receipts")) == RECEIPTS
+    engine.close()
+    engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    engine.save("receipts", RECEIPTS)
+    assert list(engine.iter_records("receipts")) == RECEIPTS
+
+# test that a torn last line is ignored when reading and cut off before the next append
+def test_torn_append(tmp_path):
+    path = tmp_path / "receipts.jsonl"
+    path.write_bytes(b'{"id": 1}\n{"id": 2, "cust')
+    assert read_jsonl_file(path) == [{"id": 1}]
+    append_jsonl_file(path, [{"id": 3}])
+    assert read_jsonl_file(path) == [{"id": 1}, {"id": 3}]
+
+# test that migration converts the array files once and switches the config over
+def test_migrate(tmp_path):
+    (tmp_path / "receipts.json").write_text(json.dumps(RECEIPTS, indent=2))
+    (tmp_path / "notifications.json").write_text("")
+
+    assert migrate(["receipts", "notifications"], tmp_path) == ["receipts", "notifications"]
+    assert not (tmp_path / "receipts.json").exists()
+    assert read_jsonl_file(tmp_path / "receipts.jsonl") == RECEIPTS
+    assert load_config()["JSONL_COLLECTIONS"] == ["receipts", "notifications"]
+    assert migrate(["receipts"], tmp_path) == []
+
+    engine = JsonStorageEngine.from_config({**load_config(), "JOURNALED_COLLECTIONS": []})
+    assert engine.path_for("notifications").suffix == ".jsonl"
+    with pytest.raises(ValueError):
+        migrate(["carts"], tmp_path)
@@ -0,0 +1,132 @@
+"""Testing the schema versions of the collections and the migrations that upgrade stored records."""
+
+import json
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+import pytest
+
+from app.main import app
+
+from app.repositories.binary_snapshots import read_snapshot
+from app.repositories.config_repo import load_config, save_config
+from app.repositories.document_cache import DocumentCache
+from app.repositories.json_files import file_stamp, read_json_file, read_jsonl_file
+from app.repositories.migrations import SCHEMA_FIELD, migration, schema_version, upgrade_record
+from app.repositories.schema_migrate import migrate, upgrade_stale_collections
+from app.repositories.storage_engine import (
+    ENGINES, JsonStorageEngine, SqliteStorageEngine, record_version, set_engine,
+)
+
+OLD_USERS = [
+    {"id": "c1", "email": "c@x.com", "name": "C", "password": "p", "age": 30, "gender": "f", "role": "customer",
+     "auth_token": "t", "auth_token_expiry": 0},
+    {"id": "d1", "email": "d@x.com", "name": "D", "password": "p", "age": 30, "gender": "m", "role": "driver"},
+]
+OLD_ORDERS = [{"id": 1, "customer_id": "c1"}, {"id": 2, "customer_id": "c1", "status": "delivered"}]
+
+def make_engine(kind, path, **options):
+    if kind == "json":
+        return JsonStorageEngine(path, cache=DocumentCache(), migrate=True, **options)
+    return SqliteStorageEngine(path / "storage.db", json_dir=path, migrate=True)
+
+# test that old records get the fields of their current shape, and current records are left alone
+def test_upgrade_record():
+    customer, driver = (dict(user) for user in OLD_USERS)
+    assert upgrade_record("users", customer) and upgrade_record("users", driver)
+    assert customer["wallet_balance"] == 0.0 and customer["cart"]["cart_items"] == []
+    assert driver["vehicle"] == "bike" and driver["driver_status"] == "available"
+    assert "vehicle" not in customer and customer[SCHEMA_FIELD] == schema_version("users")
+    assert "auth_token" not in customer and "auth_token_expiry" not in customer
+    assert customer["email_key"] == "c@x.com"
+
+    assert not upgrade_record("users", customer)
+    restaurant = {"id": 1, "menu": {"items": [{"price": 4.0}, {"price": 5.0}]}}
+    assert upgrade_record("restaurants", restaurant)
+    assert restaurant["menu_item_count"] == 2 and restaurant["average_price"] == 4.5
+    assert not upgrade_record("receipts", {"id": 1})
+    with pytest.raises(ValueError):
+        migration("users", schema_version("users") + 2)(lambda user: None)
+
+# test that every engine upgrades records as it reads them, and rewrites stale collections without new versions
+@pytest.mark.parametrize("kind", ["json", "journal", "sqlite"])
+def test_engines_upgrade_on_read(tmp_path, kind):
+    (tmp_path / "orders.json").write_text(json.dumps(OLD_ORDERS, indent=2))
+    if kind == "sqlite":
+        # a migrating engine imports json files upgraded, so the old rows are imported by a plain one
+        plain = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+        plain.load("orders")
+        plain.close()
+    engine = make_engine("json" if kind == "journal" else kind, tmp_path,
+                         **({"journaled": ["orders"]} if kind == "journal" else {}))
+    assert [o["status"] for o in engine.load("orders")] == ["pending", "delivered"]
+    assert engine.get("orders", 1)["distance_km"] == 0.0
+    # the sqlite engine upgrades old rows as it opens their table, so they are found by fields added since
+    assert engine.stale_collections() == ([] if kind == "sqlite" else ["orders"])
+    assert [o["id"] for o in engine.find_by("orders", "status", "pending")] == [1]
+
+    engine.upgrade("orders")
+    assert engine.stale_collections() == []
+    assert all(record_version(o) == 0 for o in engine.load("orders"))
+    if kind != "sqlite":
+        assert all(o[SCHEMA_FIELD] == schema_version("orders") for o in read_json_file(tmp_path / "orders.json"))
+    engine.close()
+
+# test that records written are stamped with the current version, and snapshots are tagged with it
+def test_writes_and_snapshots(tmp_path):
+    engine = make_engine("json", tmp_path, snapshots=True)
+    engine.upsert("orders", {"id": 3, "customer_id": "c1"})
+    path = engine.path_for("orders")
+    assert read_json_file(path)[0][SCHEMA_FIELD] == schema_version("orders")
+    assert read_snapshot(path, file_stamp(path), schema_version("orders")) is not None
+    assert read_snapshot(path, file_stamp(path)) is None
+    assert engine.stale_collections() == []
+
+# test that the offline command streams json and jsonl files through the migrations
+def test_offline_migrate(tmp_path):
+    (tmp_path / "users.json").write_text(json.dumps(OLD_USERS, indent=2))
+    (tmp_path / "orders.jsonl").write_text("".join(json.dumps(order) + "\n" for order in OLD_ORDERS))
+
+    assert migrate(["users", "orders", "restaurants"], tmp_path) == {"users": 2, "orders": 2, "restaurants": 0}
+    users = read_json_file(tmp_path / "users.json")
+    assert (tmp_path / "users.json").read_text() == json.dumps(users, indent=2)
+    assert users[1]["driver_status"] == "available"
+    assert read_jsonl_file(tmp_path / "orders.jsonl")[0]["status"] == "pending"
+    assert not (tmp_path / "restaurants.json").exists()
+
+    assert migrate(["users", "orders"], tmp_path) == {"users": 0, "orders": 0}
+    with pytest.raises(ValueError):
+        migrate(["receipts"], tmp_path)
+
+# test that the startup job rewrites only the collections that held old records
+def test_upgrade_stale_collections(tmp_path):
+    (tmp_path / "users.json").write_text(json.dumps(OLD_USERS, indent=2))
+    previous = set_engine(make_engine("json", tmp_path))
+    try:
+        assert upgrade_stale_collections() == ["users"]
+        assert upgrade_stale_collections() == []
+    finally:
+        set_engine(previous)
+    assert read_json_file(tmp_path / "users.json")[0]["favourites"] == []
+
+# test that old records are upgraded even with the removed SCHEMA_MIGRATIONS switch still set to false
+def test_old_records_served_without_migration_switch():
+    data = Path(__file__).resolve().parent.parent / "app" / "data"
+    (data / "users.json").write_text(json.dumps(OLD_USERS, indent=2))
+    address = {"street": "1 Main St", "city": "Kelowna", "province": "BC", "postal_code": "A1A 1A1"}
+    restaurants = [
+        {"id": 1, "name": "Dear", "city": "Kelowna", "address": address, "manager_ids": [],
+         "menu": {"items": [{"id": 1, "name": "Steak", "description": "", "price": 30.0}]}},
+        {"id": 2, "name": "Cheap", "city": "Kelowna", "address": address, "manager_ids": []},
+    ]
+    (data / "restaurants.json").write_text(json.dumps(restaurants, indent=2))
+    save_config({**load_config(), "SCHEMA_MIGRATIONS": False})
+    previous = set_engine(ENGINES[load_config().get("STORAGE_ENGINE", "json")].from_config(load_config()))
+    try:
+        client = TestClient(app)
+        assert client.post("/user/login", json={"email": "C@x.com", "password": "p"}).status_code == 200
+        response = client.get("/restaurant/search?sort_price=asc")
+        assert response.status_code == 200
+        assert [restaurant["id"] for restaurant in response.json()["results"]] == [2, 1]
+    finally:
+        set_engine(previous).close()
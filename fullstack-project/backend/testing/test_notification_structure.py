@@ -6,7 +6,7 @@ from fastapi.testclient import TestClient
 from fastapi import HTTPException
 import pytest
 from app.main import app
-from app.repositories.notification_repo import load_notifications
+from app.repositories.notification_repo import load_notifications, save_notifications
 from app.services.notification_service import Notification
 from .test_password_updates import register_user
 
@@ -22,11 +22,6 @@ def notification():
 def real_notification(register_user):
     return Notification("testing testing 1 2 3", [register_user.get("user_id")])
 
-# mock database
-@pytest.fixture
-def mock_load(mocker):
-    return mocker.patch("app.services.notification_service.load_notifications")
-
 # test creation
 def test_create(notification):
     assert notification.message == "test message"
@@ -39,17 +34,31 @@ def test_create(notification):
     assert e.value.status_code == 400
 
 # test getting id with both an empty database an one with an entry
+# the fixture's notification has already been given id 1
 @pytest.mark.parametrize(
         "existing_db, expected_id",
         [
-            ([], 1),
+            ([], 2),
             ([{"id": 1}], 2),
         ],
 )
-def test_get_next_id(mock_load, notification, existing_db, expected_id):
-    mock_load.return_value = existing_db
+def test_get_next_id(notification, existing_db, expected_id):
+    save_notifications(existing_db)
+    assert notification.id == 1
     assert notification._get_next_id() == expected_id
 
+# test that ids are never reused, even after the notification holding the highest id is removed
+def test_get_next_id_not_reused(notification):
+    notification.save()
+    save_notifications([])
+    assert Notification("another message", ["user1"]).id == notification.id + 1
+
+# test that converting a stored notification keeps its id without allocating a new one
+def test_model_to_notification_keeps_id(notification):
+    notif = Notification.model_to_Notification(notification.to_model())
+    assert notif.id == notification.id
+    assert notification._get_next_id() == notification.id + 1
+
 # test converting Notification class to the pydantic model
 def test_to_model(notification):
     notification_model = notification.to_model()
@@ -58,8 +67,7 @@ def test_to_model(notification):
     assert notification_model.is_read == {"user1": False, "user2": False}
 
 # test saving notification to db
-def test_save(mock_load, notification):
-    mock_load.return_value = []
+def test_save(notification):
     notification.save()
     notifs = load_notifications()
     for notif in notifs:
@@ -68,8 +76,7 @@ def test_save(mock_load, notification):
     assert loaded_notif["message"] == notification.message
 
 # test marking notification as read
-def test_read_notif(mock_load, notification):
-    mock_load.return_value = []
+def test_read_notif(notification):
     notification.save()
     notification.mark_as_read("user1")
     notifs = load_notifications()
@@ -79,15 +86,13 @@ def test_read_notif(mock_load, notification):
     assert loaded_notif["is_read"].get("user1") == True
 
 # test that HTTP 404 status is raised when notification not found
-def test_read_missing_notif(mock_load, notification):
-    mock_load.return_value = []
+def test_read_missing_notif(notification):
     with pytest.raises(HTTPException) as e:
         notification.mark_as_read("user1")
     assert e.value.status_code == 404
 
 # test that HTTP 404 status is raised when user is not a recipient
-def read_notif_not_recipient(mock_load, notification):
-    mock_load.return_value = []
+def read_notif_not_recipient(notification):
     notification.save()
     with pytest.raises(HTTPException) as e:
         notification.mark_as_read("user5")
@@ -0,0 +1,125 @@
+"""Testing the archiving of old orders and receipts into monthly partitions."""
+
+import datetime
+from fastapi.testclient import TestClient
+import pytest
+
+from app.main import app
+from app.repositories.archive_repo import archive_months, get_archived, load_archive
+from app.repositories.conflicts import StorageConflictError
+from app.repositories.order_repo import get_order, update_order_record
+from app.repositories.receipt_repo import get_receipt_by_id
+from app.repositories.storage_engine import (
+    DATA_DIR, JsonStorageEngine, SqliteStorageEngine, archive_partition, get_engine,
+)
+from app.repositories.document_cache import DocumentCache
+from app.services import order_service
+from app.services.order_service import archive_old_orders, get_order_by_id, has_placed_orders
+from app.services.user_service import get_user_by_id
+from testing.test_cart_management import customer_with_cart_and_token, customer_with_token
+from testing.test_order_management import place_order
+from testing.test_restaurant_crud import setup_restaurant, setup_restaurant_menu
+
+client = TestClient(app)
+NOW = datetime.datetime(2026, 3, 10, tzinfo=datetime.timezone.utc)
+
+# partitions are new files, so the data backup in conftest does not remove them
+@pytest.fixture(autouse=True)
+def remove_partitions():
+    yield
+    for path in DATA_DIR.glob("*_archive_*"):
+        path.unlink()
+
+def set_order(order_id, status, created):
+    def change(order):
+        order["status"] = status
+        order["date_created"] = created.isoformat()
+        return order
+    return update_order_record(order_id, change)
+
+@pytest.fixture
+def old_order(customer_with_cart_and_token):
+    token = customer_with_cart_and_token["token"]
+    order = place_order(token)
+    return {**set_order(order["id"], "delivered", datetime.datetime(2026, 1, 15, tzinfo=datetime.timezone.utc)),
+            "token": token}
+
+# test that old orders in a final status move to their month's partition, with their receipts
+def test_archive_old_orders(old_order):
+    assert archive_old_orders(NOW) == 1
+    assert get_order(old_order["id"]) is None
+    assert get_receipt_by_id(old_order["receipt_id"], include_archived=False) is None
+    assert archive_months("orders") == ["2026-01"]
+    assert [o["id"] for o in load_archive("orders", "2026-01")] == [old_order["id"]]
+    assert get_archived("receipts", old_order["receipt_id"])["id"] == old_order["receipt_id"]
+
+    assert get_order_by_id(old_order["id"]).status == "delivered"
+    assert has_placed_orders(get_user_by_id(old_order["customer_id"]))
+    assert archive_old_orders(NOW) == 0
+
+# test that recent orders and orders still in progress stay active
+def test_recent_and_live_orders_stay(old_order):
+    set_order(old_order["id"], "preparing", datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+    assert archive_old_orders(NOW) == 0
+    set_order(old_order["id"], "cancelled", NOW - datetime.timedelta(days=5))
+    assert archive_old_orders(NOW) == 0
+    assert get_order(old_order["id"]) is not None
+
+# test the archive routes for customers and managers
+def test_archive_routes(old_order, setup_restaurant_menu):
+    archive_old_orders(NOW)
+    headers = {"Authorization": f"Bearer {old_order['token']}"}
+    assert client.get("/order/customer", headers=headers).json() == []
+
+    response = client.get("/order/customer/archive", headers=headers)
+    assert response.status_code == 200
+    assert [o["id"] for o in response.json()] == [old_order["id"]]
+    assert client.get("/order/customer/archive?month=2026-02", headers=headers).json() == []
+    assert client.get("/order/customer/archive?month=2026-13", headers=headers).status_code == 400
+
+    restaurant_id = setup_restaurant_menu["restaurant"]["id"]
+    manager_headers = {"Authorization": f"Bearer {setup_restaurant_menu['token']}"}
+    response = client.get(f"/order/restaurant/{restaurant_id}/archive?month=2026-01", headers=manager_headers)
+    assert response.status_code == 200
+    assert [o["id"] for o in response.json()] == [old_order["id"]]
+
+# test that the receipt of an archived order is still served, from the archive
+def test_archived_receipt_route(old_order):
+    archive_old_orders(NOW)
+    headers = {"Authorization": f"Bearer {old_order['token']}"}
+    response = client.get(f"/receipt/{old_order['receipt_id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == old_order["receipt_id"]
+
+# test that both engines list the partitions that were written
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_engine_partitions(tmp_path, kind):
+    if kind == "json":
+        engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    else:
+        engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    engine.upsert(archive_partition("orders", "2026-02"), {"id": 2})
+    engine.upsert(archive_partition("orders", "2025-12"), {"id": 1})
+    engine.upsert(archive_partition("receipts", "2026-02"), {"id": 7})
+    assert engine.partitions("orders") == ["orders_archive_2025_12", "orders_archive_2026_02"]
+    assert engine.get("orders_archive_2026_02", 2) == {"id": 2}
+    engine.close()
+
+    with pytest.raises(ValueError):
+        archive_partition("users", "2026-01")
+    with pytest.raises(ValueError):
+        archive_partition("orders", "January")
+
+# test that an order changed by another request while it is being archived stays active
+def test_archive_conflict(old_order, monkeypatch):
+    engine = get_engine()
+    def reopen(receipt_id, include_archived):
+        # another request changes the order after it was picked for the archive
+        engine.update("orders", old_order["id"], lambda order: {**order, "status": "pending"})
+        return get_receipt_by_id(receipt_id, include_archived)
+    monkeypatch.setattr(order_service, "get_receipt_by_id", reopen)
+
+    with pytest.raises(StorageConflictError):
+        archive_old_orders(NOW)
+    assert get_order(old_order["id"])["status"] == "pending"
+    assert archive_months("orders") == []
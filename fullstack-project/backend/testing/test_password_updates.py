@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.repositories.user_repo import load_users, save_users
 from app.services.config_service import get_reset_token_expiry_default
+from app.services.password_service import verify_password
 
 client = TestClient(app)
 
@@ -50,7 +51,10 @@ def test_password_reset(register_user):
         if user.get("id") == user_id:
             new_password_response = user.get("password")
             break
-    assert new_password_response == new_password
+    assert verify_password(new_password, new_password_response)
+    # sessions opened before the reset are logged out
+    headers = {"Authorization": f"Bearer {register_user.get('token')}"}
+    assert client.get(f"/user/{user_id}", headers=headers).status_code == 401
 
 # check that expired reset token is rejected
 def test_password_reset_expired_token(register_user):
@@ -105,7 +109,7 @@ def test_password_update(register_user):
         if user.get("id") == user_id:
             new_password_response = user.get("password")
             break
-    assert new_password_response == new_password
+    assert verify_password(new_password, new_password_response)
 
 # test logged-in user password change with wrong password
 def test_password_update_wrong_pw(register_user):
@@ -0,0 +1,100 @@
+"""Testing password hashing and the worker pool passwords are checked in."""
+
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repositories.config_repo import load_config, save_config
+from app.repositories.user_repo import find_user_by_email, get_user, update_user_record
+from app.services import password_service, user_service
+from app.services.password_benchmark import benchmark
+from app.services.password_service import hash_password, hash_password_async, needs_rehash, verify_password
+from testing.test_authorization import register_and_login
+
+client = TestClient(app)
+
+def login(email, password="Password123"):
+    return client.post("/user/login", json={"email": email, "password": password})
+
+def store_password(user_id, password):
+    def change(user):
+        user["password"] = password
+        return user
+    update_user_record(user_id, change)
+
+# test that hashes are salted and checked, and that passwords stored as plain text are still accepted
+def test_hash_and_verify():
+    first, second = hash_password("Password123", iterations=1000), hash_password("Password123", iterations=1000)
+    assert first != second and first.startswith("pbkdf2_sha256$1000$")
+    assert verify_password("Password123", first) and not verify_password("password123", first)
+    assert verify_password("Password123", "Password123") and not verify_password("Password", "Password123")
+    assert needs_rehash("Password123") and needs_rehash(hash_password("x", iterations=2000))
+    assert not needs_rehash(first)
+    malformed = "pbkdf2_sha256$many$salt$digest"
+    assert needs_rehash(malformed) and not verify_password("Password123", malformed)
+
+# test that sign-up stores a hash, and login rehashes passwords stored at another cost
+def test_login_rehashes():
+    _, user_id = register_and_login("hashed@example.com")
+    assert get_user(user_id)["password"].startswith("pbkdf2_sha256$1000$")
+
+    store_password(user_id, "Password123")
+    assert login("hashed@example.com").status_code == 200
+    assert get_user(user_id)["password"].startswith("pbkdf2_sha256$1000$")
+
+    save_config({**load_config(), "PASSWORD_HASH_ITERATIONS": 1500, "PASSWORD_REHASH_ON_LOGIN": False})
+    assert login("hashed@example.com").status_code == 200
+    assert get_user(user_id)["password"].startswith("pbkdf2_sha256$1000$")
+    save_config({**load_config(), "PASSWORD_REHASH_ON_LOGIN": True})
+    assert login("hashed@example.com").status_code == 200
+    assert get_user(user_id)["password"].startswith("pbkdf2_sha256$1500$")
+    assert login("hashed@example.com", "wrong-password").status_code == 401
+
+    store_password(user_id, "pbkdf2_sha256$many$salt$digest")
+    assert login("hashed@example.com").status_code == 401
+
+# test that login reads and writes storage outside the event loop, so a burst of logins does not block other requests
+def test_login_storage_off_event_loop(monkeypatch):
+    register_and_login("threaded@example.com")
+    def off_loop(function):
+        def call(*args):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return function(*args)
+            raise AssertionError(f"{function.__name__} ran on the event loop")
+        return call
+    for name in ("find_user_by_email", "update_user_record", "create_session"):
+        monkeypatch.setattr(user_service, name, off_loop(getattr(user_service, name)))
+    save_config({**load_config(), "PASSWORD_HASH_ITERATIONS": 1500})
+    assert login("threaded@example.com").status_code == 200
+    assert find_user_by_email("threaded@example.com")["password"].startswith("pbkdf2_sha256$1500$")
+
+# test that no more passwords are hashed at once than the pool has workers
+def test_pool_bounds_concurrency(monkeypatch):
+    active, most = [0], [0]
+    lock = threading.Lock()
+    derive = password_service._derive
+    def slow_derive(password, salt, iterations):
+        with lock:
+            active[0] += 1
+            most[0] = max(most[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return derive(password, salt, iterations)
+    monkeypatch.setattr(password_service, "_derive", slow_derive)
+
+    async def burst():
+        return await asyncio.gather(*(hash_password_async("Password123", iterations=1000) for _ in range(8)))
+    assert len(set(asyncio.run(burst()))) == 8
+    # PASSWORD_HASH_WORKERS is 2 by default
+    assert most[0] == 2
+
+# test that the benchmark reports a rate for each cost
+def test_benchmark():
+    rates = benchmark([1000, 2000], logins=4)
+    assert list(rates) == [1000, 2000] and all(rate > 0 for rate in rates.values())
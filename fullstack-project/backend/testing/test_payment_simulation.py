@@ -1,5 +1,6 @@
 """Test cases for payment simulation and checkout."""
 
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 import pytest
 from app.main import app
@@ -429,6 +430,26 @@ def test_failed_payment_cart_preserved(customer_with_cart_and_token):
     cart_after = get_customer_from_db(customer_id)["cart"]
     assert cart_after == cart_before
 
+# test that a checkout failing after the wallet was charged writes nothing
+def test_failed_checkout_rolls_back(customer_with_cart_and_token, monkeypatch):
+    token = customer_with_cart_and_token["token"]
+    customer_id = customer_with_cart_and_token["customer"]["id"]
+    receipt_id = get_receipt_id(token)
+    customer_before = get_customer_from_db(customer_id)
+
+    def fail(current_user):
+        raise HTTPException(status_code=500, detail="Cart could not be emptied")
+    monkeypatch.setattr("app.services.order_service.empty_cart", fail)
+
+    response = client.post(
+        "/payment/checkout",
+        json={"receipt_id": receipt_id},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 500
+    assert get_customer_from_db(customer_id) == customer_before
+    assert get_orders_for_customer(customer_id) == []
+
 # test that receipt_id is added to _processing during payment
 def test_receipt_id_in_processing_during_payment(customer_with_cart_and_token):
     token = customer_with_cart_and_token["token"]
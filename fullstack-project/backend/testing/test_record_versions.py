@@ -0,0 +1,95 @@
+"""Testing record versions and conditional single-record updates."""
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repositories.conflicts import StorageConflictError
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine, record_version
+from app.repositories.document_cache import DocumentCache
+from app.repositories.user_repo import get_user
+from app.services.user_service import deposit_to_wallet, withdraw_from_wallet, get_user_by_id
+
+client = TestClient(app)
+
+@pytest.fixture(params=["json", "journaled", "sqlite"])
+def engine(request, tmp_path):
+    if request.param == "json":
+        engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    elif request.param == "journaled":
+        engine = JsonStorageEngine(tmp_path, journaled=["users"], cache=DocumentCache())
+    else:
+        engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    engine.save("users", [{"id": "u1", "wallet_balance": 0}, {"id": "u2", "wallet_balance": 0}])
+    yield engine
+    engine.close()
+
+def deposit(user):
+    user["wallet_balance"] += 1
+    return user
+
+# test that versions only change when a record changes
+def test_versions_follow_changes(engine):
+    assert record_version(engine.get("users", "u1")) == 0
+    engine.upsert("users", {"id": "u1", "wallet_balance": 5})
+    assert record_version(engine.get("users", "u1")) == 1
+    engine.upsert("users", engine.get("users", "u1"))
+    assert record_version(engine.get("users", "u1")) == 1
+
+    users = engine.load("users")
+    users[0]["wallet_balance"] = 6
+    engine.save("users", users)
+    assert [record_version(user) for user in engine.load("users")] == [2, 0]
+
+# test that a write based on a stale version is refused
+def test_compare_and_swap(engine):
+    user = engine.get("users", "u1")
+    written = engine.compare_and_swap("users", {**user, "wallet_balance": 10}, 0)
+    assert record_version(written) == 1
+    assert engine.compare_and_swap("users", {**user, "wallet_balance": 20}, 0) is None
+    assert engine.get("users", "u1")["wallet_balance"] == 10
+    assert record_version(engine.compare_and_swap("users", {"id": "u3", "wallet_balance": 0}, 0)) == 0
+
+# test that update re-applies the change after a concurrent write
+def test_update_retries_on_conflict(engine):
+    calls = []
+    def change(user):
+        calls.append(user["wallet_balance"])
+        if len(calls) == 1:
+            engine.upsert("users", {**user, "wallet_balance": 100})
+        user["wallet_balance"] += 1
+        return user
+
+    assert engine.update("users", "u1", change)["wallet_balance"] == 101
+    assert calls == [0, 100]
+    assert engine.update("users", "missing", change) is None
+
+# test that update gives up if the record never stops changing
+def test_update_gives_up(engine):
+    def change(user):
+        engine.upsert("users", {**user, "wallet_balance": user["wallet_balance"] + 10})
+        return deposit(user)
+
+    with pytest.raises(StorageConflictError):
+        engine.update("users", "u1", change, retries=3)
+
+# test that concurrent updates to the same record are never lost
+def test_concurrent_updates(engine):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: engine.update("users", "u1", deposit, retries=100), range(40)))
+    assert engine.get("users", "u1")["wallet_balance"] == 40
+
+# test that concurrent wallet deposits and withdrawals all apply
+def test_concurrent_wallet_updates():
+    client.post("/user", json={
+        "email": "concurrent@example.com", "password": "Password123", "name": "Test User",
+        "age": 25, "gender": "male", "role": "customer"
+    })
+    user_id = client.post("/user/login", json={"email": "concurrent@example.com", "password": "Password123"}).json()["user_id"]
+    customer = get_user_by_id(user_id)
+    deposit_to_wallet(100, customer)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda i: deposit_to_wallet(2, customer) if i % 2 else withdraw_from_wallet(1, customer), range(20)))
+    assert get_user(user_id)["wallet_balance"] == 110
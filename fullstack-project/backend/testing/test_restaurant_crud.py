@@ -104,8 +104,8 @@ def test_create_restaurant(setup_restaurant):
 # test getting the list of managers
 def test_get_managers(mocker):
     sample_id = 79
-    mock_load = mocker.patch("app.services.restaurant_service.load_restaurants")
-    mock_load.return_value = [{"id": sample_id, "manager_ids": ["manager1", "manager2"]}]
+    mock_get = mocker.patch("app.services.restaurant_service.get_restaurant")
+    mock_get.return_value = {"id": sample_id, "manager_ids": ["manager1", "manager2"]}
     assert get_managers(sample_id) == ["manager1", "manager2"]
 
 # test a typical restaurant update
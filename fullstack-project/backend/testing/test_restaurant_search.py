@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 import uuid
 from app.main import app
+from app.services.restaurant_service import _search_key
 
 client = TestClient(app)
 
@@ -195,4 +196,107 @@ def test_page_size_zero_rejected():
 # test that page_size over 50 is rejected
 def test_page_size_over_50_rejected():
     response = client.get("/restaurant/search?page_size=51")
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+# test that a menu item added after the restaurant was created can be searched for right away
+def test_search_new_menu_item():
+    setup = setup_restaurant()
+    response = client.post(
+        f"/restaurant/{setup['restaurant']['id']}/menu",
+        json={"name": "Maple Donut", "description": "A donut", "price": 2.5},
+        headers={"Authorization": f"Bearer {setup['token']}"}
+    )
+    assert response.status_code == 201
+
+    response = client.get("/restaurant/search?menu_item=maple don&city=kel")
+    assert [r["id"] for r in response.json()["results"]] == [setup["restaurant"]["id"]]
+
+# test that text filters are answered by the index, without loading every restaurant
+def test_search_does_not_load_every_restaurant(monkeypatch):
+    setup_restaurant(name="Indexed Diner")
+    setup_restaurant(name="Other Grill")
+    def fail():
+        raise AssertionError("every restaurant was loaded")
+    monkeypatch.setattr("app.services.restaurant_service.load_restaurants", fail)
+
+    response = client.get("/restaurant/search?name=diner&province=bc")
+    assert [r["name"] for r in response.json()["results"]] == ["Indexed Diner"]
+
+# test that sorting by price follows the menu items added and updated after the restaurants were created
+def test_sort_price_follows_menu_changes():
+    cheap = setup_restaurant(name="Cheap Eats", menu_items=[{"name": "Fries", "description": "Fries", "price": 3.0}])
+    setup_restaurant(name="Fine Dining", menu_items=[{"name": "Steak", "description": "Steak", "price": 40.0}])
+    middle = setup_restaurant(name="Bistro", menu_items=[{"name": "Soup", "description": "Soup", "price": 10.0}])
+
+    response = client.get("/restaurant/search?sort_price=asc")
+    assert [r["name"] for r in response.json()["results"]] == ["Cheap Eats", "Bistro", "Fine Dining"]
+
+    headers = {"Authorization": f"Bearer {cheap['token']}"}
+    response = client.post(f"/restaurant/{cheap['restaurant']['id']}/menu",
+                           json={"name": "Caviar", "description": "Caviar", "price": 99.0}, headers=headers)
+    assert response.status_code == 201
+    menu_item = middle["restaurant"]["menu"]["items"][0]
+    response = client.put(f"/restaurant/{middle['restaurant']['id']}/menu/{menu_item['id']}",
+                          json={"id": menu_item["id"], "name": "Soup", "price": 1.0}, headers={"Authorization": f"Bearer {middle['token']}"})
+    assert response.status_code == 200
+
+    response = client.get("/restaurant/search?sort_price=desc&page=1&page_size=2")
+    assert [r["name"] for r in response.json()["results"]] == ["Cheap Eats", "Fine Dining"]
+    assert response.json()["total"] == 3
+    response = client.get("/restaurant/search?sort_price=desc&page=2&page_size=2")
+    assert [r["name"] for r in response.json()["results"]] == ["Bistro"]
+
+# test that filtered searches are sorted by the stored average price too
+def test_sort_price_with_filters():
+    setup_restaurant(name="Taco Stand", menu_items=[{"name": "Taco", "description": "Taco", "price": 4.0}])
+    setup_restaurant(name="Taco Palace", menu_items=[{"name": "Taco", "description": "Taco", "price": 9.0}])
+    setup_restaurant(name="Burger Barn", menu_items=[{"name": "Burger", "description": "Burger", "price": 1.0}])
+
+    response = client.get("/restaurant/search?name=taco&sort_price=desc")
+    assert [r["name"] for r in response.json()["results"]] == ["Taco Palace", "Taco Stand"]
+
+# test that restaurants stored before the average price was recorded are ordered by their menu
+def test_search_key_without_average_price():
+    old = {"id": 4, "menu": {"items": [{"price": 2.0}, {"price": 6.0}]}}
+    assert _search_key(old, "asc") == (4.0, 4)
+    assert _search_key(old, "desc") == (-4.0, 4)
+    assert _search_key({"id": 5}, "asc") == (0.0, 5)
+
+# test walking through every result with cursors, in price order
+def test_cursor_pagination():
+    for price in [7.0, 3.0, 9.0, 3.0, 5.0]:
+        setup_restaurant(name=f"Cursor {price}", menu_items=[{"name": "Dish", "description": "Dish", "price": price}])
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/restaurant/search?sort_price=asc&page_size=2" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        body = response.json()
+        seen += [r["id"] for r in body["results"]]
+        assert body["total"] == 5
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    by_page = client.get("/restaurant/search?sort_price=asc&page_size=5").json()["results"]
+    assert seen == [r["id"] for r in by_page]
+    assert [r["name"] for r in by_page] == ["Cursor 3.0", "Cursor 3.0", "Cursor 5.0", "Cursor 7.0", "Cursor 9.0"]
+
+# test that pages fetched by cursor do not shift when restaurants are added before them
+def test_cursor_is_stable_across_inserts():
+    for i in range(4):
+        setup_restaurant(name=f"Stable {i}")
+    first = client.get("/restaurant/search?name=stable&page_size=2").json()
+    setup_restaurant(name="Stable New")
+
+    second = client.get(f"/restaurant/search?name=stable&page_size=2&cursor={first['next_cursor']}").json()
+    assert [r["name"] for r in second["results"]] == ["Stable 2", "Stable 3"]
+    assert second["next_cursor"] is not None
+
+# test that invalid cursors, and cursors of another sort order, are rejected
+def test_invalid_cursor_rejected():
+    for i in range(3):
+        setup_restaurant(name=f"Rejected {i}")
+    cursor = client.get("/restaurant/search?page_size=1&sort_price=asc").json()["next_cursor"]
+
+    assert client.get("/restaurant/search?cursor=not-a-cursor").status_code == 400
+    assert client.get(f"/restaurant/search?sort_price=desc&cursor={cursor}").status_code == 400
+    assert client.get(f"/restaurant/search?sort_price=asc&cursor={cursor}").status_code == 200
@@ -0,0 +1,86 @@
+"""Testing the cache of restaurant search results, and its invalidation by restaurant writes."""
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repositories.config_repo import load_config, save_config
+from app.repositories.search_cache import SearchCache, search_cache
+from app.repositories.storage_engine import get_engine
+from testing.test_restaurant_search import setup_restaurant
+from testing.test_tax_rate_management import admin_token
+
+client = TestClient(app)
+
+# test that the least recently used queries are evicted first, and that expired or outdated results are not kept
+def test_lru_and_ttl():
+    cache = SearchCache(max_entries=2)
+    for query in (("a",), ("b",)):
+        cache.put(query, [(1,)], time.time() + 60, cache.generation())
+    assert cache.get(("a",)) == [(1,)]
+    cache.put(("c",), [(2,)], time.time() + 60, cache.generation())
+    assert cache.get(("b",)) is None and cache.get(("c",)) == [(2,)]
+
+    cache.put(("d",), [(3,)], time.time() - 1, cache.generation())
+    assert cache.get(("d",)) is None
+    generation = cache.generation()
+    cache.invalidate()
+    cache.put(("e",), [(4,)], time.time() + 60, generation)
+    assert cache.get(("e",)) is None
+    assert cache.stats() == {"hits": 2, "misses": 3, "hit_rate": 0.4, "evictions": 2, "entries": 0}
+
+# test that repeated searches of a page are served from the cache, whatever their case, and counted as hits
+def test_repeated_searches_hit_the_cache(admin_token, monkeypatch):
+    for i in range(3):
+        setup_restaurant(name=f"Cached {i}")
+    first = client.get("/restaurant/search?city=Kelowna&page_size=2").json()
+    second = client.get("/restaurant/search?city=Kelowna&page=2&page_size=2").json()
+    assert [r["name"] for r in first["results"] + second["results"]] == ["Cached 0", "Cached 1", "Cached 2"]
+
+    engine = get_engine()
+    monkeypatch.setattr(engine, "search", lambda *args: (_ for _ in ()).throw(AssertionError("searched again")))
+    monkeypatch.setattr(engine, "load", lambda *args: (_ for _ in ()).throw(AssertionError("loaded everything")))
+    hits = search_cache.stats()["hits"]
+    assert client.get("/restaurant/search?city=KELOWNA&page=2&page_size=2").json() == second
+    assert search_cache.stats()["hits"] == hits + 1
+
+    response = client.get("/config/cache-stats", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert response.json()["search_cache"]["hits"] == hits + 1
+
+# test that restaurant and menu writes drop the cached results
+def test_writes_invalidate():
+    setup = setup_restaurant(name="Before")
+    assert client.get("/restaurant/search?menu_item=waffle").json()["total"] == 0
+
+    response = client.post(f"/restaurant/{setup['restaurant']['id']}/menu",
+                           json={"name": "Waffle", "description": "Waffle", "price": 6.0},
+                           headers={"Authorization": f"Bearer {setup['token']}"})
+    assert response.status_code == 201
+    assert client.get("/restaurant/search?menu_item=waffle").json()["total"] == 1
+
+# test that without the cache, searching by page and by cursor gives the same results
+def test_uncached_search_matches_cached():
+    for price in [7.0, 3.0, 9.0, 3.0, 5.0]:
+        setup_restaurant(name=f"Uncached {price}", menu_items=[{"name": "Dish", "description": "Dish", "price": price}])
+    cached = client.get("/restaurant/search?name=uncached&sort_price=desc&page_size=5").json()
+    save_config({**load_config(), "SEARCH_CACHE_TTL_SECONDS": 0})
+
+    entries = search_cache.stats()["entries"]
+    seen, cursor = [], None
+    while True:
+        body = client.get("/restaurant/search?name=uncached&sort_price=desc&page_size=2"
+                          + (f"&cursor={cursor}" if cursor else "")).json()
+        seen += [r["id"] for r in body["results"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [r["id"] for r in cached["results"]]
+    assert search_cache.stats()["entries"] == entries
+
+    # unsorted results are in id order either way
+    uncached = client.get("/restaurant/search?name=uncached&page_size=5").json()
+    save_config({**load_config(), "SEARCH_CACHE_TTL_SECONDS": 60})
+    assert client.get("/restaurant/search?name=uncached&page_size=5").json() == uncached
+    assert [r["id"] for r in uncached["results"]] == sorted(r["id"] for r in uncached["results"])
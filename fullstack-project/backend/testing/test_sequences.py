@@ -0,0 +1,77 @@
+"""Testing the id sequences used to allocate new primary keys."""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pytest
+
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine
+from app.repositories.document_cache import DocumentCache
+
+ORDERS = [{"id": 1, "status": "pending"}, {"id": 5, "status": "pending"}]
+
+def make_engine(kind, path):
+    if kind == "json":
+        return JsonStorageEngine(path, cache=DocumentCache())
+    return SqliteStorageEngine(path / "storage.db", json_dir=path)
+
+def allocate(kind, path, count):
+    engine = make_engine(kind, path)
+    try:
+        return [engine.next_id("orders") for _ in range(count)]
+    finally:
+        engine.close()
+
+@pytest.fixture(params=["json", "sqlite"])
+def kind(request):
+    return request.param
+
+# test that a new sequence continues from the highest existing id
+def test_seeded_from_existing_ids(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    assert engine.next_id("orders") == 1
+    engine.save("receipts", ORDERS)
+    assert engine.next_id("receipts") == 6
+    assert engine.next_id("receipts") == 7
+    engine.close()
+
+# test that ids are not reused after records are deleted or the engine is recreated
+def test_ids_never_reused(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    engine.save("orders", ORDERS)
+    assert engine.next_id("orders") == 6
+    engine.save("orders", [])
+    engine.close()
+    assert allocate(kind, tmp_path, 1) == [7]
+
+# test that records written past the counter are skipped over
+def test_skips_ids_already_in_use(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    engine.save("orders", ORDERS)
+    assert engine.next_id("orders") == 6
+    engine.upsert("orders", {"id": 7, "status": "pending"})
+    engine.upsert("orders", {"id": 9, "status": "pending"})
+    assert engine.next_id("orders") == 10
+    engine.close()
+
+# test that ids of archived records are counted, both when the sequence starts and when it is behind
+def test_archived_ids_not_reused(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    engine.save("orders_archive_2024_01", ORDERS)
+    assert engine.next_id("orders") == 6
+    engine.upsert("orders_archive_2024_02", {"id": 7, "status": "delivered"})
+    assert engine.next_id("orders") == 8
+    engine.close()
+
+# test that concurrent threads never receive the same id
+def test_unique_across_threads(kind, tmp_path):
+    engine = make_engine(kind, tmp_path)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: engine.next_id("orders"), range(80)))
+    assert sorted(ids) == list(range(1, 81))
+    engine.close()
+
+# test that separate processes sharing the data directory never receive the same id
+def test_unique_across_processes(kind, tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        batches = list(pool.map(allocate, [kind] * 4, [tmp_path] * 4, [20] * 4))
+    ids = [new_id for batch in batches for new_id in batch]
+    assert sorted(ids) == list(range(1, 81))
@@ -0,0 +1,83 @@
+"""Testing the session store used to authenticate requests."""
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repositories.json_files import file_stamp
+from app.repositories.session_repo import find_user_sessions, get_session, save_session, session_key
+from app.repositories.storage_engine import DATA_DIR, get_engine
+from app.services.session_service import purge_expired_sessions
+from testing.test_authorization import register_and_login
+
+client = TestClient(app)
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+# test that login stores a session under the token's hash, which authenticates without loading every user
+def test_login_creates_session(monkeypatch):
+    token, user_id = register_and_login("session@example.com")
+    session = get_session(token)
+    assert session["id"] == session_key(token) and session["user_id"] == user_id
+    assert token not in (DATA_DIR / "sessions.json").read_text()
+
+    engine = get_engine()
+    load = engine.load
+    def load_without_users(collection):
+        assert collection != "users", "authentication loaded every user"
+        return load(collection)
+    monkeypatch.setattr(engine, "load", load_without_users)
+    assert client.get(f"/user/{user_id}", headers=auth(token)).status_code == 200
+
+def login(email):
+    return client.post("/user/login", json={"email": email, "password": "Password123"}).json()["token"]
+
+# test that logging in again opens another session, without rewriting users.json
+def test_concurrent_sessions():
+    first_token, user_id = register_and_login("relogin@example.com")
+    stamp = file_stamp(DATA_DIR / "users.json")
+    second_token = login("relogin@example.com")
+    assert file_stamp(DATA_DIR / "users.json") == stamp
+    assert len(find_user_sessions(user_id)) == 2
+    assert client.get(f"/user/{user_id}", headers=auth(first_token)).status_code == 200
+    assert client.get(f"/user/{user_id}", headers=auth(second_token)).status_code == 200
+
+# test that logging out ends only the session of the token used
+def test_logout():
+    first_token, user_id = register_and_login("logout@example.com")
+    second_token = login("logout@example.com")
+    assert client.post("/user/logout", headers=auth(first_token)).status_code == 200
+    assert client.get(f"/user/{user_id}", headers=auth(first_token)).status_code == 401
+    assert client.get(f"/user/{user_id}", headers=auth(second_token)).status_code == 200
+    assert client.post("/user/logout", headers=auth(first_token)).status_code == 401
+
+# test that a user can revoke all of their own sessions, but not another user's
+def test_revoke_sessions():
+    token, user_id = register_and_login("revoke@example.com")
+    login("revoke@example.com")
+    other_token, other_id = register_and_login("other@example.com")
+    assert client.delete(f"/user/{other_id}/sessions", headers=auth(token)).status_code == 403
+
+    response = client.delete(f"/user/{user_id}/sessions", headers=auth(token))
+    assert response.status_code == 200 and response.json() == {"revoked": 2}
+    assert find_user_sessions(user_id) == []
+    assert client.get(f"/user/{other_id}", headers=auth(other_token)).status_code == 200
+
+# test that the purge deletes expired sessions only
+def test_purge_expired_sessions():
+    token, user_id = register_and_login("purge@example.com")
+    save_session("old-token", user_id, 100)
+    assert purge_expired_sessions(now=200) == 1
+    assert get_session("old-token") is None and get_session(token) is not None
+    assert purge_expired_sessions(now=200) == 0
+
+# test that expired sessions and sessions of deleted users are rejected
+def test_expired_and_orphaned_sessions():
+    token, user_id = register_and_login("expired@example.com")
+    save_session(token, user_id, 0)
+    response = client.get(f"/user/{user_id}", headers=auth(token))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Session token has expired, please log in again"
+
+    save_session("orphan-token", "no-such-user", 2 ** 40)
+    assert client.get(f"/user/{user_id}", headers=auth("orphan-token")).status_code == 401
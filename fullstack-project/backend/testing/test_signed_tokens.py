@@ -0,0 +1,77 @@
+"""Testing the signed session tokens, which are checked without a session lookup."""
+
+from fastapi.testclient import TestClient
+import pytest
+
+from app.auth import read_signed_token, sign_token
+from app.main import app
+from app.repositories.config_repo import load_config, save_config
+from app.repositories.session_repo import find_user_sessions
+from app.repositories.storage_engine import get_engine
+from app.services.session_service import create_session, purge_expired_sessions
+from testing.test_authorization import register_and_login
+
+client = TestClient(app)
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(autouse=True)
+def signed_mode():
+    save_config({**load_config(), "SESSION_TOKEN_MODE": "signed", "SESSION_SIGNING_KEY": "test-key"})
+
+# test that login issues a signed token, which is not stored and whose role is checked before loading the user
+def test_signed_login(monkeypatch):
+    token, user_id = register_and_login("signed@example.com")
+    assert token.startswith("v1.") and find_user_sessions(user_id) == []
+    assert read_signed_token(token)["sub"] == user_id
+    assert client.get(f"/user/{user_id}", headers=auth(token)).status_code == 200
+
+    engine = get_engine()
+    get = engine.get
+    def get_without_users(collection, key):
+        assert collection != "users", "the user was loaded to check the token's role"
+        return get(collection, key)
+    monkeypatch.setattr(engine, "get", get_without_users)
+    assert client.get("/delivery/my-active", headers=auth(token)).status_code == 403
+
+# test that tampered, expired and differently keyed tokens are rejected
+def test_invalid_signed_tokens():
+    token, user_id = register_and_login("tampered@example.com")
+    prefix, claims, signature = token.split(".")
+    forged = sign_token(user_id, "admin", 2 ** 40).split(".")[1]
+    for bad in (f"{prefix}.{forged}.{signature}", f"{prefix}.{claims}.x", f"{prefix}.!!.{signature}"):
+        assert client.get(f"/user/{user_id}", headers=auth(bad)).status_code == 401
+
+    response = client.get(f"/user/{user_id}", headers=auth(sign_token(user_id, "customer", 0)))
+    assert response.json()["detail"] == "Session token has expired, please log in again"
+    save_config({**load_config(), "SESSION_TOKEN_MODE": "signed", "SESSION_SIGNING_KEY": "another-key"})
+    assert client.get(f"/user/{user_id}", headers=auth(token)).status_code == 401
+
+# test that logging out revokes only that token, and revoking a user's sessions revokes all of their tokens
+def test_signed_token_revocation():
+    first_token, user_id = register_and_login("revoked@example.com")
+    second_token = client.post("/user/login", json={"email": "revoked@example.com", "password": "Password123"}).json()["token"]
+    assert client.post("/user/logout", headers=auth(first_token)).status_code == 200
+    assert client.get(f"/user/{user_id}", headers=auth(first_token)).status_code == 401
+    assert client.get(f"/user/{user_id}", headers=auth(second_token)).status_code == 200
+
+    assert client.delete(f"/user/{user_id}/sessions", headers=auth(second_token)).status_code == 200
+    assert client.get(f"/user/{user_id}", headers=auth(second_token)).status_code == 401
+    third_token = client.post("/user/login", json={"email": "revoked@example.com", "password": "Password123"}).json()["token"]
+    assert client.get(f"/user/{user_id}", headers=auth(third_token)).status_code == 200
+
+    # revocations are purged once the tokens they revoke have expired
+    purge_expired_sessions(now=2 ** 40)
+    assert get_engine().load("revoked_tokens") == []
+
+# test that signed tokens are neither issued nor accepted without a signing key, and a worker without one does not start
+def test_signed_mode_requires_a_key():
+    token, user_id = register_and_login("keyless@example.com")
+    save_config({**load_config(), "SESSION_SIGNING_KEY": ""})
+    with pytest.raises(ValueError):
+        create_session(user_id, "customer")
+    assert client.get(f"/user/{user_id}", headers=auth(token)).status_code == 401
+    with pytest.raises(RuntimeError):
+        with TestClient(app):
+            pass
@@ -0,0 +1,159 @@
+"""Testing the coalescing of identical concurrent reads into a single call."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from app.repositories.unit_of_work import transaction
+from app.services.single_flight import single_flight, single_flight_stats
+
+# test that identical calls in flight together run once and get copies of the result, while other calls run apart
+def test_sync_calls_coalesce():
+    calls = []
+    release = threading.Event()
+
+    @single_flight
+    def lookup(key, page=1):
+        calls.append((key, page))
+        release.wait(5)
+        return {"key": key, "page": page}
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        same = [pool.submit(lookup, "a", page=2) for _ in range(5)]
+        other = pool.submit(lookup, "b")
+        time.sleep(0.2)
+        release.set()
+        results = [future.result() for future in same]
+
+    assert calls.count(("a", 2)) == 1 and ("b", 1) in calls
+    assert all(result == {"key": "a", "page": 2} for result in results)
+    assert len({id(result) for result in results}) == 5
+    assert other.result() == {"key": "b", "page": 1}
+    stats = single_flight_stats()[f"{__name__}.test_sync_calls_coalesce.<locals>.lookup"]
+    assert stats == {"calls": 6, "shared": 4}
+
+    # once returned, nothing is kept
+    lookup("a", page=2)
+    assert calls.count(("a", 2)) == 2
+
+# test that the callers waiting for a call do not see the changes its first caller makes to the result
+def test_first_caller_changes_are_not_shared():
+    release = threading.Event()
+
+    class SlowToCopy:
+        def __init__(self, items):
+            self.items = items
+
+        def __deepcopy__(self, memo):
+            # slow enough for the first caller to change its result while the others would copy it
+            time.sleep(0.1)
+            return SlowToCopy(list(self.items))
+
+    @single_flight
+    def lookup():
+        release.wait(5)
+        return SlowToCopy([])
+
+    def call():
+        result = lookup()
+        result.items.append(threading.get_ident())
+        return result.items
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(call) for _ in range(4)]
+        time.sleep(0.2)
+        release.set()
+        assert all(len(future.result()) == 1 for future in futures)
+
+# test that every waiting caller gets the error of the call they joined
+def test_sync_errors_are_shared():
+    release = threading.Event()
+
+    @single_flight
+    def failing():
+        release.wait(5)
+        raise ValueError("not found")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(failing) for _ in range(3)]
+        time.sleep(0.2)
+        release.set()
+        errors = []
+        for future in futures:
+            with pytest.raises(ValueError) as raised:
+                future.result()
+            errors.append(raised.value)
+    # each caller raises its own copy, so the tracebacks they collect are not mixed into one shared error
+    assert len({id(error) for error in errors}) == 3
+    assert all(str(error) == "not found" for error in errors)
+
+# test that sync calls made from a coroutine run on their own, instead of blocking the event loop while they wait
+def test_sync_calls_from_event_loop_are_not_coalesced():
+    calls = []
+
+    @single_flight
+    def lookup():
+        calls.append(1)
+        return len(calls)
+
+    async def call():
+        return lookup()
+
+    assert asyncio.run(call()) == 1
+    name = f"{__name__}.test_sync_calls_from_event_loop_are_not_coalesced.<locals>.lookup"
+    assert name not in single_flight_stats()
+
+# test that every awaiting caller gets its own copy of the error of the call they joined
+def test_async_errors_are_copied():
+    @single_flight
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("not found")
+
+    async def burst():
+        return await asyncio.gather(*(failing() for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(burst())
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert len({id(error) for error in errors}) == 3
+
+# test that identical awaits on one event loop run once
+def test_async_calls_coalesce():
+    calls = []
+
+    @single_flight
+    async def lookup(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return [key]
+
+    async def burst():
+        return await asyncio.gather(*(lookup("a") for _ in range(4)), lookup("b"))
+
+    assert asyncio.run(burst()) == [["a"]] * 4 + [["b"]]
+    assert calls == ["a", "b"]
+
+    async def changing():
+        result = await lookup("c")
+        result.append("changed")
+        return result
+
+    async def changing_burst():
+        return await asyncio.gather(*(changing() for _ in range(3)))
+
+    assert asyncio.run(changing_burst()) == [["c", "changed"]] * 3
+
+# test that calls made inside a transaction are not coalesced, since they can see its pending writes
+def test_transactions_are_not_coalesced():
+    calls = []
+
+    @single_flight
+    def lookup():
+        calls.append(1)
+        return len(calls)
+
+    with transaction():
+        assert lookup() == 1 and lookup() == 2
@@ -0,0 +1,109 @@
+"""Testing the json and sqlite storage engines behind the repositories."""
+
+import json
+import sqlite3
+import pytest
+
+from app.repositories.storage_engine import (
+    JsonStorageEngine,
+    SqliteStorageEngine,
+    get_engine,
+    set_engine,
+)
+from app.repositories.order_repo import load_orders, save_orders, get_order, save_order
+
+ORDERS = [
+    {"id": 1, "customer_id": "c1", "status": "pending"},
+    {"id": 2, "customer_id": "c2", "status": "accepted"},
+]
+
+@pytest.fixture(params=["json", "sqlite"])
+def engine(request, tmp_path):
+    if request.param == "json":
+        engine = JsonStorageEngine(tmp_path)
+    else:
+        engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    yield engine
+    engine.close()
+
+# test that a saved collection loads back in the same order
+def test_save_and_load(engine):
+    engine.save("orders", ORDERS)
+    assert engine.load("orders") == ORDERS
+
+# test that an unknown or empty collection loads as an empty list
+def test_load_empty(engine):
+    assert engine.load("orders") == []
+
+# test single record lookups
+def test_get(engine):
+    engine.save("orders", ORDERS)
+    assert engine.get("orders", 2) == ORDERS[1]
+    assert engine.get("orders", 99) is None
+
+# test that upsert replaces an existing record in place and appends new ones
+def test_upsert(engine):
+    engine.save("orders", ORDERS)
+    engine.upsert("orders", {"id": 1, "customer_id": "c1", "status": "rejected"})
+    engine.upsert("orders", {"id": 3, "customer_id": "c3", "status": "pending"})
+    assert [o["id"] for o in engine.load("orders")] == [1, 2, 3]
+    assert engine.get("orders", 1)["status"] == "rejected"
+
+# test deleting records
+def test_delete(engine):
+    engine.save("orders", ORDERS)
+    assert engine.delete("orders", 1) is True
+    assert engine.delete("orders", 1) is False
+    assert engine.load("orders") == [ORDERS[1]]
+
+# test that saving a shorter list removes the missing records
+def test_save_removes_missing(engine):
+    engine.save("orders", ORDERS)
+    engine.save("orders", ORDERS[1:])
+    assert engine.load("orders") == ORDERS[1:]
+
+# test that string primary keys are kept separate from int keys
+def test_string_keys(engine):
+    users = [{"id": "1", "name": "a"}, {"id": "abc", "name": "b"}]
+    engine.save("users", users)
+    assert engine.get("users", "1") == users[0]
+    assert engine.get("users", 1) is None
+
+# test that the sqlite engine seeds a new table from the existing json file
+def test_sqlite_seeds_from_json(tmp_path):
+    (tmp_path / "orders.json").write_text(json.dumps(ORDERS))
+    engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    assert engine.load("orders") == ORDERS
+    engine.close()
+
+# test that the sqlite database runs in WAL mode
+def test_sqlite_wal_mode(tmp_path):
+    engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    engine.save("orders", ORDERS)
+    engine.close()
+    conn = sqlite3.connect(tmp_path / "storage.db")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+# test that a sqlite save only rewrites the rows that changed
+def test_sqlite_save_only_writes_changes(tmp_path):
+    engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    engine.save("orders", ORDERS)
+    conn = engine._connect()
+    before = conn.total_changes
+    engine.save("orders", [ORDERS[0], {**ORDERS[1], "status": "ready"}])
+    assert conn.total_changes - before == 1
+    engine.close()
+
+# test that the repository functions go through the active engine
+def test_repositories_use_active_engine(tmp_path):
+    previous = set_engine(SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path))
+    try:
+        save_orders(ORDERS)
+        save_order({"id": 2, "customer_id": "c2", "status": "ready"})
+        assert get_order(2)["status"] == "ready"
+        assert [o["id"] for o in load_orders()] == [1, 2]
+        assert not (tmp_path / "orders.json").exists()
+    finally:
+        get_engine().close()
+        set_engine(previous)
@@ -0,0 +1,106 @@
+"""Testing units of work that apply the writes of one operation together."""
+
+import pytest
+
+from app.repositories.conflicts import StorageConflictError
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine, get_engine, set_engine
+from app.repositories.document_cache import DocumentCache
+from app.repositories.unit_of_work import UnitOfWork, transaction
+
+USERS = [{"id": "u1", "wallet_balance": 50, "cart": ["a"]}, {"id": "u2", "wallet_balance": 0, "cart": []}]
+
+@pytest.fixture(params=["json", "journaled", "sqlite"])
+def engine(request, tmp_path):
+    if request.param == "json":
+        engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    elif request.param == "journaled":
+        engine = JsonStorageEngine(tmp_path, journaled=["users", "orders"], cache=DocumentCache())
+    else:
+        engine = SqliteStorageEngine(tmp_path / "storage.db", json_dir=tmp_path)
+    engine.save("users", USERS)
+    engine.save("orders", [])
+    previous = set_engine(engine)
+    yield engine
+    set_engine(previous)
+    engine.close()
+
+def charge(user):
+    user["wallet_balance"] -= 20
+    return user
+
+# test that writes are only visible to the unit until it commits, then applied once per collection
+def test_commit(engine, monkeypatch):
+    commits = []
+    commit = engine.commit
+    monkeypatch.setattr(engine, "commit", lambda changes: commits.append(sorted(changes)) or commit(changes))
+
+    with transaction() as unit:
+        assert get_engine() is unit
+        unit.update("users", "u1", charge)
+        user = unit.get("users", "u1")
+        user["cart"] = []
+        unit.upsert("users", user)
+        unit.upsert("orders", {"id": 1, "customer_id": "u1"})
+        assert unit.get("users", "u1")["wallet_balance"] == 30
+        assert unit.find_by("orders", "customer_id", "u1") == [{"id": 1, "customer_id": "u1"}]
+        assert engine.get("users", "u1")["wallet_balance"] == 50
+        assert engine.load("orders") == []
+
+    assert get_engine() is engine
+    assert commits == [["orders", "users"]]
+    assert engine.get("users", "u1")["wallet_balance"] == 30
+    assert engine.get("users", "u1")["cart"] == []
+    assert engine.load("orders") == [{"id": 1, "customer_id": "u1"}]
+
+# test that nothing is written when the block raises
+def test_rollback_on_error(engine):
+    with pytest.raises(RuntimeError):
+        with transaction() as unit:
+            unit.update("users", "u1", charge)
+            unit.upsert("orders", {"id": 1, "customer_id": "u1"})
+            raise RuntimeError("payment failed")
+    assert engine.load("users") == USERS
+    assert engine.load("orders") == []
+
+# test that a conditional write fails the whole commit if the record changed after it was read
+def test_conflict_at_commit(engine):
+    with pytest.raises(StorageConflictError):
+        with transaction() as unit:
+            unit.update("users", "u1", charge)
+            unit.upsert("orders", {"id": 1, "customer_id": "u1"})
+            engine.upsert("users", {**USERS[0], "wallet_balance": 10})
+    assert engine.get("users", "u1")["wallet_balance"] == 10
+    assert engine.load("orders") == []
+
+# test whole-collection loads and saves, deletes, and nested transactions inside a unit
+def test_whole_collection_writes(engine):
+    with transaction() as unit:
+        users = unit.load("users")
+        users[1]["wallet_balance"] = 5
+        unit.save("users", users)
+        with transaction() as inner:
+            assert inner is unit
+            assert unit.delete("users", "u1")
+        assert not unit.delete("users", "u1")
+        assert [user["id"] for user in unit.load("users")] == ["u2"]
+    assert [(user["id"], user["wallet_balance"]) for user in engine.load("users")] == [("u2", 5)]
+
+# test that a json commit failing part way restores the collections it already wrote
+def test_json_partial_commit_restored(tmp_path, monkeypatch):
+    engine = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    engine.save("orders", [])
+    engine.save("users", USERS)
+    write = engine._write
+    def failing_write(collection, items):
+        if collection == "users":
+            raise OSError("disk full")
+        return write(collection, items)
+    monkeypatch.setattr(engine, "_write", failing_write)
+
+    unit = UnitOfWork(engine)
+    unit.upsert("orders", {"id": 1, "customer_id": "u1"})
+    unit.update("users", "u1", charge)
+    with pytest.raises(OSError):
+        unit.commit()
+    assert engine.load("orders") == []
+    assert engine.load("users") == USERS
@@ -0,0 +1,78 @@
+"""Testing the cache of authenticated users, keyed by their bearer token."""
+
+import time
+
+from fastapi import HTTPException
+import pytest
+
+from app.auth import get_user_from_token
+from app.repositories.session_repo import delete_session
+from app.repositories.storage_engine import get_engine
+from app.repositories.unit_of_work import transaction
+from app.repositories.user_cache import UserCache, user_cache
+from app.repositories.user_repo import get_user, save_user, update_user_record
+from testing.test_authorization import register_and_login
+
+# test that the least recently used tokens are evicted first, and expired entries are not returned
+def test_lru_and_ttl():
+    cache = UserCache(max_entries=2)
+    for token in ("a", "b"):
+        cache.put(token, f"user-{token}", token.upper(), time.time() + 60, cache.generation())
+    assert cache.get("a") == "A"
+    cache.put("c", "user-c", "C", time.time() + 60, cache.generation())
+    assert cache.get("b") is None and cache.get("a") == "A" and cache.get("c") == "C"
+
+    cache.put("d", "user-d", "D", time.time() - 1, cache.generation())
+    assert cache.get("d") is None
+    assert cache.stats() == {"hits": 3, "misses": 2, "hit_rate": 0.6, "evictions": 2, "entries": 1}
+
+# test that a user invalidated while being loaded is not cached, since the loaded copy may be outdated
+def test_invalidated_while_loading():
+    cache = UserCache()
+    generation = cache.generation()
+    cache.invalidate("user-a")
+    cache.put("a", "user-a", "A", time.time() + 60, generation)
+    assert cache.get("a") is None
+
+# test that repeated requests reuse the cached user, and that writes to the user drop it
+def test_requests_reuse_cached_user(monkeypatch):
+    token, user_id = register_and_login("cached@example.com")
+    first = get_user_from_token(token)
+    hits = user_cache.stats()["hits"]
+
+    engine = get_engine()
+    get = engine.get
+    def get_without_users(collection, key):
+        assert collection != "users", "the cached user was loaded again"
+        return get(collection, key)
+    monkeypatch.setattr(engine, "get", get_without_users)
+    assert get_user_from_token(token) is first
+    assert user_cache.stats()["hits"] == hits + 1
+    monkeypatch.undo()
+
+    save_user({**get_user(user_id), "name": "Renamed"})
+    assert get_user_from_token(token).name == "Renamed"
+
+    def top_up(user):
+        user["wallet_balance"] += 5
+        return user
+    update_user_record(user_id, top_up)
+    assert get_user_from_token(token).wallet_balance == 5
+
+# test that a write inside a transaction drops the cached user once the transaction commits
+def test_invalidated_on_commit():
+    token, user_id = register_and_login("committed@example.com")
+    get_user_from_token(token)
+    with transaction():
+        save_user({**get_user(user_id), "name": "Committed"})
+        assert get_user_from_token(token).name == "Test User"
+    assert get_user_from_token(token).name == "Committed"
+
+# test that a cached user's token stops working once its session is deleted, e.g. by a logout in another worker
+def test_cached_token_rechecked():
+    token, user_id = register_and_login("rechecked@example.com")
+    get_user_from_token(token)
+    delete_session(token)
+    with pytest.raises(HTTPException) as raised:
+        get_user_from_token(token)
+    assert raised.value.status_code == 401
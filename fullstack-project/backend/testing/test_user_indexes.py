@@ -0,0 +1,54 @@
+"""Testing the email and reset token indexes used by sign-up, login and password resets."""
+
+from fastapi.testclient import TestClient
+import pytest
+
+from app.main import app
+from app.repositories.storage_engine import get_engine
+from app.repositories.user_repo import find_user_by_email, find_user_by_reset_token, get_user
+from testing.test_authorization import register_and_login
+
+client = TestClient(app)
+
+@pytest.fixture
+def without_user_scans(monkeypatch):
+    engine = get_engine()
+    load = engine.load
+    def load_without_users(collection):
+        assert collection != "users", "every user was loaded"
+        return load(collection)
+    monkeypatch.setattr(engine, "load", load_without_users)
+
+# test that sign-up and login find users by email through the index, ignoring case
+def test_email_index(without_user_scans):
+    token, user_id = register_and_login("Indexed@Example.com")
+    assert token is not None
+    assert find_user_by_email(" indexed@example.COM ")["id"] == user_id
+
+    response = client.post("/user/login", json={"email": "INDEXED@example.com", "password": "Password123"})
+    assert response.status_code == 200 and response.json()["user_id"] == user_id
+    response = client.post("/user", json={"email": "indexed@example.com", "password": "Password123", "name": "Twin",
+                                          "age": 25, "gender": "male", "role": "customer"})
+    assert response.status_code == 409
+    assert client.post("/user/login", json={"email": "nobody@example.com", "password": "x"}).status_code == 401
+
+# test that changing a user's email moves them in the index
+def test_email_change_reindexes():
+    token, user_id = register_and_login("before@example.com")
+    response = client.put(f"/user/{user_id}", headers={"Authorization": f"Bearer {token}"}, json={
+        "email": "After@example.com", "name": "Test User", "age": 25, "gender": "male"})
+    assert response.status_code == 200
+    assert find_user_by_email("before@example.com") is None
+    assert find_user_by_email("after@example.com")["id"] == user_id
+
+# test that password resets find the user by their reset token through the index
+def test_reset_token_index(without_user_scans):
+    _, user_id = register_and_login("forgetful@example.com")
+    client.post("/user/password-reset/request", json={"email": "Forgetful@example.com"})
+    reset_token = get_user(user_id)["reset_token"]
+    assert find_user_by_reset_token(reset_token)["id"] == user_id
+
+    response = client.patch("/user/password-reset", json={"new_password": "newpassword", "reset_token": reset_token})
+    assert response.status_code == 200
+    assert find_user_by_reset_token(reset_token) is None
+    assert client.post("/user/login", json={"email": "forgetful@example.com", "password": "newpassword"}).status_code == 200
@@ -0,0 +1,114 @@
+"""Testing the write-behind mode that batches saves into periodic flushes."""
+
+import json
+import time
+import pytest
+
+from app.repositories.storage_engine import JsonStorageEngine, SqliteStorageEngine, record_version, set_engine
+from app.repositories.document_cache import DocumentCache
+from app.repositories.unit_of_work import transaction
+from app.repositories.write_behind import WriteBehindEngine
+
+ORDERS = [{"id": 1, "status": "pending"}, {"id": 2, "status": "pending"}]
+
+def make_inner(kind, path):
+    if kind == "json":
+        return JsonStorageEngine(path, cache=DocumentCache())
+    return SqliteStorageEngine(path / "storage.db", json_dir=path)
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture(params=["json", "sqlite"])
+def inner(request, tmp_path):
+    inner = make_inner(request.param, tmp_path)
+    inner.save("orders", ORDERS)
+    inner.save("users", [])
+    return inner
+
+@pytest.fixture
+def engine(inner):
+    engine = WriteBehindEngine(inner, interval_ms=60000)
+    yield engine
+    engine.close()
+
+# test that writes are served from memory and reach the wrapped engine on flush, once per collection
+def test_flush_coalesces_writes(engine, inner, monkeypatch):
+    saves = []
+    save = inner.save
+    monkeypatch.setattr(inner, "save", lambda collection, items: saves.append(collection) or save(collection, items))
+
+    for status in ["accepted", "preparing", "ready"]:
+        engine.upsert("orders", {"id": 1, "status": status})
+    engine.upsert("orders", {"id": 3, "status": "pending"})
+    engine.delete("orders", 2)
+    engine.upsert("users", {"id": "u1", "role": "customer"})
+
+    assert [o["id"] for o in engine.find_by("orders", "status", "pending")] == [3]
+    assert engine.get("orders", 1)["status"] == "ready"
+    assert inner.load("orders") == ORDERS
+    assert engine.stats()["dirty"] == 2
+
+    engine.flush()
+    assert sorted(saves) == ["orders", "users"]
+    assert [(o["id"], o["status"]) for o in inner.load("orders")] == [(1, "ready"), (3, "pending")]
+    assert record_version(inner.get("orders", 1)) == 3
+    assert engine.stats() == {"writes": 6, "flushes": 1, "collections_written": 2, "dirty": 0}
+
+# test that the flusher writes on its own once the interval is up
+def test_interval_flush(inner):
+    engine = WriteBehindEngine(inner, interval_ms=20)
+    engine.upsert("orders", {"id": 1, "status": "accepted"})
+    assert wait_for(lambda: inner.get("orders", 1)["status"] == "accepted")
+    engine.close()
+
+# test that enough pending writes flush before the interval is up
+def test_max_pending_flush(inner):
+    engine = WriteBehindEngine(inner, interval_ms=60000, max_pending=3)
+    for order_id in range(3, 6):
+        engine.upsert("orders", {"id": order_id, "status": "pending"})
+    assert wait_for(lambda: len(inner.load("orders")) == 5)
+    engine.close()
+
+# test that closing the engine writes out what is still buffered
+def test_close_flushes(inner):
+    engine = WriteBehindEngine(inner, interval_ms=60000)
+    engine.save("orders", ORDERS[:1])
+    engine.close()
+    assert inner.load("orders") == ORDERS[:1]
+
+# test that conditional updates and transactions work on the buffered state
+def test_updates_and_transactions(engine, inner):
+    def accept(order):
+        order["status"] = "accepted"
+        return order
+
+    assert engine.update("orders", 1, accept)["_version"] == 1
+    assert engine.compare_and_swap("orders", {"id": 1, "status": "ready"}, 0) is None
+
+    previous = set_engine(engine)
+    try:
+        with transaction() as unit:
+            unit.update("orders", 2, accept)
+            unit.upsert("users", {"id": "u1", "role": "customer"})
+    finally:
+        set_engine(previous)
+    assert engine.get("orders", 2)["status"] == "accepted"
+    assert engine.get("users", "u1") is not None
+
+    engine.flush()
+    assert [o["status"] for o in inner.load("orders")] == ["accepted", "accepted"]
+
+# test that new ids skip records that are still only buffered
+def test_next_id_skips_buffered_records(tmp_path):
+    inner = JsonStorageEngine(tmp_path, cache=DocumentCache())
+    engine = WriteBehindEngine(inner, interval_ms=60000)
+    engine.upsert("orders", {"id": 1, "status": "pending"})
+    assert engine.next_id("orders") == 2
+    engine.close()
+    assert json.loads((tmp_path / "orders.json").read_text()) == [{"id": 1, "status": "pending"}]